@@ -0,0 +1,60 @@
+import sys
+import os
+import time
+import argparse
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cli import compile_source
+from src.runtime import Runtime
+
+# An element-wise loop over three arrays, filled with copy() so the loop is
+# all that takes time
+ARRAY_SOURCE = """
+var n: Int = %d;
+var scale: Int = 3;
+var a: Array = array(n);
+var b: Array = array(n);
+var c: Array = array(n);
+copy(a, 2);
+copy(b, 5);
+var i: Int = 0;
+while i < n {
+    set(c, i, get(a, i) * scale + get(b, i));
+    i = %s;
+}
+var total: Int = sum(c);
+"""
+
+
+def bench(instructions, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        runtime = Runtime()
+        runtime.load_program(instructions)
+        start = time.perf_counter()
+        runtime.run()
+        best = min(best, time.perf_counter() - start)
+    return best, runtime.globals[-1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Element-wise array loops, vectorized and interpreted')
+    parser.add_argument('--size', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # The step written as 1 + i is not recognized, so the loop then
+    # runs in the interpreter
+    results = {}
+    for name, step in (('vectorized', 'i + 1'), ('element by element', '1 + i')):
+        seconds, total = bench(compile_source(ARRAY_SOURCE % (args.size, step)), args.repeat)
+        results[name] = seconds
+        print(f'{name:>18}: {results[name] * 1000:9.2f} ms  (total {total})')
+    speedup = results['element by element'] / results['vectorized']
+    print(f'speedup {speedup:.1f}x over {args.size} elements')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,148 @@
+import sys
+import os
+import gc
+import time
+import argparse
+import tracemalloc
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.ast_nodes import ASTNode, Arena, Integer, Identifier
+
+def synthetic_source(statements):
+    # Every fourth line opens a block holding one more statement
+    parts = ['var v0: Int = 0;\n']
+    for i in range(1, statements // 2):
+        if i % 4 == 0:
+            parts.append(f'if v{i - 1} {{\n    var t{i}: Int = {i};\n}}\n')
+        elif i % 4 == 1:
+            parts.append(f'while v{i - 1} {{\n    var u{i}: Int = v{i - 1};\n}}\n')
+        elif i % 4 == 2:
+            parts.append(f'func f{i}(a: Int, b: Int = {i}) -> Int {{\n    var r{i}: Int = a;\n}}\n')
+        else:
+            parts.append(f'var v{i}: Int = v{i - 1};\n')
+        parts.append(f'var v{i}: Int = {i};\n' if i % 4 != 3 else f'var w{i}: Int = {i};\n')
+    return ''.join(parts)
+
+class PlainNode:
+    # Stand-in for the node classes before __slots__: one __dict__ per node,
+    # with bare ints and strings for literals and names.
+    pass
+
+def to_plain(node):
+    if isinstance(node, Integer):
+        return int(node)
+    if isinstance(node, Identifier):
+        return node.name
+    if isinstance(node, ASTNode):
+        plain = PlainNode()
+        for field in type(node).__slots__:
+            setattr(plain, field, to_plain(getattr(node, field)))
+        return plain
+    if isinstance(node, list):
+        return [to_plain(item) for item in node]
+    if isinstance(node, tuple):
+        return tuple(to_plain(item) for item in node)
+    return node
+
+def retained(build):
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return result, size
+
+class CountingVisitor:
+    # Dispatches like SemanticAnalyzer, with the visitor cached per node class
+    def __init__(self):
+        self.count = 0
+        self.visitors = {}
+
+    def visit(self, node):
+        visitor = self.visitors.get(type(node))
+        if visitor is None:
+            visitor = self.visitors[type(node)] = getattr(self, 'visit_' + type(node).__name__, self.visit_leaf)
+        visitor(node)
+
+    def visit_all(self, nodes):
+        for node in nodes or ():
+            self.visit(node)
+
+    def visit_Program(self, node):
+        self.count += 1
+        self.visit_all(node.statements)
+
+    def visit_VariableDeclaration(self, node):
+        self.count += 1
+        self.visit(node.value)
+
+    def visit_FunctionDeclaration(self, node):
+        self.count += 1
+        for param in node.parameters:
+            if param[2] is not None:
+                self.visit(param[2])
+        self.visit_all(node.body)
+
+    def visit_IfStatement(self, node):
+        self.count += 1
+        self.visit(node.condition)
+        self.visit_all(node.then_block)
+        self.visit_all(node.else_block)
+
+    def visit_WhileStatement(self, node):
+        self.count += 1
+        self.visit(node.condition)
+        self.visit_all(node.body)
+
+    def visit_leaf(self, node):
+        self.count += 1
+
+class StringDispatchVisitor(CountingVisitor):
+    # The lookup the visitors did before: build the method name for every node
+    def visit(self, node):
+        getattr(self, 'visit_' + type(node).__name__, self.visit_leaf)(node)
+
+def best_time(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='AST memory and traversal benchmark')
+    parser.add_argument('--statements', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    code = synthetic_source(args.statements)
+
+    # Each representation is built from source on its own, so names and
+    # literals are counted in all three
+    plain, plain_bytes = retained(lambda: to_plain(Parser(Lexer(code)).parse()))
+    del plain
+    tree, tree_bytes = retained(lambda: Parser(Lexer(code)).parse())
+    arena = Arena()
+    root, arena_bytes = retained(lambda: Parser(Lexer(code), arena=arena).parse())
+    print(f'{len(tree.statements):,} top-level statements, {len(arena):,} nodes')
+    print(f'memory, __dict__ nodes:  {plain_bytes / 2**20:8.2f} MiB')
+    print(f'memory, __slots__ nodes: {tree_bytes / 2**20:8.2f} MiB')
+    print(f'memory, arena:           {arena_bytes / 2**20:8.2f} MiB')
+
+    timings = (
+        ('string dispatch visitor', lambda: StringDispatchVisitor().visit(tree)),
+        ('cached dispatch visitor', lambda: CountingVisitor().visit(tree)),
+        ('arena walk', lambda: sum(1 for _ in arena.walk(root))),
+        ('arena scan', lambda: len([kind for kind in arena.kinds])),
+    )
+    for label, function in timings:
+        print(f'traversal, {label}: {best_time(function, args.repeat) * 1000:8.1f} ms')
+
+if __name__ == '__main__':
+    main()
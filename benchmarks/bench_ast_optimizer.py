@@ -0,0 +1,92 @@
+import sys
+import os
+import time
+import argparse
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cli import compile_source
+from src.runtime import Runtime, Function
+
+# Hot loops of the kinds the AST optimizer rewrites: a helper called every
+# iteration, values recomputed from variables the loop never changes, and
+# an index that is a multiple of the loop counter
+PROGRAMS = {
+    'inlining': """
+func clamp_add(x: Int, y: Int) -> Int {
+    return x + y - (x + y > 1000) * 1000;
+}
+var i: Int = 0;
+var total: Int = 0;
+while i < %d {
+    total = clamp_add(total, i);
+    i = i + 1;
+}
+""",
+    'invariants': """
+var width: Int = 640;
+var height: Int = 480;
+var depth: Int = 3;
+var i: Int = 0;
+var total: Int = 0;
+while i < %d {
+    total = total + (width * height * depth - 1) - (width + height) * 2;
+    i = i + 1;
+}
+""",
+    'strength': """
+func checksum(n: Int) -> Int {
+    var i: Int = 0;
+    var total: Int = 0;
+    while i < n {
+        total = total + (i * 12 + 7) - (i * 12 + 7 > 5000) * 5;
+        i = i + 1;
+    }
+    return total;
+}
+var result: Int = checksum(%d);
+""",
+}
+SIZES = {'inlining': 100000, 'invariants': 100000, 'strength': 100000}
+
+
+def run(code, ast_optimize):
+    runtime = Runtime()
+    runtime.load_program(compile_source(code, 2, ast_optimize=ast_optimize))
+    start = time.perf_counter()
+    runtime.run()
+    return time.perf_counter() - start, runtime.globals
+
+
+def values(globals):
+    return [None if type(value) is Function else value for value in globals]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run time at -O2 with and without the AST optimizer')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplier for the iteration counts')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per configuration; the best is reported')
+    args = parser.parse_args()
+
+    for name, template in PROGRAMS.items():
+        code = template % int(SIZES[name] * args.scale)
+        times = {}
+        results = {}
+        for ast_optimize in (False, True):
+            best = None
+            for _ in range(args.repeat):
+                seconds, results[ast_optimize] = run(code, ast_optimize)
+                best = seconds if best is None else min(best, seconds)
+            times[ast_optimize] = best
+        # The optimizer's variables come after the program's own globals;
+        # functions are left out, since inlined ones are removed
+        declared = len(results[False])
+        if values(results[True][:declared]) != values(results[False]):
+            raise SystemExit(f'{name}: results differ with the AST optimizer')
+        print(f'{name:>10}: {times[False] * 1000:8.1f} ms without, {times[True] * 1000:8.1f} ms with '
+              f'({times[False] / times[True]:.2f}x)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import sys
+import os
+import time
+import argparse
+import threading
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cli import compile_source
+from src.runtime import Runtime
+from src.embedding import RuntimePool, compile_program
+
+# A small script of the kind a service runs per request, with its input
+# declared by the host
+SCRIPT = """
+func score(value: Int, weight: Int) -> Int {
+    if value > 100 {
+        return weight * 100;
+    }
+    return value * weight;
+}
+var total: Int = 0;
+var i: Int = 0;
+while i < 20 {
+    total = total + score(n + i, 3);
+    i = i + 1;
+}
+"""
+
+
+def per_request(requests):
+    # Everything rebuilt for every request; the input becomes a declaration
+    for n in range(requests):
+        runtime = Runtime(workers=1)
+        runtime.load_program(compile_source(f'var n: Int = {n};\n' + SCRIPT))
+        runtime.run()
+
+
+def compiled_once(requests):
+    program = compile_program(SCRIPT, inputs={'n': 'Int'})
+    for n in range(requests):
+        program.run(n=n)
+
+
+def pooled(requests, threads):
+    program = compile_program(SCRIPT, inputs={'n': 'Int'})
+    with RuntimePool(program, size=threads) as pool:
+        def serve(start):
+            for n in range(start, requests, threads):
+                pool.run(n=n)
+        workers = [threading.Thread(target=serve, args=(start,)) for start in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Requests per second through the embedding API')
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--threads', type=int, default=4)
+    args = parser.parse_args()
+
+    configurations = {
+        'compile per request': lambda: per_request(args.requests),
+        'compiled once': lambda: compiled_once(args.requests),
+        f'pool, {args.threads} threads': lambda: pooled(args.requests, args.threads),
+    }
+    for name, bench in configurations.items():
+        start = time.perf_counter()
+        bench()
+        seconds = time.perf_counter() - start
+        print(f'{name:>22}: {args.requests / seconds:9.0f} requests/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,129 @@
+import sys
+import os
+import time
+import argparse
+import tracemalloc
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cli import compile_source
+from src.runtime import Runtime
+
+# Two goroutines handing a value back and forth over unbuffered channels:
+# every message is one blocking send and one wake-up, so two switches
+PING_PONG = """
+func pong(ping: Chan, pong: Chan) -> Int {
+    var value: Int = recv(ping);
+    while value > 0 {
+        send(pong, value - 1);
+        value = recv(ping);
+    }
+}
+var ping: Chan = chan(0);
+var back: Chan = chan(0);
+go pong(ping, back);
+var value: Int = %d;
+while value > 0 {
+    send(ping, value);
+    value = recv(back);
+}
+send(ping, 0);
+"""
+
+# Goroutines that never block, so every switch is a time-slice preemption
+SPINNERS = """
+func spin(n: Int, done: Chan) -> Int {
+    while n > 0 {
+        n = n - 1;
+    }
+    send(done, 1);
+}
+var done: Chan = chan(%d);
+var i: Int = 0;
+while i < %d {
+    go spin(%d, done);
+    i = i + 1;
+}
+while i > 0 {
+    recv(done);
+    i = i - 1;
+}
+"""
+
+# Many goroutines each sending a batch of values to one channel read by main
+FAN_IN = """
+func produce(out: Chan, n: Int) -> Int {
+    while n > 0 {
+        send(out, n);
+        n = n - 1;
+    }
+}
+var out: Chan = chan(%d);
+var i: Int = 0;
+while i < %d {
+    go produce(out, %d);
+    i = i + 1;
+}
+var received: Int = 0;
+while received < %d {
+    recv(out);
+    received = received + 1;
+}
+"""
+
+def timed_run(code, repeat, time_slice=None):
+    instructions = compile_source(code)
+    best = float('inf')
+    for _ in range(repeat):
+        runtime = Runtime() if time_slice is None else Runtime(time_slice)
+        runtime.load_program(instructions)
+        start = time.perf_counter()
+        runtime.run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def goroutine_memory(goroutines):
+    # Memory held by parked goroutines, measured with all of them blocked
+    code = FAN_IN % (0, goroutines, 1, 0)
+    runtime = Runtime()
+    runtime.load_program(compile_source(code))
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    runtime.run()
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    return size
+
+def main():
+    parser = argparse.ArgumentParser(description='Goroutine scheduler and channel benchmark')
+    parser.add_argument('--goroutines', type=int, default=100000)
+    parser.add_argument('--messages', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    seconds = timed_run(PING_PONG % args.messages, args.repeat)
+    switches = 2 * args.messages
+    print(f'ping-pong: {switches:,} switches in {seconds:.3f}s: {seconds / switches * 1e6:.2f} us/switch')
+
+    spinners, spins, time_slice = 100, 10000, 100
+    seconds = timed_run(SPINNERS % (spinners, spinners, spins, ), args.repeat, time_slice)
+    preemptions = spinners * spins * 4 // time_slice
+    print(f'preemption: {spinners} goroutines, about {preemptions:,} time slices of {time_slice} '
+          f'instructions in {seconds:.3f}s')
+
+    for capacity, label in ((0, 'unbuffered'), (64, 'buffered(64)')):
+        seconds = timed_run(FAN_IN % (capacity, args.goroutines, 1, args.goroutines), args.repeat)
+        print(f'{label}, {args.goroutines:,} goroutines x 1 message: '
+              f'{args.goroutines / seconds:,.0f} messages/s ({seconds:.3f}s incl. spawning)')
+    per_goroutine = 10
+    messages = args.goroutines * per_goroutine // 10
+    seconds = timed_run(FAN_IN % (64, args.goroutines // 10, per_goroutine, messages), args.repeat)
+    print(f'buffered(64), {args.goroutines // 10:,} goroutines x {per_goroutine} messages: '
+          f'{messages / seconds:,.0f} messages/s')
+
+    size = goroutine_memory(args.goroutines)
+    print(f'{args.goroutines:,} parked goroutines: {size / 2**20:.1f} MiB, {size / args.goroutines:.0f} bytes each')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,74 @@
+import sys
+import os
+import time
+import argparse
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.semantic_analyzer import SemanticAnalyzer
+from src.incremental import IncrementalAnalyzer
+
+def synthetic_source(declarations):
+    # Globals, and functions reading the global declared just before them
+    parts = ['var g0: Int = 0;\n']
+    for i in range(1, declarations):
+        if i % 2:
+            parts.append(f'func f{i}(a: Int, b: Int = {i}) -> Int {{\n'
+                         f'    var r: Int = a * b + g{i - 1};\n'
+                         f'    while r > 0 {{\n        r = r - 1;\n    }}\n}}\n')
+        else:
+            parts.append(f'var g{i}: Int = g{i - 2} + {i};\n')
+    return ''.join(parts)
+
+def full_check(code):
+    # What the tooling did before: the whole pipeline over the whole file
+    try:
+        SemanticAnalyzer().visit(Parser(Lexer(code)).parse())
+    except Exception as error:
+        return [str(error)]
+    return []
+
+def edits(code, declarations):
+    # (label, edited source) pairs, each applied to the unedited source
+    middle = declarations // 2 - (declarations // 2) % 2
+    return (
+        ('edit a function body', code.replace('a * b + g0;', 'a * b + g0 + 1;', 1)),
+        ('retype a global', code.replace(f'var g{middle}: Int', f'var g{middle}: Float', 1)),
+        ('insert a function', code.replace(f'var g{middle}: Int', f'func h() -> Int {{\n}}\nvar g{middle}: Int', 1)),
+        ('break the last line', code[:-2] + '\n'),
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description='Edit-to-diagnostics latency benchmark')
+    parser.add_argument('--declarations', type=int, default=20000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    code = synthetic_source(args.declarations)
+    print(f'{args.declarations:,} top-level declarations, {code.count(chr(10)):,} lines')
+
+    start = time.perf_counter()
+    full_check(code)
+    print(f'full check:         {(time.perf_counter() - start) * 1000:8.1f} ms')
+
+    analyzer = IncrementalAnalyzer()
+    start = time.perf_counter()
+    analyzer.update(code)
+    print(f'initial update:     {(time.perf_counter() - start) * 1000:8.1f} ms')
+
+    for label, edited in edits(code, args.declarations):
+        best = float('inf')
+        for _ in range(args.repeat):
+            # Edit then revert, timing only the edit
+            start = time.perf_counter()
+            analyzer.update(edited)
+            best = min(best, time.perf_counter() - start)
+            reparsed, rechecked = analyzer.reparsed, analyzer.rechecked
+            analyzer.update(code)
+        print(f'{label + ":":20}{best * 1000:8.1f} ms  ({reparsed} reparsed, {rechecked} rechecked)')
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,120 @@
+import sys
+import os
+import re
+import time
+import argparse
+from functools import partial
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.lexer import END_PAIR, Lexer, TokenType, KEYWORDS
+
+# The scanner Lexer used before the compiled master pattern, kept as the
+# reference point for the speedup figure.
+token_specification = [
+    ('INTEGER',   r'\d+'),
+    ('IDENTIFIER', r'[A-Za-z_]\w*'),
+    ('SYMBOL',    r'==|!=|<=|>=|->|[:+\-*/=(){};,<>]'),
+    ('NEWLINE',   r'\n'),
+    ('SKIP',      r'[ \t]+'),
+    ('MISMATCH',  r'.'),
+]
+
+tok_regex = '|'.join('(?P<%s>%s)' % pair for pair in token_specification)
+
+def reference_tokenize(code):
+    tokens = []
+    for mo in re.finditer(tok_regex, code):
+        kind = mo.lastgroup
+        value = mo.group()
+        if kind == 'INTEGER':
+            tokens.append((TokenType.INTEGER, int(value)))
+        elif kind == 'IDENTIFIER':
+            if value in KEYWORDS:
+                tokens.append((TokenType.KEYWORD, value))
+            else:
+                tokens.append((TokenType.IDENTIFIER, value))
+        elif kind == 'SYMBOL':
+            tokens.append((TokenType.SYMBOL, value))
+        elif kind == 'NEWLINE':
+            tokens.append((TokenType.NEWLINE, value))
+        elif kind == 'SKIP':
+            continue
+        elif kind == 'MISMATCH':
+            raise RuntimeError(f'Unexpected token: {value}')
+    tokens.append((TokenType.EOF, None))
+    return tokens
+
+# Speedup over the reference asked of the scanner, scan plus consume
+TARGET_SPEEDUP = 3.0
+
+def synthetic_source(lines):
+    # A mix of declarations, arithmetic and control flow with many distinct names
+    parts = []
+    for i in range(lines // 4):
+        parts.append(f'var value_{i}: Int = value_{i - 1} * {i} + 17;\n')
+        parts.append(f'func helper_{i % 97}(a: Int, b: Int) -> Int {{\n')
+        parts.append(f'    while a <= b {{ a = a + {i % 13}; }}\n')
+        parts.append('}\n')
+    return ''.join(parts)
+
+# Both consumers compare against this rather than looking up TokenType.EOF
+# per token, which costs as much as the lexer's own per-token work
+EOF = TokenType.EOF
+
+def drain(next_token):
+    count = 0
+    while next_token()[0] != EOF:
+        count += 1
+    return count
+
+def drain_pairs(code):
+    # How the Parser consumes a Lexer: its (kind, value) pairs
+    return drain(partial(next, Lexer(code).pairs(), END_PAIR))
+
+def drain_records(code):
+    return drain(Lexer(code).next_token)
+
+def drain_reference(tokens):
+    # How the Parser consumed the old token list, one next_token() at a time
+    count = 0
+    current = 0
+    while tokens[current][0] != EOF:
+        current += 1
+        count += 1
+    return count
+
+def best_time(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description='Lexer throughput benchmark')
+    parser.add_argument('--lines', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    code = synthetic_source(args.lines)
+    count = drain_pairs(code)
+    print(f'{len(code):,} characters, {count:,} tokens')
+
+    # Throughput is scanning plus handing every token to a consumer, as the
+    # parser does
+    reference = best_time(lambda: drain_reference(reference_tokenize(code)), args.repeat)
+    scanner = best_time(lambda: drain_pairs(code), args.repeat)
+    speedup = reference / scanner
+    print(f'reference: {reference:.4f}s, {count / reference:,.0f} tokens/s')
+    print(f'scanner:   {scanner:.4f}s, {count / scanner:,.0f} tokens/s, {speedup:.2f}x')
+    print(f'target {TARGET_SPEEDUP:.0f}x: {"met" if speedup >= TARGET_SPEEDUP else "missed"}')
+
+    # Token records, offsets included, through next_token()
+    records = best_time(lambda: drain_records(code), args.repeat)
+    print(f'Token records: {records:.4f}s, {count / records:,.0f} tokens/s, {reference / records:.2f}x')
+
+if __name__ == '__main__':
+    main()
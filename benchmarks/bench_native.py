@@ -0,0 +1,106 @@
+import sys
+import os
+import time
+import argparse
+import tempfile
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.embedding import compile_program
+from src.native import compile_native, run_native
+
+# CPU-bound Int programs of the kinds the C backend compiles: recursive
+# calls, nested loops, and a loop of calls that loop themselves
+PROGRAMS = {
+    'fib': """
+func fib(n: Int) -> Int {
+    if n < 2 {
+        return n;
+    }
+    return fib(n - 1) + fib(n - 2);
+}
+var result: Int = fib(%d);
+""",
+    'loops': """
+var total: Int = 0;
+var i: Int = 0;
+while i < %d {
+    var j: Int = 0;
+    while j < 100 {
+        total = total + i * j - (i > j) * 3;
+        j = j + 1;
+    }
+    i = i + 1;
+}
+""",
+    'gcd': """
+func gcd(a: Int, b: Int) -> Int {
+    while a != b {
+        if a > b {
+            a = a - b;
+        } else {
+            b = b - a;
+        }
+    }
+    return a;
+}
+var total: Int = 0;
+var i: Int = 1;
+while i < %d {
+    total = total + gcd(i * 7 + 3, 1001);
+    i = i + 1;
+}
+""",
+}
+SIZES = {'fib': 22, 'loops': 1000, 'gcd': 3000}
+
+
+def run_vm(code):
+    program = compile_program(code, optimize=2)
+    start = time.perf_counter()
+    results = program.run()
+    return time.perf_counter() - start, {name: value for name, value in results.items() if type(value) is int}
+
+
+def run_executable(path):
+    start = time.perf_counter()
+    results = run_native(path)
+    return time.perf_counter() - start, results
+
+
+def best(function, argument, repeat):
+    times = []
+    for _ in range(repeat):
+        seconds, results = function(argument)
+        times.append(seconds)
+    return min(times), results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run time of CPU-bound programs on the VM at -O2 and compiled with the C backend')
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplier for the problem sizes (fib grows by one per doubling)')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per configuration; the best is reported')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, template in PROGRAMS.items():
+            if name == 'fib':
+                size = SIZES[name] + max(0, int(args.scale).bit_length() - 1)
+            else:
+                size = int(SIZES[name] * args.scale)
+            code = template % size
+            start = time.perf_counter()
+            executable = compile_native(code, os.path.join(directory, name))
+            build = time.perf_counter() - start
+            vm_time, vm_results = best(run_vm, code, args.repeat)
+            native_time, native_results = best(run_executable, executable, args.repeat)
+            if native_results != vm_results:
+                raise SystemExit(f'{name}: results differ between the VM and the native executable')
+            # The native time includes starting the executable
+            print(f'{name:>6}: {vm_time * 1000:8.1f} ms on the VM, {native_time * 1000:7.1f} ms native '
+                  f'({vm_time / native_time:.0f}x), built in {build * 1000:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
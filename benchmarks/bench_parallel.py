@@ -0,0 +1,79 @@
+import sys
+import os
+import time
+import argparse
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cli import compile_source
+from src.runtime import Runtime
+
+# An embarrassingly parallel loop: every iteration runs the same amount of
+# interpreted work and only its result is combined
+PARALLEL_SOURCE = """
+func work(seed: Int, steps: Int) -> Int {
+    var value: Int = seed;
+    while steps > 0 {
+        value = value * 3 + 1;
+        while value > 65537 {
+            value = value - 65537;
+        }
+        steps = steps - 1;
+    }
+    return value;
+}
+var steps: Int = %d;
+var total: Int = 0;
+parallel for i in 0 .. %d reduce(+: total) {
+    return work(i, steps);
+}
+"""
+
+
+def bench(instructions, workers, repeat):
+    # The pool is started by a warm-up run, so timings only cover the loop
+    runtime = Runtime(workers=workers)
+    runtime.load_program(instructions)
+    try:
+        runtime.run()
+        best = float('inf')
+        for _ in range(repeat):
+            runtime.load_program(instructions)
+            runtime.instruction_pointer = 0
+            start = time.perf_counter()
+            runtime.run()
+            best = min(best, time.perf_counter() - start)
+        return best, runtime.globals[2]
+    finally:
+        runtime.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='parallel for scaling across worker processes')
+    parser.add_argument('--iterations', type=int, default=256)
+    parser.add_argument('--steps', type=int, default=2000)
+    parser.add_argument('--workers', type=int, nargs='+', default=None,
+                        help='Worker counts to compare (default: 1, 2, 4, ... up to the number of cores)')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    workers = args.workers
+    if workers is None:
+        cores = os.cpu_count() or 1
+        workers = [1]
+        while workers[-1] * 2 <= cores:
+            workers.append(workers[-1] * 2)
+        if workers[-1] != cores:
+            workers.append(cores)
+
+    instructions = compile_source(PARALLEL_SOURCE % (args.steps, args.iterations))
+    baseline = None
+    for count in workers:
+        seconds, result = bench(instructions, count, args.repeat)
+        baseline = baseline or seconds
+        print(f'{count:3d} workers: {seconds:.3f}s  speedup {baseline / seconds:5.2f}x  (result {result})')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+import sys
+import os
+import time
+import argparse
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cli import compile_source, compile_registers
+from src.runtime import Runtime
+from src.register_vm import RegisterVM
+
+# Arithmetic on a few variables per iteration, and recursive calls
+PROGRAMS = {
+    'arithmetic': """
+var i: Int = 0;
+var total: Int = 0;
+var scale: Int = 3;
+while i < %d {
+    total = total + i * scale - (total / 1000) * 1000;
+    i = i + 1;
+}
+""",
+    'calls': """
+func fib(n: Int) -> Int {
+    if n < 2 {
+        return n;
+    }
+    return fib(n - 1) + fib(n - 2);
+}
+var result: Int = fib(%d);
+""",
+}
+SIZES = {'arithmetic': 100000, 'calls': 20}
+
+
+def stack_vm(code, optimize):
+    runtime = Runtime()
+    runtime.load_program(compile_source(code, optimize))
+    return runtime
+
+
+def register_vm(code):
+    vm = RegisterVM()
+    vm.load_program(*compile_registers(code))
+    return vm
+
+
+def bench(make, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        vm = make()
+        start = time.perf_counter()
+        vm.run()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def dispatches(vm):
+    # Instructions executed, counted on a run with every handler wrapped
+    count = [0]
+
+    def counting(handler):
+        def counted(operand):
+            count[0] += 1
+            return handler(operand)
+        return counted
+
+    vm.handlers[:] = [None if handler is None else counting(handler) for handler in vm.handlers]
+    vm.run()
+    return count[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='The register VM against the stack VM')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--scale', type=float, default=1.0, help='Multiplies the loop count (not the fib argument)')
+    args = parser.parse_args()
+
+    for name, source in PROGRAMS.items():
+        size = SIZES[name] if name == 'calls' else int(SIZES[name] * args.scale)
+        code = source % size
+        configurations = {
+            'stack -O1': lambda: stack_vm(code, 1),
+            'stack -O2': lambda: stack_vm(code, 2),
+            'register': lambda: register_vm(code),
+        }
+        print(f'{name}:')
+        baseline = None
+        for label, make in configurations.items():
+            seconds = bench(make, args.repeat)
+            baseline = baseline or seconds
+            print(f'  {label:>10}: {seconds * 1000:9.2f} ms  {dispatches(make()):>10} dispatches  '
+                  f'{baseline / seconds:5.2f}x')
+
+
+if __name__ == '__main__':
+    main()
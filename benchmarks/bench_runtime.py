@@ -0,0 +1,182 @@
+import sys
+import os
+import time
+import argparse
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.cli import compile_source
+from src.peephole import PeepholeOptimizer
+from src.runtime import Runtime
+from src.profiler import Profiler
+
+CALLS_SOURCE = """
+func fib(n: Int) -> Int {
+    if n < 2 {
+        return n;
+    }
+    return fib(n - 1) + fib(n - 2);
+}
+func count(n: Int) -> Int {
+    if n == 0 {
+        return 0;
+    }
+    return count(n - 1);
+}
+var a: Int = fib(%d);
+var b: Int = count(%d);
+"""
+
+
+class ReferenceRuntime:
+    # The Runtime used before table-driven dispatch, kept as the reference
+    # point for the speedup figure: one if/elif chain per instruction and
+    # another per binary operator.
+    def __init__(self):
+        self.memory = {}
+        self.call_stack = []
+        self.instruction_pointer = 0
+        self.instructions = []
+
+    def load_program(self, instructions):
+        self.instructions = instructions
+
+    def run(self):
+        while self.instruction_pointer < len(self.instructions):
+            instruction = self.instructions[self.instruction_pointer]
+            self.execute(instruction)
+            self.instruction_pointer += 1
+
+    def execute(self, instruction):
+        op = instruction[0]
+        if op == 'PUSH':
+            self.call_stack.append(instruction[1])
+        elif op == 'STORE':
+            self.memory[instruction[1]] = self.call_stack.pop()
+        elif op == 'LOAD':
+            self.call_stack.append(self.memory.get(instruction[1], None))
+        elif op == 'BIN_OP':
+            self.handle_bin_op(instruction[1])
+        elif op == 'JUMP_IF_FALSE':
+            if not self.call_stack.pop():
+                self.instruction_pointer = instruction[1] - 1
+        elif op == 'JUMP':
+            self.instruction_pointer = instruction[1] - 1
+        elif op == 'HALT':
+            return
+        else:
+            raise RuntimeError(f'Unknown instruction: {instruction}')
+
+    def handle_bin_op(self, operator):
+        right = self.call_stack.pop()
+        left = self.call_stack.pop()
+        if operator == '+':
+            result = left + right
+        elif operator == '-':
+            result = left - right
+        elif operator == '*':
+            result = left * right
+        elif operator == '/':
+            result = left / right
+        elif operator == '>':
+            result = left > right
+        elif operator == '<':
+            result = left < right
+        elif operator == '>=':
+            result = left >= right
+        elif operator == '<=':
+            result = left <= right
+        elif operator == '==':
+            result = left == right
+        elif operator == '!=':
+            result = left != right
+        else:
+            raise RuntimeError(f'Unknown binary operator: {operator}')
+        self.call_stack.append(result)
+
+
+def counting_loop(iterations, slots=False):
+    # i = iterations; while i > 0 { acc = acc + i; i = i - 1; }
+    instructions = [
+        ('PUSH', iterations),
+        ('STORE', 'i'),
+        ('PUSH', 0),
+        ('STORE', 'acc'),
+        ('LOAD', 'i'),            # loop start
+        ('PUSH', 0),
+        ('BIN_OP', '>'),
+        ('JUMP_IF_FALSE', 17),
+        ('LOAD', 'acc'),
+        ('LOAD', 'i'),
+        ('BIN_OP', '+'),
+        ('STORE', 'acc'),
+        ('LOAD', 'i'),
+        ('PUSH', 1),
+        ('BIN_OP', '-'),
+        ('STORE', 'i'),
+        ('JUMP', 4),
+        ('HALT',),
+    ]
+    if slots:
+        slot = {'i': 0, 'acc': 1}
+        instructions = [(op + '_GLOBAL', slot[instruction[1]]) if op in ('LOAD', 'STORE') else instruction
+                        for instruction in instructions for op in [instruction[0]]]
+    executed = 4 + iterations * 13 + 4 + 1
+    return instructions, executed
+
+
+def bench(iterations, repeat, slots=False, optimize=0, jit=False, profile=False, reference=False):
+    instructions, executed = counting_loop(iterations, slots)
+    # Rates at higher levels are in unoptimized-equivalent instructions
+    instructions = PeepholeOptimizer(optimize).optimize(instructions)
+    best = float('inf')
+    for _ in range(repeat):
+        runtime = ReferenceRuntime() if reference else Runtime(jit=jit)
+        runtime.load_program(instructions)
+        run = Profiler(runtime).run if profile else runtime.run
+        start = time.perf_counter()
+        run()
+        best = min(best, time.perf_counter() - start)
+    return executed, best
+
+
+def bench_calls(depth, repeat):
+    # fib(n) makes 2 * F(n + 1) - 1 calls; count() is all tail calls
+    a, b = 1, 1
+    for _ in range(depth - 1):
+        a, b = b, a + b
+    calls = 2 * b - 1 + depth * 100 + 1
+    instructions = compile_source(CALLS_SOURCE % (depth, depth * 100))
+    best = float('inf')
+    for _ in range(repeat):
+        runtime = Runtime()
+        runtime.load_program(instructions)
+        start = time.perf_counter()
+        runtime.run()
+        best = min(best, time.perf_counter() - start)
+    return calls, best
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Runtime dispatch benchmark')
+    parser.add_argument('--iterations', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--call-depth', type=int, default=20)
+    args = parser.parse_args()
+
+    executed, baseline = bench(args.iterations, args.repeat, reference=True)
+    print(f'reference if/elif dispatch: {executed} instructions in {baseline:.4f}s: '
+          f'{executed / baseline:,.0f} instructions/s')
+    configurations = (('names', False, 0, False, False), ('slots', True, 0, False, False),
+                      ('slots -O2', True, 2, False, False), ('slots --jit', True, 1, True, False),
+                      ('slots --profile', True, 0, False, True))
+    for label, slots, optimize, jit, profile in configurations:
+        executed, seconds = bench(args.iterations, args.repeat, slots, optimize, jit, profile)
+        print(f'{label}: {executed} instructions in {seconds:.4f}s: {executed / seconds:,.0f} instructions/s, '
+              f'{baseline / seconds:.2f}x the reference')
+    calls, seconds = bench_calls(args.call_depth, args.repeat)
+    print(f'calls: {calls} calls in {seconds:.4f}s: {calls / seconds:,.0f} calls/s')
+
+if __name__ == '__main__':
+    main()
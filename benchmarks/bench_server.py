@@ -0,0 +1,86 @@
+import sys
+import os
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.client import request
+
+CLI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'cli.py')
+PROGRAMS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'programs')
+
+# A script that runs in a few milliseconds, so a command's latency is nearly
+# all startup and compiling
+SCRIPT = """
+var total: Int = 0;
+var i: Int = 0;
+while i < 200 {
+    total = total + i;
+    i = i + 1;
+}
+"""
+
+
+def latency(command, repeat):
+    # Best and median wall time of whole invocations, as a shell would see them
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        subprocess.run(command, check=True)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    return times[0], times[len(times) // 2]
+
+
+def start_daemon(socket_path, cache_dir):
+    daemon = subprocess.Popen([sys.executable, CLI, 'serve', '--socket', socket_path, '--cache-dir', cache_dir])
+    for _ in range(200):
+        try:
+            request({'command': 'ping'}, socket_path)
+            return daemon
+        except (FileNotFoundError, ConnectionRefusedError):
+            time.sleep(0.05)
+    daemon.kill()
+    raise RuntimeError('The daemon did not start')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Per-invocation latency of cli.py with and without the serve daemon')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('program', nargs='?', default=None, help='Program to run (default: a small loop)')
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp()
+    try:
+        source = args.program
+        if source is None:
+            source = os.path.join(directory, 'small.fusion')
+            with open(source, 'w') as file:
+                file.write(SCRIPT)
+        socket_path = os.path.join(directory, 'fusion.sock')
+        cache_dir = os.path.join(directory, 'cache')
+        daemon = start_daemon(socket_path, cache_dir)
+        try:
+            configurations = {
+                'python -c pass': [sys.executable, '-c', 'pass'],
+                'cli, no cache': [sys.executable, CLI, '--no-cache', source],
+                'cli, disk cache': [sys.executable, CLI, '--cache-dir', cache_dir, source],
+                'cli --connect': [sys.executable, CLI, '--connect', '--socket', socket_path, source],
+            }
+            for name, command in configurations.items():
+                best, median = latency(command, args.repeat)
+                print(f'{name:>16}: best {best * 1000:7.1f} ms  median {median * 1000:7.1f} ms')
+        finally:
+            request({'command': 'shutdown'}, socket_path)
+            daemon.wait()
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
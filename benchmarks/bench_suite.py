@@ -0,0 +1,201 @@
+import sys
+import os
+import json
+import time
+import platform
+import argparse
+
+# Add the project root directory to the Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.semantic_analyzer import SemanticAnalyzer
+from src.code_generator import CodeGenerator
+from src.peephole import PeepholeOptimizer
+from src.runtime import Runtime, numpy
+
+PROGRAMS_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'programs')
+
+# The phases of compiling and running a program, in order
+PHASES = ('lex', 'parse', 'analyze', 'generate', 'optimize', 'run')
+
+# Programs in PROGRAMS_DIRECTORY: loops (nested counting loops), fib
+# (recursive calls) and sieve (array indexing, skipped without NumPy). The
+# other two are generated, to stress the front end.
+ARRAY_PROGRAMS = {'sieve'}
+
+# Phases shorter than this, in seconds, are too noisy to judge
+MIN_JUDGED = 1e-3
+
+
+def straight_line_source(statements):
+    # One long basic block: declarations and arithmetic on earlier variables
+    parts = ['var v0: Int = 1;\n']
+    for i in range(1, statements):
+        parts.append(f'var v{i}: Int = v{i - 1} * {i % 7 + 1} + {i} - v{(i * 7) // 11};\n')
+    return ''.join(parts)
+
+
+def nested_source(depth, repeat):
+    # if and while blocks nested depth deep, run a few times
+    parts = ['var total: Int = 0;\n']
+    for level in range(depth):
+        parts.append(f'var c{level}: Int = 0;\n')
+    parts.append('var round: Int = 0;\nwhile round < %d {\n' % repeat)
+    for level in range(depth):
+        indent = '    ' * (level + 1)
+        if level % 2 == 0:
+            parts.append(f'{indent}if total >= 0 {{\n')
+        else:
+            parts.append(f'{indent}c{level} = 0;\n{indent}while c{level} < 2 {{\n')
+    parts.append('    ' * (depth + 1) + 'total = total + 1;\n')
+    for level in reversed(range(depth)):
+        indent = '    ' * (level + 1)
+        if level % 2 == 1:
+            parts.append(f'{indent}    c{level} = c{level} + 1;\n')
+        parts.append(f'{indent}}}\n')
+    parts.append('    round = round + 1;\n}\n')
+    return ''.join(parts)
+
+
+def load_programs(names=None):
+    programs = {}
+    for file_name in sorted(os.listdir(PROGRAMS_DIRECTORY)):
+        name, suffix = os.path.splitext(file_name)
+        if suffix == '.fusion':
+            with open(os.path.join(PROGRAMS_DIRECTORY, file_name)) as file:
+                programs[name] = file.read()
+    programs['straight_line'] = straight_line_source(5000)
+    programs['nested'] = nested_source(24, 20)
+    if names:
+        programs = {name: programs[name] for name in names}
+    return programs
+
+
+class TokenList:
+    # Hands tokens lexed beforehand to the parser, so parsing is timed alone
+    def __init__(self, tokens):
+        self.iterator = iter(tokens)
+
+    def next_token(self):
+        return next(self.iterator)
+
+
+def time_phases(code, optimize):
+    # Seconds taken by each phase, each one fed the previous one's output
+    times = {}
+    clock = time.perf_counter
+
+    start = clock()
+    tokens = Lexer(code).tokens
+    times['lex'] = clock() - start
+
+    start = clock()
+    ast = Parser(TokenList(tokens)).parse()
+    times['parse'] = clock() - start
+
+    start = clock()
+    analyzer = SemanticAnalyzer()
+    analyzer.visit(ast)
+    times['analyze'] = clock() - start
+
+    start = clock()
+    generator = CodeGenerator(analyzer.symbol_table, analyzer.scopes, analyzer.types)
+    generator.generate(ast)
+    times['generate'] = clock() - start
+
+    start = clock()
+    instructions = PeepholeOptimizer(optimize).optimize(generator.get_instructions())
+    times['optimize'] = clock() - start
+
+    runtime = Runtime()
+    runtime.load_program(instructions)
+    start = clock()
+    try:
+        runtime.run()
+    finally:
+        runtime.close()
+    times['run'] = clock() - start
+    return times
+
+
+def run_suite(programs, repeat, optimize):
+    # Best of repeat runs for every phase of every program
+    results = {}
+    for name, code in programs.items():
+        best = dict.fromkeys(PHASES, float('inf'))
+        for _ in range(repeat):
+            for phase, seconds in time_phases(code, optimize).items():
+                best[phase] = min(best[phase], seconds)
+        results[name] = best
+    return results
+
+
+def compare(results, baseline, threshold):
+    # (program, phase, baseline, current) for every phase that got slower by
+    # more than threshold, a fraction
+    regressions = []
+    for name, phases in results.items():
+        for phase, seconds in phases.items():
+            before = baseline.get(name, {}).get(phase)
+            if before is None or max(before, seconds) < MIN_JUDGED:
+                continue
+            if seconds > before * (1 + threshold):
+                regressions.append((name, phase, before, seconds))
+    return regressions
+
+
+def print_table(results, baseline=None):
+    print(f'{"program":<15}' + ''.join(f'{phase:>18}' for phase in PHASES))
+    for name, phases in results.items():
+        cells = []
+        for phase in PHASES:
+            cell = f'{phases[phase] * 1000:.2f}ms'
+            before = (baseline or {}).get(name, {}).get(phase)
+            if before:
+                cell += f' {(phases[phase] - before) / before:+5.0%}'
+            cells.append(f'{cell:>18}')
+        print(f'{name:<15}' + ''.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Time every compiler phase and the VM on a suite of programs')
+    parser.add_argument('programs', nargs='*', help='Programs to run (default: all)')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('-O', dest='optimize', type=int, choices=[0, 1, 2], default=1)
+    parser.add_argument('--json', type=str, default=None, metavar='PATH', help='Write the results as JSON, usable as a baseline')
+    parser.add_argument('--baseline', type=str, default=None, metavar='PATH', help='Compare against results saved with --json')
+    parser.add_argument('--threshold', type=float, default=0.10, help='Slowdown that counts as a regression (default: 0.10)')
+    args = parser.parse_args()
+
+    programs = load_programs(args.programs)
+    if numpy is None:
+        for name in ARRAY_PROGRAMS & set(programs):
+            print(f'skipping {name}: NumPy is not installed', file=sys.stderr)
+            del programs[name]
+
+    results = run_suite(programs, args.repeat, args.optimize)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)['results']
+    print_table(results, baseline)
+
+    if args.json:
+        report = {'python': platform.python_version(), 'repeat': args.repeat,
+                  'optimize': args.optimize, 'results': results}
+        with open(args.json, 'w') as file:
+            json.dump(report, file, indent=2)
+
+    if baseline is not None:
+        regressions = compare(results, baseline, args.threshold)
+        for name, phase, before, seconds in regressions:
+            print(f'REGRESSION {name} {phase}: {before * 1000:.2f}ms -> {seconds * 1000:.2f}ms '
+                  f'({(seconds - before) / before:+.0%})')
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,2 +1,448 @@
+from array import array
+
+
 class ASTNode:
-    pass
\ No newline at end of file
+    __slots__ = ()
+
+
+class Program(ASTNode):
+    __slots__ = ('statements',)
+
+    def __init__(self, statements):
+        self.statements = statements
+
+
+class ClassDeclaration(ASTNode):
+    __slots__ = ('identifier', 'body')
+
+    def __init__(self, identifier, body):
+        self.identifier = identifier
+        self.body = body
+
+
+class VariableDeclaration(ASTNode):
+    __slots__ = ('identifier', 'var_type', 'value')
+
+    def __init__(self, identifier, var_type, value):
+        self.identifier = identifier
+        self.var_type = var_type
+        self.value = value
+
+
+class FunctionDeclaration(ASTNode):
+    __slots__ = ('identifier', 'parameters', 'return_type', 'body')
+
+    def __init__(self, identifier, parameters, return_type, body):
+        self.identifier = identifier
+        self.parameters = parameters
+        self.return_type = return_type
+        self.body = body
+
+
+class IfStatement(ASTNode):
+    __slots__ = ('condition', 'then_block', 'else_block')
+
+    def __init__(self, condition, then_block, else_block=None):
+        self.condition = condition
+        self.then_block = then_block
+        self.else_block = else_block
+
+
+class WhileStatement(ASTNode):
+    __slots__ = ('condition', 'body')
+
+    def __init__(self, condition, body):
+        self.condition = condition
+        self.body = body
+
+
+class ReturnStatement(ASTNode):
+    __slots__ = ('value',)
+
+    def __init__(self, value=None):
+        self.value = value
+
+
+class ExpressionStatement(ASTNode):
+    __slots__ = ('expression',)
+
+    def __init__(self, expression):
+        self.expression = expression
+
+
+class GoStatement(ASTNode):
+    __slots__ = ('call',)
+
+    def __init__(self, call):
+        self.call = call
+
+
+class ParallelFor(ASTNode):
+    # parallel for variable in start .. stop reduce(operator: target) { body }
+    __slots__ = ('variable', 'start', 'stop', 'operator', 'target', 'body')
+
+    def __init__(self, variable, start, stop, operator, target, body):
+        self.variable = variable
+        self.start = start
+        self.stop = stop
+        self.operator = operator
+        self.target = target
+        self.body = body
+
+
+class Assignment(ASTNode):
+    __slots__ = ('identifier', 'value')
+
+    def __init__(self, identifier, value):
+        self.identifier = identifier
+        self.value = value
+
+
+class BinaryOperation(ASTNode):
+    __slots__ = ('left', 'operator', 'right')
+
+    def __init__(self, left, operator, right):
+        self.left = left
+        self.operator = operator
+        self.right = right
+
+
+class Call(ASTNode):
+    __slots__ = ('identifier', 'arguments')
+
+    def __init__(self, identifier, arguments):
+        self.identifier = identifier
+        self.arguments = arguments
+
+
+class Identifier(ASTNode):
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
+
+
+class Integer(int, ASTNode):
+    # An integer literal is its own value, so it compares and hashes like the
+    # int it holds and takes no more memory than one.
+    __slots__ = ()
+
+    @property
+    def value(self):
+        return int(self)
+
+
+# Arena kinds. PARAMETER only exists in the arena; trees keep parameters as
+# (identifier, type, default) tuples on FunctionDeclaration.
+NODE_TYPES = (
+    Program, ClassDeclaration, VariableDeclaration, FunctionDeclaration,
+    IfStatement, WhileStatement, Assignment, BinaryOperation, Call, Identifier, Integer,
+    ReturnStatement, ExpressionStatement, GoStatement, ParallelFor,
+    None,
+)
+KIND_OF = {node_type: kind for kind, node_type in enumerate(NODE_TYPES) if node_type is not None}
+PARAMETER = len(NODE_TYPES) - 1
+NO_NODE = -1
+
+
+def tree_children(node):
+    # The child nodes of a tree node in the order Arena.from_tree() adds
+    # them, None for missing values included
+    node_type = type(node)
+    if node_type is Program:
+        return node.statements
+    if node_type is ClassDeclaration:
+        return node.body
+    if node_type is VariableDeclaration or node_type is Assignment or node_type is ReturnStatement:
+        return [node.value]
+    if node_type is FunctionDeclaration:
+        return [default for _, _, default in node.parameters] + node.body
+    if node_type is IfStatement:
+        return [node.condition] + node.then_block + (node.else_block or [])
+    if node_type is WhileStatement:
+        return [node.condition] + node.body
+    if node_type is BinaryOperation:
+        return [node.left, node.right]
+    if node_type is Call:
+        return node.arguments
+    if node_type is Identifier or node_type is Integer:
+        return []
+    if node_type is ExpressionStatement:
+        return [node.expression]
+    if node_type is GoStatement:
+        return [node.call]
+    if node_type is ParallelFor:
+        return [node.start, node.stop] + node.body
+    raise TypeError(f'Cannot store {node_type.__name__} in an arena')
+
+
+class Arena:
+    # Stores a tree as parallel columns indexed by node id, with no object per
+    # node. Each node has a kind, a text payload (identifier, operator or
+    # integer value), an aux payload (a declared type) and three int fields
+    # holding child ids or list handles. A list handle points into links,
+    # where the list is stored as its length followed by the child ids.
+    #
+    #   Program              first=statements
+    #   ClassDeclaration     text=identifier first=body
+    #   VariableDeclaration  text=identifier aux=var_type first=value
+    #   FunctionDeclaration  text=identifier aux=return_type first=parameters second=body
+    #   (parameter)          text=identifier aux=type first=default
+    #   IfStatement          first=condition second=then_block third=else_block
+    #   WhileStatement       first=condition second=body
+    #   Assignment           text=identifier first=value
+    #   BinaryOperation      text=operator first=left second=right
+    #   Call                 text=identifier first=arguments
+    #   Identifier           text=name
+    #   Integer              text=value
+    #   ReturnStatement      first=value
+    #   ExpressionStatement  first=expression
+    #   GoStatement          first=call
+    #   ParallelFor          text=variable aux=(operator, target) first=start second=stop third=body
+    def __init__(self):
+        self.kinds = array('B')
+        self.text = []
+        self.aux = []
+        self.first = array('i')
+        self.second = array('i')
+        self.third = array('i')
+        self.links = array('i')
+
+    def __len__(self):
+        return len(self.kinds)
+
+    def add(self, kind, text=None, aux=None, first=NO_NODE, second=NO_NODE, third=NO_NODE):
+        node_id = len(self.kinds)
+        self.kinds.append(kind)
+        self.text.append(text)
+        self.aux.append(aux)
+        self.first.append(first)
+        self.second.append(second)
+        self.third.append(third)
+        return node_id
+
+    def add_list(self, node_ids):
+        handle = len(self.links)
+        self.links.append(len(node_ids))
+        self.links.extend(node_ids)
+        return handle
+
+    def children(self, handle):
+        if handle == NO_NODE:
+            return []
+        return self.links[handle + 1:handle + 1 + self.links[handle]]
+
+    def add_node(self, node_type, *fields):
+        # Same arguments as node_type(*fields), with child nodes given as ids
+        kind = KIND_OF[node_type]
+        if node_type is Program:
+            return self.add(kind, first=self.add_list(fields[0]))
+        if node_type is ClassDeclaration:
+            return self.add(kind, fields[0], first=self.add_list(fields[1]))
+        if node_type is VariableDeclaration:
+            return self.add(kind, fields[0], fields[1], fields[2])
+        if node_type is FunctionDeclaration:
+            identifier, parameters, return_type, body = fields
+            parameter_ids = [self.add(PARAMETER, name, param_type, NO_NODE if default is None else default)
+                             for name, param_type, default in parameters]
+            return self.add(kind, identifier, return_type, self.add_list(parameter_ids), self.add_list(body))
+        if node_type is IfStatement:
+            condition, then_block = fields[:2]
+            else_block = fields[2] if len(fields) > 2 else None
+            return self.add(kind, first=condition, second=self.add_list(then_block),
+                            third=NO_NODE if else_block is None else self.add_list(else_block))
+        if node_type is WhileStatement:
+            return self.add(kind, first=fields[0], second=self.add_list(fields[1]))
+        if node_type is Assignment:
+            return self.add(kind, fields[0], first=fields[1])
+        if node_type is BinaryOperation:
+            left, operator, right = fields
+            return self.add(kind, operator, first=left, second=right)
+        if node_type is Call:
+            return self.add(kind, fields[0], first=self.add_list(fields[1]))
+        if node_type is Identifier:
+            return self.add(kind, fields[0])
+        if node_type is Integer:
+            return self.add(kind, int(fields[0]))
+        if node_type is ReturnStatement:
+            value = fields[0] if fields else None
+            return self.add(kind, first=NO_NODE if value is None else value)
+        if node_type is ExpressionStatement or node_type is GoStatement:
+            return self.add(kind, first=fields[0])
+        if node_type is ParallelFor:
+            variable, start, stop, operator, target, body = fields
+            return self.add(kind, variable, (operator, target), start, stop, self.add_list(body))
+        raise TypeError(f'Cannot store {node_type.__name__} in an arena')
+
+    def from_tree(self, root):
+        # Children are added before their parent, so ids come out in post-order
+        # and the root is the last node. Without recursion: pending holds
+        # (node, None) for a node to visit and (node, count) for one whose
+        # count children have their ids at the end of done.
+        pending = [(root, None)]
+        done = []
+        while pending:
+            node, count = pending.pop()
+            if count is not None:
+                ids = done[len(done) - count:]
+                del done[len(done) - count:]
+                done.append(self.add_tree_node(node, ids))
+            elif node is None:
+                done.append(NO_NODE)
+            else:
+                children = tree_children(node)
+                pending.append((node, len(children)))
+                pending.extend((child, None) for child in reversed(children))
+        return done[0]
+
+    def add_tree_node(self, node, ids):
+        # Adds node, given the ids its tree_children() were stored under
+        node_type = type(node)
+        if node_type is Program:
+            return self.add_node(Program, ids)
+        if node_type is ClassDeclaration:
+            return self.add_node(ClassDeclaration, node.identifier, ids)
+        if node_type is VariableDeclaration:
+            return self.add_node(VariableDeclaration, node.identifier, node.var_type, ids[0])
+        if node_type is FunctionDeclaration:
+            count = len(node.parameters)
+            parameters = [(name, param_type, default)
+                          for (name, param_type, _), default in zip(node.parameters, ids)]
+            return self.add_node(FunctionDeclaration, node.identifier, parameters, node.return_type, ids[count:])
+        if node_type is IfStatement:
+            count = len(node.then_block) + 1
+            else_block = None if node.else_block is None else ids[count:]
+            return self.add_node(IfStatement, ids[0], ids[1:count], else_block)
+        if node_type is WhileStatement:
+            return self.add_node(WhileStatement, ids[0], ids[1:])
+        if node_type is Assignment:
+            return self.add_node(Assignment, node.identifier, ids[0])
+        if node_type is BinaryOperation:
+            return self.add_node(BinaryOperation, ids[0], node.operator, ids[1])
+        if node_type is Call:
+            return self.add_node(Call, node.identifier, ids)
+        if node_type is Identifier:
+            return self.add_node(Identifier, node.name)
+        if node_type is Integer:
+            return self.add_node(Integer, node)
+        if node_type is ParallelFor:
+            return self.add_node(ParallelFor, node.variable, ids[0], ids[1], node.operator, node.target, ids[2:])
+        # ReturnStatement, ExpressionStatement and GoStatement
+        return self.add_node(node_type, ids[0])
+
+    def to_tree(self, root):
+        # Without recursion, as from_tree: pending holds (node_id, None) for
+        # a node to visit and (node_id, count) for one whose count children
+        # are built at the end of done
+        pending = [(root, None)]
+        done = []
+        while pending:
+            node_id, count = pending.pop()
+            if count is not None:
+                nodes = done[len(done) - count:]
+                del done[len(done) - count:]
+                done.append(self.tree_node(node_id, nodes))
+            elif node_id == NO_NODE:
+                done.append(None)
+            else:
+                children = self.child_ids(node_id)
+                pending.append((node_id, len(children)))
+                pending.extend((child, None) for child in reversed(children))
+        return done[0]
+
+    def child_ids(self, node_id):
+        # The child ids of a node in the order to_tree() builds them, None
+        # and missing values included as NO_NODE
+        node_type = NODE_TYPES[self.kinds[node_id]]
+        first = self.first[node_id]
+        second = self.second[node_id]
+        if node_type is Program or node_type is ClassDeclaration or node_type is Call:
+            return list(self.children(first))
+        if node_type is FunctionDeclaration:
+            return [self.first[param] for param in self.children(first)] + list(self.children(second))
+        if node_type is IfStatement:
+            return [first, *self.children(second), *self.children(self.third[node_id])]
+        if node_type is WhileStatement:
+            return [first, *self.children(second)]
+        if node_type is BinaryOperation:
+            return [first, second]
+        if node_type is ParallelFor:
+            return [first, second, *self.children(self.third[node_id])]
+        if (node_type is VariableDeclaration or node_type is Assignment or node_type is ReturnStatement
+                or node_type is ExpressionStatement or node_type is GoStatement):
+            return [first]
+        return []
+
+    def tree_node(self, node_id, nodes):
+        # Builds the node with id node_id from the nodes of its child_ids()
+        node_type = NODE_TYPES[self.kinds[node_id]]
+        text = self.text[node_id]
+        if node_type is Program:
+            return Program(nodes)
+        if node_type is ClassDeclaration:
+            return ClassDeclaration(text, nodes)
+        if node_type is VariableDeclaration:
+            return VariableDeclaration(text, self.aux[node_id], nodes[0])
+        if node_type is FunctionDeclaration:
+            params = self.children(self.first[node_id])
+            parameters = [(self.text[param], self.aux[param], default) for param, default in zip(params, nodes)]
+            return FunctionDeclaration(text, parameters, self.aux[node_id], nodes[len(params):])
+        if node_type is IfStatement:
+            count = len(self.children(self.second[node_id])) + 1
+            else_block = None if self.third[node_id] == NO_NODE else nodes[count:]
+            return IfStatement(nodes[0], nodes[1:count], else_block)
+        if node_type is WhileStatement:
+            return WhileStatement(nodes[0], nodes[1:])
+        if node_type is Assignment:
+            return Assignment(text, nodes[0])
+        if node_type is BinaryOperation:
+            return BinaryOperation(nodes[0], text, nodes[1])
+        if node_type is Call:
+            return Call(text, nodes)
+        if node_type is Identifier:
+            return Identifier(text)
+        if node_type is ReturnStatement:
+            return ReturnStatement(nodes[0])
+        if node_type is ExpressionStatement:
+            return ExpressionStatement(nodes[0])
+        if node_type is GoStatement:
+            return GoStatement(nodes[0])
+        if node_type is ParallelFor:
+            operator, target = self.aux[node_id]
+            return ParallelFor(text, nodes[0], nodes[1], operator, target, nodes[2:])
+        return Integer(text)
+
+    def walk(self, root):
+        # Pre-order node ids below root, without recursion
+        pending = [root]
+        kinds = self.kinds
+        while pending:
+            node_id = pending.pop()
+            if node_id == NO_NODE:
+                continue
+            yield node_id
+            node_type = NODE_TYPES[kinds[node_id]]
+            first = self.first[node_id]
+            second = self.second[node_id]
+            if node_type is Program or node_type is ClassDeclaration or node_type is Call:
+                pending.extend(reversed(self.children(first)))
+            elif node_type is FunctionDeclaration:
+                pending.extend(reversed(self.children(second)))
+                pending.extend(reversed(self.children(first)))
+            elif node_type is IfStatement:
+                pending.extend(reversed(self.children(self.third[node_id])))
+                pending.extend(reversed(self.children(second)))
+                pending.append(first)
+            elif node_type is WhileStatement:
+                pending.extend(reversed(self.children(second)))
+                pending.append(first)
+            elif node_type is ParallelFor:
+                pending.extend(reversed(self.children(self.third[node_id])))
+                pending.append(second)
+                pending.append(first)
+            elif node_type is BinaryOperation:
+                pending.append(second)
+                pending.append(first)
+            elif (node_type is VariableDeclaration or node_type is Assignment or node_type is ReturnStatement
+                  or node_type is ExpressionStatement or node_type is GoStatement or node_type is None):
+                pending.append(first)
@@ -0,0 +1,700 @@
+from collections import Counter
+
+from src.ast_nodes import (
+    ClassDeclaration, VariableDeclaration, FunctionDeclaration,
+    IfStatement, WhileStatement, ReturnStatement, ExpressionStatement,
+    GoStatement, ParallelFor, Assignment, BinaryOperation, Call, Identifier,
+    Integer,
+)
+from src.code_generator import CodeGenerator
+from src.dead_code import PURE_OPERATORS, statement_names
+
+# Optimization level from which the pass runs, unless it is turned off
+AST_OPTIMIZE_LEVEL = 2
+
+# Operators through which an expression stays linear in a loop counter
+LINEAR_OPERATORS = {'+', '-', '*'}
+
+# Instructions run to advance a reduced product by its step: one fused
+# UPDATE for a constant step, LOAD, LOAD, BIN_OP_INT and STORE otherwise
+CONSTANT_STEP_COST = 1
+VARIABLE_STEP_COST = 4
+
+
+def optimize_ast(ast, analyzer, optimize, enabled=True, cost_model=None):
+    # Runs the optimizer on an analyzed tree at optimization levels that
+    # include it, unless disabled; returns the optimizer, or None
+    if optimize < AST_OPTIMIZE_LEVEL or not enabled:
+        return None
+    optimizer = AstOptimizer(analyzer.symbol_table, analyzer.scopes, analyzer.types, cost_model)
+    optimizer.optimize(ast)
+    return optimizer
+
+
+def postorder(node):
+    # Every node of an expression, operands first and left to right, which
+    # is the order they are evaluated in; without recursion, since machine-
+    # generated expressions nest deeper than the recursion limit
+    order = []
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        order.append(node)
+        if type(node) is BinaryOperation:
+            pending.append(node.left)
+            pending.append(node.right)
+        elif type(node) is Call:
+            pending.extend(node.arguments)
+    order.reverse()
+    return order
+
+
+def get_slot(container, key):
+    # An expression held by a node attribute or a list of arguments
+    return container[key] if type(key) is int else getattr(container, key)
+
+
+def set_slot(container, key, node):
+    if type(key) is int:
+        container[key] = node
+    else:
+        setattr(container, key, node)
+
+
+def all_statements(statements):
+    # Every statement in statements and nested in them, functions included
+    pending = list(statements)
+    while pending:
+        statement = pending.pop()
+        yield statement
+        statement_type = type(statement)
+        if statement_type is IfStatement:
+            pending.extend(statement.then_block)
+            pending.extend(statement.else_block or [])
+        elif statement_type in (WhileStatement, FunctionDeclaration, ParallelFor, ClassDeclaration):
+            pending.extend(statement.body)
+
+
+class CostModel:
+    # Estimates, in instructions run once -O2 has fused superinstructions,
+    # of what evaluating an expression costs. The optimizer only rewrites
+    # what the estimate says pays for itself.
+    #   inline_limit: the most nodes a function's expression may have to be
+    #   copied into its callers; larger ones are called, to bound code size.
+    def __init__(self, inline_limit=16):
+        self.inline_limit = inline_limit
+
+    def cost(self, node):
+        total = 0
+        for node in postorder(node):
+            total += 1
+            # A constant right operand is folded into BIN_OP_CONST
+            if type(node) is BinaryOperation and type(node.right) is Integer:
+                total -= 1
+        return total
+
+    def inline(self, body):
+        return len(postorder(body)) <= self.inline_limit
+
+    def hoist(self, node):
+        # Computed once before the loop, the expression costs one load per
+        # evaluation instead
+        return self.cost(node) > 1
+
+    def reduce(self, node, uses, constant_step):
+        # Each use becomes one load, for the price of advancing the product
+        # once per iteration
+        step = CONSTANT_STEP_COST if constant_step else VARIABLE_STEP_COST
+        return uses * self.cost(node) > uses + step
+
+
+class AstOptimizer:
+    # Rewrites the analyzed tree in place, before dead code elimination and
+    # code generation:
+    #   - calls to small top-level functions whose body is a single return of
+    #     an expression over their parameters are replaced by the expression;
+    #   - expressions a while loop recomputes from variables it never changes
+    #     are computed once before it, into a new variable;
+    #   - products of a loop counter, advanced by a fixed step once per
+    #     iteration, become a new variable advanced by an addition alongside.
+    # Only expressions that can neither fail nor call anything move or are
+    # duplicated. A variable counts as unchanged by a loop if the loop does
+    # not assign it and nothing else can: a local of the function itself
+    # that no nested code refers to, or a global in a loop that calls no
+    # function in a program that starts no goroutines. The new variables
+    # get slots but no symbols, so they are not among a program's results.
+    def __init__(self, symbol_table, scopes, types, cost_model=None):
+        self.symbol_table = symbol_table
+        self.scopes = scopes
+        self.types = types
+        self.cost_model = cost_model or CostModel()
+        # The scope being rewritten, names nested code in it refers to, and
+        # a code generator for it, to recognize loops it vectorizes
+        self.scope = symbol_table
+        self.pinned = set()
+        self.generator = CodeGenerator(symbol_table, scopes, types)
+        # Index of the top-level statement being rewritten
+        self.position = 0
+        self.concurrent = False
+        self.inlinable = {}
+        # Interned structure of expressions, to find repeated ones
+        self.shapes = {}
+        self.temporaries = 0
+        self.inlined_calls = 0
+        self.hoisted_expressions = 0
+        self.reduced_multiplications = 0
+
+    def optimize(self, program):
+        statements = program.statements
+        everything = list(all_statements(statements))
+        self.concurrent = any(type(statement) is GoStatement for statement in everything)
+        assigned = {statement.identifier for statement in everything if type(statement) is Assignment}
+        for index, statement in enumerate(statements):
+            if type(statement) is FunctionDeclaration and statement.identifier not in assigned:
+                body = self.inline_body(statement)
+                if body is not None:
+                    self.inlinable[statement.identifier] = (index, statement, body)
+        if self.inlinable:
+            for index, statement in enumerate(statements):
+                self.position = index
+                self.inline_block([statement])
+        program.statements = self.block(statements, set())
+        return program
+
+    # Inlining
+
+    def inline_body(self, function):
+        # The expression a function returns, if that is all it does, it only
+        # reads its parameters and is small enough to copy
+        if len(function.body) != 1 or type(function.body[0]) is not ReturnStatement:
+            return None
+        body = function.body[0].value
+        if body is None:
+            return None
+        parameters = {param[0] for param in function.parameters}
+        for node in postorder(body):
+            node_type = type(node)
+            if node_type is Identifier:
+                if node.name not in parameters:
+                    return None
+            elif node_type is not BinaryOperation and node_type is not Integer:
+                return None
+        return body if self.cost_model.inline(body) else None
+
+    def inline_block(self, statements):
+        for statement in statements:
+            for container, key in self.expression_slots(statement):
+                self.inline_calls(container, key)
+            statement_type = type(statement)
+            if statement_type is FunctionDeclaration or statement_type is ParallelFor:
+                self.in_scope(statement, self.inline_block, statement.body)
+            else:
+                for block in self.blocks(statement):
+                    self.inline_block(block)
+
+    def inline_calls(self, container, key):
+        # Innermost calls first, so arguments are inlined before the call
+        # they are passed to
+        root = get_slot(container, key)
+        for node in postorder(root):
+            if type(node) is BinaryOperation:
+                if type(node.left) is Call:
+                    node.left = self.inline_call(node.left)
+                if type(node.right) is Call:
+                    node.right = self.inline_call(node.right)
+            elif type(node) is Call:
+                arguments = node.arguments
+                for index, argument in enumerate(arguments):
+                    if type(argument) is Call:
+                        arguments[index] = self.inline_call(argument)
+        if type(root) is Call:
+            set_slot(container, key, self.inline_call(root))
+
+    def inline_call(self, call):
+        # The expression replacing call, or call itself
+        entry = self.inlinable.get(call.identifier)
+        if entry is None:
+            return call
+        index, function, body = entry
+        # Not shadowed here, and certainly declared by the time this runs
+        table, _ = self.scope.resolve(call.identifier)
+        if table is not self.symbol_table or index >= self.position:
+            return call
+        parameters = [param[0] for param in function.parameters]
+        if len(call.arguments) != len(parameters):
+            return call
+        if not all(self.is_simple(argument) for argument in call.arguments):
+            # Other arguments are evaluated where the parameter is read, so
+            # each parameter must be read once, in order, with nothing that
+            # can fail in between
+            reads = [node.name for node in postorder(body) if type(node) is Identifier]
+            if reads != parameters or not self.is_pure(body):
+                return call
+        arguments = dict(zip(parameters, call.arguments))
+        self.inlined_calls += 1
+        return self.substitute(body, arguments)
+
+    def is_simple(self, node):
+        # An argument whose value is the same however often and whenever it
+        # is read while the expression it is copied into is evaluated
+        if type(node) is Integer:
+            return True
+        if type(node) is not Identifier:
+            return False
+        table, _ = self.scope.resolve(node.name)
+        return table is not None and (table.parent is not None or not self.concurrent)
+
+    def substitute(self, body, arguments):
+        # A copy of body with the arguments in place of the parameters
+        copies = {}
+        for node in postorder(body):
+            node_type = type(node)
+            if node_type is Identifier:
+                argument = arguments[node.name]
+                if type(argument) is Identifier:
+                    copy = Identifier(argument.name)
+                    self.types[copy] = self.types.get(argument)
+                else:
+                    copy = argument
+            elif node_type is BinaryOperation:
+                copy = self.operation(copies[id(node.left)], node.operator, copies[id(node.right)])
+            else:
+                copy = node
+            copies[id(node)] = copy
+        return copies[id(body)]
+
+    def operation(self, left, operator, right):
+        # A new operation, typed as the analyzer would have typed it
+        node = BinaryOperation(left, operator, right)
+        left_type, right_type = self.type_of(left), self.type_of(right)
+        if left_type == 'Array' or right_type == 'Array':
+            self.types[node] = 'Array'
+        elif left_type == 'Int' and right_type == 'Int':
+            self.types[node] = None if operator == '/' else 'Int'
+        else:
+            self.types[node] = 'Int' if operator in ('==', '!=') else None
+        return node
+
+    # Loops
+
+    def block(self, statements, defined):
+        # Rewrites the loops in statements, given the names certainly assigned
+        # before them; returns statements with what was taken out of each
+        # loop placed before it
+        rewritten = []
+        for statement in statements:
+            statement_type = type(statement)
+            if statement_type is WhileStatement:
+                if self.generator.vector_kernel(statement) is None:
+                    rewritten.extend(self.loop(statement, defined))
+                    statement.body = self.block(statement.body, set(defined))
+            elif statement_type is IfStatement:
+                statement.then_block = self.block(statement.then_block, set(defined))
+                if statement.else_block is not None:
+                    statement.else_block = self.block(statement.else_block, set(defined))
+            elif statement_type is FunctionDeclaration or statement_type is ParallelFor:
+                self.in_scope(statement, self.function, statement, defined)
+            rewritten.append(statement)
+            if statement_type is VariableDeclaration or statement_type is Assignment:
+                defined.add(statement.identifier)
+            elif statement_type is ParallelFor:
+                defined.add(statement.target)
+        return rewritten
+
+    def function(self, node, defined):
+        if type(node) is FunctionDeclaration:
+            parameters = {param[0] for param in node.parameters}
+        else:
+            parameters = {node.variable}
+        # Globals assigned before the declaration are by the time it runs;
+        # its own locals only once it assigns them
+        defined = {name for name in defined if name not in self.scope.slots} | parameters
+        # Functions and parallel for bodies declared inside this one use its
+        # variables by name, out of reach of the analysis
+        inner = [statement for statement in all_statements(node.body)
+                 if type(statement) in (FunctionDeclaration, ParallelFor, ClassDeclaration)]
+        self.pinned = statement_names(inner)
+        self.pinned |= {statement.identifier for statement in all_statements(inner)
+                        if type(statement) is Assignment}
+        node.body = self.block(node.body, defined)
+
+    def in_scope(self, node, method, *args):
+        scope = self.scopes.get(node)
+        if scope is None:
+            return
+        saved = self.scope, self.pinned, self.generator
+        self.scope = scope
+        self.pinned = set()
+        self.generator = CodeGenerator(scope, self.scopes, self.types)
+        try:
+            method(*args)
+        finally:
+            self.scope, self.pinned, self.generator = saved
+
+    def loop(self, node, defined):
+        # Rewrites one loop; returns the statements to run before it
+        slots = self.loop_slots(node)
+        assigned = Counter()
+        calls = False
+        for statement in self.loop_statements(node):
+            statement_type = type(statement)
+            if statement_type in (VariableDeclaration, Assignment, FunctionDeclaration):
+                assigned[statement.identifier] += 1
+            elif statement_type is ParallelFor:
+                assigned[statement.target] += 1
+                calls = True
+            elif statement_type is GoStatement:
+                calls = True
+        for container, key in slots:
+            for expression in postorder(get_slot(container, key)):
+                if type(expression) is Call and not self.generator.is_builtin(expression):
+                    calls = True
+
+        def owned(name):
+            # Only this loop can change the variable while it runs
+            if name not in defined:
+                return False
+            table, _ = self.scope.resolve(name)
+            if table is None:
+                return False
+            if table.parent is None:
+                return not calls and not self.concurrent
+            return table is self.scope and name not in self.pinned
+
+        def fixed(name):
+            return name not in assigned and owned(name)
+
+        prelude = []
+        self.hoist(slots, fixed, prelude)
+        for statement in prelude:
+            defined.add(statement.identifier)
+        self.reduce(node, slots, assigned, owned, fixed, prelude)
+        for statement in prelude:
+            defined.add(statement.identifier)
+        return prelude
+
+    def loop_statements(self, node):
+        # Statements of a loop that run in its scope, nested loops included
+        pending = list(node.body)
+        while pending:
+            statement = pending.pop()
+            yield statement
+            for block in self.blocks(statement):
+                pending.extend(block)
+
+    def loop_slots(self, node):
+        # Every expression a loop evaluates in its scope, except in nested
+        # loops the code generator vectorizes, which must stay as they are
+        slots = [(node, 'condition')]
+        pending = list(reversed(node.body))
+        while pending:
+            statement = pending.pop()
+            if type(statement) is WhileStatement and self.generator.vector_kernel(statement) is not None:
+                continue
+            slots.extend(self.expression_slots(statement))
+            for block in reversed(self.blocks(statement)):
+                pending.extend(reversed(block))
+        return slots
+
+    def hoist(self, slots, fixed, prelude):
+        # Loop-invariant code motion: the largest expressions the loop does not
+        # change, each computed once before it
+        hoisted = {}
+
+        def choose(node, marks):
+            if not marks[id(node)] or type(node) is not BinaryOperation:
+                return None
+            shape = self.shape(node)
+            name = hoisted.get(shape)
+            if name is None:
+                if not any(type(leaf) is Identifier for leaf in postorder(node)) or not self.cost_model.hoist(node):
+                    return None
+                name = hoisted[shape] = self.temporary()
+                prelude.append(VariableDeclaration(name, 'Int', node))
+                self.hoisted_expressions += 1
+            return self.variable(name)
+
+        for container, key in slots:
+            marks = self.invariants(get_slot(container, key), fixed)
+            self.rewrite(container, key, lambda node: choose(node, marks))
+
+    def invariants(self, root, fixed):
+        # id -> whether the node's value is the same on every iteration and
+        # computing it can neither fail nor call anything
+        marks = {}
+        for node in postorder(root):
+            node_type = type(node)
+            if node_type is Integer:
+                marks[id(node)] = True
+            elif node_type is Identifier:
+                marks[id(node)] = fixed(node.name) and self.types.get(node) == 'Int'
+            elif node_type is BinaryOperation:
+                marks[id(node)] = (marks[id(node.left)] and marks[id(node.right)]
+                                   and node.operator in PURE_OPERATORS)
+            else:
+                marks[id(node)] = False
+        return marks
+
+    def reduce(self, node, slots, assigned, owned, fixed, prelude):
+        # Strength reduction: for each counter the loop body advances by a
+        # fixed step, the products of it that pay for it are kept in a new
+        # variable, advanced by the product's step after the counter is
+        body = node.body
+        updates = {}
+        for statement in body:
+            counter = self.counter(statement, assigned, owned, fixed)
+            if counter is None:
+                continue
+            name, operator, step = counter
+            candidates = [(container, key) for container, key in slots if container is not statement]
+            uses = Counter()
+            found = {}
+            for container, key in candidates:
+                linear = self.linear(get_slot(container, key), name, fixed)
+                for expression in self.maximal(container, key, linear):
+                    shape = self.shape(expression)
+                    uses[shape] += 1
+                    found.setdefault(shape, (expression, linear[id(expression)][0]))
+            reduced = {}
+            for shape, (expression, coefficient) in found.items():
+                delta = self.multiply(coefficient, step)
+                if not self.cost_model.reduce(expression, uses[shape], type(delta) is int):
+                    continue
+                variable = reduced[shape] = self.temporary()
+                prelude.append(VariableDeclaration(variable, 'Int', expression))
+                update_operator = operator
+                if type(delta) is int:
+                    if delta < 0:
+                        delta, update_operator = -delta, '-' if operator == '+' else '+'
+                    delta = Integer(delta)
+                elif type(delta) is not Identifier:
+                    step_variable = self.temporary()
+                    prelude.append(VariableDeclaration(step_variable, 'Int', delta))
+                    delta = self.variable(step_variable)
+                update = Assignment(variable, self.operation(self.variable(variable), update_operator, delta))
+                updates.setdefault(id(statement), []).append(update)
+                self.reduced_multiplications += 1
+            if reduced:
+                for container, key in candidates:
+                    linear = self.linear(get_slot(container, key), name, fixed)
+                    self.rewrite(container, key, lambda expression, linear=linear: self.reduced(expression, linear, reduced))
+        if updates:
+            node.body = []
+            for statement in body:
+                node.body.append(statement)
+                node.body.extend(updates.get(id(statement), []))
+
+    def reduced(self, expression, linear, reduced):
+        entry = linear.get(id(expression))
+        if entry is None or not entry[1]:
+            return None
+        name = reduced.get(self.shape(expression))
+        return None if name is None else self.variable(name)
+
+    def counter(self, statement, assigned, owned, fixed):
+        # (name, operator, step) if statement is the only assignment of a
+        # variable in the loop and advances it by a step the loop does not
+        # change: i = i + step, i = step + i or i = i - step
+        if type(statement) is not Assignment or type(statement.value) is not BinaryOperation:
+            return None
+        name = statement.identifier
+        value = statement.value
+        if value.operator == '+' and type(value.right) is Identifier and value.right.name == name:
+            step, current = value.left, value.right
+        elif value.operator in ('+', '-'):
+            step, current = value.right, value.left
+        else:
+            return None
+        if type(current) is not Identifier or current.name != name or self.types.get(current) != 'Int':
+            return None
+        if assigned[name] != 1 or not owned(name):
+            return None
+        if type(step) is Integer:
+            return name, value.operator, int(step)
+        if type(step) is Identifier and fixed(step.name) and self.types.get(step) == 'Int':
+            return name, value.operator, step
+        return None
+
+    def linear(self, root, counter, fixed):
+        # id -> (coefficient, multiplied) for the nodes whose value is the
+        # counter times a coefficient the loop does not change, plus such a
+        # value; multiplied tells whether that takes a product. Coefficients
+        # are ints or expressions.
+        marks = self.invariants(root, fixed)
+        linear = {}
+        for node in postorder(root):
+            if type(node) is Identifier and node.name == counter and self.types.get(node) == 'Int':
+                linear[id(node)] = (1, False)
+                continue
+            if type(node) is not BinaryOperation or node.operator not in LINEAR_OPERATORS:
+                continue
+            left, right = linear.get(id(node.left)), linear.get(id(node.right))
+            left_fixed, right_fixed = marks[id(node.left)], marks[id(node.right)]
+            operator = node.operator
+            if operator == '*':
+                if left is not None and right_fixed:
+                    linear[id(node)] = (self.multiply(left[0], node.right), True)
+                elif right is not None and left_fixed:
+                    linear[id(node)] = (self.multiply(right[0], node.left), True)
+            elif left is not None and right is not None:
+                coefficient = self.combine(left[0], operator, right[0])
+                linear[id(node)] = (coefficient, left[1] or right[1])
+            elif left is not None and right_fixed:
+                linear[id(node)] = left
+            elif right is not None and left_fixed:
+                coefficient = right[0] if operator == '+' else self.combine(0, '-', right[0])
+                linear[id(node)] = (coefficient, right[1])
+        return linear
+
+    def maximal(self, container, key, linear):
+        # The outermost expressions in a slot that are linear and take a product
+        found = []
+        pending = [get_slot(container, key)]
+        while pending:
+            node = pending.pop()
+            entry = linear.get(id(node))
+            if entry is not None and entry[1]:
+                found.append(node)
+            elif type(node) is BinaryOperation:
+                pending.append(node.right)
+                pending.append(node.left)
+            elif type(node) is Call:
+                pending.extend(reversed(node.arguments))
+        return found
+
+    def multiply(self, coefficient, factor):
+        # coefficient * factor, folded where both are known
+        if type(factor) is Integer:
+            factor = int(factor)
+        if type(coefficient) is int and type(factor) is int:
+            return coefficient * factor
+        if coefficient == 1 and type(coefficient) is int:
+            return factor
+        if factor == 1 and type(factor) is int:
+            return coefficient
+        return self.operation(self.expression(coefficient), '*', self.expression(factor))
+
+    def combine(self, left, operator, right):
+        if type(left) is int and type(right) is int:
+            return left + right if operator == '+' else left - right
+        return self.operation(self.expression(left), operator, self.expression(right))
+
+    def expression(self, value):
+        return Integer(value) if type(value) is int else value
+
+    # Helpers
+
+    def expression_slots(self, statement):
+        # Where the expressions a statement evaluates in its own scope are
+        statement_type = type(statement)
+        if statement_type is VariableDeclaration or statement_type is Assignment:
+            return [(statement, 'value')]
+        if statement_type is ExpressionStatement:
+            return [(statement, 'expression')]
+        if statement_type is ReturnStatement:
+            return [] if statement.value is None else [(statement, 'value')]
+        if statement_type is IfStatement or statement_type is WhileStatement:
+            return [(statement, 'condition')]
+        if statement_type is GoStatement:
+            return [(statement.call.arguments, index) for index in range(len(statement.call.arguments))]
+        if statement_type is ParallelFor:
+            return [(statement, 'start'), (statement, 'stop')]
+        return []
+
+    def blocks(self, statement):
+        # The statement lists nested in statement that run in its scope
+        statement_type = type(statement)
+        if statement_type is IfStatement:
+            return [statement.then_block] + ([statement.else_block] if statement.else_block else [])
+        if statement_type is WhileStatement:
+            return [statement.body]
+        return []
+
+    def rewrite(self, container, key, choose):
+        # Replaces, outermost first, every node in the slot for which choose
+        # returns a replacement
+        pending = [(container, key)]
+        while pending:
+            container, key = pending.pop()
+            node = get_slot(container, key)
+            replacement = choose(node)
+            if replacement is not None:
+                set_slot(container, key, replacement)
+            elif type(node) is BinaryOperation:
+                pending.append((node, 'right'))
+                pending.append((node, 'left'))
+            elif type(node) is Call:
+                pending.extend((node.arguments, index) for index in reversed(range(len(node.arguments))))
+
+    def shape(self, root):
+        # A small int standing for the structure of an expression, equal for
+        # equal expressions
+        shapes = {}
+        for node in postorder(root):
+            node_type = type(node)
+            if node_type is BinaryOperation:
+                key = (node.operator, shapes[id(node.left)], shapes[id(node.right)])
+            elif node_type is Identifier:
+                key = ('name', node.name)
+            elif node_type is Integer:
+                key = ('int', int(node))
+            else:
+                key = ('node', id(node))
+            shapes[id(node)] = self.shapes.setdefault(key, len(self.shapes))
+        return shapes[id(root)]
+
+    def is_pure(self, node):
+        for node in postorder(node):
+            if type(node) is BinaryOperation:
+                if (node.operator not in PURE_OPERATORS or self.type_of(node.left) != 'Int'
+                        or self.type_of(node.right) != 'Int'):
+                    return False
+            elif type(node) is not Integer and type(node) is not Identifier:
+                return False
+        return True
+
+    def type_of(self, node):
+        return 'Int' if type(node) is Integer else self.types.get(node)
+
+    def temporary(self):
+        # A new Int variable of the scope being rewritten, with a slot but no
+        # symbol; no identifier in source can start with $
+        name = f'${self.temporaries}'
+        self.temporaries += 1
+        self.scope.slots[name] = len(self.scope.slots)
+        return name
+
+    def variable(self, name):
+        node = Identifier(name)
+        self.types[node] = 'Int'
+        return node
+
+# Example usage
+if __name__ == "__main__":
+    from src.lexer import Lexer
+    from src.parser import Parser
+    from src.semantic_analyzer import SemanticAnalyzer
+
+    code = """
+    func square(x: Int) -> Int {
+        return x * x;
+    }
+    func total(n: Int, width: Int, height: Int) -> Int {
+        var sum: Int = 0;
+        var i: Int = 0;
+        while i < n {
+            sum = sum + square(i) + (width * height + 1) + (i * 4 + 1);
+            i = i + 1;
+        }
+        return sum;
+    }
+    var result: Int = total(10, 3, 5);
+    """
+    ast = Parser(Lexer(code)).parse()
+    analyzer = SemanticAnalyzer()
+    analyzer.visit(ast)
+    optimizer = optimize_ast(ast, analyzer, AST_OPTIMIZE_LEVEL)
+    generator = CodeGenerator(analyzer.symbol_table, analyzer.scopes, analyzer.types)
+    generator.generate(ast)
+    print(generator.get_instructions())
+    print(optimizer.inlined_calls, optimizer.hoisted_expressions, optimizer.reduced_multiplications)
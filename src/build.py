@@ -0,0 +1,141 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.semantic_analyzer import SemanticAnalyzer
+from src.code_generator import CodeGenerator
+from src.peephole import PeepholeOptimizer, JUMP_OPS
+from src.dead_code import eliminate_dead_code
+from src.ast_optimizer import optimize_ast
+
+SOURCE_SUFFIX = '.fusion'
+
+class Module:
+    # The result of compiling one source file on its own: its bytecode, with
+    # global slots numbered from 0, and its global symbols as name -> (type,
+    # slot). error holds the message if the file failed to compile.
+    __slots__ = ('name', 'path', 'instructions', 'symbols', 'error')
+
+    def __init__(self, name, path, instructions=None, symbols=None, error=None):
+        self.name = name
+        self.path = path
+        self.instructions = instructions or []
+        self.symbols = symbols or {}
+        self.error = error
+
+class LinkedProgram:
+    # Modules merged into one program that runs them in order. Globals from
+    # every module share one frame; symbols maps 'module.name' -> (type, slot)
+    # in that frame and modules maps a module name to its first instruction.
+    __slots__ = ('instructions', 'symbols', 'modules')
+
+    def __init__(self, instructions, symbols, modules):
+        self.instructions = instructions
+        self.symbols = symbols
+        self.modules = modules
+
+def find_sources(directory):
+    # Every .fusion file below directory, in a stable order
+    sources = []
+    for root, dirs, files in os.walk(directory):
+        dirs.sort()
+        sources.extend(os.path.join(root, name) for name in sorted(files) if name.endswith(SOURCE_SUFFIX))
+    return sources
+
+def module_name(path, directory):
+    relative = os.path.relpath(path, directory)[:-len(SOURCE_SUFFIX)]
+    return relative.replace(os.sep, '.')
+
+def compile_module(path, name, optimize=1):
+    # Runs in a worker process, so errors are returned rather than raised
+    try:
+        with open(path, 'r') as file:
+            ast = Parser(Lexer(file, streaming=True)).parse()
+        analyzer = SemanticAnalyzer()
+        analyzer.visit(ast)
+        optimize_ast(ast, analyzer, optimize)
+        eliminate_dead_code(ast, analyzer, optimize)
+        generator = CodeGenerator(analyzer.symbol_table, analyzer.scopes, analyzer.types)
+        generator.generate(ast)
+        instructions = PeepholeOptimizer(optimize).optimize(generator.get_instructions())
+    except Exception as error:
+        return Module(name, path, error=f'{path}: {error}')
+    table = analyzer.symbol_table
+    symbols = {symbol: (symbol_type, table.slots[symbol]) for symbol, symbol_type in table.symbols.items()}
+    return Module(name, path, instructions, symbols)
+
+def compile_modules(paths, names, optimize=1, jobs=None):
+    # Compiles each file independently, across jobs worker processes
+    # (default: one per core). Results come back in the order of paths.
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(paths) <= 1:
+        return [compile_module(path, name, optimize) for path, name in zip(paths, names)]
+    # Batch files per task so small scripts don't pay one round trip each
+    chunksize = max(1, len(paths) // (jobs * 4))
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(compile_module, paths, names, [optimize] * len(paths), chunksize=chunksize))
+
+def relocate(instruction, code_base, slot_base):
+    # Moves one module instruction to its place in the linked program
+    op = instruction[0]
+    if op in JUMP_OPS:
+        return (op, instruction[1] + code_base)
+    if op == 'LOAD_GLOBAL' or op == 'STORE_GLOBAL':
+        return (op, instruction[1] + slot_base)
+    if op == 'UPDATE_GLOBAL':
+        slot, operator, constant = instruction[1]
+        return (op, (slot + slot_base, operator, constant))
+    return instruction
+
+def global_slots(module):
+    # Slots a module's globals take, including those of variables the
+    # optimizer added, which have no symbol
+    count = len(module.symbols)
+    for instruction in module.instructions:
+        op = instruction[0]
+        if op == 'LOAD_GLOBAL' or op == 'STORE_GLOBAL':
+            count = max(count, instruction[1] + 1)
+        elif op == 'UPDATE_GLOBAL':
+            count = max(count, instruction[1][0] + 1)
+    return count
+
+def link(modules):
+    # Concatenates module bytecode, giving each module's globals their own
+    # range of slots and turning every HALT but the last module's into a jump
+    # to the next module.
+    instructions = []
+    symbols = {}
+    starts = {}
+    slot_base = 0
+    for index, module in enumerate(modules):
+        code_base = len(instructions)
+        code_end = code_base + len(module.instructions)
+        last = index == len(modules) - 1
+        starts[module.name] = code_base
+        for instruction in module.instructions:
+            if instruction[0] == 'HALT' and not last:
+                instructions.append(('JUMP', code_end))
+            else:
+                instructions.append(relocate(instruction, code_base, slot_base))
+        for symbol, (symbol_type, slot) in module.symbols.items():
+            symbols[f'{module.name}.{symbol}'] = (symbol_type, slot + slot_base)
+        slot_base += global_slots(module)
+    if not modules or instructions[-1:] != [('HALT',)]:
+        instructions.append(('HALT',))
+    return LinkedProgram(instructions, symbols, starts)
+
+def build(directory, optimize=1, jobs=None):
+    # Returns (program, errors); program is None if any module failed
+    paths = find_sources(directory)
+    names = [module_name(path, directory) for path in paths]
+    modules = compile_modules(paths, names, optimize, jobs)
+    errors = [module.error for module in modules if module.error is not None]
+    if errors:
+        return None, errors
+    return link(modules), []
+
+# Example usage
+if __name__ == "__main__":
+    program, errors = build('examples')
+    print(errors or program.instructions)
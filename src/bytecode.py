@@ -0,0 +1,230 @@
+import sys
+import mmap
+import struct
+from array import array
+
+from src.opcodes import OPCODES, OPCODE_NAMES
+
+# File layout (all header fields little-endian):
+#   magic        4 bytes  b'FBC\0'
+#   version      u16      FORMAT_VERSION
+#   reserved     u16
+#   constants    u32      number of entries in the constant pool
+#   names        u32      number of entries in the name table
+#   instructions u32      number of instructions
+#   constant pool, name table, then the instruction stream as
+#   (opcode, operand) pairs of u32 words.
+MAGIC = b'FBC\0'
+FORMAT_VERSION = 6
+HEADER = struct.Struct('<4sHHIII')
+
+# Operand kinds, selected by opcode
+NO_OPERAND, CONST_OPERAND, NAME_OPERAND, INDEX_OPERAND = range(4)
+
+OPERAND_KINDS = {
+    'PUSH': CONST_OPERAND,
+    'STORE': NAME_OPERAND,
+    'LOAD': NAME_OPERAND,
+    'BIN_OP': NAME_OPERAND,
+    'BIN_OP_INT': NAME_OPERAND,
+    'CLASS': NAME_OPERAND,
+    'JUMP_IF_FALSE': INDEX_OPERAND,
+    'JUMP': INDEX_OPERAND,
+    'LOAD_GLOBAL': INDEX_OPERAND,
+    'STORE_GLOBAL': INDEX_OPERAND,
+    'LOAD_FAST': INDEX_OPERAND,
+    'STORE_FAST': INDEX_OPERAND,
+    # Superinstruction operands are stored as tuple constants
+    'UPDATE_GLOBAL': CONST_OPERAND,
+    'UPDATE_FAST': CONST_OPERAND,
+    'BIN_OP_CONST': CONST_OPERAND,
+    'FUNC': NAME_OPERAND,
+    'PARAM': NAME_OPERAND,
+    'STORE_DEFAULT': INDEX_OPERAND,
+    'CALL': INDEX_OPERAND,
+    'TAIL_CALL': INDEX_OPERAND,
+    'GO': INDEX_OPERAND,
+    'PARALLEL': NAME_OPERAND,
+    # (arrays, scalars) counts
+    'VECTOR_GUARD': CONST_OPERAND,
+}
+
+# Constant pool tags
+TAG_NONE, TAG_FALSE, TAG_TRUE, TAG_INT, TAG_FLOAT, TAG_STR, TAG_TUPLE = range(7)
+
+WORD = 'I'
+assert array(WORD).itemsize == 4
+
+
+class Bytecode:
+    def __init__(self, constants, names, code):
+        self.constants = constants
+        self.names = names
+        self.code = code  # array of u32 words: opcode, operand, opcode, operand, ...
+
+    @classmethod
+    def from_instructions(cls, instructions):
+        constants = []
+        names = []
+        constant_index = {}
+        name_index = {}
+        code = array(WORD)
+        for instruction in instructions:
+            opcode = OPCODES.get(instruction[0])
+            if opcode is None:
+                raise RuntimeError(f'Unknown instruction: {instruction}')
+            kind = OPERAND_KINDS.get(instruction[0], NO_OPERAND)
+            operand = 0
+            if kind == CONST_OPERAND:
+                value = instruction[1]
+                key = constant_key(value)
+                operand = constant_index.get(key)
+                if operand is None:
+                    operand = constant_index[key] = len(constants)
+                    constants.append(value)
+            elif kind == NAME_OPERAND:
+                operand = name_index.get(instruction[1])
+                if operand is None:
+                    operand = name_index[instruction[1]] = len(names)
+                    names.append(instruction[1])
+            elif kind == INDEX_OPERAND:
+                operand = instruction[1]
+            code.append(opcode)
+            code.append(operand)
+        return cls(constants, names, code)
+
+    def to_instructions(self):
+        constants = self.constants
+        names = self.names
+        code = self.code
+        instructions = []
+        for index in range(0, len(code), 2):
+            name = OPCODE_NAMES[code[index]]
+            kind = OPERAND_KINDS.get(name, NO_OPERAND)
+            operand = code[index + 1]
+            if kind == CONST_OPERAND:
+                instructions.append((name, constants[operand]))
+            elif kind == NAME_OPERAND:
+                instructions.append((name, names[operand]))
+            elif kind == INDEX_OPERAND:
+                instructions.append((name, operand))
+            else:
+                instructions.append((name,))
+        return instructions
+
+    def serialize(self):
+        parts = [HEADER.pack(MAGIC, FORMAT_VERSION, 0, len(self.constants),
+                             len(self.names), len(self.code) // 2)]
+        for value in self.constants:
+            parts.append(encode_constant(value))
+        for name in self.names:
+            parts.append(encode_string(name))
+        code = array(WORD, self.code)
+        if sys.byteorder != 'little':
+            code.byteswap()
+        parts.append(code.tobytes())
+        return b''.join(parts)
+
+    @classmethod
+    def deserialize(cls, buffer):
+        if len(buffer) < HEADER.size:
+            raise ValueError('Truncated bytecode header')
+        magic, version, _, n_constants, n_names, n_instructions = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a FusionLang bytecode file')
+        if version != FORMAT_VERSION:
+            raise ValueError(f'Unsupported bytecode version: {version}')
+        offset = HEADER.size
+        constants = []
+        for _ in range(n_constants):
+            value, offset = decode_constant(buffer, offset)
+            constants.append(value)
+        names = []
+        for _ in range(n_names):
+            name, offset = decode_string(buffer, offset)
+            names.append(name)
+        end = offset + n_instructions * 2 * 4
+        if end > len(buffer):
+            raise ValueError('Truncated instruction stream')
+        code = array(WORD)
+        code.frombytes(buffer[offset:end])
+        if sys.byteorder != 'little':
+            code.byteswap()
+        return cls(constants, names, code)
+
+
+def constant_key(value):
+    # Key on the type too so that 1, 1.0 and True get separate pool entries
+    if isinstance(value, tuple):
+        return (tuple, tuple(constant_key(item) for item in value))
+    return (type(value), value)
+
+
+def encode_string(text):
+    data = text.encode('utf-8')
+    return struct.pack('<I', len(data)) + data
+
+
+def decode_string(buffer, offset):
+    (length,) = struct.unpack_from('<I', buffer, offset)
+    offset += 4
+    return bytes(buffer[offset:offset + length]).decode('utf-8'), offset + length
+
+
+def encode_constant(value):
+    if value is None:
+        return bytes((TAG_NONE,))
+    if value is False:
+        return bytes((TAG_FALSE,))
+    if value is True:
+        return bytes((TAG_TRUE,))
+    if isinstance(value, int):
+        data = value.to_bytes((value.bit_length() + 8) // 8, 'little', signed=True)
+        return bytes((TAG_INT,)) + struct.pack('<I', len(data)) + data
+    if isinstance(value, float):
+        return bytes((TAG_FLOAT,)) + struct.pack('<d', value)
+    if isinstance(value, str):
+        return bytes((TAG_STR,)) + encode_string(value)
+    if isinstance(value, tuple):
+        return b''.join([bytes((TAG_TUPLE,)), struct.pack('<I', len(value))]
+                        + [encode_constant(item) for item in value])
+    raise TypeError(f'Cannot serialize constant of type {type(value).__name__}')
+
+
+def decode_constant(buffer, offset):
+    tag = buffer[offset]
+    offset += 1
+    if tag == TAG_NONE:
+        return None, offset
+    if tag == TAG_FALSE:
+        return False, offset
+    if tag == TAG_TRUE:
+        return True, offset
+    if tag == TAG_INT:
+        (length,) = struct.unpack_from('<I', buffer, offset)
+        offset += 4
+        return int.from_bytes(buffer[offset:offset + length], 'little', signed=True), offset + length
+    if tag == TAG_FLOAT:
+        return struct.unpack_from('<d', buffer, offset)[0], offset + 8
+    if tag == TAG_STR:
+        return decode_string(buffer, offset)
+    if tag == TAG_TUPLE:
+        (length,) = struct.unpack_from('<I', buffer, offset)
+        offset += 4
+        items = []
+        for _ in range(length):
+            item, offset = decode_constant(buffer, offset)
+            items.append(item)
+        return tuple(items), offset
+    raise ValueError(f'Unknown constant tag: {tag}')
+
+
+def dump(bytecode, path):
+    with open(path, 'wb') as file:
+        file.write(bytecode.serialize())
+
+
+def load(path):
+    with open(path, 'rb') as file:
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            return Bytecode.deserialize(buffer)
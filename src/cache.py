@@ -0,0 +1,59 @@
+import os
+import hashlib
+import tempfile
+
+from src import __version__
+from src.bytecode import FORMAT_VERSION, Bytecode, load
+from src.lexer import CHUNK_SIZE
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'fusionlang')
+
+
+class BytecodeCache:
+    def __init__(self, directory=None):
+        self.directory = directory or os.environ.get('FUSION_CACHE_DIR', DEFAULT_CACHE_DIR)
+
+    def key(self, source, *options):
+        digest = self.digest(options)
+        digest.update(source.encode('utf-8') if isinstance(source, str) else source)
+        return digest.hexdigest()
+
+    def file_key(self, path, *options):
+        # Same key as key() on the file's UTF-8 contents, hashed in chunks
+        digest = self.digest(options)
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    def digest(self, options):
+        digest = hashlib.sha256()
+        digest.update(f'{__version__}:{FORMAT_VERSION}:{options!r}\0'.encode('utf-8'))
+        return digest
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.fbc')
+
+    def get(self, key):
+        path = self.path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return load(path)
+        except (OSError, ValueError):
+            # Empty, truncated or foreign files are treated as a miss and rebuilt
+            return None
+
+    def put(self, key, instructions):
+        bytecode = Bytecode.from_instructions(instructions)
+        os.makedirs(self.directory, exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(bytecode.serialize())
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+        return bytecode
@@ -1,26 +1,42 @@
 import sys
 import os
+import signal
 import argparse
+import subprocess
+import tempfile
 
 # Add the project root directory to the Python path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from src.client import DEFAULT_SOCKET, client_main, request, wants_client
+
+# Handing a file to a running daemon needs none of the compiler imported
+# below, and importing it is most of a cold start
+if __name__ == '__main__' and wants_client(sys.argv[1:]):
+    sys.exit(client_main(sys.argv[1:]))
+
 from src.lexer import Lexer
 from src.parser import Parser
-from src.semantic_analyser import SemanticAnalyzer
+from src.semantic_analyzer import SemanticAnalyzer
 from src.code_generator import CodeGenerator
+from src.peephole import PeepholeOptimizer
 from src.runtime import Runtime
+from src.profiler import Profiler
+from src.bytecode import Bytecode, dump, load
+from src.cache import BytecodeCache
+from src.build import build
+from src.register_generator import RegisterGenerator
+from src.register_vm import RegisterVM
+from src.server import serve
+from src.heap import parse_size
+from src.dead_code import DEAD_CODE_LEVEL, eliminate_dead_code
+from src.ast_optimizer import optimize_ast
+from src.native import FALLBACK_STATUS, NativeUnsupported, compile_native
 
-def main():
-    parser = argparse.ArgumentParser(description='FusionLang Compiler')
-    parser.add_argument('source', type=str, help='Source file to compile and run')
-    args = parser.parse_args()
-
-    with open(args.source, 'r') as file:
-        code = file.read()
-
-    # Lexical Analysis
-    lexer = Lexer(code)
+def analyze_source(code):
+    # Lexical Analysis (tokens are produced lazily as the parser asks for them,
+    # so code may also be an open file)
+    lexer = Lexer(code, streaming=True)
 
     # Parsing
     parser = Parser(lexer)
@@ -29,16 +45,233 @@ def main():
     # Semantic Analysis
     analyzer = SemanticAnalyzer()
     analyzer.visit(ast)
+    return ast, analyzer
+
+def compile_source(code, optimize=1, report=False, ast_optimize=True):
+    ast, analyzer = analyze_source(code)
+
+    # Inlining, Loop-Invariant Code Motion and Strength Reduction
+    optimize_ast(ast, analyzer, optimize, ast_optimize)
+
+    # Dead Code Elimination
+    eliminator = eliminate_dead_code(ast, analyzer, optimize, report)
 
     # Code Generation
-    generator = CodeGenerator()
+    generator = CodeGenerator(analyzer.symbol_table, analyzer.scopes, analyzer.types)
     generator.generate(ast)
     instructions = generator.get_instructions()
+    if report and eliminator is not None:
+        print(eliminator.report(len(instructions)), file=sys.stderr)
+
+    # Bytecode Optimization
+    return PeepholeOptimizer(optimize).optimize(instructions)
+
+def compile_registers(code):
+    # Three-address code for the register VM and the layout of its main frame
+    ast, analyzer = analyze_source(code)
+    generator = RegisterGenerator(analyzer.symbol_table, analyzer.scopes)
+    generator.generate(ast)
+    return generator.get_instructions(), generator.frame
+
+def load_instructions(args):
+    if args.source.endswith('.fbc'):
+        return load(args.source).to_instructions()
+
+    if args.no_cache or args.dead_code_report:
+        with open(args.source, 'r') as file:
+            return compile_source(file, args.optimize, args.dead_code_report, args.ast_optimize)
+
+    # Unchanged sources skip the whole front end
+    cache = BytecodeCache(args.cache_dir)
+    options = (args.optimize,) if args.ast_optimize else (args.optimize, 'no-ast-opt')
+    key = cache.file_key(args.source, *options)
+    bytecode = cache.get(key)
+    if bytecode is not None:
+        return bytecode.to_instructions()
+
+    with open(args.source, 'r') as file:
+        instructions = compile_source(file, args.optimize, ast_optimize=args.ast_optimize)
+    try:
+        cache.put(key, instructions)
+    except OSError:
+        pass  # A read-only or full cache directory must not stop the program from running
+    return instructions
+
+def native_main(args):
+    # Builds the program with the C backend and runs it, or with -o only
+    # writes the executable. Returns False when it has to run on the VM.
+    if args.output is not None:
+        try:
+            with open(args.source, 'r') as file:
+                compile_native(file, args.output)
+        except (NativeUnsupported, RuntimeError) as error:
+            sys.exit(f'--native: {error}')
+        return True
+
+    with tempfile.TemporaryDirectory() as directory:
+        executable = os.path.join(directory, 'program')
+        try:
+            if args.no_cache:
+                with open(args.source, 'r') as file:
+                    compile_native(file, executable)
+            else:
+                executable = native_cached(args, executable)
+        except (NativeUnsupported, RuntimeError) as error:
+            print(f'--native: {error}; running on the VM', file=sys.stderr)
+            return False
+        status = subprocess.call([executable])
+    if status == FALLBACK_STATUS:
+        print('--native: the program could not finish natively as it would on the VM; running it there', file=sys.stderr)
+        return False
+    if status != 0:
+        sys.exit(status if status > 0 else 128 - status)
+    return True
+
+def native_cached(args, fallback_path):
+    # The executable from the cache, built into it on a miss; at
+    # fallback_path if the cache directory cannot be written
+    cache = BytecodeCache(args.cache_dir)
+    path = os.path.join(cache.directory, cache.file_key(args.source, 'native') + '.native')
+    if os.path.exists(path):
+        return path
+    try:
+        os.makedirs(cache.directory, exist_ok=True)
+        writable = os.access(cache.directory, os.W_OK)
+    except OSError:
+        writable = False
+    with open(args.source, 'r') as file:
+        return compile_native(file, path if writable else fallback_path)
+
+def build_main(argv):
+    parser = argparse.ArgumentParser(prog='fusion build', description='Compile every .fusion file in a directory and link them into one bytecode file')
+    parser.add_argument('directory', type=str, help='Directory searched recursively for .fusion files')
+    parser.add_argument('-o', '--output', type=str, default=None, help='Linked bytecode file to write (default: <directory>/build.fbc)')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='Worker processes (default: one per core)')
+    parser.add_argument('-O', dest='optimize', type=int, choices=[0, 1, 2], default=1, help='Bytecode optimization level')
+    args = parser.parse_args(argv)
+
+    program, errors = build(args.directory, args.optimize, args.jobs)
+    if errors:
+        for error in errors:
+            print(error, file=sys.stderr)
+        sys.exit(1)
+    output = args.output or os.path.join(args.directory, 'build.fbc')
+    dump(Bytecode.from_instructions(program.instructions), output)
+    print(f'Linked {len(program.modules)} modules ({len(program.instructions)} instructions) into {output}')
+
+def serve_main(argv):
+    parser = argparse.ArgumentParser(prog='fusion serve', description='Keep the compiler and compiled programs warm, and compile and run files for "--connect" clients over a Unix socket')
+    parser.add_argument('--socket', type=str, default=DEFAULT_SOCKET, help='Socket to listen on (default: $FUSION_SOCKET or %(default)s)')
+    parser.add_argument('--cache-size', type=int, default=64, help='Compiled programs kept in memory')
+    parser.add_argument('--pool-size', type=int, default=2, help='Loaded runtimes kept per program')
+    parser.add_argument('-j', '--workers', type=int, default=1, help='Worker processes for parallel for loops, per runtime')
+    parser.add_argument('--cache-dir', type=str, default=None, help='Bytecode cache directory shared with plain runs')
+    parser.add_argument('--no-cache', action='store_true', help='Keep compiled programs in memory only')
+    parser.add_argument('--status', action='store_true', help='Print the running daemon\'s statistics and exit')
+    parser.add_argument('--stop', action='store_true', help='Stop the running daemon and exit')
+    args = parser.parse_args(argv)
+
+    if args.status or args.stop:
+        try:
+            response = request({'command': 'shutdown' if args.stop else 'stats'}, args.socket)
+        except (FileNotFoundError, ConnectionRefusedError):
+            print(f'No FusionLang daemon is listening on {args.socket}', file=sys.stderr)
+            sys.exit(2)
+        if args.status:
+            for name, value in response.items():
+                if name != 'ok':
+                    print(f'{name}: {value}')
+        return
+
+    # Stopped with --stop, Ctrl-C or SIGTERM, removing the socket each time
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        serve(args.socket, cache_size=args.cache_size, pool_size=args.pool_size, workers=args.workers,
+              cache_dir=args.cache_dir, use_disk_cache=not args.no_cache)
+    except KeyboardInterrupt:
+        pass
+    except RuntimeError as error:
+        print(error, file=sys.stderr)
+        sys.exit(1)
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    if argv and argv[0] == 'build':
+        return build_main(argv[1:])
+    if argv and argv[0] == 'serve':
+        return serve_main(argv[1:])
+    if wants_client(argv):
+        sys.exit(client_main(argv))
+
+    parser = argparse.ArgumentParser(description='FusionLang Compiler', epilog='Use "build <directory>" to compile and link a whole directory, and "serve" to start a daemon that "--connect" runs are handed to.')
+    parser.add_argument('source', type=str, help='Source file (.fusion) or compiled bytecode (.fbc) to run')
+    parser.add_argument('--cache-dir', type=str, default=None, help='Bytecode cache directory (default: $FUSION_CACHE_DIR or ~/.cache/fusionlang)')
+    parser.add_argument('-O', dest='optimize', type=int, choices=[0, 1, 2], default=1, help='Bytecode optimization level: -O0 none, -O1 folding and jump cleanup (default), -O2 also inlining, loop optimizations, dead code elimination and superinstructions')
+    parser.add_argument('--no-ast-opt', dest='ast_optimize', action='store_false', help='Leave out the -O2 inlining, loop-invariant code motion and strength reduction')
+    parser.add_argument('--no-cache', action='store_true', help='Always compile from source and do not write the bytecode cache')
+    parser.add_argument('--dead-code-report', action='store_true', help='Print what -O2 dead code elimination removed to stderr (compiles without the cache)')
+    parser.add_argument('-j', '--workers', type=int, default=None, help='Worker processes for parallel for loops (default: one per core)')
+    parser.add_argument('--jit', action='store_true', help='Compile hot loops to Python functions while running')
+    parser.add_argument('--profile', action='store_true', help='Count and time every instruction and print a summary to stderr')
+    parser.add_argument('--profile-json', type=str, default=None, metavar='PATH', help='Write the profile as JSON (implies --profile)')
+    parser.add_argument('--flamegraph', type=str, default=None, metavar='PATH', help='Write the profile as collapsed stacks for flamegraph.pl (implies --profile)')
+    parser.add_argument('--heap-limit', type=parse_size, default=None, metavar='SIZE', help='Fail once arrays, channels and class records take more than SIZE bytes, as in 64M')
+    parser.add_argument('--heap-stats', action='store_true', help='Print live objects, bytes and collection pauses to stderr after the run')
+    parser.add_argument('--vm', choices=['stack', 'register'], default='stack', help='Run on the stack VM (default) or the register VM, which has no goroutines, parallel for loops or bytecode cache')
+    parser.add_argument('--native', action='store_true', help='Compile to a native executable with the system C compiler ($CC) and run that; programs using more than Int arithmetic, if, while and functions run on the VM instead')
+    parser.add_argument('-o', '--output', type=str, default=None, metavar='PATH', help='With --native, write the executable to PATH instead of running it')
+    args = parser.parse_args(argv)
+
+    if args.dead_code_report and (args.optimize < DEAD_CODE_LEVEL or args.source.endswith('.fbc')):
+        parser.error('--dead-code-report needs a .fusion source compiled with -O2')
+    if args.output is not None and not args.native:
+        parser.error('-o writes a native executable and needs --native')
+    if args.native:
+        if args.source.endswith('.fbc') or args.vm == 'register':
+            parser.error('--native compiles a .fusion source and runs on the stack VM when it cannot')
+        if args.jit or args.profile or args.profile_json or args.flamegraph or args.heap_limit or args.heap_stats or args.dead_code_report:
+            parser.error('--native cannot be combined with --jit, --profile, --dead-code-report or the heap options')
+        if native_main(args):
+            return
+    if args.vm == 'register':
+        if args.source.endswith('.fbc'):
+            parser.error('.fbc files hold stack VM bytecode; run them without --vm register')
+        if args.jit or args.profile or args.profile_json or args.flamegraph or args.heap_limit or args.heap_stats:
+            parser.error('--vm register cannot be combined with --jit, --profile or the heap options')
+        with open(args.source, 'r') as file:
+            instructions, frame = compile_registers(file)
+        vm = RegisterVM()
+        vm.load_program(instructions, frame)
+        vm.run()
+        return
+
+    instructions = load_instructions(args)
 
     # Runtime Execution
-    runtime = Runtime()
+    runtime = Runtime(workers=args.workers, jit=args.jit, heap_limit=args.heap_limit)
     runtime.load_program(instructions)
-    runtime.run()
+    if not (args.profile or args.profile_json or args.flamegraph):
+        try:
+            runtime.run()
+        finally:
+            runtime.close()
+            if args.heap_stats:
+                print(runtime.heap.report(), file=sys.stderr)
+        return
+
+    # The profiler runs the program on its own instrumented dispatch loop
+    profiler = Profiler(runtime)
+    try:
+        profiler.run()
+    finally:
+        runtime.close()
+    print(profiler.report(), file=sys.stderr)
+    if args.heap_stats:
+        print(runtime.heap.report(), file=sys.stderr)
+    if args.profile_json:
+        profiler.dump_json(args.profile_json)
+    if args.flamegraph:
+        profiler.dump_collapsed(args.flamegraph)
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,54 @@
+import os
+import sys
+import json
+import socket
+import argparse
+
+# The client half of the daemon in src/server.py. It imports nothing from the
+# compiler, so handing a file to a running daemon costs little more than
+# starting the interpreter; the imports and compiling happen in the daemon.
+
+DEFAULT_SOCKET = os.environ.get('FUSION_SOCKET') or os.path.join(
+    os.environ.get('XDG_RUNTIME_DIR') or os.environ.get('TMPDIR') or '/tmp', f'fusionlang-{os.getuid()}.sock')
+
+
+def request(message, path=None, timeout=None):
+    # Sends one request to the daemon and returns its reply. Both are a single
+    # line of JSON; the daemon closes the connection after replying.
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.settimeout(timeout)
+        connection.connect(path or DEFAULT_SOCKET)
+        connection.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        with connection.makefile('rb') as reply:
+            line = reply.readline()
+    if not line:
+        raise ConnectionError('The daemon closed the connection without replying')
+    return json.loads(line)
+
+
+def wants_client(argv):
+    return '--connect' in argv
+
+
+def client_main(argv):
+    parser = argparse.ArgumentParser(prog='fusion --connect', description='Compile and run a program on a running "fusion serve" daemon')
+    parser.add_argument('source', type=str, help='Source file (.fusion) or compiled bytecode (.fbc) to run')
+    parser.add_argument('--connect', action='store_true', required=True, help='Send the file to the daemon instead of compiling it here')
+    parser.add_argument('--socket', type=str, default=DEFAULT_SOCKET, help='Daemon socket (default: $FUSION_SOCKET or %(default)s)')
+    parser.add_argument('-O', dest='optimize', type=int, choices=[0, 1, 2], default=1, help='Bytecode optimization level')
+    parser.add_argument('--jit', action='store_true', help='Compile hot loops to Python functions while running')
+    parser.add_argument('--check', action='store_true', help='Only compile, reporting any errors, and do not run')
+    args = parser.parse_args(argv)
+
+    # The daemon has its own working directory
+    message = {'command': 'compile' if args.check else 'run', 'path': os.path.abspath(args.source),
+               'optimize': args.optimize, 'jit': args.jit}
+    try:
+        response = request(message, args.socket)
+    except (FileNotFoundError, ConnectionRefusedError):
+        print(f'No FusionLang daemon is listening on {args.socket}; start one with "fusion serve"', file=sys.stderr)
+        return 2
+    if not response['ok']:
+        print(f"{response['error_type']}: {response['error']}", file=sys.stderr)
+        return 1
+    return 0
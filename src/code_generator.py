@@ -1,15 +1,34 @@
+from src.ast_nodes import (
+    BinaryOperation, Call, Identifier, Integer, Assignment, ExpressionStatement,
+)
+from src.opcodes import BUILTINS, INT_OPCODES
 from src.lexer import Lexer
 from src.parser import Parser
-from src.semantic_analyser import SemanticAnalyzer
+from src.semantic_analyzer import SemanticAnalyzer
+
+# Operators a vectorized loop body may use; they work the same on elements
+# and on whole slices (division by zero does not)
+VECTOR_OPERATORS = {'+', '-', '*'}
 
 
 class CodeGenerator:
-    def __init__(self):
+    def __init__(self, symbol_table=None, scopes=None, types=None):
         self.instructions = []
+        # With the analyzer's symbol tables, variables are resolved to frame slots;
+        # without them every access stays a name-keyed LOAD/STORE.
+        self.symbol_table = symbol_table
+        self.scopes = scopes or {}
+        # With the analyzer's expression types, operators on two Ints get
+        # specialized instructions
+        self.types = types
+        self.generators = {}
 
     def generate(self, node):
-        method_name = 'generate_' + type(node).__name__
-        generator = getattr(self, method_name, self.generic_generate)
+        # Look the generator up once per node class rather than once per node
+        generator = self.generators.get(type(node))
+        if generator is None:
+            method_name = 'generate_' + type(node).__name__
+            generator = self.generators[type(node)] = getattr(self, method_name, self.generic_generate)
         generator(node)
 
     def generic_generate(self, node):
@@ -22,18 +41,100 @@ class CodeGenerator:
 
     def generate_VariableDeclaration(self, node):
         self.generate(node.value)
-        self.instructions.append(('STORE', node.identifier))
+        self.instructions.append(self.resolve('STORE', node.identifier))
+
+    def resolve(self, op, name):
+        if self.symbol_table is None:
+            return (op, name)
+        table, slot = self.symbol_table.resolve(name)
+        if table is None:
+            return (op, name)
+        if table.parent is None:
+            return (op + '_GLOBAL', slot)
+        if table is self.symbol_table:
+            return (op + '_FAST', slot)
+        return (op, name)
 
     def generate_FunctionDeclaration(self, node):
+        # FUNC, one PARAM per parameter, then the code for each default value
+        # ending in STORE_DEFAULT, then the body. The runtime enters a call
+        # with n arguments at the default code of parameter n, or at the body
+        # when every argument was passed. Executing FUNC creates the function
+        # and skips past END_FUNC, where it is stored under its name.
         self.instructions.append(('FUNC', node.identifier))
+        enclosing = self.symbol_table
+        if node in self.scopes:
+            self.symbol_table = self.scopes[node]
         for param in node.parameters:
             self.instructions.append(('PARAM', param[0]))
+        for index, param in enumerate(node.parameters):
             if param[2] is not None:  # If there is a default value
                 self.generate(param[2])
-                self.instructions.append(('STORE_DEFAULT', param[0]))
+                self.instructions.append(('STORE_DEFAULT', index))
         for statement in node.body:
             self.generate(statement)
+        self.symbol_table = enclosing
         self.instructions.append(('END_FUNC',))
+        self.instructions.append(self.resolve('STORE', node.identifier))
+
+    def generate_ParallelFor(self, node):
+        # The body becomes a function of the loop variable, left on the stack
+        # by FUNC between the reduction's current value and the bounds.
+        # PARALLEL runs it for every value in the range and replaces all four
+        # with the combined result.
+        self.instructions.append(self.resolve('LOAD', node.target))
+        self.instructions.append(('FUNC', 'parallel for'))
+        enclosing = self.symbol_table
+        if node in self.scopes:
+            self.symbol_table = self.scopes[node]
+        self.instructions.append(('PARAM', node.variable))
+        for statement in node.body:
+            self.generate(statement)
+        self.symbol_table = enclosing
+        self.instructions.append(('END_FUNC',))
+        self.generate(node.start)
+        self.generate(node.stop)
+        self.instructions.append(('PARALLEL', node.operator))
+        self.instructions.append(self.resolve('STORE', node.target))
+
+    def generate_ReturnStatement(self, node):
+        if type(node.value) is Call and not self.is_builtin(node.value):
+            # The caller's frame is not needed after a call in tail position
+            self.generate_call(node.value, 'TAIL_CALL')
+            return
+        if node.value is None:
+            self.instructions.append(('PUSH', None))
+        else:
+            self.generate(node.value)
+        self.instructions.append(('RETURN',))
+
+    def generate_ExpressionStatement(self, node):
+        self.generate(node.expression)
+        self.instructions.append(('POP',))
+
+    def generate_GoStatement(self, node):
+        self.generate_call(node.call, 'GO')
+
+    def generate_Call(self, node):
+        if self.is_builtin(node):
+            for argument in node.arguments:
+                self.generate(argument)
+            self.instructions.append((BUILTINS[node.identifier][0],))
+            return
+        self.generate_call(node, 'CALL')
+
+    def is_builtin(self, node):
+        # A call to a builtin that no declaration shadows
+        if node.identifier not in BUILTINS:
+            return False
+        return self.symbol_table is None or self.symbol_table.resolve(node.identifier)[0] is None
+
+    def generate_call(self, node, op):
+        # Arguments are pushed first, then the function itself
+        for argument in node.arguments:
+            self.generate(argument)
+        self.instructions.append(self.resolve('LOAD', node.identifier))
+        self.instructions.append((op, len(node.arguments)))
 
     def generate_ClassDeclaration(self, node):
         self.instructions.append(('CLASS', node.identifier))
@@ -58,6 +159,10 @@ class CodeGenerator:
             self.instructions[jump_if_false] = ('JUMP_IF_FALSE', len(self.instructions))
 
     def generate_WhileStatement(self, node):
+        kernel = self.vector_kernel(node)
+        vector_end = None
+        if kernel is not None:
+            vector_end = self.generate_vector_loop(*kernel)
         loop_start = len(self.instructions)
         self.generate(node.condition)
         jump_if_false = len(self.instructions)
@@ -66,20 +171,177 @@ class CodeGenerator:
             self.generate(statement)
         self.instructions.append(('JUMP', loop_start))
         self.instructions[jump_if_false] = ('JUMP_IF_FALSE', len(self.instructions))
+        if vector_end is not None:
+            self.instructions[vector_end] = ('JUMP', len(self.instructions))
+
+    def vector_kernel(self, node):
+        # Recognizes an element-wise loop
+        #     while i < n { set(c, i, value); i = i + 1; }
+        # where value combines get(a, i) of any arrays, Int variables other
+        # than i and constants with + - *. Each iteration only touches index
+        # i, so the loop can run as one operation on the slices i .. n.
+        # Returns (i, n, target, value, arrays, scalars) or None.
+        condition = node.condition
+        if (type(condition) is not BinaryOperation or condition.operator != '<'
+                or type(condition.left) is not Identifier or len(node.body) != 2):
+            return None
+        index = condition.left.name
+        bound = condition.right
+        if type(bound) is not Integer and (type(bound) is not Identifier or bound.name == index):
+            return None
+        statement, step = node.body
+        if (type(step) is not Assignment or step.identifier != index
+                or type(step.value) is not BinaryOperation or step.value.operator != '+'
+                or not self.is_variable(step.value.left, index) or type(step.value.right) is not Integer
+                or step.value.right != 1):
+            return None
+        if type(statement) is not ExpressionStatement or not self.is_array_call(statement.expression, 'set', index):
+            return None
+        target, _, value = statement.expression.arguments
+        arrays = [target.name]
+        scalars = []
+        pending = [value]
+        while pending:
+            node = pending.pop()
+            if type(node) is BinaryOperation:
+                if node.operator not in VECTOR_OPERATORS:
+                    return None
+                pending.append(node.left)
+                pending.append(node.right)
+            elif type(node) is Call:
+                if not self.is_array_call(node, 'get', index):
+                    return None
+                if node.arguments[0].name not in arrays:
+                    arrays.append(node.arguments[0].name)
+            elif type(node) is Identifier:
+                if node.name == index or self.declared_type(node.name) != 'Int':
+                    return None
+                if node.name not in scalars:
+                    scalars.append(node.name)
+            elif type(node) is not Integer:
+                return None
+        return index, bound, target.name, value, arrays, scalars
+
+    def is_variable(self, node, name):
+        return type(node) is Identifier and node.name == name
+
+    def is_array_call(self, node, builtin, index):
+        # builtin(array, index, ...) with a plain variable as the array
+        return (type(node) is Call and node.identifier == builtin and self.is_builtin(node)
+                and len(node.arguments) == BUILTINS[builtin][1] and type(node.arguments[0]) is Identifier and node.arguments[0].name != index
+                and self.is_variable(node.arguments[1], index))
+
+    def declared_type(self, name):
+        if self.symbol_table is None:
+            return None
+        table, _ = self.symbol_table.resolve(name)
+        return None if table is None else table.symbols.get(name)
+
+    def generate_vector_loop(self, index, bound, target, value, arrays, scalars):
+        # VECTOR_GUARD checks at run time that the arrays and scalars have
+        # the types the kernel assumes, that the slices are in range and
+        # don't overlap, and that no step of the kernel, which it carries in
+        # post-order, can overflow the elements. If so, the loop runs as
+        #     copy(slice(target, i, n), value with get(a, i) -> slice(a, i, n))
+        #     i = n
+        # and jumps past the original loop, which runs otherwise. Returns the
+        # index of that jump, for the caller to patch.
+        for name in arrays + scalars:
+            self.instructions.append(self.resolve('LOAD', name))
+        self.instructions.append(self.resolve('LOAD', index))
+        self.generate(bound)
+        self.instructions.append(('VECTOR_GUARD', (len(arrays), len(scalars), self.kernel_steps(value, arrays, scalars))))
+        jump_if_false = len(self.instructions)
+        self.instructions.append(('JUMP_IF_FALSE', None))
+        self.generate_slice(target, index, bound)
+        # Post-order as in generate_BinaryOperation, with reads of elements
+        # at i turned into slices
+        pending = [value]
+        while pending:
+            node = pending.pop()
+            if type(node) is BinaryOperation:
+                pending.append(('BIN_OP', node.operator))
+                pending.append(node.right)
+                pending.append(node.left)
+            elif type(node) is tuple:
+                self.instructions.append(node)
+            elif type(node) is Call:
+                self.generate_slice(node.arguments[0].name, index, bound)
+            else:
+                self.generate(node)
+        self.instructions.append(('COPY',))
+        self.instructions.append(('POP',))
+        self.generate(bound)
+        self.instructions.append(self.resolve('STORE', index))
+        vector_end = len(self.instructions)
+        self.instructions.append(('JUMP', None))
+        self.instructions[jump_if_false] = ('JUMP_IF_FALSE', len(self.instructions))
+        return vector_end
+
+    def kernel_steps(self, value, arrays, scalars):
+        # The kernel in post-order for the guard: ('get', k) for an element of
+        # arrays[k], ('load', k) for scalars[k], ('push', c) and ('op', symbol)
+        steps = []
+        pending = [value]
+        while pending:
+            node = pending.pop()
+            if type(node) is BinaryOperation:
+                pending.append(('op', node.operator))
+                pending.append(node.right)
+                pending.append(node.left)
+            elif type(node) is tuple:
+                steps.append(node)
+            elif type(node) is Call:
+                steps.append(('get', arrays.index(node.arguments[0].name)))
+            elif type(node) is Identifier:
+                steps.append(('load', scalars.index(node.name)))
+            else:
+                steps.append(('push', int(node)))
+        return tuple(steps)
+
+    def generate_slice(self, name, index, bound):
+        self.instructions.append(self.resolve('LOAD', name))
+        self.instructions.append(self.resolve('LOAD', index))
+        self.generate(bound)
+        self.instructions.append(('SLICE',))
 
     def generate_Integer(self, node):
-        self.instructions.append(('PUSH', node))
+        self.instructions.append(('PUSH', int(node)))
 
     def generate_str(self, node):
-        self.instructions.append(('LOAD', node))
+        self.instructions.append(self.resolve('LOAD', node))
 
     def generate_Identifier(self, node):
-        self.instructions.append(('LOAD', node))
+        self.instructions.append(self.resolve('LOAD', node.name))
+
+    def generate_Assignment(self, node):
+        self.generate(node.value)
+        self.instructions.append(self.resolve('STORE', node.identifier))
 
     def generate_BinaryOperation(self, node):
-        self.generate(node.left)
-        self.generate(node.right)
-        self.instructions.append(('BIN_OP', node.operator))
+        # Post-order over operator chains with an explicit stack, so expressions
+        # nested deeper than the recursion limit still compile. Instructions
+        # waiting for their operands sit on the stack as tuples.
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            if type(node) is BinaryOperation:
+                pending.append(self.operator_instruction(node))
+                pending.append(node.right)
+                pending.append(node.left)
+            elif type(node) is tuple:
+                self.instructions.append(node)
+            else:
+                self.generate(node)
+
+    def operator_instruction(self, node):
+        if (self.types is not None and node.operator in INT_OPCODES
+                and self.type_of(node.left) == 'Int' and self.type_of(node.right) == 'Int'):
+            return ('BIN_OP_INT', node.operator)
+        return ('BIN_OP', node.operator)
+
+    def type_of(self, node):
+        return 'Int' if type(node) is Integer else self.types.get(node)
 
     def get_instructions(self):
         return self.instructions
@@ -105,7 +367,7 @@ if __name__ == "__main__":
     ast = parser.parse()
     analyzer = SemanticAnalyzer()
     analyzer.visit(ast)
-    generator = CodeGenerator()
+    generator = CodeGenerator(analyzer.symbol_table, analyzer.scopes, analyzer.types)
     generator.generate(ast)
     instructions = generator.get_instructions()
     print(instructions)
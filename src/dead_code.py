@@ -0,0 +1,395 @@
+from src.ast_nodes import (
+    ClassDeclaration, VariableDeclaration, FunctionDeclaration,
+    IfStatement, WhileStatement, ReturnStatement, ExpressionStatement,
+    GoStatement, ParallelFor, Assignment, BinaryOperation, Call, Identifier,
+    Integer,
+)
+from src.code_generator import CodeGenerator
+from src.semantic_analyzer import FunctionType
+
+# Optimization level from which the pass runs
+DEAD_CODE_LEVEL = 2
+
+# Operators that cannot fail on two Ints, so an unused result of them can be
+# dropped without hiding an error
+PURE_OPERATORS = {'+', '-', '*', '<', '>', '<=', '>=', '==', '!='}
+
+
+def read_names(node):
+    # Every name an expression reads, functions called included
+    names = set()
+    pending = [node]
+    while pending:
+        node = pending.pop()
+        node_type = type(node)
+        if node_type is BinaryOperation:
+            pending.append(node.left)
+            pending.append(node.right)
+        elif node_type is Identifier:
+            names.add(node.name)
+        elif node_type is Call:
+            names.add(node.identifier)
+            pending.extend(node.arguments)
+        elif node_type is str:
+            names.add(node)
+    return names
+
+
+def statement_names(statements):
+    # Every name read anywhere in statements, nested code included
+    names = set()
+    pending = list(statements)
+    while pending:
+        node = pending.pop()
+        node_type = type(node)
+        if node_type is VariableDeclaration or node_type is Assignment:
+            names |= read_names(node.value)
+        elif node_type is ExpressionStatement:
+            names |= read_names(node.expression)
+        elif node_type is ReturnStatement:
+            if node.value is not None:
+                names |= read_names(node.value)
+        elif node_type is GoStatement:
+            names |= read_names(node.call)
+        elif node_type is IfStatement:
+            names |= read_names(node.condition)
+            pending.extend(node.then_block)
+            pending.extend(node.else_block or [])
+        elif node_type is WhileStatement:
+            names |= read_names(node.condition)
+            pending.extend(node.body)
+        elif node_type is FunctionDeclaration:
+            for param in node.parameters:
+                if param[2] is not None:
+                    names |= read_names(param[2])
+            pending.extend(node.body)
+        elif node_type is ParallelFor:
+            names |= read_names(node.start) | read_names(node.stop)
+            names.add(node.target)
+            pending.extend(node.body)
+        elif node_type is ClassDeclaration:
+            pending.extend(node.body)
+    return names
+
+
+def eliminate_dead_code(ast, analyzer, optimize, report=False):
+    # Runs the pass on an analyzed tree at optimization levels that include
+    # it; returns the eliminator, for its report, or None
+    if optimize < DEAD_CODE_LEVEL:
+        return None
+    eliminator = DeadCodeEliminator(analyzer.symbol_table, analyzer.scopes, analyzer.types, report)
+    eliminator.eliminate(ast)
+    return eliminator
+
+
+class DeadCodeEliminator:
+    # Removes code whose effect nobody can observe, rewriting the analyzed
+    # tree in place before code is generated:
+    #   - top-level functions no kept code refers to, transitively;
+    #   - statements after a return in the same block;
+    #   - stores to a function's locals that no later statement reads, found
+    #     by liveness analysis. The store goes; the value is still computed if
+    #     it may call something or fail, and dropped with it if not.
+    # Globals are the program's results, read by the host after it halts
+    # (see src/embedding.py), so every global variable and store to one is
+    # kept; the report lists those never read.
+    #
+    # With measure set, the code removed is generated once more to count its
+    # instructions for the report; otherwise removed_instructions stays 0.
+    def __init__(self, symbol_table, scopes, types, measure=True):
+        self.symbol_table = symbol_table
+        self.scopes = scopes
+        self.types = types
+        self.measuring = measure
+        # The scope of the function being rewritten, its local names, and
+        # those nested code may read, which are never treated as dead
+        self.scope = symbol_table
+        self.locals = set()
+        self.pinned = set()
+        # The names certainly assigned before each store and if statement of
+        # the function, the only ones an expression can read without failing
+        self.assigned = {}
+        self.removed_functions = []
+        self.removed_statements = 0
+        self.removed_stores = 0
+        self.removed_instructions = 0
+        self.unused_globals = []
+
+    def eliminate(self, program):
+        statements = program.statements
+        declared = {statement.identifier: statement for statement in statements
+                    if type(statement) is FunctionDeclaration}
+        # Functions reachable from the main program, following references
+        # from the body of each one reached
+        reached = set()
+        pending = statement_names([statement for statement in statements if type(statement) is not FunctionDeclaration])
+        while pending:
+            name = pending.pop()
+            if name in declared and name not in reached:
+                reached.add(name)
+                pending |= statement_names([declared[name]])
+        kept = []
+        for statement in statements:
+            if type(statement) is FunctionDeclaration and statement.identifier not in reached:
+                self.removed_functions.append(statement.identifier)
+                self.removed_instructions += self.measure(statement)
+            else:
+                kept.append(statement)
+        program.statements = kept
+        self.nested(kept, set())
+
+        read = statement_names(kept)
+        self.unused_globals = [name for name, symbol in self.symbol_table.symbols.items()
+                               if type(symbol) is not FunctionType and name not in read]
+        return program
+
+    def nested(self, statements, defined):
+        # Rewrites the body of every function and parallel for in statements,
+        # given the names certainly assigned before them
+        for statement in statements:
+            statement_type = type(statement)
+            if statement_type is FunctionDeclaration or statement_type is ParallelFor:
+                self.function(statement, defined)
+            elif statement_type is IfStatement:
+                self.nested(statement.then_block, set(defined))
+                self.nested(statement.else_block or [], set(defined))
+            elif statement_type is WhileStatement or statement_type is ClassDeclaration:
+                self.nested(statement.body, set(defined))
+            if statement_type is VariableDeclaration or statement_type is Assignment:
+                defined.add(statement.identifier)
+            elif statement_type is ParallelFor:
+                defined.add(statement.target)
+
+    def function(self, node, defined):
+        scope = self.scopes.get(node)
+        if scope is None:
+            return
+        if type(node) is FunctionDeclaration:
+            parameters = {param[0] for param in node.parameters}
+        else:
+            parameters = {node.variable}
+        # Globals assigned before the declaration are by the time it runs;
+        # its own locals only once it assigns them
+        defined = {name for name in defined if name not in scope.symbols} | parameters
+        saved = self.scope, self.locals, self.pinned, self.assigned
+        self.scope = scope
+        self.locals = set(scope.symbols)
+        self.assigned = {}
+        self.record_assigned(node.body, set(defined))
+        # Functions and parallel for bodies declared inside this one read
+        # its variables by name, out of reach of the analysis
+        self.pinned = set()
+        for statement in self.inner_code(node.body):
+            self.pinned |= statement_names([statement])
+        try:
+            # Nothing is live after the function returns
+            node.body = self.block(node.body, set(), True)
+            self.nested(node.body, defined)
+        finally:
+            self.scope, self.locals, self.pinned, self.assigned = saved
+
+    def record_assigned(self, statements, defined):
+        # Fills self.assigned for statements, walking them first to last; a
+        # name assigned in a branch or loop body is certain only inside it
+        for statement in statements:
+            statement_type = type(statement)
+            if statement_type is VariableDeclaration or statement_type is Assignment:
+                self.assigned[statement] = frozenset(defined)
+                defined.add(statement.identifier)
+            elif statement_type is IfStatement:
+                self.assigned[statement] = frozenset(defined)
+                self.record_assigned(statement.then_block, set(defined))
+                self.record_assigned(statement.else_block or [], set(defined))
+            elif statement_type is WhileStatement:
+                self.record_assigned(statement.body, set(defined))
+            elif statement_type is ParallelFor:
+                defined.add(statement.target)
+
+    def inner_code(self, statements):
+        pending = list(statements)
+        while pending:
+            statement = pending.pop()
+            statement_type = type(statement)
+            if statement_type in (FunctionDeclaration, ParallelFor, ClassDeclaration):
+                yield statement
+            elif statement_type is IfStatement:
+                pending.extend(statement.then_block)
+                pending.extend(statement.else_block or [])
+            elif statement_type is WhileStatement:
+                pending.extend(statement.body)
+
+    def block(self, statements, live, rewrite):
+        # Walks statements last to first from the set of names live after
+        # them, and returns the statements, rewritten if rewrite is set, with
+        # the set live before them left in live
+        statements = self.reachable(statements, rewrite)
+        kept = []
+        for statement in reversed(statements):
+            statement = self.statement(statement, live, rewrite)
+            if statement is not None:
+                kept.append(statement)
+        kept.reverse()
+        return kept
+
+    def reachable(self, statements, rewrite):
+        for index, statement in enumerate(statements):
+            if type(statement) is ReturnStatement and index + 1 < len(statements):
+                if rewrite:
+                    for unreachable in statements[index + 1:]:
+                        self.removed_statements += 1
+                        self.removed_instructions += self.measure(unreachable)
+                return statements[:index + 1]
+        return statements
+
+    def statement(self, node, live, rewrite):
+        # Updates live from after node to before it; returns what replaces node
+        node_type = type(node)
+        if node_type is VariableDeclaration or node_type is Assignment:
+            return self.store(node, node.identifier, node.value, live, rewrite)
+        if node_type is ExpressionStatement:
+            live |= read_names(node.expression)
+        elif node_type is ReturnStatement:
+            # What was live after a return is not reached from here
+            live.clear()
+            if node.value is not None:
+                live |= read_names(node.value)
+        elif node_type is GoStatement:
+            live |= read_names(node.call)
+        elif node_type is IfStatement:
+            then_live = set(live)
+            then_block = self.block(node.then_block, then_live, rewrite)
+            else_block = node.else_block
+            if else_block is not None:
+                else_live = set(live)
+                else_block = self.block(else_block, else_live, rewrite)
+                then_live |= else_live
+            else:
+                then_live |= live
+            live.clear()
+            live |= then_live
+            if rewrite:
+                if not then_block and not else_block and self.is_pure(node.condition, node):
+                    self.removed_statements += 1
+                    self.removed_instructions += self.measure(node)
+                    return None
+                node.then_block = then_block
+                node.else_block = else_block
+            live |= read_names(node.condition)
+        elif node_type is WhileStatement:
+            # Names live at the loop condition, to a fixed point: those live
+            # after the loop, those the condition reads, and those live at the
+            # start of the body given this set at its end
+            head = live | read_names(node.condition)
+            while True:
+                body_live = set(head)
+                self.block(node.body, body_live, False)
+                if body_live <= head:
+                    break
+                head |= body_live
+            if rewrite:
+                node.body = self.block(node.body, set(head), True)
+            live |= head
+        elif node_type is ParallelFor:
+            live |= read_names(node.start) | read_names(node.stop)
+            live.add(node.target)
+            live |= self.pinned
+        else:
+            # Declarations of nested functions and classes are kept; what they
+            # read is pinned
+            live |= self.pinned
+        return node
+
+    def store(self, node, name, value, live, rewrite):
+        if name not in self.locals or name in live or name in self.pinned:
+            live.discard(name)
+            live |= read_names(value)
+            return node
+        # A store nothing reads
+        if self.is_pure(value, node):
+            if rewrite:
+                self.removed_stores += 1
+                self.removed_instructions += self.measure(node)
+            return None
+        live |= read_names(value)
+        if not rewrite:
+            return node
+        self.removed_stores += 1
+        return ExpressionStatement(value)
+
+    def is_pure(self, node, statement):
+        # Whether evaluating node, in statement, can have no effect but its
+        # value: no calls, only operators that cannot fail on the Ints they
+        # are given, and only variables certainly assigned by then
+        defined = self.assigned.get(statement, ())
+        pending = [node]
+        while pending:
+            node = pending.pop()
+            node_type = type(node)
+            if node_type is BinaryOperation:
+                if node.operator not in PURE_OPERATORS or self.type_of(node.left) != 'Int' or self.type_of(node.right) != 'Int':
+                    return False
+                pending.append(node.left)
+                pending.append(node.right)
+            elif node_type is Identifier:
+                if node.name not in defined:
+                    return False
+            elif node_type is str:
+                if node not in defined:
+                    return False
+            elif node_type is not Integer:
+                return False
+        return True
+
+    def type_of(self, node):
+        return 'Int' if type(node) is Integer else self.types.get(node)
+
+    def measure(self, node):
+        # Instructions the code generator would have emitted for node
+        if not self.measuring:
+            return 0
+        generator = CodeGenerator(self.scope, self.scopes, self.types)
+        generator.generate(node)
+        return len(generator.get_instructions())
+
+    def report(self, instructions):
+        # instructions: how many were generated for what was kept
+        total = instructions + self.removed_instructions
+        share = self.removed_instructions / total * 100 if total else 0.0
+        functions = len(self.removed_functions)
+        lines = [
+            f'dead code: {self.removed_instructions} of {total} instructions removed ({share:.1f}%)',
+            f'  {functions} unused function{"" if functions == 1 else "s"}'
+            + (f': {", ".join(self.removed_functions)}' if functions else ''),
+            f'  {self.removed_stores} dead stores, {self.removed_statements} unreachable or empty statements',
+        ]
+        if self.unused_globals:
+            lines.append(f'  globals never read (kept as results): {", ".join(self.unused_globals)}')
+        return '\n'.join(lines)
+
+# Example usage
+if __name__ == "__main__":
+    from src.lexer import Lexer
+    from src.parser import Parser
+    from src.semantic_analyzer import SemanticAnalyzer
+
+    code = """
+    func unused(a: Int) -> Int {
+        return a * 2;
+    }
+    func area(w: Int, h: Int) -> Int {
+        var perimeter: Int = 2 * (w + h);
+        var result: Int = w * h;
+        return result;
+        result = 0;
+    }
+    var a: Int = area(3, 4);
+    """
+    ast = Parser(Lexer(code)).parse()
+    analyzer = SemanticAnalyzer()
+    analyzer.visit(ast)
+    eliminator = DeadCodeEliminator(analyzer.symbol_table, analyzer.scopes, analyzer.types)
+    eliminator.eliminate(ast)
+    generator = CodeGenerator(analyzer.symbol_table, analyzer.scopes, analyzer.types)
+    generator.generate(ast)
+    print(generator.get_instructions())
+    print(eliminator.report(len(generator.get_instructions())))
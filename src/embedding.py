@@ -0,0 +1,186 @@
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+from queue import LifoQueue, Empty
+from types import MappingProxyType
+
+from src.lexer import Lexer
+from src.parser import Parser
+from src.semantic_analyzer import SemanticAnalyzer
+from src.code_generator import CodeGenerator
+from src.peephole import PeepholeOptimizer
+from src.dead_code import eliminate_dead_code
+from src.ast_optimizer import optimize_ast
+from src.runtime import Runtime, numpy
+
+
+def compile_program(source, inputs=None, optimize=1, ast_optimize=True):
+    # Compiles source once into a Program. inputs maps the names of values
+    # the host passes in on every run to their types; the program uses them
+    # as globals without declaring them.
+    inputs = dict(inputs or {})
+    ast = Parser(Lexer(source, streaming=True)).parse()
+    analyzer = SemanticAnalyzer()
+    for name, input_type in inputs.items():
+        analyzer.symbol_table.define(name, input_type)
+    analyzer.visit(ast)
+    optimize_ast(ast, analyzer, optimize, ast_optimize)
+    eliminate_dead_code(ast, analyzer, optimize)
+    generator = CodeGenerator(analyzer.symbol_table, analyzer.scopes, analyzer.types)
+    generator.generate(ast)
+    instructions = PeepholeOptimizer(optimize).optimize(generator.get_instructions())
+    table = analyzer.symbol_table
+    symbols = {name: (symbol_type, table.slots[name]) for name, symbol_type in table.symbols.items()}
+    return Program(tuple(instructions), MappingProxyType(symbols), tuple(inputs), optimize)
+
+
+class Program(namedtuple('Program', ('instructions', 'symbols', 'inputs', 'optimize'))):
+    # A compiled program, immutable so any number of threads and runtimes can
+    # share it. symbols maps every global name to (type, slot), as build's
+    # modules do; inputs are the names a run must be given values for.
+    __slots__ = ()
+
+    @classmethod
+    def from_instructions(cls, instructions, optimize=1):
+        # A Program from already compiled instructions, such as a bytecode
+        # file's. Without the analyzer's symbols it takes no inputs and
+        # reports no outputs.
+        return cls(tuple(instructions), MappingProxyType({}), (), optimize)
+
+    def new_runtime(self, **options):
+        # A Runtime with the program loaded, ready to run with bind()
+        runtime = Runtime(**options)
+        runtime.load_program(list(self.instructions))
+        # Globals the code never touches, such as unused inputs, still get a slot
+        missing = len(self.symbols) - len(runtime.globals)
+        if missing > 0:
+            runtime.globals.extend([None] * missing)
+        return runtime
+
+    def bind(self, runtime, inputs):
+        # Stores the inputs into a freshly reset runtime's globals
+        missing = [name for name in self.inputs if name not in inputs]
+        unknown = [name for name in inputs if name not in self.inputs]
+        if missing or unknown:
+            raise TypeError(f'Program takes inputs {list(self.inputs)}; missing {missing}, unknown {unknown}')
+        for name, value in inputs.items():
+            input_type, slot = self.symbols[name]
+            check_input(name, input_type, value)
+            runtime.globals[slot] = value
+
+    def outputs(self, runtime):
+        # name -> value of every global after a run
+        global_slots = runtime.globals
+        return {name: global_slots[slot] for name, (_, slot) in self.symbols.items()}
+
+    def run(self, **inputs):
+        # Runs the program once on a runtime of its own; a RuntimePool
+        # serves repeated runs without building a runtime each time
+        runtime = self.new_runtime(workers=1)
+        try:
+            self.bind(runtime, inputs)
+            runtime.run()
+            return self.outputs(runtime)
+        finally:
+            runtime.close()
+
+
+def check_input(name, input_type, value):
+    # Inputs of a known type must hold one, since the compiled code relies on it
+    if input_type == 'Int' and not isinstance(value, int):
+        raise TypeError(f'Input "{name}" must be an Int, got {value!r}')
+    if input_type == 'Array' and (numpy is None or type(value) is not numpy.ndarray):
+        raise TypeError(f'Input "{name}" must be an Array, got {value!r}')
+
+
+class RuntimePool:
+    # Runtimes with one program loaded, handed to one thread at a time. run()
+    # may be called from any number of threads at once: each call takes an
+    # idle runtime, or makes one while fewer than size exist, or waits for
+    # one. A runtime is reset when it comes back, which is much cheaper than
+    # compiling or loading again, and jit-compiled loops survive it. The
+    # most recently used runtime is handed out first, so its caches stay warm.
+    def __init__(self, program, size=4, **options):
+        self.program = program
+        self.size = size
+        # parallel for loops run inline unless asked otherwise, rather than
+        # each runtime starting a process per core
+        options.setdefault('workers', 1)
+        self.options = options
+        self.idle = LifoQueue()
+        self.created = 0
+        self.runtimes = []
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except Empty:
+            pass
+        with self.lock:
+            if self.closed:
+                raise RuntimeError('RuntimePool is closed')
+            # Counted before it exists, so no other thread makes one too many
+            create = self.created < self.size
+            if create:
+                self.created += 1
+        if not create:
+            return self.idle.get()
+        try:
+            runtime = self.program.new_runtime(**self.options)
+        except BaseException:
+            with self.lock:
+                self.created -= 1
+            raise
+        with self.lock:
+            self.runtimes.append(runtime)
+        return runtime
+
+    def release(self, runtime):
+        runtime.reset()
+        self.idle.put(runtime)
+
+    @contextmanager
+    def runtime(self):
+        # A reset runtime for the duration of a with block
+        runtime = self.acquire()
+        try:
+            yield runtime
+        finally:
+            self.release(runtime)
+
+    def run(self, **inputs):
+        # Runs the program with the given inputs; returns its globals by name
+        with self.runtime() as runtime:
+            self.program.bind(runtime, inputs)
+            runtime.run()
+            return self.program.outputs(runtime)
+
+    def close(self):
+        # Stops the worker processes of every runtime made so far
+        with self.lock:
+            self.closed = True
+            runtimes = list(self.runtimes)
+        for runtime in runtimes:
+            runtime.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+# Example usage
+if __name__ == "__main__":
+    program = compile_program("""
+    var total: Int = 0;
+    var i: Int = 0;
+    while i < n {
+        total = total + i * scale;
+        i = i + 1;
+    }
+    """, inputs={'n': 'Int', 'scale': 'Int'})
+    with RuntimePool(program, size=2) as pool:
+        for n in (10, 100, 1000):
+            print(n, pool.run(n=n, scale=3)['total'])
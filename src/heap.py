@@ -0,0 +1,138 @@
+import gc
+import sys
+import time
+import threading
+import weakref
+from collections import deque
+
+# Accounting for the objects a program allocates: arrays, channels and class
+# records. Their memory is Python's, so it is freed by reference counting as
+# soon as the last reference goes, and cycles (a goroutine parked on a
+# channel only it can reach, say) by the cycle collector. The heap sees both
+# through a finalizer per object, which keeps live_objects and live_bytes
+# exact without scanning anything.
+#
+# With a limit, an allocation that would take live_bytes past it first runs a
+# full collection, timed as a pause, and fails with a RuntimeError only if
+# the garbage freed is not enough. collect() may also be called between
+# requests, so pauses happen where the host chooses rather than mid-run.
+
+
+class Record(dict):
+    # The storage a CLASS declaration creates; a dict that can be tracked
+    __slots__ = ('__weakref__',)
+
+
+def array_size(empty, length):
+    # What sys.getsizeof reports for an array like empty but with length
+    # elements, known before it is made. Views own no data and are not
+    # counted; the array they keep alive is.
+    return sys.getsizeof(empty) + length * empty.itemsize
+
+
+def channel_size(channel):
+    # The object, its three queues, and a slot per buffered value, charged
+    # when the channel is made so a full buffer cannot exceed the limit later
+    return sys.getsizeof(channel) + 3 * sys.getsizeof(deque()) + 8 * channel.capacity
+
+
+def record_size(record):
+    return sys.getsizeof(record)
+
+
+class Heap:
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.live_objects = 0
+        self.live_bytes = 0
+        self.peak_bytes = 0
+        self.allocations = 0
+        self.allocated_bytes = 0
+        self.collections = 0
+        self.pause_total = 0.0
+        self.pause_max = 0.0
+        # Objects may be freed on any thread, such as a host's holding outputs
+        self.lock = threading.Lock()
+
+    def allocate(self, value, size):
+        self.reserve(size)
+        return self.track(value, size)
+
+    def reserve(self, size):
+        # Raises unless size more bytes fit under the limit, collecting first
+        # if they do not; called before making anything large
+        if self.limit is not None and self.live_bytes + size > self.limit:
+            self.collect()
+            if self.live_bytes + size > self.limit:
+                raise RuntimeError(f'Heap limit of {self.limit} bytes exceeded: {self.live_bytes} bytes live, '
+                                   f'{size} more requested')
+
+    def track(self, value, size):
+        # Counts value, which takes size bytes, until it is freed
+        with self.lock:
+            self.live_objects += 1
+            self.live_bytes += size
+            self.allocations += 1
+            self.allocated_bytes += size
+            if self.live_bytes > self.peak_bytes:
+                self.peak_bytes = self.live_bytes
+        weakref.finalize(value, self.free, size).atexit = False
+        return value
+
+    def free(self, size):
+        with self.lock:
+            self.live_objects -= 1
+            self.live_bytes -= size
+
+    def collect(self):
+        # A full cycle collection; returns the bytes it freed
+        before = self.live_bytes
+        start = time.perf_counter()
+        gc.collect()
+        pause = time.perf_counter() - start
+        with self.lock:
+            self.collections += 1
+            self.pause_total += pause
+            self.pause_max = max(self.pause_max, pause)
+        return before - self.live_bytes
+
+    def stats(self):
+        with self.lock:
+            return {
+                'limit': self.limit,
+                'live_objects': self.live_objects,
+                'live_bytes': self.live_bytes,
+                'peak_bytes': self.peak_bytes,
+                'allocations': self.allocations,
+                'allocated_bytes': self.allocated_bytes,
+                'collections': self.collections,
+                'pause_total': self.pause_total,
+                'pause_max': self.pause_max,
+            }
+
+    def report(self):
+        stats = self.stats()
+        limit = 'none' if self.limit is None else f'{self.limit} bytes'
+        return '\n'.join([
+            f'heap: {stats["live_objects"]} live objects, {stats["live_bytes"]} bytes (peak {stats["peak_bytes"]}, limit {limit})',
+            f'      {stats["allocations"]} allocations, {stats["allocated_bytes"]} bytes in total',
+            f'      {stats["collections"]} collections, {stats["pause_total"] * 1000:.2f} ms paused '
+            f'(longest {stats["pause_max"] * 1000:.2f} ms)',
+        ])
+
+
+def parse_size(text):
+    # A byte count with an optional K, M or G suffix, as in 64M
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    text = text.strip().upper().removesuffix('B')
+    if text and text[-1] in units:
+        return int(text[:-1]) * units[text[-1]]
+    return int(text)
+
+# Example usage
+if __name__ == "__main__":
+    heap = Heap(limit=1 << 20)
+    records = [heap.allocate(Record(), 256) for _ in range(10)]
+    print(heap.stats())
+    del records
+    print(heap.report())
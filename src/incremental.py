@@ -0,0 +1,232 @@
+from bisect import bisect_left
+from collections import ChainMap
+from collections.abc import Mapping
+from operator import attrgetter
+
+from src.lexer import Lexer, MASTER_PATTERN
+from src.parser import Parser
+from src.semantic_analyzer import SemanticAnalyzer, SymbolTable
+
+# Recorded for a name that was looked up but not defined at the time
+MISSING = object()
+
+def statement_ends(source, start=0):
+    # Yields the offset just past each top-level statement from start, which
+    # must be a statement boundary: a ';' or a closing '}' at brace depth 0,
+    # where a block is continued by a following 'else'. A trailing incomplete
+    # statement ends at the end of the source. Only braces are counted, since
+    # no statement can appear inside parentheses.
+    depth = 0
+    block_end = None
+    pending = False
+    for match in MASTER_PATTERN.finditer(source, start):
+        lexeme = match.group()
+        if lexeme == '\n':
+            continue
+        if block_end is not None:
+            if lexeme != 'else':
+                yield block_end
+            block_end = None
+        pending = True
+        if lexeme == '{':
+            depth += 1
+        elif lexeme == '}':
+            depth -= 1
+            if depth == 0:
+                block_end = match.end()
+            elif depth < 0:
+                # A stray '}' ends up on its own and fails to parse there
+                depth = 0
+                pending = False
+                yield match.end()
+        elif lexeme == ';' and depth == 0:
+            pending = False
+            yield match.end()
+    if block_end is not None:
+        yield block_end
+    elif pending:
+        yield len(source)
+
+class RecordingScope(Mapping):
+    # Read-only view of the globals defined by earlier statements that
+    # remembers every name looked up in it and what it was bound to, so an
+    # analysis result can be reused for as long as those bindings hold.
+    def __init__(self, symbols):
+        self.symbols = symbols
+        self.reads = {}
+
+    def __getitem__(self, name):
+        symbol = self.reads[name] = self.symbols.get(name, MISSING)
+        if symbol is MISSING:
+            raise KeyError(name)
+        return symbol
+
+    def __contains__(self, name):
+        symbol = self.reads[name] = self.symbols.get(name, MISSING)
+        return symbol is not MISSING
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+    def __len__(self):
+        return len(self.symbols)
+
+class Chunk:
+    # One top-level statement: its source text (with the blanks before it),
+    # its parse and its analysis. reads is None until it has been analyzed.
+    __slots__ = ('start', 'text', 'node', 'error', 'definitions', 'reads', 'scopes', 'problem')
+
+    def __init__(self, start, text):
+        self.start = start
+        self.text = text
+        self.node = None
+        self.error = None
+        self.definitions = {}
+        self.reads = None
+        self.scopes = {}
+        self.problem = None
+
+    @property
+    def end(self):
+        return self.start + len(self.text)
+
+class IncrementalAnalyzer:
+    # Runs Lexer -> Parser -> SemanticAnalyzer one top-level statement at a
+    # time and keeps the results between calls to update(). After an edit only
+    # the statements around the changed text are re-split and re-lexed, only
+    # statements whose text is new are parsed, and only those, plus statements
+    # that read a global whose binding changed, are analyzed again.
+    def __init__(self):
+        self.source = ''
+        self.chunks = []
+        self.symbols = {}
+        self.diagnostics = []
+        self.reparsed = 0
+        self.rechecked = 0
+
+    def update(self, source):
+        # Returns the diagnostics for source as a list of (line, message)
+        old = self.chunks
+        delta = len(source) - len(self.source)
+
+        # Statements matching at the front are kept. The last of them is split
+        # again, since text added after a block may be an 'else' continuing it.
+        first = 0
+        while first < len(old) and source.startswith(old[first].text, old[first].start):
+            first += 1
+        first = max(first - 1, 0)
+        position = old[first].start if old else 0
+
+        # Statements matching at the back, shifted by the change in length,
+        # can be reused once splitting reaches one of their starts
+        last = len(old)
+        if old and source.endswith(self.source[old[-1].end:]):
+            while (last > first and old[last - 1].start + delta >= position
+                   and source.startswith(old[last - 1].text, old[last - 1].start + delta)):
+                last -= 1
+
+        known = {chunk.text: chunk for chunk in old[first:last]}
+        chunks = old[:first]
+        resumed = len(old)
+        self.reparsed = 0
+        for end in statement_ends(source, position):
+            chunks.append(self.chunk(source, position, end, known))
+            position = end
+            if last < len(old) and end - delta >= old[last].start:
+                index = bisect_left(old, end - delta, last, key=attrgetter('start'))
+                if index < len(old) and old[index].start == end - delta:
+                    resumed = index
+                    break
+        split = len(chunks)
+        for chunk in old[resumed:]:
+            chunk.start += delta
+            chunks.append(chunk)
+
+        # Names defined by statements that were removed or split again may be
+        # bound differently from here on
+        changed = set()
+        for chunk in old[first:resumed]:
+            changed.update(chunk.definitions)
+        self.source = source
+        self.chunks = chunks
+        return self.check(changed, first, split)
+
+    def chunk(self, source, start, end, known):
+        text = source[start:end]
+        chunk = Chunk(start, text)
+        reused = known.get(text)
+        if reused is not None:
+            # Same text as a statement that was split again or moved, so its
+            # parse and analysis carry over
+            for field in Chunk.__slots__[2:]:
+                setattr(chunk, field, getattr(reused, field))
+            return chunk
+        self.reparsed += 1
+        try:
+            chunk.node = Parser(Lexer(text)).parse().statements[0]
+        except Exception as error:
+            chunk.error = chunk.problem = str(error)
+        return chunk
+
+    def check(self, changed=None, first=0, split=None):
+        # Statements in chunks[first:split] were split again and are always
+        # verified. The others are only verified if they read a name in
+        # changed, which collects every name whose binding may differ from the
+        # last check at the current position.
+        changed = set() if changed is None else changed
+        split = len(self.chunks) if split is None else split
+        symbols = {}
+        diagnostics = []
+        self.rechecked = 0
+        for index, chunk in enumerate(self.chunks):
+            touched = first <= index < split
+            if chunk.error is None and (chunk.reads is None or (touched or not changed.isdisjoint(chunk.reads))
+                                        and any(symbols.get(name, MISSING) != symbol
+                                                for name, symbol in chunk.reads.items())):
+                changed.update(chunk.definitions)
+                self.analyze(chunk, symbols)
+                changed.update(chunk.definitions)
+            elif touched:
+                changed.update(chunk.definitions)
+            symbols.update(chunk.definitions)
+            if chunk.problem is not None:
+                offset = chunk.end - len(chunk.text.lstrip())
+                diagnostics.append((self.source.count('\n', 0, offset) + 1, chunk.problem))
+        self.symbols = symbols
+        self.diagnostics = diagnostics
+        return diagnostics
+
+    def analyze(self, chunk, symbols):
+        # The statement defines into its own dict, while lookups fall through
+        # to the globals defined before it and are recorded
+        scope = RecordingScope(symbols)
+        table = SymbolTable()
+        table.symbols = ChainMap({}, scope)
+        analyzer = SemanticAnalyzer()
+        analyzer.symbol_table = table
+        self.rechecked += 1
+        try:
+            analyzer.visit(chunk.node)
+            chunk.problem = None
+        except Exception as error:
+            chunk.problem = str(error)
+        chunk.definitions = table.symbols.maps[0]
+        chunk.reads = scope.reads
+        chunk.scopes = analyzer.scopes
+
+    def statements(self):
+        return [chunk.node for chunk in self.chunks if chunk.node is not None]
+
+# Example usage
+if __name__ == "__main__":
+    code = """
+    var x: Int = 10;
+    func add(a: Int, b: Int) -> Int {
+        var total: Int = a + b;
+    }
+    var y: Int = x + 1;
+    """
+    analyzer = IncrementalAnalyzer()
+    print(analyzer.update(code))
+    print(analyzer.update(code.replace('var x: Int = 10;', 'var z: Int = 10;')))
+    print(f'reparsed {analyzer.reparsed}, rechecked {analyzer.rechecked}')
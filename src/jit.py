@@ -0,0 +1,306 @@
+from src.opcodes import (
+    PUSH, LOAD_GLOBAL, STORE_GLOBAL, LOAD_FAST, STORE_FAST, BIN_OP, BIN_OP_CONST,
+    UPDATE_GLOBAL, UPDATE_FAST, POP, JUMP, JUMP_IF_FALSE, LOOP, ENTER_LOOP,
+    BINARY_OPERATORS, SPECIALIZED_SYMBOLS,
+)
+
+# Backward jumps a loop takes in the interpreter before it is compiled
+JIT_THRESHOLD = 1000
+
+# Entries that fail the type guard before a compiled loop is given up on
+MAX_DEOPTS = 16
+
+# The type assumption compiled code makes: every variable a loop reads holds a
+# number. Arithmetic and comparisons on numbers have no side effects and can
+# only fail by raising ArithmeticError, which deoptimizes, so the variables
+# can live in Python locals and be written back only when the loop leaves.
+NUMBER_TYPES = frozenset((int, float, bool))
+CONSTANT_TYPES = (int, float, bool)
+
+SYMBOLS = {function: symbol for symbol, function in BINARY_OPERATORS.items()}
+ARITHMETIC = {'+', '-', '*', '/'}
+
+# Stack and variable effects of the instructions compiled code supports
+STACK_EFFECTS = {
+    PUSH: 1, LOAD_GLOBAL: 1, LOAD_FAST: 1, STORE_GLOBAL: -1, STORE_FAST: -1,
+    BIN_OP: -1, BIN_OP_CONST: 0, UPDATE_GLOBAL: 0, UPDATE_FAST: 0,
+    POP: -1, JUMP: 0, JUMP_IF_FALSE: -1,
+}
+STACK_INPUTS = {STORE_GLOBAL: 1, STORE_FAST: 1, BIN_OP: 2, BIN_OP_CONST: 1, POP: 1, JUMP_IF_FALSE: 1}
+
+
+class Unsupported(Exception):
+    # The loop uses something compiled code cannot do, such as a call
+    pass
+
+
+class CompiledLoop:
+    # A loop from header to end (its backward jump) translated into a Python
+    # function of (stack, globals, locals). The function returns the index
+    # where the interpreter continues: where the loop exits, or the
+    # instruction that failed, with the operand stack rebuilt as it was
+    # before it. ~index means it stopped at a backward jump to index because
+    # its time slice ran out, and None that the type guard failed on entry.
+    # original is the instruction the loop's entry replaced.
+    __slots__ = ('header', 'end', 'function', 'original', 'source', 'deopts')
+
+    def __init__(self, header, end, function, original, source):
+        self.header = header
+        self.end = end
+        self.function = function
+        self.original = original
+        self.source = source
+        self.deopts = 0
+
+    def __repr__(self):
+        return f'<compiled loop {self.header}-{self.end}>'
+
+
+def compile_loop(code, header, end, time_slice):
+    # Returns a CompiledLoop, or None if the loop cannot be compiled
+    try:
+        translator = LoopTranslator(code, header, end, time_slice)
+        source = translator.translate()
+    except Unsupported:
+        return None
+    namespace = dict(translator.constants, NUMBERS=NUMBER_TYPES)
+    exec(compile(source, f'<loop {header}-{end}>', 'exec'), namespace)
+    original = code[header]
+    if original[0] == ENTER_LOOP:
+        original = original[1].original
+    return CompiledLoop(header, end, namespace['loop'], original, source)
+
+
+class LoopTranslator:
+    # Turns the instructions from header to end into Python source. Operand
+    # stack entries become Python locals s0, s1, ... by depth, and the
+    # variables the loop uses become locals g<slot> and f<slot>. Values that
+    # are only loaded, or compared, are kept as expressions and used in place
+    # until a store or a jump needs them in their stack local. Each entry is
+    # (expression, names it reads).
+    #
+    # Loops whose only jumps inside go back to the header are emitted as one
+    # straight 'while True' body. Otherwise every jump target starts an
+    # 'if pc == target' section and jumps set pc and continue.
+    def __init__(self, code, header, end, time_slice):
+        self.code = code
+        self.header = header
+        self.end = end
+        self.budget = max(1, time_slice // (end - header + 1))
+        self.constants = {}
+        self.lines = []
+        self.stack = []
+        self.loaded = set()
+        self.stored = set()
+
+    def instruction(self, index):
+        # Back-edges and entries of other loops inside this one are read as
+        # the instructions they stand for, and so are Int operators. A
+        # compare-and-branch is read as its comparison, which the
+        # JUMP_IF_FALSE it was fused with still follows.
+        opcode, operand = self.code[index]
+        if opcode == ENTER_LOOP:
+            opcode, operand = operand.original
+        if opcode == LOOP:
+            opcode, operand = JUMP, operand[0]
+        if opcode in SPECIALIZED_SYMBOLS:
+            opcode, operand = BIN_OP, BINARY_OPERATORS[SPECIALIZED_SYMBOLS[opcode]]
+        if opcode not in STACK_EFFECTS:
+            raise Unsupported(index)
+        return opcode, operand
+
+    def inside(self, target):
+        return self.header <= target <= self.end
+
+    def depths(self):
+        # Operand stack depth, relative to the loop entry, before each
+        # reachable instruction; it must agree wherever paths meet
+        depths = {self.header: 0}
+        pending = [self.header]
+        while pending:
+            index = pending.pop()
+            opcode, operand = self.instruction(index)
+            if depths[index] < STACK_INPUTS.get(opcode, 0):
+                # Would use values from below the loop's entry
+                raise Unsupported(index)
+            depth = depths[index] + STACK_EFFECTS[opcode]
+            successors = []
+            if opcode != JUMP:
+                successors.append(index + 1)
+            if opcode == JUMP or opcode == JUMP_IF_FALSE:
+                successors.append(operand)
+            for successor in successors:
+                if not self.inside(successor):
+                    continue
+                if successor not in depths:
+                    depths[successor] = depth
+                    pending.append(successor)
+                elif depths[successor] != depth:
+                    raise Unsupported(successor)
+        return depths
+
+    def translate(self):
+        depths = self.depths()
+        targets = {self.header}
+        for index in depths:
+            opcode, operand = self.instruction(index)
+            if (opcode == JUMP or opcode == JUMP_IF_FALSE) and self.inside(operand):
+                targets.add(operand)
+            if opcode == PUSH and type(operand) not in CONSTANT_TYPES:
+                raise Unsupported(index)
+            if opcode == BIN_OP_CONST or opcode == UPDATE_GLOBAL or opcode == UPDATE_FAST:
+                if type(operand[-1]) not in CONSTANT_TYPES:
+                    raise Unsupported(index)
+            # Every exit writes back all the variables the loop may change
+            if opcode == LOAD_GLOBAL or opcode == LOAD_FAST:
+                self.loaded.add(self.variable(opcode, operand))
+            elif opcode == STORE_GLOBAL or opcode == STORE_FAST:
+                self.stored.add(self.variable(opcode, operand))
+            elif opcode == UPDATE_GLOBAL or opcode == UPDATE_FAST:
+                self.loaded.add(self.variable(opcode, operand[0]))
+                self.stored.add(self.variable(opcode, operand[0]))
+        self.dispatch = targets != {self.header}
+        body = 3 if self.dispatch else 2
+        for index in sorted(depths):
+            if index in targets and self.dispatch:
+                if index != self.header and self.falls_through(index - 1, depths):
+                    self.canonicalize(body)
+                    self.emit(body, f'pc = {index}')
+                self.emit(2, f'if pc == {index}:')
+            if index in targets:
+                self.stack = [(f's{depth}', (f's{depth}',)) for depth in range(depths[index])]
+            self.translate_instruction(index, body)
+
+        variables = sorted(self.loaded | self.stored)
+        preamble = ['def loop(stack, g, f):']
+        preamble += [f'    {name} = {name[0]}[{name[1:]}]' for name in variables]
+        if self.loaded:
+            guard = ' or '.join(f'type({name}) not in NUMBERS' for name in sorted(self.loaded))
+            preamble.append(f'    if {guard}:')
+            preamble.append('        return None')
+        preamble.append(f'    budget = {self.budget}')
+        if self.dispatch:
+            preamble.append(f'    pc = {self.header}')
+        preamble.append('    while True:')
+        return '\n'.join(preamble + self.lines) + '\n'
+
+    def falls_through(self, index, depths):
+        if index not in depths:
+            return False
+        return self.instruction(index)[0] != JUMP
+
+    def emit(self, indent, line):
+        self.lines.append('    ' * indent + line)
+
+    def variable(self, opcode, slot):
+        return ('g' if opcode in (LOAD_GLOBAL, STORE_GLOBAL, UPDATE_GLOBAL) else 'f') + str(slot)
+
+    def constant(self, value):
+        if type(value) is float:
+            name = f'c{len(self.constants)}'
+            self.constants[name] = value
+            return name
+        return f'({value!r})'
+
+    def translate_instruction(self, index, indent):
+        opcode, operand = self.instruction(index)
+        stack = self.stack
+        if opcode == PUSH:
+            stack.append((self.constant(operand), ()))
+        elif opcode == LOAD_GLOBAL or opcode == LOAD_FAST:
+            name = self.variable(opcode, operand)
+            stack.append((name, (name,)))
+        elif opcode == STORE_GLOBAL or opcode == STORE_FAST:
+            name = self.variable(opcode, operand)
+            value = stack.pop()
+            self.store(name, value[0], indent)
+        elif opcode == POP:
+            stack.pop()
+        elif opcode == BIN_OP:
+            right = stack[-1]
+            left = stack[-2]
+            self.operation(index, indent, SYMBOLS[operand], left, right, 2)
+        elif opcode == BIN_OP_CONST:
+            function, value = operand
+            self.operation(index, indent, SYMBOLS[function], stack[-1], (self.constant(value), ()), 1)
+        elif opcode == UPDATE_GLOBAL or opcode == UPDATE_FAST:
+            slot, function, value = operand
+            name = self.variable(opcode, slot)
+            symbol = SYMBOLS[function]
+            expression = f'{name} {symbol} {self.constant(value)}'
+            if symbol in ARITHMETIC:
+                self.spill(name, indent)
+                self.guarded(index, indent, f'{name} = {expression}')
+            else:
+                self.store(name, f'({expression})', indent)
+        elif opcode == JUMP_IF_FALSE:
+            condition = stack.pop()[0]
+            self.emit(indent, f'if not {condition}:')
+            self.jump(index, operand, indent + 1)
+        elif opcode == JUMP:
+            self.jump(index, operand, indent)
+
+    def operation(self, index, indent, symbol, left, right, operands):
+        # Comparisons stay expressions; arithmetic is computed into the stack
+        # local of its result, deoptimizing to this instruction if it fails
+        del self.stack[-operands:]
+        expression = f'{left[0]} {symbol} {right[0]}'
+        if symbol not in ARITHMETIC:
+            self.stack.append((f'({expression})', left[1] + right[1]))
+            return
+        target = f's{len(self.stack)}'
+        self.spill(target, indent)
+        self.stack.extend((left, right)[:operands])
+        self.guarded(index, indent, f'{target} = {expression}')
+        del self.stack[-operands:]
+        self.stack.append((target, (target,)))
+
+    def guarded(self, index, indent, statement):
+        self.emit(indent, 'try:')
+        self.emit(indent + 1, statement)
+        self.emit(indent, 'except ArithmeticError:')
+        self.leave(index, indent + 1)
+
+    def store(self, name, expression, indent):
+        self.spill(name, indent)
+        self.emit(indent, f'{name} = {expression}')
+
+    def spill(self, name, indent):
+        # Stack entries still reading name must be computed before it changes
+        if any(name in reads for _, reads in self.stack):
+            self.canonicalize(indent)
+
+    def canonicalize(self, indent):
+        # Puts every entry in its own stack local. Bottom up, since an entry
+        # only reads the stack locals at or above its own depth.
+        for depth, (expression, reads) in enumerate(self.stack):
+            local = f's{depth}'
+            if expression != local:
+                self.emit(indent, f'{local} = {expression}')
+                self.stack[depth] = (local, (local,))
+
+    def leave(self, target, indent, result=None):
+        # Writes the variables back, rebuilds the operand stack and returns
+        for name in sorted(self.stored):
+            self.emit(indent, f'{name[0]}[{name[1:]}] = {name}')
+        if len(self.stack) == 1:
+            self.emit(indent, f'stack.append({self.stack[0][0]})')
+        elif self.stack:
+            self.emit(indent, f'stack.extend(({", ".join(entry[0] for entry in self.stack)}))')
+        self.emit(indent, f'return {target if result is None else result}')
+
+    def jump(self, index, target, indent):
+        if not self.inside(target):
+            self.leave(target, indent)
+            return
+        saved = list(self.stack)
+        self.canonicalize(indent)
+        if target <= index:
+            self.emit(indent, 'budget -= 1')
+            self.emit(indent, 'if not budget:')
+            self.leave(target, indent + 1, f'~{target}')
+        if self.dispatch:
+            self.emit(indent, f'pc = {target}')
+        self.emit(indent, 'continue')
+        # A conditional jump falls through with the entries it had
+        self.stack = saved
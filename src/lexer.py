@@ -1,62 +1,182 @@
+import io
 import re
-from enum import Enum, auto
-
-class TokenType(Enum):
-    KEYWORD = auto()
-    IDENTIFIER = auto()
-    SYMBOL = auto()
-    INTEGER = auto()
-    NEWLINE = auto()
-    EOF = auto()
-
-KEYWORDS = {'var', 'func', 'if', 'else', 'for', 'while', 'return'}
-SYMBOLS = {'(', ')', '{', '}', ',', ';', '+', '-', '*', '/', '=', '==', '!=', '<', '>', '<=', '>=', ':', '->'}
-
-token_specification = [
-    ('INTEGER',   r'\d+'),
-    ('IDENTIFIER', r'[A-Za-z_]\w*'),
-    ('SYMBOL',    r'==|!=|<=|>=|->|[:+\-*/=(){};,<>]'),
-    ('NEWLINE',   r'\n'),
-    ('SKIP',      r'[ \t]+'),
-    ('MISMATCH',  r'.'),
-]
-
-tok_regex = '|'.join('(?P<%s>%s)' % pair for pair in token_specification)
+import sys
+from enum import IntEnum
+from itertools import accumulate, chain, islice, repeat
+from operator import add, itemgetter
+
+class TokenType(IntEnum):
+    KEYWORD = 1
+    IDENTIFIER = 2
+    SYMBOL = 3
+    INTEGER = 4
+    NEWLINE = 5
+    EOF = 6
+
+KEYWORDS = {'var', 'func', 'if', 'else', 'for', 'while', 'return', 'go', 'parallel', 'in', 'reduce'}
+SYMBOLS = {'(', ')', '{', '}', ',', ';', '+', '-', '*', '/', '=', '==', '!=', '<', '>', '<=', '>=', ':', '->', '..'}
+# Matches the character an identifier starts with
+IDENTIFIER_START = re.compile(r'[A-Za-z_]')
+
+# Splits source into lexemes: identifiers/keywords, integers, the two-character
+# symbols, then any other single non-blank character. Blanks end up between the
+# captured lexemes. Which lexemes are valid is decided by scan().
+MASTER_PATTERN = re.compile(r'([A-Za-z_]\w*|\d+|[=!<>]=?|->|\.\.|[^ \t])')
+
+# The same, with the blanks before each lexeme taken into the match, so that
+# findall() does not try every alternative again at each blank
+LEXEME_PATTERN = re.compile(r'[ \t]*' + MASTER_PATTERN.pattern)
+
+# Characters read per chunk when streaming from a file or buffer
+CHUNK_SIZE = 64 * 1024
+
+class Token(tuple):
+    # An immutable (kind, value, offset) record; offset is the character
+    # position in the source where the token starts.
+    __slots__ = ()
+
+    kind = property(itemgetter(0))
+    value = property(itemgetter(1))
+    offset = property(itemgetter(2))
+
+    def __new__(cls, kind, value, offset=None):
+        return tuple.__new__(cls, (kind, value, offset))
+
+    def __repr__(self):
+        return f'Token({self[0].name}, {self[1]!r}, {self[2]})'
+
+# Returned by next_token() once the stream is exhausted
+END_OF_INPUT = Token(TokenType.EOF, None)
+
+# The (kind, value) pair pairs() ends with
+END_PAIR = (TokenType.EOF, None)
+
+def scan(code, base=0):
+    # Finds the lexemes of code and classifies the distinct ones in bulk, set
+    # by set. Returns (lexemes, table) where table maps a lexeme to its
+    # (kind, value). No Python code runs per token or per lexeme here.
+    lexemes = LEXEME_PATTERN.findall(code)
+    rest = set(lexemes)
+    keywords = rest & KEYWORDS
+    symbols = rest & SYMBOLS
+    rest -= keywords | symbols
+    identifiers = set(filter(IDENTIFIER_START.match, rest))
+    rest -= identifiers
+    integers = set(filter(str.isdecimal, rest))
+    rest -= integers
+    rest.discard('\n')
+    if rest:
+        match = next(match for match in MASTER_PATTERN.finditer(code) if match.group() in rest)
+        raise RuntimeError(f'Unexpected token: {match.group()} at offset {base + match.start()}')
+    table = {'\n': (TokenType.NEWLINE, '\n')}
+    table.update(zip(keywords, zip(repeat(TokenType.KEYWORD), map(sys.intern, keywords))))
+    table.update(zip(identifiers, zip(repeat(TokenType.IDENTIFIER), map(sys.intern, identifiers))))
+    table.update(zip(symbols, zip(repeat(TokenType.SYMBOL), symbols)))
+    table.update(zip(integers, zip(repeat(TokenType.INTEGER), map(int, integers))))
+    return lexemes, table
+
+def iter_pairs(lexemes, table):
+    # The (kind, value) pair of each lexeme: the table's own tuples, so
+    # nothing is built per token
+    return map(table.__getitem__, lexemes)
+
+def iter_tokens(code, lexemes, table, base=0):
+    # Token records for the lexemes of code, built in bulk. Offsets come from
+    # the blanks MASTER_PATTERN.split leaves between the lexemes, which takes
+    # a second pass over code; only records need it.
+    parts = MASTER_PATTERN.split(code)
+    offsets = islice(accumulate(map(len, parts), initial=base), 1, None, 2)
+    return map(tuple.__new__, repeat(Token), map(add, iter_pairs(lexemes, table), zip(offsets)))
 
 class Lexer:
-    def __init__(self, code):
-        self.tokens = []
-        self.current = 0
-        self.tokenize(code)
+    # By default the whole source is scanned up front, which also reports any
+    # invalid character straight away. With streaming=True, code may also be
+    # a file object, an mmap or bytes, and it is read and scanned one chunk
+    # of lines at a time.
+    #
+    # Tokens are handed out once, in one of two forms: Token records, with
+    # offsets, from next_token(), or the (kind, value) pairs the parser reads
+    # from pairs(), which cost nothing per token to make. Unless streaming,
+    # tokens lists every record whichever form was handed out.
+    def __init__(self, code, streaming=False, chunk_size=CHUNK_SIZE):
+        self.code = None
+        self.lexemes = []
+        self.table = {}
+        self.streaming = streaming
+        self._tokens = None
+        self.stream = None
+        if streaming:
+            self.chunks = self.read_chunks(code, chunk_size)
+        else:
+            self.tokenize(code)
 
     def tokenize(self, code):
-        for mo in re.finditer(tok_regex, code):
-            kind = mo.lastgroup
-            value = mo.group()
-            if kind == 'INTEGER':
-                self.tokens.append((TokenType.INTEGER, int(value)))
-            elif kind == 'IDENTIFIER':
-                if value in KEYWORDS:
-                    self.tokens.append((TokenType.KEYWORD, value))
-                else:
-                    self.tokens.append((TokenType.IDENTIFIER, value))
-            elif kind == 'SYMBOL':
-                self.tokens.append((TokenType.SYMBOL, value))
-            elif kind == 'NEWLINE':
-                self.tokens.append((TokenType.NEWLINE, value))
-            elif kind == 'SKIP':
-                continue
-            elif kind == 'MISMATCH':
-                raise RuntimeError(f'Unexpected token: {value}')
-        self.tokens.append((TokenType.EOF, None))
+        self.code = code
+        self.lexemes, self.table = scan(code)
+        self._tokens = None
+        self.stream = None
+        self.chunks = iter([(code, 0, self.lexemes, self.table)])
+
+    def read_chunks(self, source, chunk_size=CHUNK_SIZE):
+        # (text, offset of text, lexemes, table) per chunk of the source
+        base = 0
+        for text in read_lines(source, chunk_size):
+            yield (text, base, *scan(text, base))
+            base += len(text)
+
+    def records(self):
+        # Token records per chunk, then the EOF record at the end of the source
+        end = 0
+        for text, base, lexemes, table in self.chunks:
+            yield iter_tokens(text, lexemes, table, base)
+            end = base + len(text)
+        yield (Token(TokenType.EOF, None, end),)
+
+    @property
+    def tokens(self):
+        # Streaming lexers keep no tokens around, so this is empty for them
+        if self._tokens is None:
+            if self.streaming:
+                self._tokens = []
+            else:
+                self._tokens = list(iter_tokens(self.code, self.lexemes, self.table))
+                self._tokens.append(Token(TokenType.EOF, None, len(self.code)))
+        return self._tokens
 
     def next_token(self):
-        if self.current < len(self.tokens):
-            token = self.tokens[self.current]
-            self.current += 1
-            return token
-        else:
-            return (TokenType.EOF, None)
+        if self.stream is None:
+            self.stream = chain.from_iterable(self.records())
+        return next(self.stream, END_OF_INPUT)
+
+    def pairs(self):
+        # An iterator of the remaining tokens as (kind, value) pairs, ending
+        # with END_PAIR
+        return chain(chain.from_iterable(iter_pairs(lexemes, table) for _, _, lexemes, table in self.chunks),
+                     (END_PAIR,))
+
+def read_lines(source, chunk_size=CHUNK_SIZE):
+    # Yields the source as text made of whole lines, at most about chunk_size
+    # characters at a time (longer only for a single longer line). No token
+    # spans a newline, and a newline byte never occurs inside a multi-byte
+    # UTF-8 sequence, so every piece can be scanned and decoded on its own.
+    if isinstance(source, str):
+        yield source
+        return
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        source = io.BytesIO(source)
+    pending = None
+    while True:
+        chunk = source.read(chunk_size)
+        if not chunk:
+            break
+        pending = chunk if pending is None else pending + chunk
+        newline = '\n' if isinstance(pending, str) else b'\n'
+        cut = pending.rfind(newline) + 1
+        if cut:
+            text, pending = pending[:cut], pending[cut:]
+            yield text if isinstance(text, str) else text.decode('utf-8')
+    if pending:
+        yield pending if isinstance(pending, str) else pending.decode('utf-8')
 
 # Debugging: Print the tokens
 if __name__ == "__main__":
@@ -0,0 +1,554 @@
+import os
+import shlex
+import shutil
+import subprocess
+import tempfile
+from contextlib import contextmanager
+
+from src.ast_nodes import (
+    ClassDeclaration, VariableDeclaration, FunctionDeclaration,
+    IfStatement, WhileStatement, ReturnStatement, GoStatement, ParallelFor,
+    Assignment, BinaryOperation, Call, Identifier, Integer,
+)
+from src.ast_optimizer import postorder
+from src.lexer import Lexer
+from src.parser import Parser
+from src.runtime import MAX_CALL_DEPTH
+from src.semantic_analyzer import SemanticAnalyzer, FunctionType
+
+# Exit status of a native program that met something it cannot finish the
+# way the VM would: an Int outgrowing 64 bits, a variable read before it is
+# set, a function returning nothing, or calls nested too deep. A program
+# has no effect but the globals it ends with, so it is then run again on
+# the VM, which gives the result or raises the error it would have.
+FALLBACK_STATUS = 3
+
+# Compilers tried in order when $CC is not set
+COMPILERS = ('cc', 'gcc', 'clang')
+COMPILE_FLAGS = ('-O2', '-pthread')
+
+# Stack of the thread a program runs on: room for MAX_CALL_DEPTH frames.
+# It is reserved, not touched, until calls nest that deep.
+STACK_SIZE = 1 << 30
+
+INT64_MAX = (1 << 63) - 1
+
+# Arithmetic goes through the overflow-checked helpers of PRELUDE;
+# comparisons are C's own
+ARITHMETIC = {'+': 'fusion_add', '-': 'fusion_sub', '*': 'fusion_mul'}
+
+# Statements of what the backend leaves to the VM
+UNSUPPORTED = {
+    ClassDeclaration: 'classes',
+    GoStatement: 'goroutines',
+    ParallelFor: 'parallel for loops',
+}
+
+PRELUDE = """\
+#include <pthread.h>
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+
+#define FALLBACK_STATUS %d
+#define MAX_CALL_DEPTH %d
+#define STACK_SIZE ((size_t) %d)
+
+static long depth;
+
+static void fallback(void) __attribute__((noreturn, cold));
+static void fallback(void) { exit(FALLBACK_STATUS); }
+
+static inline int64_t fusion_add(int64_t a, int64_t b) {
+    int64_t result;
+    if (__builtin_add_overflow(a, b, &result)) fallback();
+    return result;
+}
+
+static inline int64_t fusion_sub(int64_t a, int64_t b) {
+    int64_t result;
+    if (__builtin_sub_overflow(a, b, &result)) fallback();
+    return result;
+}
+
+static inline int64_t fusion_mul(int64_t a, int64_t b) {
+    int64_t result;
+    if (__builtin_mul_overflow(a, b, &result)) fallback();
+    return result;
+}
+""" % (FALLBACK_STATUS, MAX_CALL_DEPTH, STACK_SIZE)
+
+# The program runs on a thread with a stack deep enough for MAX_CALL_DEPTH
+# calls; given --globals, the executable prints the globals it ended with,
+# one "name value" line each, for the host to read
+MAIN = """
+int main(int argc, char **argv) {
+    pthread_attr_t attributes;
+    pthread_t thread;
+    pthread_attr_init(&attributes);
+    if (pthread_attr_setstacksize(&attributes, STACK_SIZE) != 0
+            || pthread_create(&thread, &attributes, run, NULL) != 0)
+        run(NULL);
+    else
+        pthread_join(thread, NULL);
+    if (argc > 1 && strcmp(argv[1], "--globals") == 0) {
+%s
+    }
+    return 0;
+}
+"""
+
+
+class NativeUnsupported(Exception):
+    # The program uses something the C backend does not compile; it runs on
+    # the VM instead
+    pass
+
+
+def unsupported(what):
+    return NativeUnsupported(f'{what} cannot be compiled to C')
+
+
+def may_be_unset(statements):
+    # Names declared inside a branch or loop of statements, which code after
+    # it may read without the declaration having run
+    names = set()
+    pending = []
+    for statement in statements:
+        if type(statement) is IfStatement:
+            pending.extend(statement.then_block)
+            pending.extend(statement.else_block or [])
+        elif type(statement) is WhileStatement:
+            pending.extend(statement.body)
+    while pending:
+        statement = pending.pop()
+        statement_type = type(statement)
+        if statement_type is VariableDeclaration:
+            names.add(statement.identifier)
+        elif statement_type is IfStatement:
+            pending.extend(statement.then_block)
+            pending.extend(statement.else_block or [])
+        elif statement_type is WhileStatement:
+            pending.extend(statement.body)
+    return names
+
+
+def always_returns(statements):
+    # Whether running statements always ends in a return
+    if not statements:
+        return False
+    last = statements[-1]
+    if type(last) is ReturnStatement:
+        return True
+    if type(last) is IfStatement and last.else_block:
+        return always_returns(last.then_block) and always_returns(last.else_block)
+    return False
+
+
+class NativeGenerator:
+    # Lowers an analyzed tree to a C program. Ints are int64_t, with every
+    # +, - and * checked for overflow; globals are static variables,
+    # functions are C functions, and a function's parameters and locals are
+    # its C locals. Operands are evaluated into temporaries one at a time,
+    # so calls happen left to right as they do on the VM.
+    #
+    # Only Int variables, arithmetic and comparisons, if, while, and calls
+    # to top-level functions are compiled; anything else raises
+    # NativeUnsupported. What can only turn out differently at run time
+    # makes the program exit with FALLBACK_STATUS.
+    def __init__(self, symbol_table, scopes, types):
+        self.symbol_table = symbol_table
+        self.scopes = scopes
+        self.types = types
+        # Top-level functions by name
+        self.functions = {}
+        # The function being generated, None for the main program, its scope,
+        # and the names in it that may be read before they are set
+        self.function = None
+        self.scope = symbol_table
+        self.unset = set()
+        self.global_unset = set()
+        # Wrappers that fill in default arguments, as (function, argument
+        # count), and whether the function calls itself in tail position
+        self.wrappers = set()
+        self.tail_calls = False
+        self.temporaries = 0
+        self.lines = []
+        self.indent = 1
+
+    def generate(self, program):
+        # Returns the C source of program
+        for statement in program.statements:
+            if type(statement) is FunctionDeclaration:
+                self.functions[statement.identifier] = statement
+        variables = [name for name, symbol in self.symbol_table.symbols.items() if type(symbol) is not FunctionType]
+        for name in variables:
+            self.check_variable(self.symbol_table.symbols[name])
+        self.global_unset = self.unset = may_be_unset(program.statements)
+
+        run = self.body(program.statements)
+        definitions = [self.definition(node) for node in self.functions.values()]
+        # Default arguments may call for more wrappers
+        done = set()
+        while self.wrappers - done:
+            wrapper = min(self.wrappers - done)
+            done.add(wrapper)
+            definitions.append(self.wrapper(*wrapper))
+
+        parts = [PRELUDE]
+        for name in variables:
+            parts.append(f'static int64_t g_{name};')
+            if name in self.global_unset:
+                parts.append(f'static unsigned char set_g_{name};')
+        parts.append('')
+        for node in self.functions.values():
+            parts.append(self.signature(node.identifier, len(node.parameters)) + ';')
+        for name, count in sorted(self.wrappers):
+            parts.append(self.signature(name, count) + ';')
+        parts.extend(definitions)
+        parts.append('\nstatic void *run(void *unused) {')
+        parts.extend(run)
+        parts.append('    return NULL;\n}')
+        printed = []
+        for name in variables:
+            if name in self.global_unset:
+                printed.append(f'        if (set_g_{name})')
+                printed.append(f'            printf("{name} %lld\\n", (long long) g_{name});')
+            else:
+                printed.append(f'        printf("{name} %lld\\n", (long long) g_{name});')
+        parts.append(MAIN % '\n'.join(printed))
+        return '\n'.join(parts)
+
+    def check_variable(self, symbol):
+        if type(symbol) is FunctionType:
+            raise unsupported('functions used as values')
+        if symbol != 'Int':
+            raise unsupported(f'{symbol or "untyped"} values')
+
+    # Functions
+
+    def signature(self, name, count):
+        # The full function is f_<name>; the wrapper taking count arguments
+        # of one with defaults is f<count>_<name>
+        node = self.functions[name]
+        c_name = f'f_{name}' if count == len(node.parameters) else f'f{count}_{name}'
+        parameters = ', '.join(f'int64_t v_{param[0]}' for param in node.parameters[:count])
+        return f'static int64_t {c_name}({parameters or "void"})'
+
+    @contextmanager
+    def inside(self, node):
+        saved = self.function, self.scope, self.unset, self.tail_calls
+        self.function, self.scope = node, self.scopes[node]
+        self.unset, self.tail_calls = may_be_unset(node.body), False
+        try:
+            yield
+        finally:
+            self.function, self.scope, self.unset, self.tail_calls = saved
+
+    def definition(self, node):
+        if node.return_type != 'Int':
+            raise unsupported(f'functions returning {node.return_type}')
+        scope = self.scopes[node]
+        for symbol in scope.symbols.values():
+            if type(symbol) is FunctionType:
+                raise unsupported('functions declared inside other code')
+            self.check_variable(symbol)
+        with self.inside(node):
+            body = self.body(node.body)
+            if not always_returns(node.body):
+                # Falling off the end returns nothing, which no Int holds
+                body.append('    fallback();')
+            lines = ['', self.signature(node.identifier, len(node.parameters)) + ' {']
+            parameters = {param[0] for param in node.parameters}
+            for name in scope.symbols:
+                if name not in parameters:
+                    lines.append(f'    int64_t v_{name} = 0;')
+            for name in sorted(self.unset):
+                lines.append(f'    unsigned char set_v_{name} = 0;')
+            if self.tail_calls:
+                lines.append('entry:;')
+        lines.extend(body)
+        lines.append('}')
+        return '\n'.join(lines)
+
+    def wrapper(self, name, count):
+        # Evaluates the defaults of the parameters not given, in the
+        # function's scope as the VM does, and calls the full function
+        node = self.functions[name]
+        missing = node.parameters[count:]
+        with self.inside(node):
+            self.unset = set()
+            body = self.body([Assignment(param[0], param[2]) for param in missing])
+        lines = ['', self.signature(name, count) + ' {']
+        lines.extend(f'    int64_t v_{param[0]};' for param in missing)
+        lines.extend(body)
+        arguments = ', '.join(f'v_{param[0]}' for param in node.parameters)
+        lines.append(f'    return f_{name}({arguments});')
+        lines.append('}')
+        return '\n'.join(lines)
+
+    # Statements
+
+    def body(self, statements):
+        # The C lines of statements, one level in
+        saved = self.lines, self.indent
+        self.lines, self.indent = [], 1
+        try:
+            self.block(statements)
+            return self.lines
+        finally:
+            self.lines, self.indent = saved
+
+    def block(self, statements):
+        for statement in statements:
+            statement_type = type(statement)
+            if statement_type in UNSUPPORTED:
+                raise unsupported(UNSUPPORTED[statement_type])
+            getattr(self, 'generate_' + statement_type.__name__)(statement)
+
+    def line(self, text):
+        self.lines.append('    ' * self.indent + text)
+
+    @contextmanager
+    def scoped(self):
+        # Temporaries a statement declares go in a C block of their own
+        start, count = len(self.lines), self.temporaries
+        yield
+        if self.temporaries != count:
+            padding = '    ' * self.indent
+            self.lines[start:] = [padding + '{'] + ['    ' + line for line in self.lines[start:]] + [padding + '}']
+
+    def nested(self, statements):
+        self.indent += 1
+        self.block(statements)
+        self.indent -= 1
+
+    def generate_VariableDeclaration(self, node):
+        self.check_variable(node.var_type)
+        self.assign(node.identifier, node.value)
+
+    def generate_Assignment(self, node):
+        self.assign(node.identifier, node.value)
+
+    def assign(self, name, value):
+        target = self.variable(name)
+        with self.scoped():
+            value = self.expression(value)
+            self.line(f'{target} = {value};')
+            if self.is_unset(name):
+                self.line(f'set_{target} = 1;')
+
+    def generate_FunctionDeclaration(self, node):
+        # Top-level functions are defined ahead of the main program
+        if self.function is not None or self.functions.get(node.identifier) is not node:
+            raise unsupported('functions declared inside other code')
+
+    def generate_ExpressionStatement(self, node):
+        with self.scoped():
+            self.line(f'(void) {self.expression(node.expression)};')
+
+    def generate_IfStatement(self, node):
+        with self.scoped():
+            self.line(f'if ({self.expression(node.condition)}) {{')
+            self.nested(node.then_block)
+            if node.else_block:
+                self.line('} else {')
+                self.nested(node.else_block)
+            self.line('}')
+
+    def generate_WhileStatement(self, node):
+        self.line('for (;;) {')
+        self.indent += 1
+        with self.scoped():
+            self.line(f'if (!{self.expression(node.condition)}) break;')
+        self.block(node.body)
+        self.indent -= 1
+        self.line('}')
+
+    def generate_ReturnStatement(self, node):
+        value = node.value
+        if value is None:
+            # Returns nothing, which no Int holds
+            self.line('fallback();')
+            return
+        with self.scoped():
+            if self.is_self_call(value):
+                # A call to the function itself in tail position reuses its
+                # frame, as TAIL_CALL does on the VM, so it can recur without
+                # bound
+                arguments = [self.temporary(self.expression(argument)) for argument in value.arguments]
+                for param, argument in zip(self.function.parameters, arguments):
+                    self.line(f'v_{param[0]} = {argument};')
+                for name in sorted(self.unset):
+                    self.line(f'set_v_{name} = 0;')
+                self.line('goto entry;')
+                self.tail_calls = True
+            else:
+                self.line(f'return {self.expression(value)};')
+
+    def is_self_call(self, node):
+        return (type(node) is Call and self.function is not None
+                and node.identifier == self.function.identifier
+                and self.scope.resolve(node.identifier)[0] is self.symbol_table
+                and len(node.arguments) == len(self.function.parameters))
+
+    # Expressions
+
+    def expression(self, node):
+        # Emits the lines evaluating node and returns the C expression of its
+        # value: a constant, a local or a temporary
+        values = []
+        for item in postorder(node):
+            item_type = type(item)
+            if item_type is Integer:
+                if item > INT64_MAX:
+                    raise unsupported('integers beyond 64 bits')
+                values.append(f'INT64_C({int(item)})')
+            elif item_type is Identifier or item_type is str:
+                values.append(self.read(item if item_type is str else item.name))
+            elif item_type is BinaryOperation:
+                right = values.pop()
+                left = values.pop()
+                values.append(self.operation(item, left, right))
+            elif item_type is Call:
+                count = len(item.arguments)
+                arguments = values[len(values) - count:]
+                del values[len(values) - count:]
+                values.append(self.call(item, arguments))
+            else:
+                raise unsupported(f'{item_type.__name__} expressions')
+        return values[0]
+
+    def operation(self, node, left, right):
+        operator = node.operator
+        if self.types.get(node) != 'Int':
+            raise unsupported('division' if operator == '/' else f'"{operator}" on values other than Int')
+        if operator in ARITHMETIC:
+            return self.temporary(f'{ARITHMETIC[operator]}({left}, {right})')
+        return self.temporary(f'(int64_t) ({left} {operator} {right})')
+
+    def call(self, node, arguments):
+        name = node.identifier
+        table = self.scope.resolve(name)[0]
+        if table is None:
+            raise unsupported(f'the builtin {name}()')
+        function = self.functions.get(name)
+        if table is not self.symbol_table or function is None:
+            raise unsupported('calls through Func variables')
+        count = len(arguments)
+        required = sum(1 for param in function.parameters if param[2] is None)
+        if not required <= count <= len(function.parameters):
+            raise unsupported(f'calling {name}() with {count} arguments')
+        if count < len(function.parameters):
+            self.wrappers.add((name, count))
+            c_name = f'f{count}_{name}'
+        else:
+            c_name = f'f_{name}'
+        self.line('if (++depth > MAX_CALL_DEPTH) fallback();')
+        result = self.temporary(f'{c_name}({", ".join(arguments)})')
+        self.line('depth--;')
+        return result
+
+    def variable(self, name):
+        # The C name of the Int variable name
+        table = self.scope.resolve(name)[0]
+        if table is None:
+            raise unsupported(f'the variable {name}')
+        self.check_variable(table.symbols.get(name))
+        if table is self.symbol_table:
+            return f'g_{name}'
+        if table is self.scope:
+            return f'v_{name}'
+        raise unsupported('functions reading variables of the code around them')
+
+    def is_unset(self, name):
+        table = self.scope.resolve(name)[0]
+        return name in (self.global_unset if table is self.symbol_table else self.unset)
+
+    def read(self, name):
+        c_name = self.variable(name)
+        if self.is_unset(name):
+            self.line(f'if (!set_{c_name}) fallback();')
+        if c_name.startswith('g_'):
+            # A call later in the expression may change a global, so its
+            # value is taken now
+            return self.temporary(c_name)
+        return c_name
+
+    def temporary(self, value):
+        self.temporaries += 1
+        name = f't{self.temporaries}'
+        self.line(f'int64_t {name} = {value};')
+        return name
+
+
+def find_compiler():
+    # The C compiler command: $CC, or the first of COMPILERS on the PATH
+    if os.environ.get('CC'):
+        return shlex.split(os.environ['CC'])
+    for name in COMPILERS:
+        path = shutil.which(name)
+        if path is not None:
+            return [path]
+    raise RuntimeError('No C compiler found; set $CC')
+
+
+def translate(code):
+    # The C source of a program, given as a string or open file
+    ast = Parser(Lexer(code, streaming=True)).parse()
+    analyzer = SemanticAnalyzer()
+    analyzer.visit(ast)
+    return NativeGenerator(analyzer.symbol_table, analyzer.scopes, analyzer.types).generate(ast)
+
+
+def compile_native(code, output, compiler=None):
+    # Builds a program into the executable output with the system C
+    # compiler. Raises NativeUnsupported, before running the compiler, if
+    # the program uses what the backend does not compile.
+    source = translate(code)
+    compiler = compiler or find_compiler()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'program.c')
+        with open(path, 'w') as file:
+            file.write(source)
+        # Written next to output and moved into place, so a cached
+        # executable is never seen half written
+        temp_output = output + '.tmp%d' % os.getpid()
+        result = subprocess.run([*compiler, *COMPILE_FLAGS, '-o', temp_output, path],
+                                capture_output=True, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f'C compiler failed:\n{result.stderr}')
+        os.replace(temp_output, output)
+    return output
+
+
+def run_native(path):
+    # Runs a native executable and returns the globals it ended with by
+    # name, or None if it stopped for the program to be run on the VM
+    result = subprocess.run([path, '--globals'], capture_output=True, text=True)
+    if result.returncode == FALLBACK_STATUS:
+        return None
+    if result.returncode != 0:
+        raise RuntimeError(f'{path} exited with status {result.returncode}')
+    values = {}
+    for line in result.stdout.splitlines():
+        name, value = line.split()
+        values[name] = int(value)
+    return values
+
+# Example usage
+if __name__ == "__main__":
+    code = """
+    func fib(n: Int) -> Int {
+        if n < 2 {
+            return n;
+        }
+        return fib(n - 1) + fib(n - 2);
+    }
+    var result: Int = fib(30);
+    """
+    print(translate(code))
+    with tempfile.TemporaryDirectory() as directory:
+        executable = compile_native(code, os.path.join(directory, 'fib'))
+        print(run_native(executable))
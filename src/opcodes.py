@@ -0,0 +1,183 @@
+import operator
+
+OPCODE_NAMES = (
+    'PUSH',
+    'STORE',
+    'LOAD',
+    'BIN_OP',
+    'JUMP_IF_FALSE',
+    'JUMP',
+    'CLASS',
+    'END_CLASS',
+    'HALT',
+    'LOAD_GLOBAL',
+    'STORE_GLOBAL',
+    'LOAD_FAST',
+    'STORE_FAST',
+    'UPDATE_GLOBAL',
+    'UPDATE_FAST',
+    'BIN_OP_CONST',
+    'FUNC',
+    'PARAM',
+    'STORE_DEFAULT',
+    'END_FUNC',
+    'CALL',
+    'TAIL_CALL',
+    'RETURN',
+    'POP',
+    'GO',
+    'CHANNEL',
+    'SEND',
+    'RECV',
+    'CLOSE',
+    'EXIT',
+    'PARALLEL',
+    'LOOP',
+    'ENTER_LOOP',
+    'ARRAY',
+    'INDEX',
+    'STORE_INDEX',
+    'SLICE',
+    'COPY',
+    'SUM',
+    'LENGTH',
+    'VECTOR_GUARD',
+    'BIN_OP_INT',
+    'ADD_INT',
+    'SUB_INT',
+    'MUL_INT',
+    'LT_INT',
+    'GT_INT',
+    'LE_INT',
+    'GE_INT',
+    'EQ_INT',
+    'NE_INT',
+    'JUMP_IF_NOT_LT',
+    'JUMP_IF_NOT_GT',
+    'JUMP_IF_NOT_LE',
+    'JUMP_IF_NOT_GE',
+    'JUMP_IF_NOT_EQ',
+    'JUMP_IF_NOT_NE',
+)
+
+OPCODES = {name: opcode for opcode, name in enumerate(OPCODE_NAMES)}
+
+(PUSH, STORE, LOAD, BIN_OP, JUMP_IF_FALSE, JUMP,
+ CLASS, END_CLASS, HALT, LOAD_GLOBAL, STORE_GLOBAL,
+ LOAD_FAST, STORE_FAST, UPDATE_GLOBAL, UPDATE_FAST,
+ BIN_OP_CONST, FUNC, PARAM, STORE_DEFAULT, END_FUNC,
+ CALL, TAIL_CALL, RETURN, POP, GO, CHANNEL, SEND,
+ RECV, CLOSE, EXIT, PARALLEL, LOOP, ENTER_LOOP,
+ ARRAY, INDEX, STORE_INDEX, SLICE, COPY, SUM, LENGTH,
+ VECTOR_GUARD, BIN_OP_INT, ADD_INT, SUB_INT, MUL_INT, LT_INT, GT_INT,
+ LE_INT, GE_INT, EQ_INT, NE_INT, JUMP_IF_NOT_LT, JUMP_IF_NOT_GT,
+ JUMP_IF_NOT_LE, JUMP_IF_NOT_GE, JUMP_IF_NOT_EQ,
+ JUMP_IF_NOT_NE) = range(len(OPCODE_NAMES))
+
+# Builtin functions compiled to their own instruction: name -> (instruction,
+# number of arguments). Each one leaves a single result on the stack, None for
+# send, close, set and copy. A declared function of the same name takes
+# precedence.
+BUILTINS = {
+    'chan': ('CHANNEL', 1),
+    'send': ('SEND', 2),
+    'recv': ('RECV', 1),
+    'close': ('CLOSE', 1),
+    'array': ('ARRAY', 1),
+    'get': ('INDEX', 2),
+    'set': ('STORE_INDEX', 3),
+    'slice': ('SLICE', 3),
+    'copy': ('COPY', 2),
+    'sum': ('SUM', 1),
+    'len': ('LENGTH', 1),
+}
+
+BINARY_OPERATORS = {
+    '+': operator.add,
+    '-': operator.sub,
+    '*': operator.mul,
+    '/': operator.truediv,
+    '>': operator.gt,
+    '<': operator.lt,
+    '>=': operator.ge,
+    '<=': operator.le,
+    '==': operator.eq,
+    '!=': operator.ne,
+}
+
+# BIN_OP_INT is emitted where the analyzer knows both operands are Ints. It
+# decodes to one opcode per operator, whose handler applies the operator
+# itself instead of calling the operator function BIN_OP carries. Division
+# is left generic, since it makes a float.
+INT_OPCODES = {
+    '+': ADD_INT,
+    '-': SUB_INT,
+    '*': MUL_INT,
+    '<': LT_INT,
+    '>': GT_INT,
+    '<=': LE_INT,
+    '>=': GE_INT,
+    '==': EQ_INT,
+    '!=': NE_INT,
+}
+
+# Comparisons of two Ints that the runtime fuses with the JUMP_IF_FALSE after
+# them into one compare-and-branch instruction
+BRANCH_OPCODES = {
+    LT_INT: JUMP_IF_NOT_LT,
+    GT_INT: JUMP_IF_NOT_GT,
+    LE_INT: JUMP_IF_NOT_LE,
+    GE_INT: JUMP_IF_NOT_GE,
+    EQ_INT: JUMP_IF_NOT_EQ,
+    NE_INT: JUMP_IF_NOT_NE,
+}
+
+# The operator symbol of every specialized opcode
+SPECIALIZED_SYMBOLS = {opcode: symbol for symbol, opcode in INT_OPCODES.items()}
+SPECIALIZED_SYMBOLS.update({branch: SPECIALIZED_SYMBOLS[opcode] for opcode, branch in BRANCH_OPCODES.items()})
+
+# Operators a parallel for loop may combine its results with. Both are
+# associative, so the result does not depend on how iterations are split.
+REDUCTIONS = ('+', '*')
+
+
+def resolve_operator(symbol):
+    try:
+        return BINARY_OPERATORS[symbol]
+    except KeyError:
+        raise RuntimeError(f'Unknown binary operator: {symbol}') from None
+
+
+def decode(instruction):
+    """Turn a ('NAME', arg) tuple into an (opcode, operand) pair."""
+    opcode = OPCODES.get(instruction[0])
+    if opcode is None:
+        raise RuntimeError(f'Unknown instruction: {instruction}')
+    operand = instruction[1] if len(instruction) > 1 else None
+    if opcode == BIN_OP or opcode == PARALLEL:
+        operand = resolve_operator(operand)
+    elif opcode == BIN_OP_INT:
+        if operand not in INT_OPCODES:
+            raise RuntimeError(f'Unknown Int operator: {operand}')
+        return (INT_OPCODES[operand], None)
+    elif opcode == UPDATE_GLOBAL or opcode == UPDATE_FAST:
+        slot, symbol, constant = operand
+        operand = (slot, resolve_operator(symbol), constant)
+    elif opcode == BIN_OP_CONST:
+        symbol, constant = operand
+        operand = (resolve_operator(symbol), constant)
+    return (opcode, operand)
+
+
+def frame_size(instructions, load_opcode, store_opcode):
+    """Number of slots a frame needs to hold every slot the given opcodes touch."""
+    size = 0
+    update_opcode = UPDATE_GLOBAL if load_opcode == LOAD_GLOBAL else UPDATE_FAST
+    for opcode, operand in instructions:
+        if opcode == update_opcode:
+            operand = operand[0]
+        elif opcode != load_opcode and opcode != store_opcode:
+            continue
+        if operand >= size:
+            size = operand + 1
+    return size
@@ -1,55 +1,61 @@
-from lexer import Lexer, TokenType
-from src.ast_nodes import ASTNode
+from functools import partial
+from src.lexer import END_PAIR, Lexer, TokenType
+from src.ast_nodes import (
+    Program, ClassDeclaration, VariableDeclaration, FunctionDeclaration,
+    IfStatement, WhileStatement, Assignment, BinaryOperation, Identifier, Integer, Call,
+    ReturnStatement, ExpressionStatement, GoStatement, ParallelFor, KIND_OF,
+)
 
+# Binding power of the binary operators; all of them are left-associative
+PRECEDENCE = {
+    '==': 1, '!=': 1,
+    '<': 2, '>': 2, '<=': 2, '>=': 2,
+    '+': 3, '-': 3,
+    '*': 4, '/': 4,
+}
+UNARY_PRECEDENCE = 5
 
-
-class Program(ASTNode):
-    def __init__(self, statements):
-        self.statements = statements
-
-class ClassDeclaration(ASTNode):
-    def __init__(self, identifier, body):
-        self.identifier = identifier
-        self.body = body
-
-class VariableDeclaration(ASTNode):
-    def __init__(self, identifier, var_type, value):
-        self.identifier = identifier
-        self.var_type = var_type
-        self.value = value
-
-class FunctionDeclaration(ASTNode):
-    def __init__(self, identifier, parameters, return_type, body):
-        self.identifier = identifier
-        self.parameters = parameters
-        self.return_type = return_type
-        self.body = body
-
-class IfStatement(ASTNode):
-    def __init__(self, condition, then_block, else_block=None):
-        self.condition = condition
-        self.then_block = then_block
-        self.else_block = else_block
-
-class WhileStatement(ASTNode):
-    def __init__(self, condition, body):
-        self.condition = condition
-        self.body = body
+# Operator stack entries are (operator, precedence, payload). Groups and call
+# argument lists are markers with precedence None, which no binary operator
+# reduces past.
+NEGATE = 'neg'
+GROUP = '('
+CALL = 'call'
 
 class Parser:
-    def __init__(self, lexer):
+    # With an Arena, nodes are stored in it instead of being built as objects,
+    # and parse() returns the root's node id.
+    def __init__(self, lexer, arena=None):
         self.lexer = lexer
-        self.current_token = self.lexer.next_token()
+        self.arena = arena
+        # Tokens are only read as (kind, value), so a Lexer hands over its
+        # pairs rather than Token records; anything with next_token() works
+        if isinstance(lexer, Lexer):
+            self.next_token = partial(next, lexer.pairs(), END_PAIR)
+        else:
+            self.next_token = lexer.next_token
+        self.current_token = self.next_token()
+
+    def node(self, node_type, *fields):
+        if self.arena is None:
+            return node_type(*fields)
+        return self.arena.add_node(node_type, *fields)
 
     def eat(self, token_type):
         if self.current_token[0] == token_type:
-            self.current_token = self.lexer.next_token()
+            self.current_token = self.next_token()
         else:
             raise SyntaxError(f'Expected {token_type}, got {self.current_token[0]}')
 
+    def expect(self, token_type, value):
+        # Eats a token that must have a particular value, such as a keyword
+        if self.current_token[1] != value:
+            raise SyntaxError(f'Expected "{value}", got {self.current_token[1]}')
+        self.eat(token_type)
+
     def skip_newlines(self):
         while self.current_token[0] == TokenType.NEWLINE:
-            self.current_token = self.lexer.next_token()
+            self.current_token = self.next_token()
 
     def parse(self):
         statements = []
@@ -57,7 +63,7 @@ class Parser:
         while self.current_token[0] != TokenType.EOF:
             statements.append(self.statement())
             self.skip_newlines()
-        return Program(statements)
+        return self.node(Program, statements)
 
     def statement(self):
         if self.current_token[1] == 'var':
@@ -70,9 +76,69 @@ class Parser:
             return self.if_statement()
         elif self.current_token[1] == 'while':
             return self.while_statement()
+        elif self.current_token[1] == 'return':
+            return self.return_statement()
+        elif self.current_token[1] == 'go':
+            return self.go_statement()
+        elif self.current_token[1] == 'parallel':
+            return self.parallel_for()
+        elif self.current_token[0] == TokenType.IDENTIFIER:
+            return self.assignment()
         else:
             raise SyntaxError(f'Unexpected token: {self.current_token[1]}')
 
+    def assignment(self):
+        # An assignment, or an expression statement such as a call, which
+        # also starts with an identifier
+        token = self.current_token
+        self.eat(TokenType.IDENTIFIER)
+        if self.current_token[1] != '=':
+            expression = self.expression(token)
+            self.eat(TokenType.SYMBOL)  # Eat the semicolon ';'
+            return self.node(ExpressionStatement, expression)
+        self.eat(TokenType.SYMBOL)  # Eat the equals '='
+        value = self.expression()
+        self.eat(TokenType.SYMBOL)  # Eat the semicolon ';'
+        return self.node(Assignment, token[1], value)
+
+    def return_statement(self):
+        self.eat(TokenType.KEYWORD)  # Eat 'return'
+        value = None
+        if self.current_token[1] != ';':
+            value = self.expression()
+        self.eat(TokenType.SYMBOL)  # Eat the semicolon ';'
+        return self.node(ReturnStatement, value)
+
+    def go_statement(self):
+        self.eat(TokenType.KEYWORD)  # Eat 'go'
+        call = self.expression()
+        is_call = type(call) is Call if self.arena is None else self.arena.kinds[call] == KIND_OF[Call]
+        if not is_call:
+            raise SyntaxError('Expected a function call after "go"')
+        self.eat(TokenType.SYMBOL)  # Eat the semicolon ';'
+        return self.node(GoStatement, call)
+
+    def parallel_for(self):
+        # parallel for i in start .. stop reduce(+: total) { body }
+        self.eat(TokenType.KEYWORD)  # Eat 'parallel'
+        self.expect(TokenType.KEYWORD, 'for')
+        variable = self.current_token[1]
+        self.eat(TokenType.IDENTIFIER)
+        self.expect(TokenType.KEYWORD, 'in')
+        start = self.expression()
+        self.expect(TokenType.SYMBOL, '..')
+        stop = self.expression()
+        self.expect(TokenType.KEYWORD, 'reduce')
+        self.expect(TokenType.SYMBOL, '(')
+        operator = self.current_token[1]
+        self.eat(TokenType.SYMBOL)
+        self.expect(TokenType.SYMBOL, ':')
+        target = self.current_token[1]
+        self.eat(TokenType.IDENTIFIER)
+        self.expect(TokenType.SYMBOL, ')')
+        body = self.block()
+        return self.node(ParallelFor, variable, start, stop, operator, target, body)
+
     def variable_declaration(self):
         self.eat(TokenType.KEYWORD)
         identifier = self.current_token[1]
@@ -83,7 +149,7 @@ class Parser:
         self.eat(TokenType.SYMBOL)  # Eat the equals '='
         value = self.expression()
         self.eat(TokenType.SYMBOL)  # Eat the semicolon ';'
-        return VariableDeclaration(identifier, var_type, value)
+        return self.node(VariableDeclaration, identifier, var_type, value)
 
     def function_declaration(self):
         self.eat(TokenType.KEYWORD)
@@ -96,7 +162,7 @@ class Parser:
         return_type = self.current_token[1]
         self.eat(TokenType.IDENTIFIER)
         body = self.block()
-        return FunctionDeclaration(identifier, parameters, return_type, body)
+        return self.node(FunctionDeclaration, identifier, parameters, return_type, body)
 
     def parameter_list(self):
         parameters = []
@@ -112,7 +178,7 @@ class Parser:
         identifier = self.current_token[1]
         self.eat(TokenType.IDENTIFIER)
         body = self.block()
-        return ClassDeclaration(identifier, body)
+        return self.node(ClassDeclaration, identifier, body)
 
     def parameter(self):
         identifier = self.current_token[1]
@@ -136,17 +202,100 @@ class Parser:
         self.eat(TokenType.SYMBOL)  # Eat the closing brace '}'
         return statements
 
-    def expression(self):
-        if self.current_token[0] == TokenType.INTEGER:
-            value = self.current_token[1]
-            self.eat(TokenType.INTEGER)
-            return value
-        elif self.current_token[0] == TokenType.IDENTIFIER:
-            identifier = self.current_token[1]
-            self.eat(TokenType.IDENTIFIER)
-            return identifier
+    def expression(self, identifier=None):
+        # Operator precedence (Pratt) parsing driven by explicit operand and
+        # operator stacks instead of recursion, so the nesting depth of the
+        # input never touches Python's recursion limit. Parentheses and call
+        # argument lists are markers on the operator stack. identifier is an
+        # identifier token the caller already consumed, which starts the
+        # expression.
+        operands = []
+        operators = []
+        while True:
+            # Operand position: prefix minus, '(' or an atom
+            if identifier is not None:
+                token, identifier = identifier, None
+            else:
+                token = self.current_token
+                if token[0] == TokenType.SYMBOL and token[1] == '-':
+                    self.eat(TokenType.SYMBOL)
+                    operators.append((NEGATE, UNARY_PRECEDENCE, None))
+                    continue
+                if token[0] == TokenType.SYMBOL and token[1] == '(':
+                    self.eat(TokenType.SYMBOL)
+                    operators.append((GROUP, None, None))
+                    continue
+                if token[0] != TokenType.INTEGER and token[0] != TokenType.IDENTIFIER:
+                    raise SyntaxError(f'Unexpected token: {token[1]}')
+                self.eat(token[0])
+            if token[0] == TokenType.INTEGER:
+                operands.append(self.node(Integer, token[1]))
+            elif self.current_token[0] == TokenType.SYMBOL and self.current_token[1] == '(':
+                self.eat(TokenType.SYMBOL)
+                if self.current_token[0] == TokenType.SYMBOL and self.current_token[1] == ')':
+                    self.eat(TokenType.SYMBOL)
+                    operands.append(self.node(Call, token[1], []))
+                else:
+                    # Arguments are the operands above this marker when it closes
+                    operators.append((CALL, None, (token[1], len(operands))))
+                    continue
+            else:
+                operands.append(self.node(Identifier, token[1]))
+
+            # Operator position: binary operators, ')' and ',' close or continue
+            # a group or call, anything else ends the expression
+            while True:
+                token = self.current_token
+                if token[0] != TokenType.SYMBOL:
+                    return self.finish_expression(operands, operators)
+                symbol = token[1]
+                if symbol in PRECEDENCE:
+                    precedence = PRECEDENCE[symbol]
+                    while operators and operators[-1][1] is not None and operators[-1][1] >= precedence:
+                        self.reduce(operands, operators)
+                    self.eat(TokenType.SYMBOL)
+                    operators.append((symbol, precedence, None))
+                    break
+                if symbol == ',' and self.innermost_marker(operators) == CALL:
+                    while operators[-1][0] != CALL:
+                        self.reduce(operands, operators)
+                    self.eat(TokenType.SYMBOL)
+                    break
+                if symbol == ')' and self.innermost_marker(operators) is not None:
+                    while operators[-1][0] != GROUP and operators[-1][0] != CALL:
+                        self.reduce(operands, operators)
+                    marker, _, payload = operators.pop()
+                    if marker == CALL:
+                        name, first_argument = payload
+                        arguments = operands[first_argument:]
+                        del operands[first_argument:]
+                        operands.append(self.node(Call, name, arguments))
+                    self.eat(TokenType.SYMBOL)
+                    continue
+                return self.finish_expression(operands, operators)
+
+    def innermost_marker(self, operators):
+        for operator, precedence, _ in reversed(operators):
+            if precedence is None:
+                return operator
+        return None
+
+    def reduce(self, operands, operators):
+        operator = operators.pop()[0]
+        right = operands.pop()
+        if operator == NEGATE:
+            # -x is parsed as 0 - x; constant folding turns -5 back into a literal
+            operands.append(self.node(BinaryOperation, self.node(Integer, 0), '-', right))
         else:
-            raise SyntaxError(f'Unexpected token: {self.current_token[1]}')
+            left = operands.pop()
+            operands.append(self.node(BinaryOperation, left, operator, right))
+
+    def finish_expression(self, operands, operators):
+        while operators:
+            if operators[-1][1] is None:
+                raise SyntaxError(f'Expected ")", got {self.current_token[1]}')
+            self.reduce(operands, operators)
+        return operands[0]
 
     def if_statement(self):
         self.eat(TokenType.KEYWORD)  # Eat 'if'
@@ -156,13 +305,13 @@ class Parser:
         if self.current_token[1] == 'else':
             self.eat(TokenType.KEYWORD)  # Eat 'else'
             else_block = self.block()
-        return IfStatement(condition, then_block, else_block)
+        return self.node(IfStatement, condition, then_block, else_block)
 
     def while_statement(self):
         self.eat(TokenType.KEYWORD)  # Eat 'while'
         condition = self.expression()
         body = self.block()
-        return WhileStatement(condition, body)
+        return self.node(WhileStatement, condition, body)
 
 # Example usage
 if __name__ == "__main__":
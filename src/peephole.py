@@ -0,0 +1,180 @@
+from src.opcodes import BINARY_OPERATORS
+
+JUMP_OPS = {'JUMP', 'JUMP_IF_FALSE'}
+# Instructions after which control never falls through to the next one
+TERMINATORS = {'JUMP', 'HALT'}
+FOLDABLE_TYPES = (int, float, bool)
+# Binary operators, generic or specialized for Ints; both carry the symbol
+BIN_OPS = {'BIN_OP', 'BIN_OP_INT'}
+# Int comparisons the runtime fuses with a following JUMP_IF_FALSE, which
+# beats folding their constant operand into BIN_OP_CONST
+BRANCH_SYMBOLS = {'<', '>', '<=', '>=', '==', '!='}
+
+
+class PeepholeOptimizer:
+    # Level 0 leaves the code untouched, level 1 folds constants, threads jumps
+    # and drops dead code, level 2 also fuses superinstructions.
+    def __init__(self, level=1):
+        self.level = level
+
+    def optimize(self, instructions):
+        instructions = list(instructions)
+        if self.level <= 0:
+            return instructions
+        # Each pass can expose work for the others, e.g. a folded condition
+        # turns into a jump that can then be threaded.
+        for _ in range(16):
+            before = instructions
+            instructions = self.fold_constants(instructions)
+            instructions = self.thread_jumps(instructions)
+            instructions = self.remove_unreachable(instructions)
+            if instructions == before:
+                break
+        if self.level >= 2:
+            instructions = self.fuse_superinstructions(instructions)
+        return instructions
+
+    def jump_targets(self, instructions):
+        return {instruction[1] for instruction in instructions if instruction[0] in JUMP_OPS}
+
+    def fused_branch(self, code, i):
+        # Whether code[i] is an Int comparison that is branched on right away
+        return (code[i][0] == 'BIN_OP_INT' and code[i][1] in BRANCH_SYMBOLS
+                and i + 1 < len(code) and code[i + 1] is not None
+                and code[i + 1][0] == 'JUMP_IF_FALSE')
+
+    def compact(self, instructions):
+        # Drop instructions replaced by None and relocate every jump. A jump to a
+        # removed instruction lands on the next instruction that was kept.
+        new_index = []
+        kept = 0
+        for instruction in instructions:
+            new_index.append(kept)
+            if instruction is not None:
+                kept += 1
+        new_index.append(kept)
+        result = []
+        for instruction in instructions:
+            if instruction is None:
+                continue
+            if instruction[0] in JUMP_OPS:
+                instruction = (instruction[0], new_index[instruction[1]])
+            result.append(instruction)
+        return result
+
+    def fold_constants(self, instructions):
+        # Works like a small stack machine over the output so that nested
+        # constant expressions collapse in a single pass. Jump operands stay
+        # as old indices until the final relocation.
+        targets = self.jump_targets(instructions)
+        out = []
+        new_index = []
+        boundary = 0  # no folding may reach back past a jump target
+        changed = False
+        for i, instruction in enumerate(instructions):
+            new_index.append(len(out))
+            if i in targets:
+                boundary = len(out)
+            op = instruction[0]
+            if (op in BIN_OPS and boundary <= len(out) - 2
+                    and out[-1][0] == 'PUSH' and out[-2][0] == 'PUSH'):
+                # PUSH a; PUSH b; BIN_OP op -> PUSH (a op b)
+                value = self.evaluate(instruction[1], out[-2][1], out[-1][1])
+                if value is not None:
+                    out.pop()
+                    out[-1] = ('PUSH', value[0])
+                    changed = True
+                    continue
+            if (op == 'JUMP_IF_FALSE' and boundary <= len(out) - 1
+                    and out[-1][0] == 'PUSH' and isinstance(out[-1][1], FOLDABLE_TYPES)):
+                # PUSH c; JUMP_IF_FALSE t -> JUMP t, or nothing when c is true
+                if out[-1][1]:
+                    out.pop()
+                else:
+                    out[-1] = ('JUMP', instruction[1])
+                changed = True
+                continue
+            out.append(instruction)
+        if not changed:
+            return instructions
+        new_index.append(len(out))
+        return [(instruction[0], new_index[instruction[1]]) if instruction[0] in JUMP_OPS else instruction
+                for instruction in out]
+
+    def evaluate(self, symbol, left, right):
+        function = BINARY_OPERATORS.get(symbol)
+        if (function is None or not isinstance(left, FOLDABLE_TYPES)
+                or not isinstance(right, FOLDABLE_TYPES)):
+            return None
+        try:
+            return (function(left, right),)
+        except ArithmeticError:
+            return None  # Leave the error to be raised at run time
+
+    def thread_jumps(self, instructions):
+        code = list(instructions)
+        for i, instruction in enumerate(code):
+            if instruction[0] not in JUMP_OPS:
+                continue
+            target = instruction[1]
+            seen = set()
+            # Follow chains of unconditional jumps, guarding against cycles
+            while target < len(code) and code[target][0] == 'JUMP' and target not in seen:
+                seen.add(target)
+                target = code[target][1]
+            if instruction[0] == 'JUMP' and target < len(code) and code[target][0] == 'HALT':
+                code[i] = ('HALT',)
+            else:
+                code[i] = (instruction[0], target)
+        # An unconditional jump to the very next instruction does nothing
+        code = [None if instruction[0] == 'JUMP' and instruction[1] == i + 1 else instruction
+                for i, instruction in enumerate(code)]
+        if None in code:
+            return self.compact(code)
+        return code
+
+    def remove_unreachable(self, instructions):
+        reachable = [False] * len(instructions)
+        pending = [0]
+        while pending:
+            i = pending.pop()
+            while i < len(instructions) and not reachable[i]:
+                reachable[i] = True
+                op = instructions[i][0]
+                if op in JUMP_OPS:
+                    pending.append(instructions[i][1])
+                if op in TERMINATORS:
+                    break
+                i += 1
+        if all(reachable):
+            return instructions
+        return self.compact([instruction if live else None
+                             for instruction, live in zip(instructions, reachable)])
+
+    def fuse_superinstructions(self, instructions):
+        targets = self.jump_targets(instructions)
+        code = list(instructions)
+        for i in range(len(code)):
+            instruction = code[i]
+            if instruction is None:
+                continue
+            window = code[i:i + 4]
+            if (len(window) == 4 and None not in window
+                    and not any(j in targets for j in range(i + 1, i + 4))):
+                load, push, bin_op, store = window
+                # LOAD x; PUSH c; BIN_OP op; STORE x -> UPDATE x (x, op, c)
+                for scope in ('_GLOBAL', '_FAST'):
+                    if (load[0] == 'LOAD' + scope and push[0] == 'PUSH' and bin_op[0] in BIN_OPS
+                            and store == ('STORE' + scope, load[1])):
+                        code[i] = ('UPDATE' + scope, (load[1], bin_op[1], push[1]))
+                        code[i + 1] = code[i + 2] = code[i + 3] = None
+                        break
+                if code[i + 1] is None:
+                    continue
+            # PUSH c; BIN_OP op -> BIN_OP_CONST (op, c)
+            if (instruction[0] == 'PUSH' and i + 1 < len(code) and code[i + 1] is not None
+                    and code[i + 1][0] in BIN_OPS and i + 1 not in targets
+                    and not self.fused_branch(code, i + 1)):
+                code[i] = ('BIN_OP_CONST', (code[i + 1][1], instruction[1]))
+                code[i + 1] = None
+        return self.compact(code)
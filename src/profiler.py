@@ -0,0 +1,243 @@
+import json
+from itertools import repeat
+from time import perf_counter_ns
+
+from src.opcodes import FUNC, END_FUNC, CALL, TAIL_CALL, RETURN, JUMP, LOOP
+from src.runtime import Park, Exit, Yield
+
+# Instructions after which the running function may be a different one
+CALL_OPCODES = frozenset((CALL, TAIL_CALL, RETURN, END_FUNC))
+
+# Names in call stacks for code outside any function: the top level of the
+# program, and the bottom of a goroutine started with go
+MAIN = '<main>'
+GOROUTINE = '<goroutine>'
+
+
+def function_names(code, exit_address):
+    # The name of the function each instruction belongs to. A FUNC belongs to
+    # the code that defines the function, its END_FUNC to the function.
+    names = []
+    open_functions = []
+    for opcode, operand in code:
+        if opcode == END_FUNC:
+            names.append(open_functions.pop())
+            continue
+        names.append(open_functions[-1] if open_functions else MAIN)
+        if opcode == FUNC:
+            open_functions.append(operand[0].name)
+    names[exit_address] = GOROUTINE
+    return names
+
+
+class Profiler:
+    # Runs a loaded Runtime with an instrumented copy of its dispatch loop,
+    # which counts and times every instruction it executes and keeps track of
+    # the call stack of the running goroutine. Runtime.run itself is left
+    # alone, so programs that are not profiled pay nothing for it.
+    #
+    # Times are nanoseconds spent in each instruction's handler. A compiled
+    # loop's iterations and parallel for workers are timed as the one
+    # instruction that runs them.
+    def __init__(self, runtime):
+        self.runtime = runtime
+        size = len(runtime.code)
+        self.counts = [0] * size
+        self.times = [0] * size
+        self.names = function_names(runtime.code, runtime.exit_address)
+        # The program's instructions as compiled, before the jit rewrote any
+        self.original = list(runtime.code)
+        # Handler time by call stack, as a tuple of function names
+        self.stacks = {}
+        self.calls = {}
+        self.stack = None
+        self.wall_time = 0
+
+    def current_stack(self, ip):
+        frames = self.runtime.frames
+        names = self.names
+        return tuple([names[address] for address, _ in frames] + [names[ip]])
+
+    def switch(self, elapsed, ip):
+        # Books the handler time of the stack that was running and returns the
+        # time to start counting from for the new one
+        stacks = self.stacks
+        stacks[self.stack] = stacks.get(self.stack, 0) + elapsed
+        self.stack = self.current_stack(ip)
+        return 0
+
+    def run(self):
+        # Mirrors Runtime.run
+        runtime = self.runtime
+        code = runtime.code
+        handlers = runtime.handlers
+        ready = runtime.ready
+        time_slice = runtime.time_slice
+        counts = self.counts
+        times = self.times
+        calls = self.calls
+        clock = perf_counter_ns
+        ip = runtime.instruction_pointer
+        self.stack = self.current_stack(ip)
+        stack_time = 0
+        started = clock()
+        while True:
+            try:
+                for _ in repeat(None, time_slice):
+                    opcode, operand = code[ip]
+                    counts[ip] += 1
+                    start = clock()
+                    try:
+                        target = handlers[opcode](operand)
+                    finally:
+                        elapsed = clock() - start
+                        times[ip] += elapsed
+                        stack_time += elapsed
+                    ip = ip + 1 if target is None else target
+                    if opcode in CALL_OPCODES:
+                        stack_time = self.switch(stack_time, ip)
+                        if opcode != RETURN and opcode != END_FUNC:
+                            name = self.stack[-1]
+                            calls[name] = calls.get(name, 0) + 1
+                if not ready:
+                    continue
+                runtime.suspend(ip)
+                ready.append(runtime.current)
+            except Park:
+                runtime.suspend(ip + 1)
+            except Yield as yielded:
+                runtime.suspend(yielded.ip)
+                ready.append(runtime.current)
+            except Exit:
+                if runtime.current is runtime.main:
+                    break
+            if not ready:
+                raise RuntimeError('All goroutines are asleep - deadlock')
+            ip = runtime.resume(ready.popleft())
+            stack_time = self.switch(stack_time, ip)
+        self.switch(stack_time, ip)
+        self.wall_time = clock() - started
+        runtime.instruction_pointer = ip
+
+    def instruction(self, index):
+        instructions = self.runtime.instructions
+        return instructions[index] if index < len(instructions) else ('EXIT',)
+
+    def opcodes(self):
+        # name -> (count, time), by the instructions as compiled
+        totals = {}
+        for index, count in enumerate(self.counts):
+            if count:
+                name = self.instruction(index)[0]
+                total_count, total_time = totals.get(name, (0, 0))
+                totals[name] = (total_count + count, total_time + self.times[index])
+        return totals
+
+    def functions(self):
+        # name -> (calls, self time, total time). Total time counts each
+        # stack once per function in it, so recursion is not counted twice.
+        own = {}
+        total = {}
+        for stack, elapsed in self.stacks.items():
+            own[stack[-1]] = own.get(stack[-1], 0) + elapsed
+            for name in set(stack):
+                total[name] = total.get(name, 0) + elapsed
+        return {name: (self.calls.get(name, 0), own.get(name, 0), total[name]) for name in total}
+
+    def loops(self):
+        # (header, end, iterations) for every loop whose backward jump ran.
+        # Iterations run by a compiled loop are not seen by the profiler.
+        loops = []
+        for index, count in enumerate(self.counts):
+            opcode, operand = self.original[index]
+            if opcode == LOOP:
+                operand = operand[0]
+            elif opcode != JUMP or operand > index:
+                continue
+            if count:
+                loops.append((operand, index, count))
+        return loops
+
+    def hot_instructions(self, limit=None):
+        # Indices of executed instructions, slowest first
+        executed = [index for index, count in enumerate(self.counts) if count]
+        executed.sort(key=lambda index: self.times[index], reverse=True)
+        return executed[:limit]
+
+    def collapsed(self):
+        # Collapsed stacks, one 'outer;inner nanoseconds' line each, the
+        # input format of flamegraph.pl and speedscope
+        lines = [f'{";".join(stack)} {elapsed}' for stack, elapsed in sorted(self.stacks.items()) if elapsed]
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self):
+        return {
+            'wall_time_ns': self.wall_time,
+            'instructions_executed': sum(self.counts),
+            'opcodes': {name: {'count': count, 'time_ns': elapsed}
+                        for name, (count, elapsed) in sorted(self.opcodes().items())},
+            'instructions': [{'index': index, 'instruction': repr(self.instruction(index)),
+                              'function': self.names[index], 'count': self.counts[index],
+                              'time_ns': self.times[index]}
+                             for index in self.hot_instructions()],
+            'functions': {name: {'calls': calls, 'self_time_ns': own, 'total_time_ns': total}
+                          for name, (calls, own, total) in sorted(self.functions().items())},
+            'loops': [{'header': header, 'end': end, 'function': self.names[header], 'iterations': iterations}
+                      for header, end, iterations in self.loops()],
+        }
+
+    def dump_json(self, path):
+        with open(path, 'w') as file:
+            json.dump(self.to_json(), file, indent=2)
+
+    def dump_collapsed(self, path):
+        with open(path, 'w') as file:
+            file.write(self.collapsed())
+
+    def report(self, limit=10):
+        # A human-readable summary of the hottest parts
+        milliseconds = lambda elapsed: f'{elapsed / 1e6:10.3f} ms'
+        lines = [f'{sum(self.counts)} instructions in {self.wall_time / 1e6:.3f} ms', '', 'opcodes:']
+        opcodes = sorted(self.opcodes().items(), key=lambda item: item[1][1], reverse=True)
+        for name, (count, elapsed) in opcodes[:limit]:
+            lines.append(f'  {name:<16}{count:>12}{milliseconds(elapsed)}')
+        lines += ['', 'instructions:']
+        for index in self.hot_instructions(limit):
+            lines.append(f'  {index:>6} {self.instruction(index)!r:<36}{self.counts[index]:>12}'
+                         f'{milliseconds(self.times[index])}  {self.names[index]}')
+        lines += ['', 'functions:                  calls        self       total']
+        functions = sorted(self.functions().items(), key=lambda item: item[1][2], reverse=True)
+        for name, (calls, own, total) in functions[:limit]:
+            lines.append(f'  {name:<20}{calls:>10}{milliseconds(own)}{milliseconds(total)}')
+        loops = self.loops()
+        if loops:
+            lines += ['', 'loops:']
+            for header, end, iterations in sorted(loops, key=lambda loop: loop[2], reverse=True)[:limit]:
+                lines.append(f'  {header:>6}-{end:<6}{iterations:>12} iterations  {self.names[header]}')
+        return '\n'.join(lines)
+
+# Example usage
+if __name__ == "__main__":
+    from src.cli import compile_source
+    from src.runtime import Runtime
+
+    code = """
+    func fib(n: Int) -> Int {
+        if n < 2 {
+            return n;
+        }
+        return fib(n - 1) + fib(n - 2);
+    }
+    var i: Int = 0;
+    var total: Int = 0;
+    while i < 15 {
+        total = total + fib(i);
+        i = i + 1;
+    }
+    """
+    runtime = Runtime()
+    runtime.load_program(compile_source(code))
+    profiler = Profiler(runtime)
+    profiler.run()
+    print(profiler.report())
+    print(profiler.collapsed())
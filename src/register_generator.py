@@ -0,0 +1,412 @@
+from collections import namedtuple
+
+from src.ast_nodes import BinaryOperation, Call, Identifier, Integer
+from src.opcodes import BINARY_OPERATORS, BUILTINS
+from src.lexer import Lexer
+from src.parser import Parser
+from src.semantic_analyzer import SemanticAnalyzer
+
+# The registers of a frame. Variables come first, in slot order with the
+# parameters at the start, then temporaries. Constants sit at the end of the
+# frame and are addressed from it: constants[k] is register -(k + 1).
+Frame = namedtuple('Frame', ('variables', 'temporaries', 'constants'))
+
+# Operators a conditional jump can test directly
+COMPARISONS = {'<', '>', '<=', '>=', '==', '!='}
+
+# Builtins the register VM runs. The channel builtins need goroutines, which
+# only the stack VM has.
+REGISTER_BUILTINS = {'array', 'get', 'set', 'slice', 'copy', 'sum', 'len'}
+
+
+class FrameLayout:
+    # Hands out the registers of one frame while its code is generated:
+    # temporaries are allocated and released like a stack, and each distinct
+    # constant gets one register
+    def __init__(self, variables):
+        self.variables = variables
+        self.next_temporary = variables
+        self.high_water = variables
+        self.constants = []
+        self.constant_registers = {}
+
+    def allocate(self):
+        register = self.next_temporary
+        self.next_temporary += 1
+        if self.next_temporary > self.high_water:
+            self.high_water = self.next_temporary
+        return register
+
+    def release(self, register):
+        # Frees register and every temporary allocated after it
+        if self.variables <= register < self.next_temporary:
+            self.next_temporary = register
+
+    def constant(self, value):
+        # Keyed by type too, so True and 1 get registers of their own
+        key = (type(value), value)
+        register = self.constant_registers.get(key)
+        if register is None:
+            self.constants.append(value)
+            register = self.constant_registers[key] = -len(self.constants)
+        return register
+
+    def is_constant(self, register):
+        return register < 0
+
+    def value(self, register):
+        return self.constants[-register - 1]
+
+    def frame(self):
+        return Frame(self.variables, self.high_water - self.variables, tuple(self.constants))
+
+
+class RegisterGenerator:
+    # Compiles an analyzed program to three-address code for the register VM
+    # (see src/register_vm.py). Every variable is a register of its frame,
+    # so x = x + 1 is the single instruction ('BIN_OP', '+', x, x, one).
+    # Globals are the registers of the main program's frame. Code in a
+    # function reaches them with LOAD_GLOBAL and STORE_GLOBAL.
+    #
+    # Instructions, with r a register:
+    #     ('MOVE', r, r)                 ('BIN_OP', op, r, r, r)
+    #     ('LOAD_GLOBAL', r, slot)       ('STORE_GLOBAL', slot, r)
+    #     ('JUMP', target)               ('JUMP_IF_TRUE' / 'JUMP_IF_FALSE', r, target)
+    #     ('JUMP_IF' / 'JUMP_IF_NOT', comparison, r, r, target)
+    #     ('FUNC', r, name, entries, Frame, end)
+    #     ('CALL', r, function, first, count)   ('TAIL_CALL', function, first, count)
+    #     ('RETURN', r)                  ('HALT',)
+    # and one instruction per array builtin, e.g. ('INDEX', r, array, index).
+    # Call arguments are in the count registers from first.
+    def __init__(self, symbol_table, scopes):
+        self.instructions = []
+        self.symbol_table = symbol_table
+        self.scopes = scopes
+        self.layout = FrameLayout(len(symbol_table.slots))
+        # Layout of the main program's frame, set once it is generated
+        self.frame = None
+        # Whether each expression makes a call, by node, for the operands
+        # that must be read before it runs
+        self.calls = {}
+        self.generators = {}
+
+    def generate(self, node):
+        # Look the generator up once per node class rather than once per node
+        generator = self.generators.get(type(node))
+        if generator is None:
+            method_name = 'generate_' + type(node).__name__
+            generator = self.generators[type(node)] = getattr(self, method_name, self.generic_generate)
+        generator(node)
+
+    def generic_generate(self, node):
+        raise Exception(f'The register VM does not support {type(node).__name__}')
+
+    def generate_Program(self, node):
+        for statement in node.statements:
+            self.generate(statement)
+        self.instructions.append(('HALT',))
+        self.frame = self.layout.frame()
+
+    def generate_VariableDeclaration(self, node):
+        self.assign(node.identifier, node.value)
+
+    def generate_Assignment(self, node):
+        self.assign(node.identifier, node.value)
+
+    def assign(self, name, value):
+        table, slot = self.resolve(name)
+        if table.parent is None and self.symbol_table.parent is not None:
+            register = self.expression(value)
+            self.instructions.append(('STORE_GLOBAL', slot, register))
+            self.layout.release(register)
+        else:
+            self.expression(value, slot)
+
+    def resolve(self, name):
+        # Variables of enclosing functions are out of reach of a nested one,
+        # as they are in the stack VM
+        table, slot = self.symbol_table.resolve(name)
+        if table is None or (table.parent is not None and table is not self.symbol_table):
+            raise Exception(f'The register VM cannot reach "{name}" from here')
+        return table, slot
+
+    def generate_FunctionDeclaration(self, node):
+        # The body gets a frame of its own. A call with n arguments starts
+        # at entries[n]: the code computing the defaults of the parameters
+        # from n on, which runs into the body, or the body itself.
+        _, destination = self.resolve(node.identifier)
+        start = len(self.instructions)
+        self.instructions.append(None)
+        enclosing, layout = self.symbol_table, self.layout
+        self.symbol_table = self.scopes[node]
+        self.layout = FrameLayout(len(self.symbol_table.slots))
+        count = len(node.parameters)
+        sections = []
+        for index, param in enumerate(node.parameters):
+            if param[2] is not None:
+                sections.append((index, len(self.instructions)))
+                self.expression(param[2], index)
+        entries = [None] * (count + 1)
+        entries[count] = len(self.instructions)
+        for index, section in reversed(sections):
+            if entries[index + 1] is None:
+                break
+            entries[index] = section
+        for statement in node.body:
+            self.generate(statement)
+        self.instructions.append(('RETURN', self.layout.constant(None)))
+        frame = self.layout.frame()
+        self.symbol_table, self.layout = enclosing, layout
+        self.instructions[start] = ('FUNC', destination, node.identifier, tuple(entries), frame, len(self.instructions))
+
+    def generate_ReturnStatement(self, node):
+        if type(node.value) is Call and not self.is_builtin(node.value):
+            # The caller's frame is not needed after a call in tail position
+            self.call(node.value, tail=True)
+            return
+        if node.value is None:
+            register = self.layout.constant(None)
+        else:
+            register = self.expression(node.value)
+        self.instructions.append(('RETURN', register))
+        self.layout.release(register)
+
+    def generate_ExpressionStatement(self, node):
+        self.layout.release(self.expression(node.expression))
+
+    def generate_IfStatement(self, node):
+        jump_if_false = self.branch(node.condition, False)
+        for statement in node.then_block:
+            self.generate(statement)
+        if node.else_block:
+            jump_to_end = len(self.instructions)
+            self.instructions.append(('JUMP', None))
+            self.patch(jump_if_false, len(self.instructions))
+            for statement in node.else_block:
+                self.generate(statement)
+            self.patch(jump_to_end, len(self.instructions))
+        else:
+            self.patch(jump_if_false, len(self.instructions))
+
+    def generate_WhileStatement(self, node):
+        # The condition is tested at the bottom, so an iteration takes one
+        # conditional jump back and no unconditional one
+        jump_to_condition = len(self.instructions)
+        self.instructions.append(('JUMP', None))
+        body = len(self.instructions)
+        for statement in node.body:
+            self.generate(statement)
+        self.patch(jump_to_condition, len(self.instructions))
+        self.patch(self.branch(node.condition, True), body)
+
+    def branch(self, condition, when):
+        # A jump taken when condition is true (when=True) or false, with its
+        # target left to patch. Returns its index, or None if a constant
+        # condition means it is never taken.
+        if type(condition) is BinaryOperation and condition.operator in COMPARISONS:
+            left, right = self.operands(condition.left, condition.right)
+            if not (self.layout.is_constant(left) and self.layout.is_constant(right)):
+                self.instructions.append(('JUMP_IF' if when else 'JUMP_IF_NOT', condition.operator, left, right, None))
+                self.layout.release(right)
+                self.layout.release(left)
+                return len(self.instructions) - 1
+            register = self.operation(condition.operator, left, right)
+        else:
+            register = self.expression(condition)
+        self.layout.release(register)
+        if self.layout.is_constant(register):
+            if bool(self.layout.value(register)) != when:
+                return None
+            self.instructions.append(('JUMP', None))
+        else:
+            self.instructions.append(('JUMP_IF_TRUE' if when else 'JUMP_IF_FALSE', register, None))
+        return len(self.instructions) - 1
+
+    def patch(self, index, target):
+        if index is not None:
+            self.instructions[index] = self.instructions[index][:-1] + (target,)
+
+    def expression(self, node, target=None):
+        # Compiles node and returns the register holding its value: target
+        # if one is given, otherwise a variable's or constant's own register
+        # where possible, or a temporary
+        kind = type(node)
+        if kind is BinaryOperation:
+            return self.binary_operation(node, target)
+        if kind is Call:
+            return self.call(node, target)
+        if kind is Integer:
+            register = self.layout.constant(int(node))
+        elif kind is Identifier or kind is str:
+            register = self.variable(node if kind is str else node.name, target)
+        else:
+            raise Exception(f'The register VM does not support {kind.__name__}')
+        if target is not None and register != target:
+            self.instructions.append(('MOVE', target, register))
+            return target
+        return register
+
+    def variable(self, name, target=None):
+        table, slot = self.resolve(name)
+        if table.parent is None and self.symbol_table.parent is not None:
+            register = self.layout.allocate() if target is None else target
+            self.instructions.append(('LOAD_GLOBAL', register, slot))
+            return register
+        return slot
+
+    def binary_operation(self, node, target=None):
+        # Post-order over operator chains with an explicit stack, as in the
+        # stack code generator. Operations wait on it as 1-tuples.
+        pending = [node]
+        registers = []
+        while pending:
+            node = pending.pop()
+            if type(node) is BinaryOperation:
+                pending.append((node,))
+                pending.append(node.right)
+                pending.append((None, node.right))
+                pending.append(node.left)
+            elif type(node) is tuple and node[0] is None:
+                # The left operand is done: keep its value if the right one
+                # makes a call that may change it
+                if self.makes_call(node[1]):
+                    registers[-1] = self.protect(registers[-1])
+            elif type(node) is tuple:
+                right = registers.pop()
+                left = registers.pop()
+                registers.append(self.operation(node[0].operator, left, right, None if pending else target))
+            else:
+                registers.append(self.expression(node))
+        return registers[0]
+
+    def operation(self, operator, left, right, target=None):
+        layout = self.layout
+        if layout.is_constant(left) and layout.is_constant(right):
+            # Folded as the peephole optimizer folds the stack code
+            value = self.evaluate(operator, layout.value(left), layout.value(right))
+            if value is not None:
+                register = layout.constant(value)
+                if target is not None:
+                    self.instructions.append(('MOVE', target, register))
+                    return target
+                return register
+        layout.release(right)
+        layout.release(left)
+        destination = layout.allocate() if target is None else target
+        self.instructions.append(('BIN_OP', operator, destination, left, right))
+        return destination
+
+    def evaluate(self, operator, left, right):
+        if type(left) is not int or type(right) is not int or operator not in BINARY_OPERATORS:
+            return None
+        try:
+            return BINARY_OPERATORS[operator](left, right)
+        except ArithmeticError:
+            return None
+
+    def operands(self, *nodes):
+        # Registers holding the values of nodes, evaluated in order
+        registers = []
+        for node in nodes:
+            if registers and self.makes_call(node):
+                registers = [self.protect(register) for register in registers]
+            registers.append(self.expression(node))
+        return registers
+
+    def protect(self, register):
+        # A global read in the main program is its register itself, which a
+        # call made by a later operand could assign before the register is
+        # used. Such a value is copied to a temporary first, so it is the one
+        # from before the call, as in the stack VM.
+        if self.symbol_table.parent is not None or not 0 <= register < self.layout.variables:
+            return register
+        temporary = self.layout.allocate()
+        self.instructions.append(('MOVE', temporary, register))
+        return temporary
+
+    def makes_call(self, node):
+        # Whether evaluating node calls a function other than a builtin. The
+        # answer for each operation is worked out bottom up without recursion
+        # and kept, so long operator chains are only walked once.
+        calls = self.calls
+        pending = [node]
+        while pending:
+            operation = pending[-1]
+            if type(operation) is BinaryOperation and operation not in calls:
+                waiting = [operand for operand in (operation.left, operation.right)
+                           if type(operand) is BinaryOperation and operand not in calls]
+                if waiting:
+                    pending.extend(waiting)
+                    continue
+                calls[operation] = self.direct_call(operation.left) or self.direct_call(operation.right)
+            pending.pop()
+        return self.direct_call(node)
+
+    def direct_call(self, node):
+        if type(node) is BinaryOperation:
+            return self.calls[node]
+        if type(node) is Call:
+            return not self.is_builtin(node) or any(self.makes_call(argument) for argument in node.arguments)
+        return False
+
+    def is_builtin(self, node):
+        # A call to a builtin that no declaration shadows
+        return node.identifier in BUILTINS and self.symbol_table.resolve(node.identifier)[0] is None
+
+    def call(self, node, target=None, tail=False):
+        layout = self.layout
+        if self.is_builtin(node):
+            if node.identifier not in REGISTER_BUILTINS:
+                raise Exception(f'The register VM does not support {node.identifier}()')
+            arguments = self.operands(*node.arguments)
+            for register in reversed(arguments):
+                layout.release(register)
+            destination = layout.allocate() if target is None else target
+            self.instructions.append((BUILTINS[node.identifier][0], destination) + tuple(arguments))
+            return destination
+        # Arguments are computed into consecutive registers, then the
+        # function is looked up, as the stack VM does
+        destination = target
+        if target is None and not tail:
+            destination = layout.allocate()
+        first = layout.next_temporary
+        for _ in node.arguments:
+            layout.allocate()
+        for index, argument in enumerate(node.arguments):
+            self.expression(argument, first + index)
+        function = self.variable(node.identifier)
+        if tail:
+            self.instructions.append(('TAIL_CALL', function, first, len(node.arguments)))
+        else:
+            self.instructions.append(('CALL', destination, function, first, len(node.arguments)))
+        layout.release(first)
+        return destination
+
+    def get_instructions(self):
+        return self.instructions
+
+# Example usage
+if __name__ == "__main__":
+    code = """
+    var x: Int = 10;
+    func add(a: Int, b: Int) -> Int {
+        if a > b {
+            return a;
+        }
+        return a + b * 2;
+    }
+    while x < 20 {
+        x = x + 1;
+    }
+    var y: Int = add(x, 3);
+    """
+    lexer = Lexer(code)
+    parser = Parser(lexer)
+    ast = parser.parse()
+    analyzer = SemanticAnalyzer()
+    analyzer.visit(ast)
+    generator = RegisterGenerator(analyzer.symbol_table, analyzer.scopes)
+    generator.generate(ast)
+    for index, instruction in enumerate(generator.get_instructions()):
+        print(index, instruction)
+    print(generator.frame)
@@ -0,0 +1,472 @@
+from src.opcodes import resolve_operator
+from src.runtime import (
+    MAX_CALL_DEPTH, ARRAY_TYPE, Exit, numpy, array_operand, index_operand, check_range,
+)
+
+REGISTER_OPCODE_NAMES = (
+    'MOVE',
+    'LOAD_GLOBAL',
+    'STORE_GLOBAL',
+    'BIN_OP',
+    'ADD',
+    'SUB',
+    'MUL',
+    'LT',
+    'GT',
+    'LE',
+    'GE',
+    'EQ',
+    'NE',
+    'JUMP',
+    'JUMP_IF_TRUE',
+    'JUMP_IF_FALSE',
+    'JUMP_IF_LT',
+    'JUMP_IF_GT',
+    'JUMP_IF_LE',
+    'JUMP_IF_GE',
+    'JUMP_IF_EQ',
+    'JUMP_IF_NE',
+    'JUMP_IF_NOT_LT',
+    'JUMP_IF_NOT_GT',
+    'JUMP_IF_NOT_LE',
+    'JUMP_IF_NOT_GE',
+    'JUMP_IF_NOT_EQ',
+    'JUMP_IF_NOT_NE',
+    'FUNC',
+    'CALL',
+    'TAIL_CALL',
+    'RETURN',
+    'HALT',
+    'ARRAY',
+    'INDEX',
+    'STORE_INDEX',
+    'SLICE',
+    'COPY',
+    'SUM',
+    'LENGTH',
+)
+
+REGISTER_OPCODES = {name: opcode for opcode, name in enumerate(REGISTER_OPCODE_NAMES)}
+
+(MOVE, LOAD_GLOBAL, STORE_GLOBAL, BIN_OP, ADD, SUB, MUL, LT, GT, LE, GE, EQ, NE,
+ JUMP, JUMP_IF_TRUE, JUMP_IF_FALSE, JUMP_IF_LT, JUMP_IF_GT, JUMP_IF_LE,
+ JUMP_IF_GE, JUMP_IF_EQ, JUMP_IF_NE, JUMP_IF_NOT_LT, JUMP_IF_NOT_GT,
+ JUMP_IF_NOT_LE, JUMP_IF_NOT_GE, JUMP_IF_NOT_EQ, JUMP_IF_NOT_NE, FUNC, CALL,
+ TAIL_CALL, RETURN, HALT, ARRAY, INDEX, STORE_INDEX, SLICE, COPY, SUM,
+ LENGTH) = range(len(REGISTER_OPCODE_NAMES))
+
+# BIN_OP decodes to an opcode of its own for these operators, whose handler
+# applies the operator itself. Division keeps the generic handler.
+OPERATOR_OPCODES = {'+': ADD, '-': SUB, '*': MUL, '<': LT, '>': GT, '<=': LE, '>=': GE, '==': EQ, '!=': NE}
+
+# Compare-and-branch opcodes, taken when the comparison holds (JUMP_IF) or
+# does not (JUMP_IF_NOT)
+BRANCH_OPCODES = {
+    'JUMP_IF': {'<': JUMP_IF_LT, '>': JUMP_IF_GT, '<=': JUMP_IF_LE, '>=': JUMP_IF_GE,
+                '==': JUMP_IF_EQ, '!=': JUMP_IF_NE},
+    'JUMP_IF_NOT': {'<': JUMP_IF_NOT_LT, '>': JUMP_IF_NOT_GT, '<=': JUMP_IF_NOT_LE,
+                    '>=': JUMP_IF_NOT_GE, '==': JUMP_IF_NOT_EQ, '!=': JUMP_IF_NOT_NE},
+}
+
+
+class Function:
+    # A function as the register VM sees it. entries[n] is where a call with
+    # n arguments starts, or None. template is a new frame's registers: None
+    # for the variables and temporaries, then the constants.
+    __slots__ = ('name', 'entries', 'template')
+
+    def __init__(self, name, entries, template):
+        self.name = name
+        self.entries = entries
+        self.template = template
+
+    def __repr__(self):
+        return f'<function {self.name}>'
+
+
+def frame_template(frame):
+    # Constants are addressed from the end, constants[k] at -(k + 1)
+    return [None] * (frame.variables + frame.temporaries) + list(reversed(frame.constants))
+
+
+def decode(instruction, index):
+    # Turns an instruction from the RegisterGenerator into an (opcode,
+    # operand) pair, with names and operators resolved
+    name = instruction[0]
+    arguments = instruction[1:]
+    if name == 'BIN_OP':
+        symbol, destination, left, right = arguments
+        if symbol in OPERATOR_OPCODES:
+            return (OPERATOR_OPCODES[symbol], (destination, left, right))
+        return (BIN_OP, (resolve_operator(symbol), destination, left, right))
+    if name in BRANCH_OPCODES:
+        symbol, left, right, target = arguments
+        if symbol not in BRANCH_OPCODES[name]:
+            raise RuntimeError(f'Cannot branch on operator: {symbol}')
+        return (BRANCH_OPCODES[name][symbol], (left, right, target))
+    opcode = REGISTER_OPCODES.get(name)
+    if opcode is None:
+        raise RuntimeError(f'Unknown instruction: {instruction}')
+    if opcode == FUNC:
+        destination, function_name, entries, frame, end = arguments
+        return (FUNC, (destination, Function(function_name, entries, frame_template(frame)), end))
+    if opcode == CALL:
+        # With its return address
+        return (CALL, arguments + (index + 1,))
+    if opcode == JUMP:
+        return (JUMP, arguments[0])
+    if opcode == RETURN:
+        return (RETURN, arguments[0])
+    return (opcode, arguments)
+
+
+class RegisterVM:
+    # Runs three-address code from the RegisterGenerator. Each call gets a
+    # frame: a list of registers, copied from its function's template, with
+    # the arguments moved into the first ones. The main program's frame holds
+    # the globals. There are no goroutines or parallel for loops here; the
+    # stack VM in src/runtime.py remains the reference implementation.
+    def __init__(self):
+        self.main = []
+        self.frame = None
+        # (return address, caller's registers, register for the result) per
+        # active call
+        self.frames = []
+        self.instruction_pointer = 0
+        self.instructions = []
+        self.code = []
+        self.handlers = None
+
+    @property
+    def globals(self):
+        return self.main[:self.frame.variables]
+
+    def load_program(self, instructions, frame):
+        # frame is the main program's Frame from the generator
+        self.instructions = instructions
+        self.code = [decode(instruction, index) for index, instruction in enumerate(instructions)]
+        self.frame = frame
+        self.main = frame_template(frame)
+        self.frames.clear()
+        self.instruction_pointer = 0
+        self.handlers = self.bind_handlers()
+
+    def bind_handlers(self):
+        # Each handler takes the decoded operand and returns a jump target,
+        # or None to fall through. registers is the running frame; calls and
+        # returns switch it.
+        frames = self.frames
+        global_registers = self.main
+        registers = self.main
+
+        def move(operand):
+            destination, source = operand
+            registers[destination] = registers[source]
+
+        def load_global(operand):
+            destination, slot = operand
+            registers[destination] = global_registers[slot]
+
+        def store_global(operand):
+            slot, source = operand
+            global_registers[slot] = registers[source]
+
+        def bin_op(operand):
+            function, destination, left, right = operand
+            registers[destination] = function(registers[left], registers[right])
+
+        def add(operand):
+            destination, left, right = operand
+            registers[destination] = registers[left] + registers[right]
+
+        def sub(operand):
+            destination, left, right = operand
+            registers[destination] = registers[left] - registers[right]
+
+        def mul(operand):
+            destination, left, right = operand
+            registers[destination] = registers[left] * registers[right]
+
+        def lt(operand):
+            destination, left, right = operand
+            registers[destination] = registers[left] < registers[right]
+
+        def gt(operand):
+            destination, left, right = operand
+            registers[destination] = registers[left] > registers[right]
+
+        def le(operand):
+            destination, left, right = operand
+            registers[destination] = registers[left] <= registers[right]
+
+        def ge(operand):
+            destination, left, right = operand
+            registers[destination] = registers[left] >= registers[right]
+
+        def eq(operand):
+            destination, left, right = operand
+            registers[destination] = registers[left] == registers[right]
+
+        def ne(operand):
+            destination, left, right = operand
+            registers[destination] = registers[left] != registers[right]
+
+        def jump(target):
+            return target
+
+        def jump_if_true(operand):
+            condition, target = operand
+            if registers[condition]:
+                return target
+
+        def jump_if_false(operand):
+            condition, target = operand
+            if not registers[condition]:
+                return target
+
+        def jump_if_lt(operand):
+            left, right, target = operand
+            if registers[left] < registers[right]:
+                return target
+
+        def jump_if_gt(operand):
+            left, right, target = operand
+            if registers[left] > registers[right]:
+                return target
+
+        def jump_if_le(operand):
+            left, right, target = operand
+            if registers[left] <= registers[right]:
+                return target
+
+        def jump_if_ge(operand):
+            left, right, target = operand
+            if registers[left] >= registers[right]:
+                return target
+
+        def jump_if_eq(operand):
+            left, right, target = operand
+            if registers[left] == registers[right]:
+                return target
+
+        def jump_if_ne(operand):
+            left, right, target = operand
+            if registers[left] != registers[right]:
+                return target
+
+        def jump_if_not_lt(operand):
+            left, right, target = operand
+            if not registers[left] < registers[right]:
+                return target
+
+        def jump_if_not_gt(operand):
+            left, right, target = operand
+            if not registers[left] > registers[right]:
+                return target
+
+        def jump_if_not_le(operand):
+            left, right, target = operand
+            if not registers[left] <= registers[right]:
+                return target
+
+        def jump_if_not_ge(operand):
+            left, right, target = operand
+            if not registers[left] >= registers[right]:
+                return target
+
+        def jump_if_not_eq(operand):
+            left, right, target = operand
+            if not registers[left] == registers[right]:
+                return target
+
+        def jump_if_not_ne(operand):
+            left, right, target = operand
+            if not registers[left] != registers[right]:
+                return target
+
+        def define_function(operand):
+            destination, function, end = operand
+            registers[destination] = function
+            return end
+
+        def new_frame(function, first, count):
+            # Returns (entry, frame) for a call of function with the count
+            # arguments in registers from first
+            if type(function) is not Function:
+                raise RuntimeError(f'{function!r} is not a function')
+            entries = function.entries
+            entry = entries[count] if count < len(entries) else None
+            if entry is None:
+                raise RuntimeError(f'{function.name}() takes {len(entries) - 1} arguments, got {count}')
+            frame = function.template[:]
+            if count:
+                frame[:count] = registers[first:first + count]
+            return entry, frame
+
+        def call(operand):
+            nonlocal registers
+            destination, function, first, count, return_address = operand
+            if len(frames) >= MAX_CALL_DEPTH:
+                raise RuntimeError('Maximum call depth exceeded')
+            entry, frame = new_frame(registers[function], first, count)
+            frames.append((return_address, registers, destination))
+            registers = frame
+            return entry
+
+        def tail_call(operand):
+            # The callee takes over the current frame's place, so it returns
+            # straight to our caller and the frame stack does not grow
+            nonlocal registers
+            function, first, count = operand
+            entry, registers = new_frame(registers[function], first, count)
+            return entry
+
+        def return_value(source):
+            nonlocal registers
+            if not frames:
+                raise RuntimeError('Return outside a function')
+            value = registers[source]
+            return_address, registers, destination = frames.pop()
+            registers[destination] = value
+            return return_address
+
+        def halt(operand):
+            raise Exit
+
+        def make_array(operand):
+            destination, length = operand
+            length = registers[length]
+            if numpy is None:
+                raise RuntimeError('Arrays need NumPy, which is not installed')
+            if type(length) is not int or length < 0:
+                raise RuntimeError(f'Array length must be a non-negative Int, got {length!r}')
+            registers[destination] = numpy.zeros(length, ARRAY_TYPE)
+
+        def load_index(operand):
+            destination, array, index = operand
+            array = array_operand(registers[array])
+            registers[destination] = array[index_operand(array, registers[index])].item()
+
+        def store_index(operand):
+            destination, array, index, value = operand
+            array = array_operand(registers[array])
+            value = registers[value]
+            try:
+                array[index_operand(array, registers[index])] = value
+            except (TypeError, ValueError, OverflowError):
+                raise RuntimeError(f'Cannot store {value!r} in an array of {array.dtype}') from None
+            registers[destination] = None
+
+        def slice_array(operand):
+            # A view: writes through it change the array it was taken from
+            destination, array, start, stop = operand
+            array = array_operand(registers[array])
+            start = registers[start]
+            stop = registers[stop]
+            check_range(array, start, stop)
+            registers[destination] = array[start:stop]
+
+        def copy(operand):
+            # Copies an array of the same length, or one value to every element
+            destination, array, source = operand
+            array = array_operand(registers[array])
+            try:
+                array[...] = registers[source]
+            except ValueError as error:
+                raise RuntimeError(f'Cannot copy into array: {error}') from None
+            registers[destination] = None
+
+        def sum_array(operand):
+            destination, array = operand
+            registers[destination] = array_operand(registers[array]).sum().item()
+
+        def length(operand):
+            destination, array = operand
+            registers[destination] = len(array_operand(registers[array]))
+
+        handlers = [None] * len(REGISTER_OPCODE_NAMES)
+        handlers[MOVE] = move
+        handlers[LOAD_GLOBAL] = load_global
+        handlers[STORE_GLOBAL] = store_global
+        handlers[BIN_OP] = bin_op
+        handlers[ADD] = add
+        handlers[SUB] = sub
+        handlers[MUL] = mul
+        handlers[LT] = lt
+        handlers[GT] = gt
+        handlers[LE] = le
+        handlers[GE] = ge
+        handlers[EQ] = eq
+        handlers[NE] = ne
+        handlers[JUMP] = jump
+        handlers[JUMP_IF_TRUE] = jump_if_true
+        handlers[JUMP_IF_FALSE] = jump_if_false
+        handlers[JUMP_IF_LT] = jump_if_lt
+        handlers[JUMP_IF_GT] = jump_if_gt
+        handlers[JUMP_IF_LE] = jump_if_le
+        handlers[JUMP_IF_GE] = jump_if_ge
+        handlers[JUMP_IF_EQ] = jump_if_eq
+        handlers[JUMP_IF_NE] = jump_if_ne
+        handlers[JUMP_IF_NOT_LT] = jump_if_not_lt
+        handlers[JUMP_IF_NOT_GT] = jump_if_not_gt
+        handlers[JUMP_IF_NOT_LE] = jump_if_not_le
+        handlers[JUMP_IF_NOT_GE] = jump_if_not_ge
+        handlers[JUMP_IF_NOT_EQ] = jump_if_not_eq
+        handlers[JUMP_IF_NOT_NE] = jump_if_not_ne
+        handlers[FUNC] = define_function
+        handlers[CALL] = call
+        handlers[TAIL_CALL] = tail_call
+        handlers[RETURN] = return_value
+        handlers[HALT] = halt
+        handlers[ARRAY] = make_array
+        handlers[INDEX] = load_index
+        handlers[STORE_INDEX] = store_index
+        handlers[SLICE] = slice_array
+        handlers[COPY] = copy
+        handlers[SUM] = sum_array
+        handlers[LENGTH] = length
+        return handlers
+
+    def run(self):
+        code = self.code
+        handlers = self.handlers
+        ip = self.instruction_pointer
+        try:
+            while True:
+                opcode, operand = code[ip]
+                target = handlers[opcode](operand)
+                ip = ip + 1 if target is None else target
+        except Exit:
+            pass
+        self.instruction_pointer = ip
+
+# Example usage
+if __name__ == "__main__":
+    from src.lexer import Lexer
+    from src.parser import Parser
+    from src.semantic_analyzer import SemanticAnalyzer
+    from src.register_generator import RegisterGenerator
+
+    code = """
+    func fib(n: Int) -> Int {
+        if n < 2 {
+            return n;
+        }
+        return fib(n - 1) + fib(n - 2);
+    }
+    var i: Int = 0;
+    var total: Int = 0;
+    while i < 20 {
+        total = total + fib(i);
+        i = i + 1;
+    }
+    """
+    ast = Parser(Lexer(code)).parse()
+    analyzer = SemanticAnalyzer()
+    analyzer.visit(ast)
+    generator = RegisterGenerator(analyzer.symbol_table, analyzer.scopes)
+    generator.generate(ast)
+    vm = RegisterVM()
+    vm.load_program(generator.get_instructions(), generator.frame)
+    vm.run()
+    print(vm.globals)
@@ -1,76 +1,971 @@
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from functools import reduce
+from itertools import repeat
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+from src.opcodes import (
+    OPCODE_NAMES, PUSH, STORE, LOAD, BIN_OP, JUMP_IF_FALSE, JUMP,
+    CLASS, END_CLASS, HALT, LOAD_GLOBAL, STORE_GLOBAL, LOAD_FAST, STORE_FAST,
+    UPDATE_GLOBAL, UPDATE_FAST, BIN_OP_CONST, FUNC, PARAM, STORE_DEFAULT,
+    END_FUNC, CALL, TAIL_CALL, RETURN, POP, GO, CHANNEL, SEND, RECV, CLOSE, EXIT,
+    PARALLEL, LOOP, ENTER_LOOP, ARRAY, INDEX, STORE_INDEX, SLICE, COPY, SUM,
+    LENGTH, VECTOR_GUARD, ADD_INT, SUB_INT, MUL_INT, LT_INT, GT_INT, LE_INT,
+    GE_INT, EQ_INT, NE_INT, JUMP_IF_NOT_LT, JUMP_IF_NOT_GT, JUMP_IF_NOT_LE,
+    JUMP_IF_NOT_GE, JUMP_IF_NOT_EQ, JUMP_IF_NOT_NE, BRANCH_OPCODES,
+    decode, frame_size, resolve_operator,
+)
+from src.jit import JIT_THRESHOLD, MAX_DEOPTS, compile_loop
+from src.heap import Heap, Record, array_size, channel_size, record_size
+
+# Arrays are NumPy buffers; without NumPy installed, array() raises
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+# Calls nested deeper than this raise instead of exhausting memory. Tail calls
+# reuse the caller's place and don't count.
+MAX_CALL_DEPTH = 100000
+
+# Instructions a goroutine runs before the scheduler may switch to another
+TIME_SLICE = 1000
+
+# Each parallel for iteration's result is stored as a signed 64-bit integer
+RESULT_FORMAT = 'q'
+RESULT_SIZE = 8
+
+# A parallel for loop is split into this many tasks per worker process, so
+# iterations of uneven cost still spread evenly
+TASKS_PER_WORKER = 4
+
+# Element type of arrays made by array(n)
+ARRAY_TYPE = 'int64'
+
+# Values a vectorized loop may combine with its array elements
+SCALAR_TYPES = (int, float, bool)
+
+# Range of the array element type, which NumPy wraps around on overflow
+INT64_MIN = -(1 << 63)
+INT64_MAX = (1 << 63) - 1
+
+
+class Park(Exception):
+    # Raised by a handler after queueing the current goroutine on a channel
+    pass
+
+
+class Exit(Exception):
+    # Raised when the current goroutine finishes, or the main one halts
+    pass
+
+
+class Yield(Exception):
+    # Raised by a compiled loop that used up the time slice while other
+    # goroutines are ready; the current one resumes at ip
+    def __init__(self, ip):
+        super().__init__(ip)
+        self.ip = ip
+
+
+class Goroutine:
+    # The saved state of a goroutine that is not running. The running one's
+    # operand stack and frames live in Runtime.stack and Runtime.frames.
+    __slots__ = ('ip', 'stack', 'frames', 'locals')
+
+    def __init__(self, ip, stack, frames, locals):
+        self.ip = ip
+        self.stack = stack
+        self.frames = frames
+        self.locals = locals
+
+
+class Channel:
+    # A FIFO of capacity values; capacity 0 makes every send wait for a
+    # receiver. Goroutines waiting on it are parked in receivers, or in
+    # senders with the value they are sending, and are made ready again by
+    # the operation that completes theirs.
+    __slots__ = ('capacity', 'buffer', 'receivers', 'senders', 'closed', '__weakref__')
+
+    def __init__(self, capacity=0):
+        self.capacity = capacity
+        self.buffer = deque()
+        self.receivers = deque()
+        self.senders = deque()
+        self.closed = False
+
+    def __repr__(self):
+        return f'<channel {len(self.buffer)}/{self.capacity}>'
+
+
+class Function:
+    # A function as the runtime sees it. entries[n] is where a call with n
+    # arguments starts, or None if n arguments are not enough (or too many).
+    # frame_size is the number of local slots, parameters first.
+    __slots__ = ('name', 'entries', 'frame_size')
+
+    def __init__(self, name, entries, frame_size):
+        self.name = name
+        self.entries = entries
+        self.frame_size = frame_size
+
+    def __repr__(self):
+        return f'<function {self.name}>'
+
+
+def array_operand(value):
+    if numpy is None or type(value) is not numpy.ndarray:
+        raise RuntimeError(f'{value!r} is not an array')
+    return value
+
+
+def index_operand(array, index):
+    if type(index) is not int or not 0 <= index < len(array):
+        raise RuntimeError(f'Index {index!r} out of range for array of length {len(array)}')
+    return index
+
+
+def check_range(array, start, stop):
+    # Slice bounds must lie inside the array, like an index
+    if type(start) is not int or type(stop) is not int or not 0 <= start <= stop <= len(array):
+        raise RuntimeError(f'Slice {start!r} .. {stop!r} out of range for array of length {len(array)}')
+
+
+def array_overflow(left, right):
+    # NumPy fails with OverflowError to combine an array with an Int too
+    # large for its elements; reported as storing that Int would be. None
+    # if neither operand is an array.
+    if numpy is not None:
+        for array, value in ((left, right), (right, left)):
+            if type(array) is numpy.ndarray:
+                return RuntimeError(f'Cannot store {value!r} in an array of {array.dtype}')
+    return None
+
+
+def array_result(heap, function, left, right):
+    # Applies function to left and right, at least one an array, charging
+    # heap for the array it makes: room for the largest it can be, elements
+    # of at most 8 bytes, is reserved first, and what it takes is tracked
+    # until it is freed
+    length = max(len(value) for value in (left, right) if type(value) is numpy.ndarray)
+    heap.reserve(array_size(numpy.empty(0, ARRAY_TYPE), length))
+    try:
+        result = function(left, right)
+    except OverflowError:
+        raise array_overflow(left, right) from None
+    if type(result) is numpy.ndarray:
+        heap.track(result, array_size(numpy.empty(0, result.dtype), len(result)))
+    return result
+
+
+def kernel_in_range(kernel, arrays, scalars, start, stop):
+    # Whether every step of a vectorized loop's kernel stays inside the
+    # int64 range for all i in start..stop. kernel is the value in post-
+    # order: ('get', k) reads arrays[k], ('load', k) is scalars[k], ('push',
+    # c) a constant and ('op', symbol) applies an operator. Each step is
+    # bounded from the least and greatest elements of the slices read, so a
+    # product that could wrap around sends the loop down the element-wise
+    # path, which fails on it as a store would.
+    extremes = {}
+    bounds = []
+    for kind, operand in kernel:
+        if kind == 'get':
+            if operand not in extremes:
+                elements = arrays[operand][start:stop]
+                extremes[operand] = (elements.min().item(), elements.max().item())
+            low, high = extremes[operand]
+        elif kind == 'op':
+            right_low, right_high = bounds.pop()
+            left_low, left_high = bounds.pop()
+            if operand == '+':
+                low, high = left_low + right_low, left_high + right_high
+            elif operand == '-':
+                low, high = left_low - right_high, left_high - right_low
+            else:
+                products = (left_low * right_low, left_low * right_high,
+                            left_high * right_low, left_high * right_high)
+                low, high = min(products), max(products)
+        else:
+            low = high = operand if kind == 'push' else scalars[operand]
+        # Also false for NaN
+        if not (INT64_MIN <= low and high <= INT64_MAX):
+            return False
+        bounds.append((low, high))
+    return True
+
+
+def vectorizable(arrays, scalars, start, stop, kernel=()):
+    # Whether a loop 'set(arrays[0], i, value)' for i in start..stop, where
+    # value reads the other arrays at i, gives the same result as one
+    # operation on the slices start..stop. Every index must be in range, the
+    # target may only share memory with a source that is the same view,
+    # since the loop would otherwise read elements it already wrote, and no
+    # step of the kernel may overflow the elements.
+    if numpy is None or type(start) is not int or type(stop) is not int or not 0 <= start < stop:
+        return False
+    for array in arrays:
+        if type(array) is not numpy.ndarray or array.ndim != 1 or len(array) < stop:
+            return False
+    for scalar in scalars:
+        if type(scalar) not in SCALAR_TYPES:
+            return False
+    target = arrays[0]
+    for source in arrays[1:]:
+        if numpy.may_share_memory(target, source) and (
+                source.ctypes.data != target.ctypes.data or source.strides != target.strides):
+            return False
+    return kernel_in_range(kernel, arrays, scalars, start, stop)
+
+
+def link_functions(code):
+    # Resolves, in place, what the call instructions need at run time: FUNC
+    # gets its Function and the index after its END_FUNC, CALL gets its
+    # return address. Function bodies may nest.
+    open_functions = []
+    for index, (opcode, operand) in enumerate(code):
+        if opcode == FUNC:
+            open_functions.append(index)
+        elif opcode == END_FUNC:
+            if not open_functions:
+                raise RuntimeError(f'END_FUNC without FUNC at {index}')
+            start = open_functions.pop()
+            code[start] = (FUNC, (make_function(code, start, index), index + 1))
+        elif opcode == CALL:
+            code[index] = (CALL, (operand, index + 1))
+    if open_functions:
+        raise RuntimeError(f'FUNC without END_FUNC at {open_functions[-1]}')
+
+
+def fuse_branches(code):
+    # Turns, in place, each comparison of two Ints followed by JUMP_IF_FALSE
+    # into a compare-and-branch to the jump's target, or past the jump. The
+    # JUMP_IF_FALSE stays, for any jump that lands on it.
+    for index in range(len(code) - 1):
+        opcode = code[index][0]
+        if opcode in BRANCH_OPCODES and code[index + 1][0] == JUMP_IF_FALSE:
+            code[index] = (BRANCH_OPCODES[opcode], (code[index + 1][1], index + 2))
+
+
+def make_function(code, start, end):
+    name = code[start][1]
+    index = start + 1
+    while code[index][0] == PARAM:
+        index += 1
+    count = index - start - 1
+    # Default value code follows the parameters, one run per defaulted
+    # parameter in order, each ending in STORE_DEFAULT. Nested functions
+    # only start in the body, after the last of them.
+    defaults = {}
+    section = index
+    for position in range(index, end):
+        opcode, operand = code[position]
+        if opcode == FUNC:
+            break
+        if opcode == STORE_DEFAULT:
+            defaults[operand] = section
+            section = position + 1
+    entries = [None] * (count + 1)
+    entries[count] = section
+    for argument_count in range(count - 1, -1, -1):
+        if argument_count not in defaults or entries[argument_count + 1] is None:
+            break
+        entries[argument_count] = defaults[argument_count]
+    # Slots used by this function, not counting the bodies of nested ones
+    own_code = []
+    depth = 0
+    for opcode, operand in code[start + 1:end]:
+        if opcode == FUNC:
+            depth += 1
+        elif opcode == END_FUNC:
+            depth -= 1
+        elif depth == 0:
+            own_code.append((opcode, operand))
+    size = max(count, frame_size(own_code, LOAD_FAST, STORE_FAST))
+    return Function(name, entries, size)
+
+
+# The Runtime a worker process runs parallel for bodies on, loaded once per
+# process by start_worker
+worker_runtime = None
+
+
+def start_worker(instructions, time_slice, jit):
+    global worker_runtime
+    worker_runtime = Runtime(time_slice, workers=1, jit=jit)
+    worker_runtime.load_program(instructions)
+
+
+def run_iterations(runtime, function, global_values, start, stop, results, offset=0):
+    # Stores function(i) for every i in start..stop into results from offset.
+    # Each iteration starts from global_values, so what one does to the
+    # globals cannot leak into another.
+    for index, value in enumerate(range(start, stop), offset):
+        runtime.globals[:] = global_values
+        result = runtime.call_function(function, value)
+        if not isinstance(result, int):
+            raise RuntimeError(f'parallel for body must return an Int, got {result!r}')
+        try:
+            results[index] = result
+        except ValueError:
+            raise RuntimeError(f'parallel for result {result} does not fit in 64 bits') from None
+
+
+def run_task(name, function, global_values, start, stop, offset):
+    # Runs in a worker process and writes into the shared buffer called name
+    shared = SharedMemory(name)
+    results = shared.buf.cast(RESULT_FORMAT)
+    try:
+        run_iterations(worker_runtime, function, global_values, start, stop, results, offset)
+    finally:
+        results.release()
+        shared.close()
+
+
+class WorkerPool:
+    # Processes that run the iterations of parallel for loops. Each worker
+    # loads the program into a Runtime of its own when it starts, so a task
+    # only carries the body function, a range and the globals, and results
+    # are written straight into a shared-memory buffer instead of being
+    # pickled back one by one.
+    def __init__(self, instructions, time_slice, workers, jit=False):
+        # Workers must share the parent's resource tracker, or each would
+        # start its own and report the buffers they attach to as leaked
+        resource_tracker.ensure_running()
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(workers, initializer=start_worker,
+                                            initargs=(instructions, time_slice, jit))
+
+    def map(self, function, global_values, start, stop):
+        # Returns the results for start..stop as a list
+        count = stop - start
+        shared = SharedMemory(create=True, size=count * RESULT_SIZE)
+        try:
+            tasks = min(count, self.workers * TASKS_PER_WORKER)
+            bounds = [start + count * task // tasks for task in range(tasks + 1)]
+            futures = [self.executor.submit(run_task, shared.name, function, global_values, low, high, low - start)
+                       for low, high in zip(bounds, bounds[1:])]
+            # Nothing may still be writing when the buffer goes away
+            wait(futures)
+            for future in futures:
+                future.result()
+            results = shared.buf.cast(RESULT_FORMAT)
+            try:
+                return results.tolist()
+            finally:
+                results.release()
+        finally:
+            shared.close()
+            shared.unlink()
+
+    def close(self):
+        self.executor.shutdown()
+
+
 class Runtime:
-    def __init__(self):
+    # Runs a program as goroutines multiplexed on one thread. The main program
+    # is the first goroutine; run() returns when it halts, as in Go. parallel
+    # for loops run on up to workers processes (default: one per core).
+    #
+    # With jit=True, execution is tiered: backward jumps are counted, and a
+    # loop that takes jit_threshold of them is compiled to a Python function
+    # that runs in place of the interpreter from then on (see src/jit.py).
+    #
+    # Arrays, channels and class records are counted by heap (see
+    # src/heap.py); with heap_limit, allocating past that many live bytes
+    # raises a RuntimeError.
+    def __init__(self, time_slice=TIME_SLICE, workers=None, jit=False, heap_limit=None):
         self.memory = {}
-        self.call_stack = []
+        self.heap = Heap(heap_limit)
+        self.globals = []
+        self.locals = []
+        # Operands and call frames are kept apart: frames holds a (return
+        # address, caller's locals) pair per active call
+        self.stack = []
+        self.frames = []
         self.instruction_pointer = 0
         self.instructions = []
+        self.code = []
+        self.time_slice = time_slice
+        self.ready = deque()
+        self.main = self.current = Goroutine(0, [], [], [])
+        # Where a goroutine's bottom frame returns to: the EXIT appended after
+        # the program
+        self.exit_address = 0
+        self.workers = workers or os.cpu_count() or 1
+        # Started by the first parallel for loop that can use them
+        self.pool = None
+        self.inline = None
+        self.jit = jit
+        self.jit_threshold = JIT_THRESHOLD
+        # Backward jumps taken so far by instruction index, and the compiled
+        # loops by header index
+        self.back_edges = {}
+        self.loops = {}
+        self.handlers = self.bind_handlers()
 
     def load_program(self, instructions):
         self.instructions = instructions
+        # Decode once so the dispatch loop never compares opcode or operator strings
+        self.code = [decode(instruction) for instruction in instructions]
+        link_functions(self.code)
+        fuse_branches(self.code)
+        self.back_edges.clear()
+        self.loops.clear()
+        if self.jit:
+            for index, (opcode, operand) in enumerate(self.code):
+                if opcode == JUMP and operand <= index:
+                    self.code[index] = (LOOP, (operand, index))
+        self.exit_address = len(self.code)
+        self.code.append((EXIT, None))
+        # Globals live in a fixed-size list, resized in place so bound handlers keep seeing it
+        self.globals[:] = [None] * frame_size(self.code, LOAD_GLOBAL, STORE_GLOBAL)
+
+    def reset(self):
+        # Back to the state load_program left: every global None, no
+        # goroutines, and the next run starting from the first instruction.
+        # The decoded code and any loops the jit compiled are kept, so a
+        # runtime can run its program again without loading it again.
+        self.memory.clear()
+        self.globals[:] = [None] * len(self.globals)
+        self.locals = []
+        self.stack.clear()
+        self.frames.clear()
+        self.ready.clear()
+        self.main = self.current = Goroutine(0, [], [], [])
+        self.instruction_pointer = 0
+
+    def bind_handlers(self):
+        # Each handler takes the pre-decoded operand and returns a jump target,
+        # or None to fall through to the next instruction.
+        stack = self.stack
+        frames = self.frames
+        ready = self.ready
+        memory = self.memory
+        heap = self.heap
+        allocate = heap.allocate
+        ndarray = None if numpy is None else numpy.ndarray
+        global_slots = self.globals
+        back_edges = self.back_edges
+        push = stack.append
+        pop = stack.pop
+
+        def store(identifier):
+            memory[identifier] = pop()
+
+        def load(identifier):
+            try:
+                push(memory[identifier])
+            except KeyError:
+                raise RuntimeError(f'Name "{identifier}" is not defined') from None
+
+        def store_global(slot):
+            global_slots[slot] = pop()
+
+        def load_global(slot):
+            push(global_slots[slot])
+
+        def store_fast(slot):
+            self.locals[slot] = pop()
+
+        def load_fast(slot):
+            push(self.locals[slot])
+
+        def bin_op(function):
+            right = pop()
+            left = stack[-1]
+            if type(left) is ndarray or type(right) is ndarray:
+                stack[-1] = array_result(heap, function, left, right)
+            else:
+                stack[-1] = function(left, right)
+
+        # Operators on two Ints, applied directly. The type checker never
+        # lets an array be an Int, so these make no arrays for the heap.
+        def add_int(operand):
+            right = pop()
+            stack[-1] = stack[-1] + right
+
+        def sub_int(operand):
+            right = pop()
+            stack[-1] = stack[-1] - right
+
+        def mul_int(operand):
+            right = pop()
+            stack[-1] = stack[-1] * right
+
+        def lt_int(operand):
+            right = pop()
+            stack[-1] = stack[-1] < right
+
+        def gt_int(operand):
+            right = pop()
+            stack[-1] = stack[-1] > right
+
+        def le_int(operand):
+            right = pop()
+            stack[-1] = stack[-1] <= right
+
+        def ge_int(operand):
+            right = pop()
+            stack[-1] = stack[-1] >= right
+
+        def eq_int(operand):
+            right = pop()
+            stack[-1] = stack[-1] == right
+
+        def ne_int(operand):
+            right = pop()
+            stack[-1] = stack[-1] != right
+
+        # Compare-and-branch: (target if false, index after the JUMP_IF_FALSE)
+        def jump_if_not_lt(operand):
+            right = pop()
+            return operand[1] if pop() < right else operand[0]
+
+        def jump_if_not_gt(operand):
+            right = pop()
+            return operand[1] if pop() > right else operand[0]
+
+        def jump_if_not_le(operand):
+            right = pop()
+            return operand[1] if pop() <= right else operand[0]
+
+        def jump_if_not_ge(operand):
+            right = pop()
+            return operand[1] if pop() >= right else operand[0]
+
+        def jump_if_not_eq(operand):
+            right = pop()
+            return operand[1] if pop() == right else operand[0]
+
+        def jump_if_not_ne(operand):
+            right = pop()
+            return operand[1] if pop() != right else operand[0]
+
+        def update_global(operand):
+            slot, function, constant = operand
+            value = global_slots[slot]
+            if type(value) is ndarray:
+                global_slots[slot] = array_result(heap, function, value, constant)
+            else:
+                global_slots[slot] = function(value, constant)
+
+        def update_fast(operand):
+            slot, function, constant = operand
+            frame = self.locals
+            value = frame[slot]
+            if type(value) is ndarray:
+                frame[slot] = array_result(heap, function, value, constant)
+            else:
+                frame[slot] = function(value, constant)
+
+        def bin_op_const(operand):
+            function, constant = operand
+            left = stack[-1]
+            if type(left) is ndarray:
+                stack[-1] = array_result(heap, function, left, constant)
+            else:
+                stack[-1] = function(left, constant)
+
+        def jump_if_false(target):
+            if not pop():
+                return target
+
+        def jump(target):
+            return target
+
+        def define_class(class_name):
+            record = Record()
+            memory[class_name] = allocate(record, record_size(record))
+
+        def end_class(operand):
+            pass
+
+        def halt(operand):
+            return self.exit_address
+
+        def define_function(operand):
+            function, after = operand
+            push(function)
+            return after
+
+        def no_op(operand):
+            pass
+
+        def store_default(index):
+            self.locals[index] = pop()
+
+        def new_frame(function, argument_count):
+            # A fresh frame of the function's size, with the arguments moved
+            # off the stack into the parameter slots. Returns (entry, frame).
+            if type(function) is not Function:
+                raise RuntimeError(f'{function!r} is not a function')
+            entries = function.entries
+            entry = entries[argument_count] if argument_count < len(entries) else None
+            if entry is None:
+                raise RuntimeError(f'{function.name}() takes {len(entries) - 1} arguments, got {argument_count}')
+            frame = [None] * function.frame_size
+            if argument_count:
+                frame[:argument_count] = stack[-argument_count:]
+                del stack[-argument_count:]
+            return entry, frame
+
+        def call(operand):
+            argument_count, return_address = operand
+            if len(frames) >= MAX_CALL_DEPTH:
+                raise RuntimeError('Maximum call depth exceeded')
+            frames.append((return_address, self.locals))
+            entry, self.locals = new_frame(pop(), argument_count)
+            return entry
+
+        def tail_call(argument_count):
+            # The callee takes over the current frame's place, so it returns
+            # straight to our caller and the frame stack does not grow
+            entry, self.locals = new_frame(pop(), argument_count)
+            return entry
+
+        def return_value(operand):
+            # The return value is already on top of the operand stack
+            if not frames:
+                raise RuntimeError('Return outside a function')
+            return_address, self.locals = frames.pop()
+            return return_address
+
+        def end_function(operand):
+            push(None)
+            return return_value(operand)
+
+        def discard(operand):
+            pop()
+
+        def go(argument_count):
+            # The new goroutine's bottom frame returns to EXIT
+            entry, frame = new_frame(pop(), argument_count)
+            ready.append(Goroutine(entry, [], [(self.exit_address, None)], frame))
+
+        def exit_goroutine(operand):
+            raise Exit
+
+        def make_channel(operand):
+            capacity = stack[-1]
+            if type(capacity) is not int or capacity < 0:
+                raise RuntimeError(f'Channel capacity must be a non-negative Int, got {capacity!r}')
+            channel = Channel(capacity)
+            stack[-1] = allocate(channel, channel_size(channel))
+
+        def channel_operand(channel):
+            if type(channel) is not Channel:
+                raise RuntimeError(f'{channel!r} is not a channel')
+            return channel
+
+        def send(operand):
+            value = pop()
+            channel = channel_operand(stack[-1])
+            stack[-1] = None
+            if channel.closed:
+                raise RuntimeError('Send on closed channel')
+            if channel.receivers:
+                receiver = channel.receivers.popleft()
+                receiver.stack.append(value)
+                ready.append(receiver)
+            elif len(channel.buffer) < channel.capacity:
+                channel.buffer.append(value)
+            else:
+                channel.senders.append((self.current, value))
+                raise Park
+
+        def receive(operand):
+            channel = channel_operand(stack[-1])
+            buffer = channel.buffer
+            if buffer:
+                stack[-1] = buffer.popleft()
+                if channel.senders:
+                    # Room for a waiting sender's value now
+                    sender, value = channel.senders.popleft()
+                    buffer.append(value)
+                    ready.append(sender)
+            elif channel.senders:
+                sender, stack[-1] = channel.senders.popleft()
+                ready.append(sender)
+            elif channel.closed:
+                stack[-1] = None
+            else:
+                pop()
+                channel.receivers.append(self.current)
+                raise Park
+
+        def close(operand):
+            channel = channel_operand(stack[-1])
+            stack[-1] = None
+            if channel.closed:
+                raise RuntimeError('Close of closed channel')
+            if channel.senders:
+                raise RuntimeError('Send on closed channel')
+            channel.closed = True
+            # Receivers still waiting get None
+            while channel.receivers:
+                receiver = channel.receivers.popleft()
+                receiver.stack.append(None)
+                ready.append(receiver)
+
+        def parallel(function):
+            # Stack: the reduction's current value, the body, start, stop
+            stop = pop()
+            start = pop()
+            body = pop()
+            if type(start) is not int or type(stop) is not int:
+                raise RuntimeError(f'parallel for bounds must be Ints, got {start!r} .. {stop!r}')
+            stack[-1] = reduce(function, self.parallel_map(body, start, stop), stack[-1])
+
+        def make_array(operand):
+            length = stack[-1]
+            if numpy is None:
+                raise RuntimeError('Arrays need NumPy, which is not installed')
+            if type(length) is not int or length < 0:
+                raise RuntimeError(f'Array length must be a non-negative Int, got {length!r}')
+            size = array_size(numpy.zeros(0, ARRAY_TYPE), length)
+            heap.reserve(size)
+            stack[-1] = heap.track(numpy.zeros(length, ARRAY_TYPE), size)
+
+        def load_index(operand):
+            index = pop()
+            array = array_operand(stack[-1])
+            stack[-1] = array[index_operand(array, index)].item()
+
+        def store_index(operand):
+            value = pop()
+            index = pop()
+            array = array_operand(stack[-1])
+            try:
+                array[index_operand(array, index)] = value
+            except (TypeError, ValueError, OverflowError):
+                raise RuntimeError(f'Cannot store {value!r} in an array of {array.dtype}') from None
+            stack[-1] = None
+
+        def slice_array(operand):
+            # A view: writes through it change the array it was taken from
+            stop = pop()
+            start = pop()
+            array = array_operand(stack[-1])
+            check_range(array, start, stop)
+            stack[-1] = array[start:stop]
+
+        def copy(operand):
+            # Copies an array of the same length, or one value to every element
+            source = pop()
+            destination = array_operand(stack[-1])
+            try:
+                destination[...] = source
+            except ValueError as error:
+                raise RuntimeError(f'Cannot copy into array: {error}') from None
+            except (TypeError, OverflowError):
+                raise RuntimeError(f'Cannot store {source!r} in an array of {destination.dtype}') from None
+            stack[-1] = None
+
+        def sum_array(operand):
+            stack[-1] = array_operand(stack[-1]).sum().item()
+
+        def length(operand):
+            stack[-1] = len(array_operand(stack[-1]))
+
+        def vector_guard(operand):
+            # Stack: the arrays, the scalars, then the index range
+            array_count, scalar_count, kernel = operand
+            stop = pop()
+            start = pop()
+            values = stack[len(stack) - array_count - scalar_count:]
+            del stack[len(stack) - array_count - scalar_count:]
+            push(vectorizable(values[:array_count], values[array_count:], start, stop, kernel))
+
+        def back_edge(operand):
+            target, index = operand
+            count = back_edges[index] = back_edges.get(index, 0) + 1
+            if count >= self.jit_threshold:
+                self.compile_loop(target, index)
+            return target
+
+        def enter_loop(loop):
+            target = loop.function(stack, global_slots, self.locals)
+            if target is None or target == loop.header:
+                # The type guard failed, or the loop deoptimized at its first
+                # instruction: the interpreter runs that instruction instead
+                if target is None:
+                    loop.deopts += 1
+                    if loop.deopts >= MAX_DEOPTS:
+                        self.code[loop.header] = loop.original
+                opcode, operand = loop.original
+                return handlers[opcode](operand)
+            if target < 0:
+                target = ~target
+                if ready:
+                    raise Yield(target)
+            return target
+
+        handlers = [None] * len(OPCODE_NAMES)
+        handlers[PUSH] = push
+        handlers[STORE] = store
+        handlers[LOAD] = load
+        handlers[BIN_OP] = bin_op
+        handlers[JUMP_IF_FALSE] = jump_if_false
+        handlers[JUMP] = jump
+        handlers[CLASS] = define_class
+        handlers[END_CLASS] = end_class
+        handlers[HALT] = halt
+        handlers[LOAD_GLOBAL] = load_global
+        handlers[STORE_GLOBAL] = store_global
+        handlers[LOAD_FAST] = load_fast
+        handlers[STORE_FAST] = store_fast
+        handlers[UPDATE_GLOBAL] = update_global
+        handlers[UPDATE_FAST] = update_fast
+        handlers[BIN_OP_CONST] = bin_op_const
+        handlers[FUNC] = define_function
+        handlers[PARAM] = no_op
+        handlers[STORE_DEFAULT] = store_default
+        handlers[END_FUNC] = end_function
+        handlers[CALL] = call
+        handlers[TAIL_CALL] = tail_call
+        handlers[RETURN] = return_value
+        handlers[POP] = discard
+        handlers[GO] = go
+        handlers[CHANNEL] = make_channel
+        handlers[SEND] = send
+        handlers[RECV] = receive
+        handlers[CLOSE] = close
+        handlers[EXIT] = exit_goroutine
+        handlers[PARALLEL] = parallel
+        handlers[LOOP] = back_edge
+        handlers[ENTER_LOOP] = enter_loop
+        handlers[ARRAY] = make_array
+        handlers[INDEX] = load_index
+        handlers[STORE_INDEX] = store_index
+        handlers[SLICE] = slice_array
+        handlers[COPY] = copy
+        handlers[SUM] = sum_array
+        handlers[LENGTH] = length
+        handlers[VECTOR_GUARD] = vector_guard
+        handlers[ADD_INT] = add_int
+        handlers[SUB_INT] = sub_int
+        handlers[MUL_INT] = mul_int
+        handlers[LT_INT] = lt_int
+        handlers[GT_INT] = gt_int
+        handlers[LE_INT] = le_int
+        handlers[GE_INT] = ge_int
+        handlers[EQ_INT] = eq_int
+        handlers[NE_INT] = ne_int
+        handlers[JUMP_IF_NOT_LT] = jump_if_not_lt
+        handlers[JUMP_IF_NOT_GT] = jump_if_not_gt
+        handlers[JUMP_IF_NOT_LE] = jump_if_not_le
+        handlers[JUMP_IF_NOT_GE] = jump_if_not_ge
+        handlers[JUMP_IF_NOT_EQ] = jump_if_not_eq
+        handlers[JUMP_IF_NOT_NE] = jump_if_not_ne
+        return handlers
 
     def run(self):
-        while self.instruction_pointer < len(self.instructions):
-            instruction = self.instructions[self.instruction_pointer]
-            self.execute(instruction)
-            self.instruction_pointer += 1
+        # The dispatch loop runs one time slice at a time. When it ends, the
+        # current goroutine keeps running unless another one is ready. A
+        # goroutine that blocks on a channel resumes after that instruction,
+        # where whoever wakes it has left the result.
+        code = self.code
+        handlers = self.handlers
+        ready = self.ready
+        time_slice = self.time_slice
+        ip = self.instruction_pointer
+        while True:
+            try:
+                for _ in repeat(None, time_slice):
+                    opcode, operand = code[ip]
+                    target = handlers[opcode](operand)
+                    ip = ip + 1 if target is None else target
+                if not ready:
+                    continue
+                self.suspend(ip)
+                ready.append(self.current)
+            except Park:
+                self.suspend(ip + 1)
+            except Yield as yielded:
+                self.suspend(yielded.ip)
+                ready.append(self.current)
+            except Exit:
+                if self.current is self.main:
+                    break
+            if not ready:
+                raise RuntimeError('All goroutines are asleep - deadlock')
+            ip = self.resume(ready.popleft())
+        self.instruction_pointer = ip
+
+    def suspend(self, ip):
+        current = self.current
+        current.ip = ip
+        current.stack = self.stack[:]
+        current.frames = self.frames[:]
+        current.locals = self.locals
+
+    def resume(self, goroutine):
+        # Makes goroutine the current one and returns its instruction pointer
+        self.current = goroutine
+        self.stack[:] = goroutine.stack
+        self.frames[:] = goroutine.frames
+        self.locals = goroutine.locals
+        goroutine.stack = goroutine.frames = None
+        return goroutine.ip
+
+    def compile_loop(self, header, end):
+        # Compiled or not, the loop's backward jump stops counting
+        code = self.code
+        code[end] = (JUMP, header)
+        loop = compile_loop(code, header, end, self.time_slice)
+        if loop is not None:
+            self.loops[header] = loop
+            code[header] = (ENTER_LOOP, loop)
+
+    def call_function(self, function, *arguments):
+        # Runs function to completion as the main goroutine and returns its
+        # result. Goroutines it starts are dropped when it returns, as they
+        # are when a program ends.
+        self.ready.clear()
+        self.main = self.current = Goroutine(0, [], [], [])
+        self.frames.clear()
+        self.stack[:] = arguments
+        self.stack.append(function)
+        self.instruction_pointer = self.handlers[CALL]((len(arguments), self.exit_address))
+        self.run()
+        return self.stack.pop()
+
+    def parallel_map(self, function, start, stop):
+        # Results of function(i) for i in start..stop. With one worker, or a
+        # single iteration, they are computed here on a Runtime of their own,
+        # so iterations see the same copies of the globals either way.
+        # Channels only work within one process and are not passed on.
+        count = stop - start
+        if count <= 0:
+            return []
+        global_values = [None if type(value) is Channel else value for value in self.globals]
+        if self.workers == 1 or count == 1:
+            if self.inline is None:
+                self.inline = Runtime(self.time_slice, workers=1, jit=self.jit)
+                self.inline.load_program(self.instructions)
+            results = memoryview(bytearray(count * RESULT_SIZE)).cast(RESULT_FORMAT)
+            run_iterations(self.inline, function, global_values, start, stop, results)
+            return results.tolist()
+        if self.pool is None:
+            self.pool = WorkerPool(self.instructions, self.time_slice, self.workers, self.jit)
+        return self.pool.map(function, global_values, start, stop)
+
+    def close(self):
+        # Stops the worker processes, if any were started
+        if self.pool is not None:
+            self.pool.close()
+            self.pool = None
 
     def execute(self, instruction):
-        op = instruction[0]
-        if op == 'PUSH':
-            value = instruction[1]
-            self.call_stack.append(value)
-        elif op == 'STORE':
-            identifier = instruction[1]
-            value = self.call_stack.pop()
-            self.memory[identifier] = value
-        elif op == 'LOAD':
-            identifier = instruction[1]
-            value = self.memory.get(identifier, None)
-            self.call_stack.append(value)
-        elif op == 'BIN_OP':
-            self.handle_bin_op(instruction[1])
-        elif op == 'JUMP_IF_FALSE':
-            condition = self.call_stack.pop()
-            if not condition:
-                self.instruction_pointer = instruction[1] - 1  # -1 because the instruction pointer will be incremented after this call
-        elif op == 'JUMP':
-            self.instruction_pointer = instruction[1] - 1  # -1 because the instruction pointer will be incremented after this call
-        elif op == 'CLASS':
-            class_name = instruction[1]
-            self.memory[class_name] = {}
-        elif op == 'END_CLASS':
-            pass
-        elif op == 'HALT':
-            return
-        else:
-            raise RuntimeError(f'Unknown instruction: {instruction}')
+        # A single instruction on its own; calls are only linked by load_program
+        opcode, operand = decode(instruction)
+        target = self.handlers[opcode](operand)
+        self.instruction_pointer = self.instruction_pointer + 1 if target is None else target
 
     def handle_bin_op(self, operator):
-        right = self.call_stack.pop()
-        left = self.call_stack.pop()
-        if operator == '+':
-            result = left + right
-        elif operator == '-':
-            result = left - right
-        elif operator == '*':
-            result = left * right
-        elif operator == '/':
-            result = left / right
-        elif operator == '>':
-            result = left > right
-        elif operator == '<':
-            result = left < right
-        elif operator == '>=':
-            result = left >= right
-        elif operator == '<=':
-            result = left <= right
-        elif operator == '==':
-            result = left == right
-        elif operator == '!=':
-            result = left != right
-        else:
-            raise RuntimeError(f'Unknown binary operator: {operator}')
-        self.call_stack.append(result)
+        self.handlers[BIN_OP](resolve_operator(operator))
 
 # Example usage
 if __name__ == "__main__":
@@ -80,7 +975,7 @@ if __name__ == "__main__":
         ('LOAD', 'x'),
         ('PUSH', 20),
         ('BIN_OP', '<'),
-        ('JUMP_IF_FALSE', 8),
+        ('JUMP_IF_FALSE', 11),
         ('LOAD', 'x'),
         ('PUSH', 1),
         ('BIN_OP', '+'),
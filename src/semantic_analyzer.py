@@ -0,0 +1,283 @@
+from collections import namedtuple
+
+from src.ast_nodes import BinaryOperation
+from src.opcodes import BUILTINS, REDUCTIONS
+
+# The symbol of a declared function: its return type and parameter types
+FunctionType = namedtuple('FunctionType', ('result', 'parameters'))
+
+# Types the analyzer knows the values of. Expressions of any other declared
+# type, and those whose type depends on values at run time, are None and
+# may be used anywhere.
+TYPES = {'Int', 'Chan', 'Array', 'Func'}
+
+# Builtin signatures, None where any value is accepted or returned
+BUILTIN_TYPES = {
+    'chan': FunctionType('Chan', ('Int',)),
+    'send': FunctionType(None, ('Chan', None)),
+    'recv': FunctionType(None, ('Chan',)),
+    'close': FunctionType(None, ('Chan',)),
+    'array': FunctionType('Array', ('Int',)),
+    'get': FunctionType('Int', ('Array', 'Int')),
+    'set': FunctionType(None, ('Array', 'Int', None)),
+    'slice': FunctionType('Array', ('Array', 'Int', 'Int')),
+    'copy': FunctionType(None, ('Array', None)),
+    'sum': FunctionType('Int', ('Array',)),
+    'len': FunctionType('Int', ('Array',)),
+}
+
+# Types each operator can be applied to; == and != compare anything
+ARITHMETIC_OPERANDS = {'Int', 'Array'}
+EQUALITY = {'==', '!='}
+
+
+def known(type_name):
+    return type_name if type_name in TYPES else None
+
+
+def symbol_type(symbol):
+    # The type of the value a name holds
+    return 'Func' if type(symbol) is FunctionType else known(symbol)
+
+
+class SymbolTable:
+    def __init__(self, parent=None):
+        self.symbols = {}
+        self.slots = {}
+        self.parent = parent
+
+    def define(self, name, symbol):
+        self.symbols[name] = symbol
+        if name not in self.slots:
+            self.slots[name] = len(self.slots)
+
+    def lookup(self, name):
+        symbol = self.symbols.get(name)
+        if symbol is None and self.parent is not None:
+            return self.parent.lookup(name)
+        return symbol
+
+    def resolve(self, name):
+        # Returns the table that owns name and its slot there, or (None, None)
+        table = self
+        while table is not None:
+            if name in table.slots:
+                return table, table.slots[name]
+            table = table.parent
+        return None, None
+
+class SemanticAnalyzer:
+    def __init__(self):
+        self.symbol_table = SymbolTable()
+        self.scopes = {}
+        # The type of every expression other than a literal, where known
+        self.types = {}
+        # What a return in the code being analyzed must return
+        self.return_type = None
+        self.visitors = {}
+        # Scope of the innermost parallel for body being analyzed
+        self.parallel = None
+
+    def visit(self, node):
+        # Look the visitor up once per node class rather than once per node
+        visitor = self.visitors.get(type(node))
+        if visitor is None:
+            method_name = 'visit_' + type(node).__name__
+            visitor = self.visitors[type(node)] = getattr(self, method_name, self.generic_visit)
+        return visitor(node)
+
+    def generic_visit(self, node):
+        raise Exception(f'No visit_{type(node).__name__} method')
+
+    def visit_Program(self, node):
+        for statement in node.statements:
+            self.visit(statement)
+
+    def check_type(self, expected, actual, description):
+        # Only values of a known type can be told apart
+        if known(expected) is not None and actual is not None and actual != expected:
+            raise Exception(f'Cannot use {actual} as {expected} {description}')
+
+    def visit_VariableDeclaration(self, node):
+        if node.identifier in self.symbol_table.symbols:
+            raise Exception(f'Variable "{node.identifier}" already declared')
+        self.check_type(node.var_type, self.visit(node.value), f'variable "{node.identifier}"')
+        self.symbol_table.define(node.identifier, node.var_type)
+
+    def visit_FunctionDeclaration(self, node):
+        if self.symbol_table.lookup(node.identifier):
+            raise Exception(f'Function "{node.identifier}" already declared')
+        parameters = tuple(param[1] for param in node.parameters)
+        self.symbol_table.define(node.identifier, FunctionType(node.return_type, parameters))
+        # Parameters and locals get their own slots in the function's frame
+        enclosing, return_type = self.symbol_table, self.return_type
+        self.symbol_table = self.scopes[node] = SymbolTable(parent=enclosing)
+        self.return_type = node.return_type
+        try:
+            for param in node.parameters:
+                if param[2] is not None:
+                    self.check_type(param[1], self.visit(param[2]), f'default of parameter "{param[0]}"')
+                self.symbol_table.define(param[0], param[1])
+            for statement in node.body:
+                self.visit(statement)
+        finally:
+            self.symbol_table, self.return_type = enclosing, return_type
+
+    def visit_IfStatement(self, node):
+        self.visit(node.condition)
+        for statement in node.then_block:
+            self.visit(statement)
+        for statement in node.else_block or []:
+            self.visit(statement)
+
+    def visit_WhileStatement(self, node):
+        self.visit(node.condition)
+        for statement in node.body:
+            self.visit(statement)
+
+    def visit_ParallelFor(self, node):
+        self.check_type('Int', self.visit(node.start), 'parallel for bound')
+        self.check_type('Int', self.visit(node.stop), 'parallel for bound')
+        if node.operator not in REDUCTIONS:
+            raise Exception(f'Cannot reduce with "{node.operator}", expected one of {", ".join(REDUCTIONS)}')
+        if not self.symbol_table.lookup(node.target):
+            raise Exception(f'Variable "{node.target}" not declared')
+        self.check_parallel_access(node.target, True)
+        # The body is compiled as a function of the loop variable
+        enclosing, parallel, return_type = self.symbol_table, self.parallel, self.return_type
+        self.symbol_table = self.parallel = self.scopes[node] = SymbolTable(parent=enclosing)
+        self.return_type = 'Int'
+        try:
+            self.symbol_table.define(node.variable, 'Int')
+            for statement in node.body:
+                self.visit(statement)
+        finally:
+            self.symbol_table, self.parallel, self.return_type = enclosing, parallel, return_type
+
+    def check_parallel_access(self, name, assigned=False):
+        # Iterations of a parallel for loop run in other processes, on copies
+        # of the globals taken when the loop starts. So inside its body only
+        # the body's own variables can be assigned, and only globals can be
+        # read from outside it.
+        if self.parallel is None:
+            return
+        table = self.symbol_table
+        inside = True
+        while table is not None and name not in table.symbols:
+            if table is self.parallel:
+                inside = False
+            table = table.parent
+        if inside or table is None:
+            return
+        if assigned:
+            raise Exception(f'Cannot assign "{name}" inside a parallel for body')
+        if table.parent is not None:
+            raise Exception(f'Cannot use local "{name}" of the enclosing function inside a parallel for body')
+
+    def check_enclosing_access(self, name):
+        # A call's frame only holds the function's own variables, and nested
+        # functions are not closures: they can use their own names and
+        # globals, but not the locals of the function around them
+        table = self.symbol_table
+        while table is not None and name not in table.symbols:
+            table = table.parent
+        if table is None or table is self.symbol_table or table.parent is None:
+            return
+        raise Exception(f'Cannot use local "{name}" of the enclosing function inside a nested function')
+
+    def visit_Identifier(self, node):
+        symbol = self.symbol_table.lookup(node.name)
+        if not symbol:
+            raise Exception(f'Variable "{node.name}" not declared')
+        self.check_parallel_access(node.name)
+        self.check_enclosing_access(node.name)
+        result = self.types[node] = symbol_type(symbol)
+        return result
+
+    def visit_Integer(self, node):
+        return 'Int'
+
+    def visit_Assignment(self, node):
+        symbol = self.symbol_table.lookup(node.identifier)
+        if not symbol:
+            raise Exception(f'Variable "{node.identifier}" not declared')
+        self.check_parallel_access(node.identifier, True)
+        self.check_enclosing_access(node.identifier)
+        self.check_type(symbol_type(symbol), self.visit(node.value), f'variable "{node.identifier}"')
+
+    def visit_BinaryOperation(self, node):
+        # Walk operator chains with an explicit stack; a long machine-generated
+        # expression nests deeper than the recursion limit allows. Operations
+        # wait on the stack as 1-tuples for the types of their operands.
+        pending = [node]
+        operand_types = []
+        while pending:
+            node = pending.pop()
+            if type(node) is BinaryOperation:
+                pending.append((node,))
+                pending.append(node.right)
+                pending.append(node.left)
+            elif type(node) is tuple:
+                right = operand_types.pop()
+                left = operand_types.pop()
+                operand_types.append(self.operation_type(node[0], left, right))
+            else:
+                operand_types.append(self.visit(node))
+        return operand_types[0]
+
+    def operation_type(self, node, left, right):
+        # Arithmetic and ordering on Ints give an Int, except division, which
+        # gives a float; on an Array and an Int or Array they work element by
+        # element. Anything else known is an error.
+        operator = node.operator
+        if left == 'Array' or right == 'Array':
+            result = 'Array'
+        elif left == 'Int' and right == 'Int':
+            result = None if operator == '/' else 'Int'
+        elif operator in EQUALITY:
+            result = 'Int'
+        else:
+            result = None
+        if operator not in EQUALITY or result == 'Array':
+            for operand in (left, right):
+                if operand is not None and operand not in ARITHMETIC_OPERANDS:
+                    raise Exception(f'Operator "{operator}" cannot be applied to {left or "a value"} and {right or "a value"}')
+        self.types[node] = result
+        return result
+
+    def visit_ReturnStatement(self, node):
+        if self.symbol_table.parent is None:
+            raise Exception('"return" outside a function')
+        if node.value is not None:
+            self.check_type(self.return_type, self.visit(node.value), 'return value')
+
+    def visit_ExpressionStatement(self, node):
+        self.visit(node.expression)
+
+    def visit_GoStatement(self, node):
+        if node.call.identifier in BUILTINS and not self.symbol_table.lookup(node.call.identifier):
+            raise Exception(f'Cannot start a goroutine on builtin "{node.call.identifier}"')
+        self.visit(node.call)
+
+    def visit_Call(self, node):
+        symbol = self.symbol_table.lookup(node.identifier)
+        if not symbol:
+            if node.identifier not in BUILTINS:
+                raise Exception(f'Function "{node.identifier}" not declared')
+            expected = BUILTINS[node.identifier][1]
+            if len(node.arguments) != expected:
+                raise Exception(f'{node.identifier}() takes {expected} arguments, got {len(node.arguments)}')
+            symbol = BUILTIN_TYPES[node.identifier]
+        else:
+            self.check_parallel_access(node.identifier)
+            self.check_enclosing_access(node.identifier)
+            if type(symbol) is not FunctionType and known(symbol) not in (None, 'Func'):
+                raise Exception(f'"{node.identifier}" is declared {symbol}, not a function')
+        # Only a declared function's signature is known, not a Func variable's
+        parameters = symbol.parameters if type(symbol) is FunctionType else ()
+        for index, argument in enumerate(node.arguments):
+            argument_type = self.visit(argument)
+            if index < len(parameters):
+                self.check_type(parameters[index], argument_type, f'argument {index + 1} of {node.identifier}()')
+        result = self.types[node] = known(symbol.result) if type(symbol) is FunctionType else None
+        return result
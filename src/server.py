@@ -0,0 +1,188 @@
+import os
+import json
+import threading
+import socketserver
+from collections import OrderedDict
+
+from src import __version__
+from src.bytecode import Bytecode
+from src.cache import BytecodeCache
+from src.embedding import Program, RuntimePool, compile_program
+from src.client import DEFAULT_SOCKET, request
+
+# A daemon that keeps the compiler imported and compiled programs in memory,
+# and compiles and runs files for clients connecting over a Unix socket (see
+# src/client.py). A client's latency is then its own interpreter's startup
+# plus the run, instead of the imports and the whole compile pipeline.
+#
+# Programs are cached by the hash of their contents and options, like the
+# bytecode cache on disk, which is consulted and written on a miss so the
+# daemon and plain cli.py runs share it. Each cached program keeps a
+# RuntimePool per jit setting, so a repeated run reuses a loaded runtime and
+# the loops the jit compiled in earlier runs.
+
+
+class CachedProgram:
+    def __init__(self, program):
+        self.program = program
+        self.pools = {}
+
+
+class CompileServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path=DEFAULT_SOCKET, cache_size=64, pool_size=2, workers=1, cache_dir=None, use_disk_cache=True):
+        self.path = path
+        self.cache_size = cache_size
+        self.pool_size = pool_size
+        self.workers = workers
+        self.cache = BytecodeCache(cache_dir)
+        self.use_disk_cache = use_disk_cache
+        self.programs = OrderedDict()  # key -> CachedProgram, least recently used first
+        self.lock = threading.Lock()
+        self.stopping = False
+        self.stats = {'requests': 0, 'runs': 0, 'errors': 0, 'memory_hits': 0, 'disk_hits': 0, 'compiles': 0}
+        # Only the owner may connect, since clients name files for the daemon to run
+        umask = os.umask(0o077)
+        try:
+            super().__init__(path, RequestHandler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def dispatch(self, message):
+        command = message.get('command')
+        self.count('requests')
+        if command == 'run':
+            cached = self.cached_program(message['path'], message.get('optimize', 1))
+            self.pool(cached, bool(message.get('jit'))).run()
+            self.count('runs')
+            return {'ok': True}
+        if command == 'compile':
+            cached = self.cached_program(message['path'], message.get('optimize', 1))
+            return {'ok': True, 'instructions': len(cached.program.instructions)}
+        if command == 'ping':
+            return {'ok': True, 'pid': os.getpid(), 'version': __version__}
+        if command == 'stats':
+            with self.lock:
+                return {'ok': True, 'cached_programs': len(self.programs), **self.stats}
+        if command == 'shutdown':
+            # Stopped once the reply is sent (see RequestHandler)
+            self.stopping = True
+            return {'ok': True}
+        raise ValueError(f'Unknown command: {command!r}')
+
+    def count(self, name):
+        with self.lock:
+            self.stats[name] += 1
+
+    def cached_program(self, path, optimize):
+        with open(path, 'rb') as file:
+            source = file.read()
+        bytecode = path.endswith('.fbc')
+        key = self.cache.key(source, 'fbc' if bytecode else optimize)
+        with self.lock:
+            cached = self.programs.get(key)
+            if cached is not None:
+                self.programs.move_to_end(key)
+                self.stats['memory_hits'] += 1
+                return cached
+        # Compiled outside the lock; two clients racing on a new file both
+        # compile it and the second result wins, which is harmless
+        cached = CachedProgram(self.compile(key, source, bytecode, optimize))
+        with self.lock:
+            self.programs[key] = cached
+            evicted = []
+            while len(self.programs) > self.cache_size:
+                evicted.append(self.programs.popitem(last=False)[1])
+        for program in evicted:
+            for pool in program.pools.values():
+                pool.close()
+        return cached
+
+    def compile(self, key, source, bytecode, optimize):
+        if bytecode:
+            return Program.from_instructions(Bytecode.deserialize(source).to_instructions(), optimize)
+        if self.use_disk_cache:
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.count('disk_hits')
+                return Program.from_instructions(cached.to_instructions(), optimize)
+        program = compile_program(source.decode('utf-8'), optimize=optimize)
+        self.count('compiles')
+        if self.use_disk_cache:
+            try:
+                self.cache.put(key, program.instructions)
+            except OSError:
+                pass  # A read-only or full cache directory must not stop the program from running
+        return program
+
+    def pool(self, cached, jit):
+        with self.lock:
+            pool = cached.pools.get(jit)
+            if pool is None:
+                pool = cached.pools[jit] = RuntimePool(cached.program, self.pool_size, workers=self.workers, jit=jit)
+            return pool
+
+    def close_pools(self):
+        with self.lock:
+            programs = list(self.programs.values())
+            self.programs.clear()
+        for program in programs:
+            for pool in program.pools.values():
+                pool.close()
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        try:
+            response = self.server.dispatch(json.loads(self.rfile.readline()))
+        except Exception as error:
+            # Compile and runtime errors go back to the client, which reports them
+            self.server.count('errors')
+            response = {'ok': False, 'error': str(error), 'error_type': type(error).__name__}
+        self.wfile.write(json.dumps(response).encode('utf-8') + b'\n')
+        if self.server.stopping:
+            # Waits for serve_forever, which runs on another thread, to return
+            self.server.shutdown()
+
+
+def serve(path=DEFAULT_SOCKET, **options):
+    # Serves until a client sends shutdown. A socket file left behind by a
+    # daemon that was killed is replaced; one that still answers is not.
+    if os.path.exists(path):
+        try:
+            request({'command': 'ping'}, path, timeout=1)
+        except OSError:
+            os.unlink(path)
+        else:
+            raise RuntimeError(f'A FusionLang daemon is already listening on {path}')
+    server = CompileServer(path, **options)
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        server.close_pools()
+
+# Example usage
+if __name__ == "__main__":
+    import tempfile
+    directory = tempfile.mkdtemp()
+    source = os.path.join(directory, 'example.fusion')
+    with open(source, 'w') as file:
+        file.write('var x: Int = 0;\nwhile x < 10 {\n    x = x + 1;\n}\n')
+    server = CompileServer(os.path.join(directory, 'fusion.sock'), use_disk_cache=False)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.start()
+    for _ in range(3):
+        print(request({'command': 'run', 'path': source}, server.path))
+    print(request({'command': 'stats'}, server.path))
+    request({'command': 'shutdown'}, server.path)
+    thread.join()
+    server.server_close()
@@ -0,0 +1,93 @@
+import unittest
+from src.lexer import Lexer
+from src.parser import Parser
+from src.ast_nodes import (
+    ASTNode, Arena, Program, VariableDeclaration, FunctionDeclaration, IfStatement,
+    WhileStatement, BinaryOperation, Identifier, Integer, NODE_TYPES,
+)
+
+CODE = """
+var x: Int = 10;
+func add(a: Int, b: Int = 3) -> Int {
+    var result: Int = a;
+}
+if x {
+    var y: Int = 1;
+} else {
+    var z: Int = x;
+}
+while x {
+    var w: Int = 2;
+}
+parallel for i in 0 .. x reduce(+: x) {
+    return i * 2;
+}
+"""
+
+def dump(node):
+    # Plain nested structure for comparing trees
+    if isinstance(node, Integer):
+        return ('Integer', int(node))
+    if isinstance(node, ASTNode):
+        return (type(node).__name__,) + tuple(dump(getattr(node, field)) for field in type(node).__slots__)
+    if isinstance(node, (list, tuple)):
+        return [dump(item) for item in node]
+    return node
+
+class TestASTNodes(unittest.TestCase):
+    def test_nodes_have_no_instance_dict(self):
+        for node_type in NODE_TYPES:
+            if node_type is not None:
+                self.assertFalse(hasattr(node_type.__new__(node_type), '__dict__'))
+
+    def test_integer_is_its_value(self):
+        self.assertEqual(Integer(10), 10)
+        self.assertEqual(Integer(10).value, 10)
+        self.assertEqual(hash(Integer(10)), hash(10))
+
+    def test_parser_builds_expression_nodes(self):
+        ast = Parser(Lexer(CODE)).parse()
+        self.assertIsInstance(ast.statements[0].value, Integer)
+        self.assertIsInstance(ast.statements[2].condition, Identifier)
+        self.assertEqual(ast.statements[2].condition.name, 'x')
+
+class TestArena(unittest.TestCase):
+    def test_parser_arena_matches_tree(self):
+        tree = Parser(Lexer(CODE)).parse()
+        arena = Arena()
+        root = Parser(Lexer(CODE), arena=arena).parse()
+        self.assertEqual(root, len(arena) - 1)
+        self.assertEqual(dump(arena.to_tree(root)), dump(tree))
+
+    def test_from_tree_round_trip(self):
+        tree = Program([
+            VariableDeclaration('x', 'Int', BinaryOperation(Integer(1), '+', Identifier('y'))),
+            FunctionDeclaration('f', [('a', 'Int', Integer(2))], 'Int', []),
+            IfStatement(Identifier('x'), [], None),
+            WhileStatement(Identifier('x'), []),
+        ])
+        arena = Arena()
+        root = arena.from_tree(tree)
+        self.assertEqual(dump(arena.to_tree(root)), dump(tree))
+
+    def test_deep_expression_round_trip(self):
+        # Far deeper than the recursion limit: 1 + 1 + ... nests to the left
+        code = 'var x: Int = ' + ' + '.join(['1'] * 50000) + ';'
+        tree = Parser(Lexer(code)).parse()
+        arena = Arena()
+        root = arena.from_tree(tree)
+        self.assertEqual(len(arena), 2 * 50000 + 1)
+        copy = Arena()
+        self.assertEqual(copy.from_tree(arena.to_tree(root)), root)
+        for column in ('kinds', 'text', 'aux', 'first', 'second', 'third', 'links'):
+            self.assertEqual(getattr(copy, column), getattr(arena, column))
+
+    def test_walk_is_pre_order(self):
+        tree = Program([VariableDeclaration('x', 'Int', BinaryOperation(Integer(1), '+', Identifier('y')))])
+        arena = Arena()
+        root = arena.from_tree(tree)
+        kinds = [NODE_TYPES[arena.kinds[node_id]] for node_id in arena.walk(root)]
+        self.assertEqual(kinds, [Program, VariableDeclaration, BinaryOperation, Integer, Identifier])
+
+if __name__ == '__main__':
+    unittest.main()
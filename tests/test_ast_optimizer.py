@@ -0,0 +1,296 @@
+import os
+import tempfile
+import unittest
+from src.ast_optimizer import AstOptimizer, CostModel
+from src.build import build
+from src.cli import analyze_source, compile_source, main
+from src.code_generator import CodeGenerator
+from src.embedding import compile_program
+from src.runtime import Runtime, Function, numpy
+
+
+def optimize(code, cost_model=None):
+    ast, analyzer = analyze_source(code)
+    optimizer = AstOptimizer(analyzer.symbol_table, analyzer.scopes, analyzer.types, cost_model)
+    optimizer.optimize(ast)
+    generator = CodeGenerator(analyzer.symbol_table, analyzer.scopes, analyzer.types)
+    generator.generate(ast)
+    return generator.get_instructions(), optimizer
+
+
+def outputs(code, ast_optimize=True):
+    # The globals a program ends with by name, arrays as lists, or the error
+    # it raises; functions left out, since those inlined are removed
+    try:
+        results = compile_program(code, optimize=2, ast_optimize=ast_optimize).run()
+    except Exception as error:
+        return (type(error), str(error))
+    return {name: value.tolist() if numpy is not None and type(value) is numpy.ndarray else value
+            for name, value in results.items() if value is not None and type(value) is not Function}
+
+
+def loop_body(instructions):
+    # The instructions of the first loop, from its start to the jump back
+    for index, instruction in enumerate(instructions):
+        if instruction[0] == 'JUMP' and instruction[1] < index:
+            return instructions[instruction[1]:index]
+
+
+class TestAstOptimizer(unittest.TestCase):
+    def assertSameResults(self, code):
+        self.assertEqual(outputs(code), outputs(code, ast_optimize=False))
+
+    def test_inlining(self):
+        code = """
+        var calls: Int = 0;
+        func square(x: Int) -> Int {
+            return x * x;
+        }
+        func scaled(x: Int, y: Int) -> Int {
+            return x * 3 + y;
+        }
+        func next() -> Int {
+            calls = calls + 1;
+            return calls;
+        }
+        func fact(n: Int) -> Int {
+            if n < 2 {
+                return 1;
+            }
+            return n * fact(n - 1);
+        }
+        var a: Int = square(7) + scaled(square(2), 1);
+        var b: Int = scaled(next(), next());
+        var c: Int = square(next());
+        var d: Int = fact(5);
+        """
+        instructions, optimizer = optimize(code)
+        # Not the call whose argument would be evaluated twice, nor functions
+        # with more to them than an expression
+        self.assertEqual(optimizer.inlined_calls, 4)
+        # next() three times, square once, and fact() twice
+        self.assertEqual(len([instruction for instruction in instructions if instruction[0] == 'CALL']), 6)
+        self.assertEqual(outputs(code), {'calls': 3, 'a': 62, 'b': 5, 'c': 9, 'd': 120})
+        self.assertSameResults(code)
+        # Nor functions called through a variable, shadowed or reassigned
+        code = """
+        func twice(x: Int) -> Int {
+            return x * 2;
+        }
+        func half(x: Int) -> Int {
+            return x / 2;
+        }
+        func apply(twice: Func) -> Int {
+            return twice(4);
+        }
+        var f: Func = twice;
+        var g: Func = half;
+        half = twice;
+        var a: Int = apply(g) + f(3) + half(5);
+        """
+        self.assertEqual(optimize(code)[1].inlined_calls, 0)
+        self.assertSameResults(code)
+
+    def test_loop_invariants(self):
+        code = """
+        func area(w: Int, h: Int, n: Int) -> Int {
+            var total: Int = 0;
+            var i: Int = 0;
+            while i < n * 2 {
+                total = total + (w * h + 1) + i * (w - h);
+                if i > w + h {
+                    total = total - (w * h + 1);
+                }
+                i = i + 1;
+            }
+            return total;
+        }
+        var result: Int = area(3, 4, 10);
+        """
+        instructions, optimizer = optimize(code)
+        # n * 2, w * h + 1 once for both uses, w - h and w + h
+        self.assertEqual(optimizer.hoisted_expressions, 4)
+        # The loop no longer reads w, h or n
+        loop = loop_body(instructions)
+        for slot in range(3):
+            self.assertNotIn(('LOAD_FAST', slot), loop)
+        self.assertEqual(outputs(code), {'result': -86})
+        self.assertSameResults(code)
+
+    def test_globals(self):
+        # A global may be changed by any function the loop calls, or by a
+        # goroutine, so only loops that call nothing keep it fixed
+        code = """
+        var scale: Int = 2;
+        var total: Int = 0;
+        var i: Int = 0;
+        func grow() -> Int {
+            scale = scale + 1;
+            return 0;
+        }
+        while i < 5 {
+            total = total + scale * 10;
+            i = i + 1;
+        }
+        var j: Int = 0;
+        while j < 5 {
+            total = total + scale * 10 + grow();
+            j = j + 1;
+        }
+        """
+        _, optimizer = optimize(code)
+        self.assertEqual(optimizer.hoisted_expressions, 1)
+        self.assertEqual(outputs(code)['total'], 100 + 200)
+        self.assertSameResults(code)
+        _, optimizer = optimize(code + 'go grow();')
+        self.assertEqual(optimizer.hoisted_expressions, 0)
+
+    def test_nothing_that_can_fail_moves(self):
+        code = """
+        func f(a: Int, b: Int, n: Int) -> Int {
+            var x: Int = 0;
+            var i: Int = 0;
+            while i < n {
+                x = x + a / b;
+                i = i + 1;
+            }
+            return x;
+        }
+        var ran: Int = f(1, 0, 0);
+        var flag: Int = 0;
+        if flag {
+            var late: Int = 3;
+        }
+        var later: Int = 0;
+        while flag {
+            later = late * 2 + 1;
+        }
+        """
+        _, optimizer = optimize(code)
+        # Neither the division nor what reads a variable that may not be set
+        self.assertEqual(optimizer.hoisted_expressions, 0)
+        self.assertEqual(outputs(code), {'ran': 0, 'flag': 0, 'later': 0})
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_strength_reduction(self):
+        code = """
+        func fill(n: Int, stride: Int) -> Int {
+            var a: Array = array(n * 4 + 1);
+            var total: Int = 0;
+            var i: Int = 0;
+            while i < n {
+                set(a, i * 4 + 1, i * stride);
+                total = total + get(a, i * 4 + 1) + i * stride - i * stride / 2;
+                i = i + 1;
+            }
+            var j: Int = n;
+            while j > 0 {
+                total = total + (j * 3 - 1);
+                j = j - 2;
+            }
+            return total;
+        }
+        var result: Int = fill(10, 5);
+        """
+        instructions, optimizer = optimize(code)
+        # i * 4 + 1 twice and j * 3 - 1 advance by constants, i * stride,
+        # used three times, by stride
+        self.assertEqual(optimizer.reduced_multiplications, 3)
+        self.assertSameResults(code)
+        # Used twice, a product by a variable costs as much to keep up as to
+        # compute
+        _, optimizer = optimize(code.replace(' - i * stride / 2', ''))
+        self.assertEqual(optimizer.reduced_multiplications, 2)
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_counters(self):
+        # Counters assigned twice, in a branch, or by a changing step are not
+        # reduced; nor are loops the code generator vectorizes
+        code = """
+        func f(n: Int, c: Array, a: Array) -> Int {
+            var total: Int = 0;
+            var i: Int = 0;
+            var step: Int = 1;
+            while i < n {
+                total = total + (i * 4 + 1) + (i * 4 + 1);
+                i = i + step;
+                step = step + 1;
+            }
+            var j: Int = 0;
+            while j < n {
+                total = total + (j * 4 + 1);
+                if total > 10 {
+                    j = j + 1;
+                }
+                j = j + 1;
+            }
+            var k: Int = 0;
+            while k < n {
+                set(c, k, get(a, k) * 3 + n * 2);
+                k = k + 1;
+            }
+            return total;
+        }
+        var c: Array = array(8);
+        var result: Int = f(8, c, c);
+        """
+        _, optimizer = optimize(code)
+        self.assertEqual((optimizer.reduced_multiplications, optimizer.hoisted_expressions), (0, 0))
+        self.assertSameResults(code)
+
+    def test_cost_model(self):
+        code = """
+        func big(a: Int, b: Int) -> Int {
+            return a * b + a * 2 + b * 3;
+        }
+        var x: Int = big(1, 2);
+        """
+        self.assertEqual(optimize(code)[1].inlined_calls, 1)
+        self.assertEqual(optimize(code, CostModel(inline_limit=8))[1].inlined_calls, 0)
+        model = CostModel()
+        ast, analyzer = analyze_source('var i: Int = 1; var a: Int = i * 4 + 1; var b: Int = i * i;')
+        cheap, costly = ast.statements[1].value, ast.statements[2].value
+        # LOAD, BIN_OP_CONST, BIN_OP_CONST against LOAD, LOAD, BIN_OP_INT
+        self.assertEqual((model.cost(cheap), model.cost(costly)), (3, 3))
+        self.assertTrue(model.reduce(cheap, 1, True))
+        self.assertFalse(model.reduce(cheap, 1, False))
+
+    def test_disabled(self):
+        code = """
+        func inc(x: Int) -> Int {
+            return x + 1;
+        }
+        var x: Int = inc(1);
+        """
+        self.assertIn(('CALL', 1), compile_source(code, 2, ast_optimize=False))
+        self.assertNotIn(('CALL', 1), compile_source(code, 2))
+        self.assertIn(('CALL', 1), compile_source(code, 1))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'inc.fusion')
+            with open(path, 'w') as file:
+                file.write(code)
+            cache = os.path.join(directory, 'cache')
+            main(['-O2', '--cache-dir', cache, path])
+            main(['-O2', '--no-ast-opt', '--cache-dir', cache, path])
+            # Each setting compiles to a cache entry of its own
+            self.assertEqual(len(os.listdir(cache)), 2)
+
+    def test_linked_modules(self):
+        # Hoisted values of one module must not share slots with the next
+        # module's globals
+        with tempfile.TemporaryDirectory() as directory:
+            with open(os.path.join(directory, 'a.fusion'), 'w') as file:
+                file.write('var n: Int = 3;\nvar t: Int = 0;\nvar i: Int = 0;\n'
+                           'while i < 4 {\n    t = t + n * n;\n    i = i + 1;\n}\n')
+            with open(os.path.join(directory, 'b.fusion'), 'w') as file:
+                file.write('var u: Int = 7;\n')
+            program, errors = build(directory, 2, jobs=1)
+        self.assertEqual(errors, [])
+        runtime = Runtime()
+        runtime.load_program(program.instructions)
+        runtime.run()
+        self.assertEqual(runtime.globals[program.symbols['a.t'][1]], 36)
+        self.assertEqual(runtime.globals[program.symbols['b.u'][1]], 7)
+
+if __name__ == '__main__':
+    unittest.main()
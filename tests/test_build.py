@@ -0,0 +1,76 @@
+import os
+import shutil
+import tempfile
+import unittest
+from src.build import Module, build, find_sources, link
+from src.runtime import Runtime
+
+SOURCES = {
+    'a.fusion': "var x: Int = 10;\nwhile x < 20 {\n    x = x + 1;\n}\n",
+    os.path.join('lib', 'b.fusion'): "var y: Int = 3;\nvar z: Int = y * 2;\nif z > 5 {\n    z = 0;\n} else {\n    z = 1;\n}\n",
+    os.path.join('lib', 'c.fusion'): "var y: Int = 7;\n",
+}
+
+class TestBuild(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        for path, code in SOURCES.items():
+            os.makedirs(os.path.dirname(os.path.join(self.directory, path)), exist_ok=True)
+            with open(os.path.join(self.directory, path), 'w') as file:
+                file.write(code)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def run_program(self, program):
+        runtime = Runtime()
+        runtime.load_program(program.instructions)
+        runtime.run()
+        return runtime
+
+    def test_find_sources(self):
+        with open(os.path.join(self.directory, 'notes.txt'), 'w') as file:
+            file.write('not a script')
+        sources = [os.path.relpath(path, self.directory) for path in find_sources(self.directory)]
+        self.assertEqual(sources, sorted(SOURCES))
+
+    def test_link_relocates_jumps_and_globals(self):
+        first = Module('first', 'first.fusion', [('PUSH', 1), ('JUMP_IF_FALSE', 3), ('STORE_GLOBAL', 0), ('HALT',)],
+                       {'a': ('Int', 0)})
+        second = Module('second', 'second.fusion', [('LOAD_GLOBAL', 0), ('JUMP', 2), ('HALT',)], {'b': ('Int', 0)})
+        program = link([first, second])
+        self.assertEqual(program.instructions, [
+            ('PUSH', 1), ('JUMP_IF_FALSE', 3), ('STORE_GLOBAL', 0), ('JUMP', 4),
+            ('LOAD_GLOBAL', 1), ('JUMP', 6), ('HALT',),
+        ])
+        self.assertEqual(program.symbols, {'first.a': ('Int', 0), 'second.b': ('Int', 1)})
+        self.assertEqual(program.modules, {'first': 0, 'second': 4})
+
+    def test_build_and_run(self):
+        program, errors = build(self.directory, jobs=1)
+        self.assertEqual(errors, [])
+        runtime = self.run_program(program)
+        symbols = program.symbols
+        # Each module has its own y
+        self.assertEqual(runtime.globals[symbols['a.x'][1]], 20)
+        self.assertEqual(runtime.globals[symbols['lib.b.y'][1]], 3)
+        self.assertEqual(runtime.globals[symbols['lib.b.z'][1]], 0)
+        self.assertEqual(runtime.globals[symbols['lib.c.y'][1]], 7)
+
+    def test_parallel_build_matches_serial(self):
+        serial, _ = build(self.directory, jobs=1)
+        parallel, errors = build(self.directory, jobs=2)
+        self.assertEqual(errors, [])
+        self.assertEqual(parallel.instructions, serial.instructions)
+        self.assertEqual(parallel.symbols, serial.symbols)
+
+    def test_errors_are_collected(self):
+        with open(os.path.join(self.directory, 'broken.fusion'), 'w') as file:
+            file.write("var a: Int = b;\n")
+        program, errors = build(self.directory, jobs=2)
+        self.assertIsNone(program)
+        self.assertEqual(len(errors), 1)
+        self.assertIn('broken.fusion', errors[0])
+
+if __name__ == '__main__':
+    unittest.main()
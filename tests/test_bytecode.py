@@ -0,0 +1,98 @@
+import os
+import unittest
+import tempfile
+from src.bytecode import Bytecode, dump, load
+from src.cache import BytecodeCache
+from src.runtime import Runtime
+
+INSTRUCTIONS = [
+    ('PUSH', 10),
+    ('STORE', 'x'),
+    ('LOAD', 'x'),
+    ('PUSH', 20),
+    ('BIN_OP', '<'),
+    ('JUMP_IF_FALSE', 11),
+    ('LOAD', 'x'),
+    ('PUSH', -1),
+    ('BIN_OP', '-'),
+    ('STORE', 'x'),
+    ('JUMP', 2),
+    ('PUSH', 2 ** 80),
+    ('PUSH', 'done'),
+    ('PUSH', 1.5),
+    ('PUSH', True),
+    ('PUSH', None),
+    ('HALT',)
+]
+
+class TestBytecode(unittest.TestCase):
+    def test_round_trip(self):
+        bytecode = Bytecode.from_instructions(INSTRUCTIONS)
+        restored = Bytecode.deserialize(bytecode.serialize())
+        self.assertEqual(restored.to_instructions(), INSTRUCTIONS)
+
+    def test_constant_and_name_pools_are_shared(self):
+        bytecode = Bytecode.from_instructions([('PUSH', 1), ('PUSH', 1), ('PUSH', True), ('STORE', 'x'), ('LOAD', 'x')])
+        self.assertEqual(bytecode.constants, [1, True])
+        self.assertEqual(bytecode.names, ['x'])
+
+    def test_dump_and_load(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'program.fbc')
+            dump(Bytecode.from_instructions(INSTRUCTIONS), path)
+            runtime = Runtime()
+            runtime.load_program(load(path).to_instructions())
+            runtime.run()
+            self.assertEqual(runtime.memory['x'], 20)
+
+    def test_superinstruction_operands(self):
+        instructions = [('UPDATE_GLOBAL', (0, '+', 1)), ('UPDATE_GLOBAL', (0, '+', True)), ('BIN_OP_CONST', ('<', 20)), ('BIN_OP_INT', '<=')]
+        restored = Bytecode.deserialize(Bytecode.from_instructions(instructions).serialize())
+        self.assertEqual(restored.to_instructions(), instructions)
+        self.assertIs(restored.to_instructions()[1][1][2], True)
+
+    def test_function_instructions(self):
+        instructions = [
+            ('FUNC', 'f'), ('PARAM', 'a'), ('PARAM', 'b'), ('PUSH', 1), ('STORE_DEFAULT', 1),
+            ('LOAD_FAST', 0), ('LOAD_FAST', 1), ('BIN_OP', '+'), ('RETURN',), ('END_FUNC',), ('STORE_GLOBAL', 0),
+            ('PUSH', 2), ('LOAD_GLOBAL', 0), ('CALL', 1), ('STORE_GLOBAL', 1), ('HALT',)
+        ]
+        restored = Bytecode.deserialize(Bytecode.from_instructions(instructions).serialize()).to_instructions()
+        self.assertEqual(restored, instructions)
+        runtime = Runtime()
+        runtime.load_program(restored)
+        runtime.run()
+        self.assertEqual(runtime.globals[1], 3)
+
+    def test_bad_magic(self):
+        with self.assertRaises(ValueError):
+            Bytecode.deserialize(b'NOPE' + bytes(16))
+
+    def test_unknown_instruction(self):
+        with self.assertRaises(RuntimeError):
+            Bytecode.from_instructions([('NOPE',)])
+
+class TestBytecodeCache(unittest.TestCase):
+    def test_cache_hit_and_miss(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = BytecodeCache(directory)
+            key = cache.key("var x: Int = 10;")
+            self.assertIsNone(cache.get(key))
+            cache.put(key, INSTRUCTIONS)
+            self.assertEqual(cache.get(key).to_instructions(), INSTRUCTIONS)
+
+    def test_key_depends_on_source_and_options(self):
+        cache = BytecodeCache('unused')
+        self.assertNotEqual(cache.key("var x: Int = 1;"), cache.key("var x: Int = 2;"))
+        self.assertNotEqual(cache.key("var x: Int = 1;", 0), cache.key("var x: Int = 1;", 2))
+
+    def test_corrupt_entry_is_a_miss(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = BytecodeCache(directory)
+            key = cache.key("var x: Int = 10;")
+            with open(cache.path(key), 'wb') as file:
+                file.write(b'garbage')
+            self.assertIsNone(cache.get(key))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -41,12 +41,183 @@ class TestCodeGenerator(unittest.TestCase):
             ('FUNC', 'add'),
             ('PARAM', 'a'),
             ('PARAM', 'b'),
-            ('PUSH', 0),
+            ('LOAD', 'a'),
+            ('LOAD', 'b'),
+            ('BIN_OP', '+'),
             ('STORE', 'result'),
+            ('LOAD', 'result'),
+            ('RETURN',),
+            ('END_FUNC',),
+            ('STORE', 'add'),
+            ('HALT',)
+        ]
+        self.assertEqual(instructions, expected_instructions)
+
+    def test_generate_slot_resolved_variables(self):
+        code = """
+        var x: Int = 10;
+        var y: Int = x;
+        func f(a: Int) -> Int {
+            var b: Int = x;
+            var c: Int = a;
+        }
+        """
+        lexer = Lexer(code)
+        parser = Parser(lexer)
+        ast = parser.parse()
+        analyzer = SemanticAnalyzer()
+        analyzer.visit(ast)
+        generator = CodeGenerator(analyzer.symbol_table, analyzer.scopes)
+        generator.generate(ast)
+        instructions = generator.get_instructions()
+        expected_instructions = [
+            ('PUSH', 10),
+            ('STORE_GLOBAL', 0),
+            ('LOAD_GLOBAL', 0),
+            ('STORE_GLOBAL', 1),
+            ('FUNC', 'f'),
+            ('PARAM', 'a'),
+            ('LOAD_GLOBAL', 0),
+            ('STORE_FAST', 1),
+            ('LOAD_FAST', 0),
+            ('STORE_FAST', 2),
+            ('END_FUNC',),
+            ('STORE_GLOBAL', 2),
+            ('HALT',)
+        ]
+        self.assertEqual(instructions, expected_instructions)
+
+    def test_generate_calls(self):
+        code = """
+        func f(a: Int, b: Int = 2) -> Int {
+            return f(a - 1);
+        }
+        f(1, 2);
+        """
+        lexer = Lexer(code)
+        parser = Parser(lexer)
+        ast = parser.parse()
+        analyzer = SemanticAnalyzer()
+        analyzer.visit(ast)
+        generator = CodeGenerator(analyzer.symbol_table, analyzer.scopes)
+        generator.generate(ast)
+        instructions = generator.get_instructions()
+        expected_instructions = [
+            ('FUNC', 'f'),
+            ('PARAM', 'a'),
+            ('PARAM', 'b'),
+            ('PUSH', 2),
+            ('STORE_DEFAULT', 1),
+            ('LOAD_FAST', 0),
+            ('PUSH', 1),
+            ('BIN_OP', '-'),
+            ('LOAD_GLOBAL', 0),
+            ('TAIL_CALL', 1),
             ('END_FUNC',),
+            ('STORE_GLOBAL', 0),
+            ('PUSH', 1),
+            ('PUSH', 2),
+            ('LOAD_GLOBAL', 0),
+            ('CALL', 2),
+            ('POP',),
+            ('HALT',)
+        ]
+        self.assertEqual(instructions, expected_instructions)
+
+    def test_generate_vectorized_loop(self):
+        code = """
+        var a: Array = array(4);
+        var i: Int = 0;
+        while i < 4 {
+            set(a, i, get(a, i) * 2);
+            i = i + 1;
+        }
+        """
+        lexer = Lexer(code)
+        parser = Parser(lexer)
+        ast = parser.parse()
+        analyzer = SemanticAnalyzer()
+        analyzer.visit(ast)
+        generator = CodeGenerator(analyzer.symbol_table, analyzer.scopes)
+        generator.generate(ast)
+        instructions = generator.get_instructions()
+        expected_instructions = [
+            ('PUSH', 4),
+            ('ARRAY',),
+            ('STORE_GLOBAL', 0),
+            ('PUSH', 0),
+            ('STORE_GLOBAL', 1),
+            # Guard, then copy(slice(a, i, 4), slice(a, i, 4) * 2) and i = 4
+            ('LOAD_GLOBAL', 0),
+            ('LOAD_GLOBAL', 1),
+            ('PUSH', 4),
+            ('VECTOR_GUARD', (1, 0, (('get', 0), ('push', 2), ('op', '*')))),
+            ('JUMP_IF_FALSE', 25),
+            ('LOAD_GLOBAL', 0),
+            ('LOAD_GLOBAL', 1),
+            ('PUSH', 4),
+            ('SLICE',),
+            ('LOAD_GLOBAL', 0),
+            ('LOAD_GLOBAL', 1),
+            ('PUSH', 4),
+            ('SLICE',),
+            ('PUSH', 2),
+            ('BIN_OP', '*'),
+            ('COPY',),
+            ('POP',),
+            ('PUSH', 4),
+            ('STORE_GLOBAL', 1),
+            ('JUMP', 43),
+            # The loop as written, for when the guard fails
+            ('LOAD_GLOBAL', 1),
+            ('PUSH', 4),
+            ('BIN_OP', '<'),
+            ('JUMP_IF_FALSE', 43),
+            ('LOAD_GLOBAL', 0),
+            ('LOAD_GLOBAL', 1),
+            ('LOAD_GLOBAL', 0),
+            ('LOAD_GLOBAL', 1),
+            ('INDEX',),
+            ('PUSH', 2),
+            ('BIN_OP', '*'),
+            ('STORE_INDEX',),
+            ('POP',),
+            ('LOAD_GLOBAL', 1),
+            ('PUSH', 1),
+            ('BIN_OP', '+'),
+            ('STORE_GLOBAL', 1),
+            ('JUMP', 25),
             ('HALT',)
         ]
         self.assertEqual(instructions, expected_instructions)
 
+    def test_generate_int_operations(self):
+        code = """
+        var x: Int = 10;
+        var c: Chan = chan(0);
+        func f(a: Int) -> Int {
+            return a * 2 + a / 3;
+        }
+        var same: Int = c == c;
+        var less: Int = x < f(x);
+        """
+        lexer = Lexer(code)
+        parser = Parser(lexer)
+        ast = parser.parse()
+        analyzer = SemanticAnalyzer()
+        analyzer.visit(ast)
+        generator = CodeGenerator(analyzer.symbol_table, analyzer.scopes, analyzer.types)
+        generator.generate(ast)
+        instructions = generator.get_instructions()
+        # Division stays generic, as do operators on anything but two Ints
+        operators = [instruction for instruction in instructions if instruction[0].startswith('BIN_OP')]
+        self.assertEqual(operators, [
+            ('BIN_OP_INT', '*'),
+            ('BIN_OP', '/'),
+            ('BIN_OP', '+'),
+            ('BIN_OP', '=='),
+            ('BIN_OP_INT', '<'),
+        ])
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,204 @@
+import io
+import os
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+from src.cli import analyze_source, compile_source, main
+from src.code_generator import CodeGenerator
+from src.dead_code import DeadCodeEliminator
+from src.runtime import Runtime, Function
+
+
+def eliminate(code):
+    ast, analyzer = analyze_source(code)
+    eliminator = DeadCodeEliminator(analyzer.symbol_table, analyzer.scopes, analyzer.types)
+    eliminator.eliminate(ast)
+    generator = CodeGenerator(analyzer.symbol_table, analyzer.scopes, analyzer.types)
+    generator.generate(ast)
+    return generator.get_instructions(), eliminator
+
+
+def results(code, optimize):
+    # The globals a program ends with, leaving out functions and the empty
+    # slots of those removed
+    runtime = Runtime()
+    runtime.load_program(compile_source(code, optimize))
+    runtime.run()
+    return [value for value in runtime.globals if value is not None and type(value) is not Function]
+
+
+def unoptimized_size(code):
+    ast, analyzer = analyze_source(code)
+    generator = CodeGenerator(analyzer.symbol_table, analyzer.scopes, analyzer.types)
+    generator.generate(ast)
+    return len(generator.get_instructions())
+
+
+class TestDeadCode(unittest.TestCase):
+    def test_unused_functions(self):
+        code = """
+        func leaf(n: Int) -> Int {
+            return n + 1;
+        }
+        func used(n: Int) -> Int {
+            return leaf(n) * 2;
+        }
+        func helper(n: Int) -> Int {
+            return n - 1;
+        }
+        func unused(n: Int) -> Int {
+            return helper(unused(n));
+        }
+        func worker(c: Chan) -> Int {
+            send(c, 1);
+        }
+        var c: Chan = chan(1);
+        go worker(c);
+        var x: Int = used(4);
+        """
+        instructions, eliminator = eliminate(code)
+        self.assertEqual(eliminator.removed_functions, ['helper', 'unused'])
+        functions = [operand for op, *operand in instructions if op == 'FUNC']
+        self.assertEqual(functions, [['leaf'], ['used'], ['worker']])
+        self.assertEqual(len(instructions) + eliminator.removed_instructions, unoptimized_size(code))
+        self.assertEqual(repr(results(code, 2)), repr(results(code, 1)))
+
+    def test_dead_stores(self):
+        code = """
+        var calls: Int = 0;
+        func count() -> Int {
+            calls = calls + 1;
+            return calls;
+        }
+        func f(a: Int, b: Int) -> Int {
+            var unused: Int = a * b + 3;
+            var called: Int = count();
+            var failing: Int = a / b;
+            a = a + 1;
+            a = b * 2;
+            return a;
+        }
+        var result: Int = f(1, 2);
+        """
+        instructions, eliminator = eliminate(code)
+        # The pure value goes with its store, the call and the division stay
+        self.assertEqual(eliminator.removed_stores, 4)
+        stores = [operand for op, operand in
+                  (instruction + (None,) if len(instruction) == 1 else instruction for instruction in instructions)
+                  if op == 'STORE_FAST']
+        self.assertEqual(stores, [0])
+        self.assertIn(('CALL', 0), instructions)
+        self.assertIn(('BIN_OP', '/'), instructions)
+        self.assertEqual(results(code, 2), [1, 4])
+        with self.assertRaises(ZeroDivisionError):
+            results(code.replace('f(1, 2)', 'f(1, 0)'), 2)
+
+    def test_loops_and_branches(self):
+        code = """
+        func f(n: Int) -> Int {
+            var previous: Int = 0;
+            var current: Int = 1;
+            var i: Int = 0;
+            var scratch: Int = 0;
+            while i < n {
+                var next: Int = previous + current;
+                previous = current;
+                current = next;
+                scratch = i * 2;
+                i = i + 1;
+            }
+            var flag: Int = 0;
+            if n > 5 {
+                flag = 1;
+            } else {
+                flag = 2;
+                scratch = 7;
+            }
+            if flag == 1 {
+                return current;
+                current = 0;
+            }
+            return previous;
+        }
+        var a: Int = f(10);
+        var b: Int = f(3);
+        """
+        instructions, eliminator = eliminate(code)
+        # scratch three times, flag's initial value, which both branches
+        # replace, and the store after the return
+        self.assertEqual((eliminator.removed_stores, eliminator.removed_statements), (4, 1))
+        self.assertEqual(results(code, 2), [89, 2])
+        self.assertEqual(results(code, 2), results(code, 1))
+
+    def test_unassigned_reads_are_kept(self):
+        # Reading a variable assigned only in a branch not taken fails, so a
+        # store of it is not dead
+        code = """
+        func f(c: Int) -> Int {
+            if c > 0 {
+                var x: Int = 1;
+            }
+            var y: Int = x + 1;
+            return 5;
+        }
+        var r: Int = f(%d);
+        """
+        for optimize in (0, 2):
+            with self.assertRaises(TypeError):
+                results(code % 0, optimize)
+        self.assertEqual(results(code % 1, 2), [5])
+        # y goes, but x + 1 is still evaluated, so x stays live
+        instructions, eliminator = eliminate(code % 0)
+        self.assertEqual(eliminator.removed_stores, 1)
+        self.assertIn(('BIN_OP_INT', '+'), instructions)
+
+    def test_globals_are_kept(self):
+        code = """
+        var written: Int = 1;
+        var read: Int = written + 1;
+        written = 5;
+        func f(x: Int) -> Int {
+            return x;
+        }
+        var result: Int = 2;
+        """
+        instructions, eliminator = eliminate(code)
+        self.assertEqual(eliminator.removed_functions, ['f'])
+        self.assertEqual(eliminator.unused_globals, ['read', 'result'])
+        self.assertEqual(results(code, 2), [5, 2, 2])
+        self.assertIn('globals never read (kept as results): read, result', eliminator.report(len(instructions)))
+
+    def test_parallel_for(self):
+        code = """
+        func square(n: Int) -> Int {
+            var unused: Int = n + 1;
+            return n * n;
+        }
+        var total: Int = 0;
+        parallel for i in 0 .. 10 reduce(+: total) {
+            var dead: Int = i * 3;
+            return square(i);
+        }
+        """
+        runtime = Runtime(workers=1)
+        runtime.load_program(compile_source(code, 2))
+        runtime.run()
+        self.assertEqual(runtime.globals[1], 285)
+        self.assertEqual(eliminate(code)[1].removed_stores, 2)
+
+    def test_report(self):
+        code = 'func unused() -> Int {\n    return 1;\n}\nvar x: Int = 1;\n'
+        with tempfile.NamedTemporaryFile('w', suffix='.fusion', delete=False) as file:
+            file.write(code)
+        try:
+            stderr = io.StringIO()
+            with redirect_stderr(stderr):
+                main(['-O2', '--dead-code-report', file.name])
+            self.assertIn('1 unused function: unused', stderr.getvalue())
+            with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+                main(['--dead-code-report', file.name])
+        finally:
+            os.unlink(file.name)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,130 @@
+import threading
+import unittest
+from src.embedding import Program, RuntimePool, compile_program
+from src.cli import compile_source
+from src.runtime import Runtime
+
+SQUARES = """
+var total: Int = 0;
+var i: Int = 0;
+while i < n {
+    total = total + i * i * scale;
+    i = i + 1;
+}
+"""
+
+
+def squares(n, scale):
+    return sum(i * i * scale for i in range(n))
+
+
+class TestEmbedding(unittest.TestCase):
+    def test_program(self):
+        program = compile_program(SQUARES, inputs={'n': 'Int', 'scale': 'Int'})
+        self.assertIsInstance(program, Program)
+        self.assertEqual(program.inputs, ('n', 'scale'))
+        self.assertEqual(program.symbols['n'], ('Int', 0))
+        self.assertEqual(program.run(n=10, scale=2), {'n': 10, 'scale': 2, 'total': squares(10, 2), 'i': 10})
+        self.assertEqual(program.run(n=5, scale=1)['total'], squares(5, 1))
+
+    def test_program_is_immutable(self):
+        program = compile_program(SQUARES, inputs={'n': 'Int', 'scale': 'Int'})
+        with self.assertRaises(AttributeError):
+            program.instructions = ()
+        with self.assertRaises(TypeError):
+            program.symbols['total'] = ('Int', 5)
+        with self.assertRaises(TypeError):
+            program.instructions[0] = ('HALT',)
+        # Runtimes get instructions of their own, which the jit may rewrite
+        runtime = program.new_runtime(jit=True)
+        self.assertIsNot(runtime.instructions, program.instructions)
+
+    def test_inputs_are_checked(self):
+        program = compile_program(SQUARES, inputs={'n': 'Int', 'scale': 'Int'})
+        for inputs in ({'n': 1}, {'n': 1, 'scale': 1, 'extra': 2}, {'n': 1.5, 'scale': 1}):
+            with self.assertRaises(TypeError):
+                program.run(**inputs)
+        # Inputs are declared, so the program may not declare them again
+        with self.assertRaises(Exception):
+            compile_program('var n: Int = 1;', inputs={'n': 'Int'})
+        # An input the code never uses still has a slot
+        unused = compile_program('var x: Int = 1;', inputs={'ignored': 'Int'})
+        self.assertEqual(unused.run(ignored=3), {'ignored': 3, 'x': 1})
+
+    def test_reset(self):
+        code = """
+        func worker(out: Chan) -> Int {
+            send(out, 7);
+        }
+        var out: Chan = chan(0);
+        go worker(out);
+        go worker(out);
+        var first: Int = recv(out);
+        var i: Int = 0;
+        while i < 100 {
+            i = i + 1;
+        }
+        """
+        runtime = Runtime(jit=True)
+        runtime.jit_threshold = 2
+        runtime.load_program(compile_source(code))
+        runtime.run()
+        # The second worker is left waiting to send
+        self.assertEqual(len(runtime.globals[1].senders), 1)
+        expected = runtime.globals[1:]
+        loops = dict(runtime.loops)
+        for _ in range(3):
+            runtime.reset()
+            self.assertEqual(runtime.globals, [None] * len(runtime.globals))
+            self.assertEqual((runtime.instruction_pointer, runtime.stack, runtime.frames), (0, [], []))
+            runtime.run()
+            self.assertEqual(runtime.globals[2:], expected[1:])
+        # Compiled loops are kept
+        self.assertEqual(runtime.loops, loops)
+
+    def test_reset_after_error(self):
+        program = compile_program("""
+        func divide(a: Int, b: Int) -> Int {
+            return a / b;
+        }
+        var result: Int = divide(12, d);
+        """, inputs={'d': 'Int'})
+        with RuntimePool(program, size=1) as pool:
+            with self.assertRaises(ZeroDivisionError):
+                pool.run(d=0)
+            self.assertEqual(pool.run(d=4)['result'], 3)
+            self.assertEqual(pool.created, 1)
+
+    def test_pool_from_threads(self):
+        program = compile_program(SQUARES, inputs={'n': 'Int', 'scale': 'Int'})
+        errors = []
+
+        def serve(worker, pool):
+            try:
+                for request in range(40):
+                    n = (worker * 7 + request) % 50
+                    outputs = pool.run(n=n, scale=worker)
+                    if outputs['total'] != squares(n, worker):
+                        errors.append((worker, n, outputs))
+            except Exception as error:
+                errors.append(error)
+
+        for jit in (False, True):
+            with RuntimePool(program, size=3, jit=jit) as pool:
+                threads = [threading.Thread(target=serve, args=(worker, pool)) for worker in range(8)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+                self.assertEqual(errors, [])
+                self.assertLessEqual(pool.created, 3)
+                self.assertEqual(pool.idle.qsize(), pool.created)
+
+    def test_closed_pool(self):
+        pool = RuntimePool(compile_program('var x: Int = 1;'))
+        pool.close()
+        with self.assertRaises(RuntimeError):
+            pool.run()
+
+if __name__ == '__main__':
+    unittest.main()
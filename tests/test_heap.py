@@ -0,0 +1,181 @@
+import gc
+import io
+import os
+import sys
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+from src.cli import compile_source, main
+from src.embedding import RuntimePool, compile_program
+from src.heap import Heap, Record, parse_size
+from src.runtime import Runtime, numpy
+
+# Each worker is left waiting to send on a channel that only it, and the
+# channel's queue of senders, refer to once c is reassigned: cyclic garbage
+PARKED = """
+func worker(c: Chan, done: Chan) -> Int {
+    send(done, 1);
+    send(c, 1);
+}
+var done: Chan = chan(0);
+var c: Chan = chan(0);
+var i: Int = 0;
+while i < 10 {
+    c = chan(0);
+    go worker(c, done);
+    i = i + recv(done);
+}
+"""
+
+
+class TestHeap(unittest.TestCase):
+    def run_code(self, code, **options):
+        runtime = Runtime(**options)
+        runtime.load_program(compile_source(code))
+        runtime.run()
+        return runtime
+
+    def test_accounting(self):
+        heap = Heap()
+        records = [heap.allocate(Record(), 100) for _ in range(3)]
+        self.assertEqual((heap.live_objects, heap.live_bytes, heap.allocations), (3, 300, 3))
+        records.pop()
+        self.assertEqual((heap.live_objects, heap.live_bytes, heap.peak_bytes), (2, 200, 300))
+        del records
+        self.assertEqual(heap.stats()['live_bytes'], 0)
+        self.assertEqual(heap.stats()['allocated_bytes'], 300)
+        self.assertEqual([parse_size(text) for text in ('512', '4K', '64M', '1g', '2MB')],
+                         [512, 4096, 64 << 20, 1 << 30, 2 << 20])
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_arrays(self):
+        runtime = self.run_code("""
+        var a: Array = array(1000);
+        var view: Array = slice(a, 0, 10);
+        var i: Int = 0;
+        while i < 20 {
+            a = array(1000);
+            i = i + 1;
+        }
+        """)
+        stats = runtime.heap.stats()
+        # The first array lives on through its view; the last is a
+        self.assertEqual((stats['live_objects'], stats['allocations']), (2, 21))
+        self.assertEqual(stats['live_bytes'], 2 * sys.getsizeof(runtime.globals[0]))
+        self.assertGreaterEqual(stats['peak_bytes'], stats['live_bytes'])
+        runtime.reset()
+        self.assertEqual(runtime.heap.live_objects, 0)
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_limit(self):
+        code = 'var a: Array = array(%d);\nvar b: Array = array(%d);'
+        runtime = self.run_code(code % (100, 100), heap_limit=4096)
+        self.assertEqual(runtime.heap.live_objects, 2)
+        with self.assertRaises(RuntimeError):
+            self.run_code(code % (100, 1000), heap_limit=4096)
+        # The limit is checked before the array is made
+        runtime = Runtime(heap_limit=1 << 20)
+        runtime.load_program(compile_source('var a: Array = array(1000000000000);'))
+        with self.assertRaises(RuntimeError):
+            runtime.run()
+        self.assertEqual(runtime.heap.allocations, 0)
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_array_arithmetic(self):
+        # Element-wise results are arrays the program allocates too
+        code = """
+        var a: Array = array(1000);
+        var b: Array = a + 1;
+        var c: Array = b * 2;
+        var d: Array = c < 5;
+        var e: Array = 3 - slice(c, 0, 10);
+        """
+        for optimize in (0, 2):
+            runtime = Runtime()
+            runtime.load_program(compile_source(code, optimize))
+            runtime.run()
+            stats = runtime.heap.stats()
+            self.assertEqual((stats['live_objects'], stats['allocations']), (5, 5))
+            self.assertEqual(stats['live_bytes'], sum(map(sys.getsizeof, runtime.globals)))
+
+        # Rebinding keeps the previous array alive until the new one is
+        # made, so each iteration needs room for two
+        code = """
+        var keep: Array = array(1000);
+        var i: Int = 0;
+        while i < 100 {
+            keep = keep + 1;
+            i = i + 1;
+        }
+        """
+        with tempfile.NamedTemporaryFile('w', suffix='.fusion', delete=False) as file:
+            file.write(code)
+        try:
+            for optimize in ('-O0', '-O2'):
+                stderr = io.StringIO()
+                with redirect_stderr(stderr):
+                    main([optimize, '--no-cache', '--heap-limit', '20000', '--heap-stats', file.name])
+                self.assertIn('heap: 1 live objects', stderr.getvalue())
+                with self.assertRaisesRegex(RuntimeError, 'Heap limit of 9000 bytes exceeded'):
+                    main([optimize, '--no-cache', '--heap-limit', '9000', file.name])
+        finally:
+            os.unlink(file.name)
+
+    def test_cycles(self):
+        enabled = gc.isenabled()
+        gc.disable()
+        try:
+            runtime = self.run_code(PARKED)
+            self.assertEqual(runtime.heap.live_objects, 11)
+            channel = runtime.heap.live_bytes // 11
+            runtime.heap.collect()
+            # Only done and the channel c holds are left
+            self.assertEqual(runtime.heap.live_objects, 2)
+            self.assertEqual(runtime.heap.collections, 1)
+            self.assertGreater(runtime.heap.pause_max, 0)
+
+            # The first run's channels outlive reset as cyclic garbage, since
+            # parked workers still refer to them; the second run reaches the
+            # limit and collects them
+            runtime = Runtime(heap_limit=15 * channel)
+            runtime.load_program(compile_source(PARKED))
+            runtime.run()
+            runtime.reset()
+            self.assertEqual(runtime.heap.live_objects, 11)
+            runtime.run()
+            self.assertEqual(runtime.heap.collections, 1)
+            # It also freed the two channels this run had already dropped
+            self.assertEqual(runtime.heap.live_objects, 9)
+        finally:
+            if enabled:
+                gc.enable()
+
+    def test_classes_and_channels(self):
+        runtime = Runtime()
+        runtime.load_program([('CLASS', 'Point'), ('END_CLASS',), ('CLASS', 'Point'), ('END_CLASS',),
+                              ('PUSH', 3), ('CHANNEL',), ('STORE', 'c'), ('HALT',)])
+        runtime.run()
+        self.assertEqual(runtime.memory['Point'], {})
+        self.assertIsInstance(runtime.memory['Point'], Record)
+        # The first Point record was freed when the second replaced it
+        self.assertEqual((runtime.heap.allocations, runtime.heap.live_objects), (3, 2))
+        for capacity in (-1, 1.5):
+            runtime = Runtime()
+            runtime.load_program([('PUSH', capacity), ('CHANNEL',), ('HALT',)])
+            with self.assertRaises(RuntimeError):
+                runtime.run()
+
+    def test_pooled_runtimes(self):
+        program = compile_program('var c: Chan = chan(n);', inputs={'n': 'Int'})
+        with RuntimePool(program, size=1, heap_limit=10000) as pool:
+            for _ in range(5):
+                pool.run(n=100)
+            with self.assertRaises(RuntimeError):
+                pool.run(n=100000)
+            runtime = pool.acquire()
+            self.assertEqual(runtime.heap.allocations, 5)
+            self.assertEqual(runtime.heap.live_objects, 0)
+            pool.release(runtime)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from src.incremental import IncrementalAnalyzer, statement_ends
+
+SOURCE = """var a: Int = 1;
+var b: Int = a + 2;
+func f(p: Int) -> Int {
+    var q: Int = p * b;
+}
+if a < b {
+    a = b;
+}
+var c: Int = f(a);
+"""
+
+class TestIncrementalAnalyzer(unittest.TestCase):
+    def test_statement_ends(self):
+        code = "var a: Int = 1;\nif a {\n    a = 2;\n} else {\n    a = 3;\n}\nwhile a { a = a - 1; }\n"
+        ends = list(statement_ends(code))
+        self.assertEqual([code[start:end].strip() for start, end in zip([0] + ends, ends)],
+                         ["var a: Int = 1;", "if a {\n    a = 2;\n} else {\n    a = 3;\n}", "while a { a = a - 1; }"])
+        self.assertEqual(list(statement_ends("var a: Int = 1;\nvar b")), [15, 21])
+
+    def test_initial_analysis(self):
+        analyzer = IncrementalAnalyzer()
+        self.assertEqual(analyzer.update(SOURCE), [])
+        self.assertEqual(len(analyzer.statements()), 5)
+        self.assertEqual(analyzer.reparsed, 5)
+        self.assertEqual(set(analyzer.symbols), {"a", "b", "c", "f"})
+
+    def test_edit_inside_function_body(self):
+        analyzer = IncrementalAnalyzer()
+        analyzer.update(SOURCE)
+        self.assertEqual(analyzer.update(SOURCE.replace("p * b", "p + b + 1")), [])
+        self.assertEqual(analyzer.reparsed, 1)
+        self.assertEqual(analyzer.rechecked, 1)
+
+    def test_dependents_are_rechecked(self):
+        analyzer = IncrementalAnalyzer()
+        analyzer.update(SOURCE)
+        self.assertEqual(analyzer.update(SOURCE.replace("var a: Int", "var a: Float")), [])
+        self.assertEqual(analyzer.reparsed, 1)
+        # The declaration itself plus the b, if and c statements that read a
+        self.assertEqual(analyzer.rechecked, 4)
+
+    def test_undeclared_after_rename(self):
+        analyzer = IncrementalAnalyzer()
+        analyzer.update(SOURCE)
+        diagnostics = analyzer.update(SOURCE.replace("var a: Int = 1;", "var z: Int = 1;"))
+        self.assertEqual(diagnostics[0], (2, 'Variable "a" not declared'))
+        self.assertEqual(analyzer.update(SOURCE), [])
+        self.assertEqual(analyzer.reparsed, 1)
+
+    def test_syntax_errors(self):
+        analyzer = IncrementalAnalyzer()
+        diagnostics = analyzer.update(SOURCE.replace("a + 2;", "a + ;"))
+        self.assertEqual(diagnostics[0], (2, "Unexpected token: ;"))
+        self.assertEqual(analyzer.update(SOURCE), [])
+        self.assertEqual(analyzer.reparsed, 1)
+
+    def test_matches_full_analysis_after_edits(self):
+        analyzer = IncrementalAnalyzer()
+        source = SOURCE
+        analyzer.update(source)
+        edits = [
+            ("    a = b;\n}\n", "    a = b;\n} else {\n    b = a;\n}\n"),
+            ("var c: Int = f(a);\n", "var c: Int = f(a);\nvar d: Int = c;\n"),
+            ("func f", "var b: Int = 3;\nfunc f"),
+            ("}\nif", "if"),
+            ("if a", "}\nif a"),
+            ("var a: Int = 1;\n", ""),
+        ]
+        for old, new in edits:
+            source = source.replace(old, new, 1)
+            diagnostics = analyzer.update(source)
+            fresh = IncrementalAnalyzer()
+            self.assertEqual(diagnostics, fresh.update(source))
+            self.assertEqual([chunk.text for chunk in analyzer.chunks], [chunk.text for chunk in fresh.chunks])
+
+if __name__ == '__main__':
+    unittest.main()
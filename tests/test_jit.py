@@ -0,0 +1,218 @@
+import random
+import unittest
+from src.cli import compile_source
+from src.jit import MAX_DEOPTS, compile_loop
+from src.opcodes import ENTER_LOOP, decode
+from src.runtime import Runtime, Function
+
+
+def run_both(code, optimize=1, threshold=2, **options):
+    # Runs code interpreted and tiered and returns both runtimes
+    instructions = compile_source(code, optimize)
+    runtimes = []
+    for jit in (False, True):
+        runtime = Runtime(jit=jit, **options)
+        runtime.jit_threshold = threshold
+        runtime.load_program(instructions)
+        runtime.run()
+        runtimes.append(runtime)
+    return runtimes
+
+
+def values(runtime):
+    # Globals comparable across runtimes, whose functions are different objects
+    return [value.name if type(value) is Function else value for value in runtime.globals]
+
+
+def random_program(rng):
+    names = ['a', 'b', 'c']
+
+    def expression(depth=0):
+        if depth > 2 or rng.random() < 0.3:
+            return rng.choice(names + [str(rng.randint(0, 5))])
+        operator = rng.choice(['+', '-', '*', '<', '>', '==', '!=', '<=', '>='])
+        return f'({expression(depth + 1)} {operator} {expression(depth + 1)})'
+
+    def block(depth):
+        statements = []
+        for _ in range(rng.randint(1, 3)):
+            if depth > 1 or rng.random() < 0.6:
+                statements.append(f'{rng.choice(names)} = {expression()};')
+            else:
+                statements.append(f'if {expression()} {{ {block(depth + 1)} }} else {{ {block(depth + 1)} }}')
+        return ' '.join(statements)
+
+    declarations = ' '.join(f'var {name}: Int = {rng.randint(-3, 3)};' for name in names)
+    return f'{declarations} var i: Int = 0; while i < {rng.randint(5, 30)} {{ {block(0)} i = i + 1; }}'
+
+
+class TestJIT(unittest.TestCase):
+    def test_hot_loop_is_compiled(self):
+        code = """
+        var i: Int = 0;
+        var total: Int = 0;
+        while i < 5000 {
+            total = total + i * 2;
+            i = i + 1;
+        }
+        """
+        for optimize in (0, 1, 2):
+            interpreted, tiered = run_both(code, optimize)
+            self.assertEqual(values(tiered), values(interpreted))
+            self.assertEqual(len(tiered.loops), 1)
+            self.assertEqual(interpreted.loops, {})
+
+    def test_branches_and_nested_loops(self):
+        code = """
+        var i: Int = 0;
+        var even: Int = 0;
+        var cells: Int = 0;
+        while i < 300 {
+            if i - (i / 2) * 2 == 0 {
+                even = even + 1;
+            } else {
+                var j: Int = 0;
+                while j < i {
+                    cells = cells + 1;
+                    j = j + 1;
+                }
+            }
+            i = i + 1;
+        }
+        """
+        for optimize in (1, 2):
+            interpreted, tiered = run_both(code, optimize)
+            self.assertEqual(values(tiered), values(interpreted))
+            self.assertTrue(tiered.loops)
+
+    def test_loop_in_function(self):
+        code = """
+        func triangle(n: Int) -> Int {
+            var total: Int = 0;
+            while n > 0 {
+                total = total + n;
+                n = n - 1;
+            }
+            return total;
+        }
+        var result: Int = triangle(1000) + triangle(10);
+        """
+        interpreted, tiered = run_both(code)
+        self.assertEqual(tiered.globals[1], 500500 + 55)
+        self.assertEqual(values(tiered), values(interpreted))
+        self.assertTrue(tiered.loops)
+
+    def test_arithmetic_error_deoptimizes(self):
+        # The failing division runs again in the interpreter, which raises
+        # with every variable as it was at that point
+        code = """
+        var i: Int = 10;
+        var total: Int = 0;
+        while 1 {
+            total = total + 100 / i;
+            i = i - 1;
+        }
+        """
+        instructions = compile_source(code)
+        states = []
+        for jit in (False, True):
+            runtime = Runtime(jit=jit)
+            runtime.jit_threshold = 2
+            runtime.load_program(instructions)
+            with self.assertRaises(ZeroDivisionError):
+                runtime.run()
+            states.append((runtime.globals, runtime.stack))
+        self.assertEqual(states[0], states[1])
+
+    def test_type_guard(self):
+        # h holds a function, so the compiled inner loop deoptimizes on every
+        # entry until it is dropped
+        code = """
+        func work() -> Int {
+            return 1;
+        }
+        var h: Func = work;
+        var total: Int = 0;
+        var i: Int = 0;
+        while i < 50 {
+            var j: Int = 0;
+            while j < 10 {
+                if h == h {
+                    total = total + 1;
+                }
+                j = j + 1;
+            }
+            i = i + 1;
+        }
+        """
+        interpreted, tiered = run_both(code)
+        self.assertEqual(tiered.globals[2], 500)
+        self.assertEqual(values(tiered), values(interpreted))
+        self.assertTrue(tiered.loops)
+        for header, loop in tiered.loops.items():
+            self.assertEqual(loop.deopts, MAX_DEOPTS)
+            self.assertNotEqual(tiered.code[header][0], ENTER_LOOP)
+
+    def test_unsupported_loops_stay_interpreted(self):
+        code = """
+        func one() -> Int {
+            return 1;
+        }
+        var i: Int = 0;
+        while i < 100 {
+            i = i + one();
+        }
+        """
+        interpreted, tiered = run_both(code)
+        self.assertEqual(values(tiered), values(interpreted))
+        self.assertEqual(tiered.loops, {})
+
+    def test_compile_loop(self):
+        code = [decode(instruction) for instruction in [
+            ('LOAD_GLOBAL', 0), ('PUSH', 3), ('BIN_OP', '<'), ('JUMP_IF_FALSE', 9),
+            ('LOAD_GLOBAL', 0), ('PUSH', 1), ('BIN_OP', '+'), ('STORE_GLOBAL', 0), ('JUMP', 0),
+            ('HALT',),
+        ]]
+        loop = compile_loop(code, 0, 8, 1000)
+        slots = [0]
+        self.assertEqual(loop.function([], slots, []), 9)
+        self.assertEqual(slots, [3])
+        self.assertIsNone(loop.function([], [None], []))
+        # A loop that pops values from below its entry cannot be compiled
+        self.assertIsNone(compile_loop([decode(('POP',)), decode(('JUMP', 0))], 0, 1, 1000))
+
+    def test_compiled_loops_are_preempted(self):
+        code = """
+        var stopped: Int = 0;
+        var spins: Int = 0;
+        func spin(done: Chan) -> Int {
+            while stopped == 0 {
+                spins = spins + 1;
+            }
+            send(done, 1);
+        }
+        func stop() -> Int {
+            stopped = 1;
+        }
+        var done: Chan = chan(0);
+        go spin(done);
+        go stop();
+        var finished: Int = recv(done);
+        """
+        runtime = Runtime(time_slice=100, jit=True)
+        runtime.jit_threshold = 2
+        runtime.load_program(compile_source(code))
+        runtime.run()
+        self.assertEqual(runtime.globals[0], 1)
+        self.assertTrue(runtime.loops)
+
+    def test_matches_interpreter(self):
+        rng = random.Random(14)
+        for _ in range(40):
+            code = random_program(rng)
+            for optimize in (0, 2):
+                interpreted, tiered = run_both(code, optimize)
+                self.assertEqual(values(tiered), values(interpreted), code)
+
+if __name__ == '__main__':
+    unittest.main()
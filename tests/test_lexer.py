@@ -1,6 +1,25 @@
+import io
+import mmap
+import tempfile
 import unittest
 from src.lexer import Lexer, TokenType
 
+SOURCE = """var x: Int = 10;
+func add(a: Int, b: Int) -> Int {
+    while x <= 20 {
+        var yé: Int = 12345;
+    }
+}
+"""
+
+def drain(lexer):
+    tokens = []
+    while True:
+        token = lexer.next_token()
+        tokens.append(token)
+        if token[0] == TokenType.EOF:
+            return tokens
+
 class TestLexer(unittest.TestCase):
     def test_tokenize_keywords(self):
         code = "var func if else for while return"
@@ -31,5 +50,64 @@ class TestLexer(unittest.TestCase):
         with self.assertRaises(RuntimeError):
             lexer = Lexer(code)
 
+    def test_streaming_matches_eager(self):
+        expected = Lexer(SOURCE).tokens
+        sources = [
+            SOURCE,
+            io.StringIO(SOURCE),
+            io.BytesIO(SOURCE.encode('utf-8')),
+        ]
+        for source in sources:
+            # A tiny chunk size forces tokens to straddle chunk boundaries
+            self.assertEqual(drain(Lexer(source, streaming=True, chunk_size=3)), expected)
+
+    def test_streaming_from_mmap(self):
+        with tempfile.TemporaryFile() as file:
+            file.write(SOURCE.encode('utf-8'))
+            file.flush()
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                tokens = drain(Lexer(buffer, streaming=True, chunk_size=7))
+        self.assertEqual(tokens, Lexer(SOURCE).tokens)
+
+    def test_streaming_is_lazy(self):
+        lexer = Lexer(io.StringIO("var x\n@"), streaming=True, chunk_size=2)
+        token = lexer.next_token()
+        self.assertEqual((token.kind, token.value), (TokenType.KEYWORD, 'var'))
+        self.assertEqual(lexer.tokens, [])
+        with self.assertRaises(RuntimeError):
+            drain(lexer)
+
+    def test_token_records(self):
+        lexer = Lexer("var x: Int = 10;\n  x <= y")
+        token = lexer.tokens[5]
+        self.assertEqual((token.kind, token.value, token.offset), (TokenType.INTEGER, 10, 13))
+        self.assertEqual([token.offset for token in lexer.tokens[-4:]], [19, 21, 24, 25])
+        self.assertEqual(lexer.tokens[-1].kind, TokenType.EOF)
+
+    def test_pairs(self):
+        # What the parser reads: the records' kinds and values, without offsets
+        expected = [token[:2] for token in Lexer(SOURCE).tokens]
+        self.assertEqual(list(Lexer(SOURCE).pairs()), expected)
+        self.assertEqual(list(Lexer(io.StringIO(SOURCE), streaming=True, chunk_size=3).pairs()), expected)
+        lexer = Lexer(io.StringIO("var x\n@"), streaming=True, chunk_size=2)
+        pairs = lexer.pairs()
+        self.assertEqual(next(pairs), (TokenType.KEYWORD, 'var'))
+        with self.assertRaisesRegex(RuntimeError, 'at offset 6'):
+            list(pairs)
+
+    def test_identifiers_are_interned(self):
+        lexer = Lexer("alpha_" + "beta alpha_" + "beta")
+        self.assertIs(lexer.tokens[0].value, lexer.tokens[1].value)
+
+    def test_unexpected_token_offset(self):
+        with self.assertRaisesRegex(RuntimeError, 'at offset 8'):
+            Lexer("var x\n  @")
+
+    def test_adjacent_symbols(self):
+        code = "a<=b->c!=d=-1>=<"
+        lexer = Lexer(code)
+        self.assertEqual([token.value for token in lexer.tokens[:-1]],
+                         ['a', '<=', 'b', '->', 'c', '!=', 'd', '=', '-', 1, '>=', '<'])
+
 if __name__ == '__main__':
     unittest.main()
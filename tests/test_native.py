@@ -0,0 +1,212 @@
+import io
+import os
+import shutil
+import subprocess
+import tempfile
+import unittest
+from contextlib import redirect_stderr
+from src.cli import main
+from src.embedding import compile_program
+from src.native import NativeUnsupported, compile_native, run_native, translate
+from src.runtime import MAX_CALL_DEPTH
+
+
+def vm_results(code):
+    # The Int globals a program ends with on the VM, or the error it raises
+    try:
+        results = compile_program(code).run()
+    except Exception as error:
+        return (type(error), str(error))
+    return {name: int(value) for name, value in results.items() if type(value) in (int, bool)}
+
+
+@unittest.skipIf(shutil.which('cc') is None and shutil.which('gcc') is None and not os.environ.get('CC'),
+                 'No C compiler')
+class TestNative(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def native_results(self, code):
+        executable = os.path.join(self.directory.name, 'program')
+        return run_native(compile_native(code, executable))
+
+    def assertSameResults(self, code):
+        results = self.native_results(code)
+        self.assertEqual(results, vm_results(code))
+        return results
+
+    def write(self, name, code):
+        path = os.path.join(self.directory.name, name)
+        with open(path, 'w') as file:
+            file.write(code)
+        return path
+
+    def test_programs(self):
+        code = """
+        func fib(n: Int) -> Int {
+            if n < 2 {
+                return n;
+            }
+            return fib(n - 1) + fib(n - 2);
+        }
+        func countdown(n: Int) -> Int {
+            var steps: Int = 0;
+            while n != 1 {
+                var half: Int = n - n / 2 * 2;
+                if n - (n - 1) * 0 == 0 {
+                    steps = 0 - 1;
+                }
+                steps = steps + 1;
+                n = n - 1;
+            }
+            return steps;
+        }
+        var a: Int = fib(20);
+        var total: Int = 0;
+        var i: Int = 0;
+        while i < 100 {
+            if i > 50 {
+                total = total + i * 2;
+            } else {
+                total = total - i;
+            }
+            i = i + 1;
+        }
+        var less: Int = a < total;
+        """
+        # Division gives a float, which the backend leaves to the VM
+        with self.assertRaises(NativeUnsupported):
+            translate(code)
+        code = code.replace('var half: Int = n - n / 2 * 2;', '')
+        self.assertEqual(self.assertSameResults(code), {'a': 6765, 'total': 6075, 'i': 100, 'less': 0})
+        # The VM keeps a comparison's result as a bool; natively it is 0 or 1
+        self.assertIs(compile_program(code).run()['less'], False)
+        self.assertIs(type(self.native_results(code)['less']), int)
+
+    def test_calls(self):
+        # Arguments and operands are evaluated left to right, defaults in
+        # the callee, and globals read before a call keep the value they had
+        code = """
+        var calls: Int = 0;
+        func next() -> Int {
+            calls = calls + 1;
+            return calls;
+        }
+        func pair(a: Int, b: Int) -> Int {
+            return a * 10 + b;
+        }
+        func offset(x: Int, step: Int = next() * 100, base: Int = x + step) -> Int {
+            return base;
+        }
+        var p: Int = pair(next(), next());
+        var q: Int = calls + next() * 1000 + calls;
+        var r: Int = offset(1) + offset(1, 2) + offset(1, 2, 3);
+        """
+        self.assertEqual(self.assertSameResults(code), {'calls': 4, 'p': 12, 'q': 3005, 'r': 407})
+
+    def test_tail_calls(self):
+        # A function calling itself in tail position recurs past the call
+        # depth limit, as on the VM
+        code = """
+        func count(n: Int, total: Int) -> Int {
+            if n == 0 {
+                return total;
+            }
+            return count(n - 1, total + n);
+        }
+        var result: Int = count(%d, 0);
+        """ % (MAX_CALL_DEPTH * 2)
+        self.assertEqual(self.assertSameResults(code), {'result': MAX_CALL_DEPTH * (MAX_CALL_DEPTH * 2 + 1)})
+
+    def test_fallback(self):
+        # What only the VM finishes the way it would: Ints past 64 bits,
+        # calls nested past the limit, variables read before they are set
+        # and functions returning nothing
+        overflow = """
+        var x: Int = 1;
+        var i: Int = 0;
+        while i < 70 {
+            x = x * 2;
+            i = i + 1;
+        }
+        """
+        deep = """
+        func depth(n: Int) -> Int {
+            if n == 0 {
+                return 0;
+            }
+            return 1 + depth(n - 1);
+        }
+        var result: Int = depth(%d);
+        """
+        unset = """
+        var flag: Int = 0;
+        if flag {
+            var late: Int = 3;
+        }
+        var y: Int = late + 1;
+        """
+        nothing = """
+        func f(x: Int) -> Int {
+            if x {
+                return 1;
+            }
+        }
+        var a: Int = f(1);
+        var b: Int = f(0) + 1;
+        """
+        for code in (overflow, deep % (MAX_CALL_DEPTH + 1), unset, nothing):
+            self.assertIsNone(self.native_results(code))
+        self.assertEqual(vm_results(overflow)['x'], 2 ** 70)
+        self.assertEqual(vm_results(deep % (MAX_CALL_DEPTH + 1))[0], RuntimeError)
+        self.assertEqual(self.assertSameResults(deep % 1000), {'result': 1000})
+        self.assertEqual(self.assertSameResults(unset.replace('flag: Int = 0', 'flag: Int = 1')),
+                         {'flag': 1, 'late': 3, 'y': 4})
+        self.assertEqual(self.assertSameResults(nothing.replace('var b: Int = f(0) + 1;', '')), {'a': 1})
+
+    def test_unsupported(self):
+        programs = {
+            'var a: Array = array(3);': 'Array values',
+            'var x: Int = 7 / 2;': 'division',
+            'func f() -> Int {\n    return 1;\n}\ngo f();': 'goroutines',
+            'var t: Int = 0;\nparallel for i in 0 .. 4 reduce(+: t) {\n    return i;\n}': 'parallel for loops',
+            'func f() -> Int {\n    return 1;\n}\nvar g: Func = f;': 'Func values',
+            'func f(x: Int) -> Int {\n    return x;\n}\nvar y: Int = f(1, 2);': 'calling f() with 2 arguments',
+            'var x: Int = 99999999999999999999;': 'integers beyond 64 bits',
+        }
+        for code, message in programs.items():
+            with self.assertRaises(NativeUnsupported) as context:
+                translate(code)
+            self.assertEqual(str(context.exception), f'{message} cannot be compiled to C')
+
+    def test_cli(self):
+        path = self.write('loop.fusion', 'var i: Int = 0;\nwhile i < 10 {\n    i = i + 1;\n}\n')
+        cache = os.path.join(self.directory.name, 'cache')
+        main(['--native', '--cache-dir', cache, path])
+        main(['--native', '--cache-dir', cache, path])
+        self.assertEqual([name[-7:] for name in os.listdir(cache)], ['.native'])
+
+        # -o only writes the executable
+        executable = os.path.join(self.directory.name, 'loop')
+        main(['--native', '-o', executable, path])
+        self.assertEqual(subprocess.run([executable, '--globals'], capture_output=True, text=True).stdout, 'i 10\n')
+
+        # What the backend cannot run goes to the VM, with a note
+        path = self.write('half.fusion', 'var x: Int = 7 / 2;\n')
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            main(['--native', '--no-cache', path])
+        self.assertIn('--native: division cannot be compiled to C; running on the VM', stderr.getvalue())
+        with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            main(['--native', '-o', executable, path])
+        path = self.write('big.fusion', 'var x: Int = 4611686018427387904 * 4;\n')
+        stderr = io.StringIO()
+        with redirect_stderr(stderr):
+            main(['--native', '--no-cache', path])
+        self.assertIn('running it there', stderr.getvalue())
+        with redirect_stderr(io.StringIO()), self.assertRaises(SystemExit):
+            main(['-o', executable, path])
+
+if __name__ == '__main__':
+    unittest.main()
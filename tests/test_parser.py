@@ -1,6 +1,26 @@
 import unittest
 from src.lexer import Lexer
-from src.parser import Parser, Program, VariableDeclaration, FunctionDeclaration
+from src.parser import (
+    Parser, Program, VariableDeclaration, FunctionDeclaration, Assignment, BinaryOperation, Call, Identifier,
+    ReturnStatement, ExpressionStatement, GoStatement, ParallelFor,
+)
+from src.semantic_analyzer import SemanticAnalyzer
+from src.code_generator import CodeGenerator
+
+
+def parse_expression(expression):
+    return Parser(Lexer(f"var x: Int = {expression};")).parse().statements[0].value
+
+
+def shape(node):
+    # Fully parenthesized form of an expression tree
+    if isinstance(node, BinaryOperation):
+        return f"({shape(node.left)} {node.operator} {shape(node.right)})"
+    if isinstance(node, Call):
+        return f"{node.identifier}({', '.join(shape(argument) for argument in node.arguments)})"
+    if isinstance(node, Identifier):
+        return node.name
+    return str(node)
 
 class TestParser(unittest.TestCase):
     def test_parse_variable_declaration(self):
@@ -26,7 +46,7 @@ class TestParser(unittest.TestCase):
         self.assertIsInstance(ast, Program)
         self.assertIsInstance(ast.statements[0], FunctionDeclaration)
         self.assertEqual(ast.statements[0].identifier, "add")
-        self.assertEqual(ast.statements[0].parameters, [("a", "Int"), ("b", "Int")])
+        self.assertEqual(ast.statements[0].parameters, [("a", "Int", None), ("b", "Int", None)])
         self.assertEqual(ast.statements[0].return_type, "Int")
 
     def test_unexpected_token(self):
@@ -36,5 +56,71 @@ class TestParser(unittest.TestCase):
         with self.assertRaises(SyntaxError):
             parser.parse()
 
+    def test_operator_precedence(self):
+        self.assertEqual(shape(parse_expression("1 + 2 * 3 - 4")), "((1 + (2 * 3)) - 4)")
+        self.assertEqual(shape(parse_expression("a < b + 1 == c >= d")), "((a < (b + 1)) == (c >= d))")
+        self.assertEqual(shape(parse_expression("10 / 2 / 5")), "((10 / 2) / 5)")
+        self.assertEqual(shape(parse_expression("a != b * c / d")), "(a != ((b * c) / d))")
+
+    def test_parentheses_and_unary_minus(self):
+        self.assertEqual(shape(parse_expression("(1 + 2) * -3")), "((1 + 2) * (0 - 3))")
+        self.assertEqual(shape(parse_expression("-(a - b) * c")), "((0 - (a - b)) * c)")
+        self.assertEqual(shape(parse_expression("((a))")), "a")
+
+    def test_calls(self):
+        self.assertEqual(shape(parse_expression("f(1, g(2, 3) * 4, (5)) + h()")), "(f(1, (g(2, 3) * 4), 5) + h())")
+
+    def test_assignment(self):
+        ast = Parser(Lexer("x = x + 1;")).parse()
+        self.assertIsInstance(ast.statements[0], Assignment)
+        self.assertEqual(ast.statements[0].identifier, "x")
+        self.assertEqual(shape(ast.statements[0].value), "(x + 1)")
+
+    def test_return_and_expression_statements(self):
+        ast = Parser(Lexer("func f() -> Int {\n    g(1);\n    return;\n    return f() + 1;\n}")).parse()
+        call, empty, value = ast.statements[0].body
+        self.assertIsInstance(call, ExpressionStatement)
+        self.assertEqual(shape(call.expression), "g(1)")
+        self.assertIsInstance(empty, ReturnStatement)
+        self.assertIsNone(empty.value)
+        self.assertEqual(shape(value.value), "(f() + 1)")
+
+    def test_go_statement(self):
+        ast = Parser(Lexer("go worker(c, 1);")).parse()
+        self.assertIsInstance(ast.statements[0], GoStatement)
+        self.assertEqual(shape(ast.statements[0].call), "worker(c, 1)")
+        with self.assertRaises(SyntaxError):
+            Parser(Lexer("go x + 1;")).parse()
+
+    def test_parallel_for(self):
+        ast = Parser(Lexer("parallel for i in 0 .. n + 1 reduce(+: total) { return i * i; }")).parse()
+        loop = ast.statements[0]
+        self.assertIsInstance(loop, ParallelFor)
+        self.assertEqual((loop.variable, loop.operator, loop.target), ('i', '+', 'total'))
+        self.assertEqual((shape(loop.start), shape(loop.stop)), ("0", "(n + 1)"))
+        self.assertIsInstance(loop.body[0], ReturnStatement)
+        for code in ("parallel i in 0 .. 1 reduce(+: t) {}", "parallel for i in 0 .. 1 {}",
+                     "parallel for i in 0, 1 reduce(+: t) {}"):
+            with self.assertRaises(SyntaxError):
+                Parser(Lexer(code)).parse()
+
+    def test_unbalanced_parentheses(self):
+        for code in ("var x: Int = (1 + 2;", "var x: Int = f(1, 2;", "var x: Int = 1 + ;", "var x: Int = );"):
+            with self.assertRaises(SyntaxError):
+                Parser(Lexer(code)).parse()
+
+    def test_long_expressions(self):
+        # Far deeper than the recursion limit in both directions
+        operands = 50000
+        flat = " + ".join(["1"] * operands)
+        nested = "(" * operands + "1" + " + 1)" * operands
+        for expression, operators in ((flat, operands - 1), (nested, operands)):
+            ast = Parser(Lexer(f"var x: Int = {expression};")).parse()
+            SemanticAnalyzer().visit(ast)
+            generator = CodeGenerator()
+            generator.generate(ast)
+            instructions = generator.get_instructions()
+            self.assertEqual(sum(1 for instruction in instructions if instruction[0] == 'BIN_OP'), operators)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,144 @@
+import unittest
+from src.peephole import PeepholeOptimizer
+from src.runtime import Runtime
+
+COUNTING_LOOP = [
+    ('PUSH', 10),
+    ('STORE_GLOBAL', 0),
+    ('PUSH', 0),
+    ('STORE_GLOBAL', 1),
+    ('LOAD_GLOBAL', 0),
+    ('PUSH', 0),
+    ('BIN_OP', '>'),
+    ('JUMP_IF_FALSE', 17),
+    ('LOAD_GLOBAL', 1),
+    ('LOAD_GLOBAL', 0),
+    ('BIN_OP', '+'),
+    ('STORE_GLOBAL', 1),
+    ('LOAD_GLOBAL', 0),
+    ('PUSH', 1),
+    ('BIN_OP', '-'),
+    ('STORE_GLOBAL', 0),
+    ('JUMP', 4),
+    ('HALT',)
+]
+
+def run(instructions):
+    runtime = Runtime()
+    runtime.load_program(instructions)
+    runtime.run()
+    return runtime
+
+class TestPeepholeOptimizer(unittest.TestCase):
+    def test_level_zero_is_identity(self):
+        self.assertEqual(PeepholeOptimizer(0).optimize(COUNTING_LOOP), COUNTING_LOOP)
+
+    def test_constant_folding(self):
+        instructions = [
+            ('PUSH', 2),
+            ('PUSH', 3),
+            ('PUSH', 4),
+            ('BIN_OP', '*'),
+            ('BIN_OP', '+'),
+            ('STORE_GLOBAL', 0),
+            ('HALT',)
+        ]
+        optimized = PeepholeOptimizer(1).optimize(instructions)
+        self.assertEqual(optimized, [('PUSH', 14), ('STORE_GLOBAL', 0), ('HALT',)])
+
+    def test_division_by_zero_is_not_folded(self):
+        instructions = [('PUSH', 1), ('PUSH', 0), ('BIN_OP', '/'), ('HALT',)]
+        self.assertEqual(PeepholeOptimizer(1).optimize(instructions), instructions)
+
+    def test_no_folding_across_jump_target(self):
+        instructions = [
+            ('LOAD_GLOBAL', 0),
+            ('LOAD_GLOBAL', 0),
+            ('JUMP_IF_FALSE', 5),
+            ('STORE_GLOBAL', 1),
+            ('PUSH', 3),
+            ('PUSH', 4),
+            ('BIN_OP', '+'),
+            ('STORE_GLOBAL', 2),
+            ('HALT',)
+        ]
+        self.assertEqual(PeepholeOptimizer(1).optimize(instructions), instructions)
+
+    def test_jump_threading_and_dead_code(self):
+        # if x { if y { a } else { b } } as nested code generation lays it out
+        instructions = [
+            ('LOAD_GLOBAL', 0),
+            ('JUMP_IF_FALSE', 10),
+            ('LOAD_GLOBAL', 1),
+            ('JUMP_IF_FALSE', 7),
+            ('PUSH', 1),
+            ('STORE_GLOBAL', 2),
+            ('JUMP', 9),
+            ('PUSH', 2),
+            ('STORE_GLOBAL', 2),
+            ('JUMP', 12),
+            ('PUSH', 3),
+            ('STORE_GLOBAL', 2),
+            ('PUSH', 9),
+            ('STORE_GLOBAL', 3),
+            ('HALT',)
+        ]
+        optimized = PeepholeOptimizer(1).optimize(instructions)
+        self.assertEqual(optimized[6], ('JUMP', 12))
+        self.assertEqual(optimized[9], ('JUMP', 12))
+        for x, y, expected in ((0, 0, 3), (1, 0, 2), (1, 1, 1)):
+            code = [('PUSH', x), ('STORE_GLOBAL', 0), ('PUSH', y), ('STORE_GLOBAL', 1)]
+            shifted = [(i[0], i[1] + 4) if i[0] in ('JUMP', 'JUMP_IF_FALSE') else i for i in optimized]
+            self.assertEqual(run(code + shifted).globals[2], expected)
+
+    def test_unreachable_code_removed(self):
+        instructions = [
+            ('JUMP', 3),
+            ('PUSH', 1),
+            ('STORE_GLOBAL', 0),
+            ('PUSH', 2),
+            ('STORE_GLOBAL', 0),
+            ('HALT',)
+        ]
+        optimized = PeepholeOptimizer(1).optimize(instructions)
+        self.assertEqual(optimized, [('PUSH', 2), ('STORE_GLOBAL', 0), ('HALT',)])
+
+    def test_constant_condition(self):
+        instructions = [
+            ('PUSH', 0),
+            ('JUMP_IF_FALSE', 4),
+            ('PUSH', 1),
+            ('STORE_GLOBAL', 0),
+            ('PUSH', 2),
+            ('STORE_GLOBAL', 1),
+            ('HALT',)
+        ]
+        optimized = PeepholeOptimizer(1).optimize(instructions)
+        self.assertEqual(optimized, [('PUSH', 2), ('STORE_GLOBAL', 1), ('HALT',)])
+
+    def test_superinstructions(self):
+        optimized = PeepholeOptimizer(2).optimize(COUNTING_LOOP)
+        self.assertIn(('UPDATE_GLOBAL', (0, '-', 1)), optimized)
+        self.assertIn(('BIN_OP_CONST', ('>', 0)), optimized)
+        self.assertLess(len(optimized), len(COUNTING_LOOP))
+
+    def test_int_operations(self):
+        instructions = [('PUSH', 6), ('PUSH', 7), ('BIN_OP_INT', '*'), ('STORE_GLOBAL', 0), ('HALT',)]
+        self.assertEqual(PeepholeOptimizer(1).optimize(instructions), [('PUSH', 42), ('STORE_GLOBAL', 0), ('HALT',)])
+        typed = [('BIN_OP_INT',) + instruction[1:] if instruction[0] == 'BIN_OP' else instruction
+                 for instruction in COUNTING_LOOP]
+        optimized = PeepholeOptimizer(2).optimize(typed)
+        self.assertIn(('UPDATE_GLOBAL', (0, '-', 1)), optimized)
+        # The comparison before JUMP_IF_FALSE keeps its constant operand, so
+        # the runtime can fuse it into a compare-and-branch
+        self.assertIn(('BIN_OP_INT', '>'), optimized)
+        self.assertNotIn(('BIN_OP_CONST', ('>', 0)), optimized)
+        self.assertEqual(run(optimized).globals, run(COUNTING_LOOP).globals)
+
+    def test_levels_agree(self):
+        expected = run(COUNTING_LOOP).globals
+        for level in (1, 2):
+            self.assertEqual(run(PeepholeOptimizer(level).optimize(COUNTING_LOOP)).globals, expected)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import json
+import unittest
+from src.cli import compile_source
+from src.profiler import Profiler, MAIN, GOROUTINE
+from src.runtime import Runtime
+
+FIB = """
+func fib(n: Int) -> Int {
+    if n < 2 {
+        return n;
+    }
+    return fib(n - 1) + fib(n - 2);
+}
+var i: Int = 0;
+var total: Int = 0;
+while i < 100 {
+    total = total + i;
+    i = i + 1;
+}
+var result: Int = fib(10);
+"""
+
+
+def profile(code, **options):
+    runtime = Runtime(**options)
+    runtime.load_program(compile_source(code))
+    profiler = Profiler(runtime)
+    try:
+        profiler.run()
+    finally:
+        runtime.close()
+    return profiler, runtime
+
+
+class TestProfiler(unittest.TestCase):
+    def test_counts(self):
+        profiler, runtime = profile(FIB)
+        plain = Runtime()
+        plain.load_program(compile_source(FIB))
+        plain.run()
+        self.assertEqual(runtime.globals[1:], plain.globals[1:])
+        self.assertEqual(runtime.globals[3], 55)
+
+        opcodes = profiler.opcodes()
+        # fib(10) makes 177 calls, one from the top level, the others recursive
+        self.assertEqual(opcodes['CALL'][0], 177)
+        self.assertEqual(opcodes['HALT'][0], 1)
+        self.assertEqual(sum(count for count, _ in opcodes.values()), sum(profiler.counts))
+        self.assertEqual([iterations for _, _, iterations in profiler.loops()], [100])
+
+    def test_functions_and_stacks(self):
+        profiler, _ = profile(FIB)
+        functions = profiler.functions()
+        calls, own, total = functions['fib']
+        self.assertEqual(calls, 177)
+        self.assertEqual(own, total)
+        self.assertGreaterEqual(functions[MAIN][2], total)
+        self.assertEqual(sum(profiler.stacks.values()), sum(profiler.times))
+        lines = profiler.collapsed().splitlines()
+        self.assertIn(f'{MAIN};fib;fib', [line.rsplit(' ', 1)[0] for line in lines])
+        # fib(10) recurses to a depth of 10 below the top level
+        self.assertEqual(max(len(stack) for stack in profiler.stacks), 11)
+
+    def test_goroutines(self):
+        profiler, runtime = profile("""
+        func worker(out: Chan) -> Int {
+            send(out, 42);
+        }
+        var out: Chan = chan(0);
+        go worker(out);
+        var result: Int = recv(out);
+        """)
+        self.assertEqual(runtime.globals[2], 42)
+        self.assertIn((GOROUTINE, 'worker'), profiler.stacks)
+
+    def test_json(self):
+        profiler, _ = profile(FIB, jit=True)
+        report = json.loads(json.dumps(profiler.to_json()))
+        self.assertEqual(report['instructions_executed'], sum(profiler.counts))
+        self.assertEqual(report['functions']['fib']['calls'], 177)
+        self.assertEqual(len(report['loops']), 1)
+        self.assertIn('fib', profiler.report())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,263 @@
+import random
+import unittest
+from src.cli import compile_source, compile_registers
+from src.runtime import Runtime, Function, MAX_CALL_DEPTH, numpy
+from src.register_vm import RegisterVM, Function as RegisterFunction
+
+
+def run_stack(code, optimize=1):
+    runtime = Runtime()
+    runtime.load_program(compile_source(code, optimize))
+    try:
+        runtime.run()
+    finally:
+        runtime.close()
+    return runtime
+
+
+def run_registers(code):
+    vm = RegisterVM()
+    vm.load_program(*compile_registers(code))
+    vm.run()
+    return vm
+
+
+def values(globals):
+    # Globals comparable across the two VMs, whose functions are different
+    # objects; arrays as lists
+    result = []
+    for value in globals:
+        if type(value) in (Function, RegisterFunction):
+            value = value.name
+        elif numpy is not None and type(value) is numpy.ndarray:
+            value = value.tolist()
+        result.append((type(value), value))
+    return result
+
+
+def outcome(run, code, *options):
+    # The globals a program ends with, or the error it raises
+    try:
+        return values(run(code, *options).globals)
+    except Exception as error:
+        return (type(error), str(error))
+
+
+def random_program(rng):
+    # Globals, loops and branches, and functions that read and assign the
+    # globals while the main program's expressions are being evaluated
+    names = ['a', 'b', 'c']
+
+    def expression(depth=0, calls=True):
+        roll = rng.random()
+        if depth > 2 or roll < 0.3:
+            return rng.choice(names + [str(rng.randint(0, 5))])
+        if calls and roll < 0.4:
+            return f'bump({expression(depth + 1, calls)})'
+        operator = rng.choice(['+', '-', '*', '<', '>', '==', '!=', '<=', '>='])
+        return f'({expression(depth + 1, calls)} {operator} {expression(depth + 1, calls)})'
+
+    def block(depth, calls=True):
+        statements = []
+        for _ in range(rng.randint(1, 3)):
+            if depth > 1 or rng.random() < 0.6:
+                statements.append(f'{rng.choice(names)} = {expression(calls=calls)};')
+            else:
+                statements.append(f'if {expression(calls=calls)} {{ {block(depth + 1, calls)} }} '
+                                  f'else {{ {block(depth + 1, calls)} }}')
+        return ' '.join(statements)
+
+    declarations = ' '.join(f'var {name}: Int = {rng.randint(-3, 3)};' for name in names)
+    function = (f'func bump(n: Int, step: Int = {rng.randint(1, 3)}) -> Int {{ var local: Int = n; '
+                f'{block(1, calls=False)} {rng.choice(names)} = local + step; return local * 2 - b; }}')
+    return (f'{declarations} {function} var i: Int = 0; '
+            f'while i < {rng.randint(3, 12)} {{ {block(0)} i = i + 1; }}')
+
+
+class TestRegisterVM(unittest.TestCase):
+    def assertSameResults(self, code):
+        # Against the stack VM, unoptimized and fully optimized
+        expected = outcome(run_registers, code)
+        for optimize in (0, 2):
+            actual = outcome(run_stack, code, optimize)
+            if optimize == 2 and type(actual) is list and type(expected) is list:
+                # Dead code elimination drops functions nothing refers to,
+                # leaving their slots empty, or not there at all if last
+                empty = (type(None), None)
+                actual = actual + [empty] * (len(expected) - len(actual))
+                actual = [wanted if value == empty and wanted[0] is str else value
+                          for value, wanted in zip(actual, expected)]
+            self.assertEqual(actual, expected, code)
+
+    def test_three_address_code(self):
+        instructions, frame = compile_registers("""
+        var x: Int = 0;
+        while x < 10 {
+            x = x + 1;
+        }
+        """)
+        # One instruction per statement, and the loop test at the bottom
+        self.assertEqual(instructions, [
+            ('MOVE', 0, -1),
+            ('JUMP', 3),
+            ('BIN_OP', '+', 0, 0, -2),
+            ('JUMP_IF', '<', 0, -3, 2),
+            ('HALT',),
+        ])
+        self.assertEqual(frame, (1, 0, (0, 1, 10)))
+
+    def test_programs(self):
+        programs = [
+            """
+            var i: Int = 0;
+            var total: Int = 0;
+            var quotient: Int = 0;
+            while i < 50 {
+                if i - (i / 3) * 3 == 0 {
+                    total = total + i * i;
+                } else {
+                    total = total - 1;
+                }
+                quotient = total / (i + 1);
+                i = i + 1;
+            }
+            var never: Int = 0;
+            while 0 {
+                never = 1;
+            }
+            if 2 > 1 {
+                never = -7;
+            }
+            """,
+            """
+            func fib(n: Int) -> Int {
+                if n < 2 {
+                    return n;
+                }
+                return fib(n - 1) + fib(n - 2);
+            }
+            func add(a: Int, b: Int = 10, c: Int = b * 10) -> Int {
+                return a + b + c;
+            }
+            func nothing() -> Int {
+                var a: Int = 1;
+            }
+            var x: Int = fib(15);
+            var y: Int = add(1) + add(1, 2) + add(1, 2, 3);
+            var z: Int = nothing();
+            var f: Func = add;
+            var w: Int = f(5);
+            """,
+            """
+            var calls: Int = 0;
+            func next() -> Int {
+                calls = calls + 1;
+                return calls * 10;
+            }
+            func pair(a: Int, b: Int) -> Int {
+                return a - b;
+            }
+            var first: Int = calls + next();
+            var second: Int = pair(calls, next());
+            var third: Int = next() + calls;
+            if calls < next() {
+                calls = calls + 100;
+            }
+            """,
+            f"""
+            func count(n: Int, total: Int) -> Int {{
+                if n == 0 {{
+                    return total;
+                }}
+                return count(n - 1, total + 1);
+            }}
+            var x: Int = count({MAX_CALL_DEPTH * 2}, 0);
+            """,
+        ]
+        for code in programs:
+            self.assertSameResults(code)
+
+    def test_errors(self):
+        programs = [
+            """
+            var i: Int = 3;
+            var x: Int = 0;
+            while 1 {
+                x = x + 12 / i;
+                i = i - 1;
+            }
+            """,
+            """
+            func f(a: Int, b: Int = 1) -> Int {
+                return a;
+            }
+            var x: Int = f(1, 2, 3);
+            """,
+            """
+            func apply(f: Any) -> Int {
+                return f(1);
+            }
+            var x: Int = apply(3);
+            """,
+            f"""
+            func deep(n: Int) -> Int {{
+                if n == 0 {{
+                    return 0;
+                }}
+                return deep(n - 1) + 1;
+            }}
+            var x: Int = deep({MAX_CALL_DEPTH + 1});
+            """,
+        ]
+        for code in programs:
+            self.assertSameResults(code)
+
+    @unittest.skipIf(numpy is None, 'NumPy is not installed')
+    def test_arrays(self):
+        self.assertSameResults("""
+        var n: Int = 20;
+        var a: Array = array(n);
+        var b: Array = array(n);
+        copy(b, 3);
+        var i: Int = 0;
+        while i < n {
+            set(a, i, get(b, i) * i + 1);
+            i = i + 1;
+        }
+        var part: Array = slice(a, 5, 10);
+        copy(part, 7);
+        var total: Int = sum(a) + len(part);
+        var doubled: Array = a * 2;
+        """)
+        self.assertSameResults("""
+        var a: Array = array(3);
+        var missing: Int = get(a, 3);
+        """)
+
+    def test_unsupported(self):
+        programs = [
+            'var c: Chan = chan(1);',
+            """
+            func work() -> Int {
+                return 1;
+            }
+            go work();
+            """,
+            """
+            var total: Int = 0;
+            parallel for i in 0 .. 10 reduce(+: total) {
+                return i;
+            }
+            """,
+        ]
+        for code in programs:
+            with self.assertRaisesRegex(Exception, 'register VM'):
+                compile_registers(code)
+
+    def test_matches_stack_vm(self):
+        rng = random.Random(19)
+        for _ in range(60):
+            self.assertSameResults(random_program(rng))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,36 @@
 import unittest
-from src.runtime import Runtime
+from src.runtime import Runtime, MAX_CALL_DEPTH, numpy
+from src.cli import compile_source
+
+def run_source(code, optimize=1, workers=1):
+    runtime = Runtime(workers=workers)
+    runtime.load_program(compile_source(code, optimize))
+    try:
+        runtime.run()
+    finally:
+        runtime.close()
+    return runtime
+
+PARALLEL_SUM = """
+var scale: Int = 3;
+func work(n: Int) -> Int {
+    var total: Int = 0;
+    while n > 0 {
+        total = total + n * scale;
+        n = n - 1;
+    }
+    return total;
+}
+func reset() -> Int {
+    scale = 0;
+}
+var total: Int = 1;
+parallel for i in 0 .. 50 reduce(+: total) {
+    var result: Int = work(i);
+    reset();
+    return result;
+}
+"""
 
 class TestRuntime(unittest.TestCase):
     def test_runtime_execution(self):
@@ -14,7 +45,484 @@ class TestRuntime(unittest.TestCase):
         runtime = Runtime()
         runtime.load_program(instructions)
         runtime.run()
-        self.assertEqual(runtime.call_stack[-1], 30)
+        self.assertEqual(runtime.stack[-1], 30)
+
+    def test_runtime_loop(self):
+        instructions = [
+            ('PUSH', 10),
+            ('STORE', 'x'),
+            ('LOAD', 'x'),
+            ('PUSH', 20),
+            ('BIN_OP', '<'),
+            ('JUMP_IF_FALSE', 11),
+            ('LOAD', 'x'),
+            ('PUSH', 1),
+            ('BIN_OP', '+'),
+            ('STORE', 'x'),
+            ('JUMP', 2),
+            ('HALT',)
+        ]
+        runtime = Runtime()
+        runtime.load_program(instructions)
+        runtime.run()
+        self.assertEqual(runtime.memory['x'], 20)
+        self.assertEqual(runtime.stack, [])
+
+    def test_unknown_instruction(self):
+        runtime = Runtime()
+        with self.assertRaises(RuntimeError):
+            runtime.load_program([('NOPE',)])
+
+    def test_unknown_operator(self):
+        runtime = Runtime()
+        with self.assertRaises(RuntimeError):
+            runtime.load_program([('PUSH', 1), ('PUSH', 2), ('BIN_OP', '%')])
+
+    def test_int_operations(self):
+        # Every Int operator, and each comparison fused with the branch after
+        # it, agree with the generic instructions
+        for symbol in ('+', '-', '*', '<', '>', '<=', '>=', '==', '!='):
+            for left, right in ((3, 5), (5, 3), (4, 4), (-2, 7)):
+                results = []
+                for op in ('BIN_OP', 'BIN_OP_INT'):
+                    runtime = Runtime()
+                    runtime.load_program([
+                        ('PUSH', left), ('PUSH', right), (op, symbol), ('STORE_GLOBAL', 0),
+                        ('PUSH', left), ('PUSH', right), (op, symbol), ('JUMP_IF_FALSE', 11),
+                        ('PUSH', 1), ('STORE_GLOBAL', 1), ('JUMP', 13),
+                        ('PUSH', 0), ('STORE_GLOBAL', 1), ('HALT',),
+                    ])
+                    runtime.run()
+                    results.append((runtime.globals, runtime.stack))
+                self.assertEqual(results[0], results[1], (left, symbol, right))
+        with self.assertRaises(RuntimeError):
+            Runtime().load_program([('PUSH', 1), ('PUSH', 2), ('BIN_OP_INT', '/')])
+
+    def test_global_slots(self):
+        instructions = [
+            ('PUSH', 10),
+            ('STORE_GLOBAL', 1),
+            ('LOAD_GLOBAL', 1),
+            ('PUSH', 5),
+            ('BIN_OP', '*'),
+            ('STORE_GLOBAL', 0),
+            ('HALT',)
+        ]
+        runtime = Runtime()
+        runtime.load_program(instructions)
+        runtime.run()
+        self.assertEqual(runtime.globals, [50, 10])
+
+    def test_load_undefined_name(self):
+        runtime = Runtime()
+        runtime.load_program([('LOAD', 'x'), ('HALT',)])
+        with self.assertRaises(RuntimeError):
+            runtime.run()
+
+    def test_calls_and_defaults(self):
+        code = """
+        func add(a: Int, b: Int = 10, c: Int = 100) -> Int {
+            return a + b + c;
+        }
+        var x: Int = add(1);
+        var y: Int = add(1, 2);
+        var z: Int = add(1, 2, 3);
+        """
+        runtime = run_source(code)
+        self.assertEqual(runtime.globals[1:], [111, 103, 6])
+        self.assertEqual(runtime.stack, [])
+        self.assertEqual(runtime.frames, [])
+
+    def test_argument_count(self):
+        code = """
+        func f(a: Int, b: Int = 1) -> Int {
+            return a;
+        }
+        var x: Int = f(1, 2, 3);
+        """
+        with self.assertRaises(RuntimeError):
+            run_source(code)
+
+    def test_recursion(self):
+        code = """
+        func fib(n: Int) -> Int {
+            if n < 2 {
+                return n;
+            }
+            return fib(n - 1) + fib(n - 2);
+        }
+        var x: Int = fib(15);
+        """
+        for optimize in (0, 1, 2):
+            self.assertEqual(run_source(code, optimize).globals[1], 610)
+
+    def test_locals_are_per_call(self):
+        code = """
+        func f(n: Int) -> Int {
+            var before: Int = n;
+            if n > 0 {
+                f(n - 1);
+            }
+            return before;
+        }
+        var x: Int = f(5);
+        """
+        self.assertEqual(run_source(code).globals[1], 5)
+
+    def test_function_without_return(self):
+        code = """
+        func f() -> Int {
+            var a: Int = 1;
+        }
+        var x: Int = f();
+        """
+        self.assertIsNone(run_source(code).globals[1])
+
+    def test_tail_calls_do_not_grow_the_frame_stack(self):
+        code = f"""
+        func count(n: Int, total: Int) -> Int {{
+            if n == 0 {{
+                return total;
+            }}
+            return count(n - 1, total + 1);
+        }}
+        var x: Int = count({MAX_CALL_DEPTH * 2}, 0);
+        """
+        self.assertEqual(run_source(code).globals[1], MAX_CALL_DEPTH * 2)
+
+    def test_call_depth_limit(self):
+        code = f"""
+        func deep(n: Int) -> Int {{
+            if n == 0 {{
+                return 0;
+            }}
+            return deep(n - 1) + 1;
+        }}
+        var x: Int = deep({MAX_CALL_DEPTH + 1});
+        """
+        with self.assertRaises(RuntimeError):
+            run_source(code)
+
+    def test_goroutines_and_unbuffered_channels(self):
+        code = """
+        func worker(jobs: Chan, results: Chan) -> Int {
+            var job: Int = recv(jobs);
+            while job != 0 {
+                send(results, job * job);
+                job = recv(jobs);
+            }
+            close(results);
+        }
+        var jobs: Chan = chan(0);
+        var results: Chan = chan(0);
+        go worker(jobs, results);
+        var i: Int = 1;
+        var total: Int = 0;
+        while i <= 10 {
+            send(jobs, i);
+            total = total + recv(results);
+            i = i + 1;
+        }
+        send(jobs, 0);
+        var last: Int = recv(results);
+        """
+        runtime = run_source(code)
+        self.assertEqual(runtime.globals[4], 385)
+        self.assertIsNone(runtime.globals[5])
+
+    def test_buffered_channel(self):
+        code = """
+        func producer(out: Chan, n: Int) -> Int {
+            while n > 0 {
+                send(out, n);
+                n = n - 1;
+            }
+            send(out, 0);
+        }
+        var c: Chan = chan(3);
+        var i: Int = 0;
+        while i < 20 {
+            go producer(c, 5);
+            i = i + 1;
+        }
+        var total: Int = 0;
+        var finished: Int = 0;
+        while finished < 20 {
+            var value: Int = recv(c);
+            if value == 0 {
+                finished = finished + 1;
+            }
+            total = total + value;
+        }
+        """
+        self.assertEqual(run_source(code).globals[3], 20 * 15)
+
+    def test_time_slicing(self):
+        # spin never blocks, so stop only ever runs if the scheduler preempts it
+        code = """
+        var stopped: Int = 0;
+        var spins: Int = 0;
+        func spin(done: Chan) -> Int {
+            while stopped == 0 {
+                spins = spins + 1;
+            }
+            send(done, 1);
+        }
+        func stop() -> Int {
+            stopped = 1;
+        }
+        var done: Chan = chan(0);
+        go spin(done);
+        go stop();
+        var finished: Int = recv(done);
+        """
+        runtime = Runtime(time_slice=100)
+        runtime.load_program(compile_source(code))
+        runtime.run()
+        self.assertEqual(runtime.globals[0], 1)
+        self.assertGreater(runtime.globals[1], 0)
+        self.assertEqual(runtime.globals[5], 1)
+
+    def test_deadlock(self):
+        code = """
+        var c: Chan = chan(0);
+        var x: Int = recv(c);
+        """
+        with self.assertRaises(RuntimeError):
+            run_source(code)
+
+    def test_main_does_not_wait_for_goroutines(self):
+        code = """
+        func block(c: Chan) -> Int {
+            return recv(c);
+        }
+        var c: Chan = chan(0);
+        go block(c);
+        var x: Int = 1;
+        """
+        runtime = run_source(code)
+        self.assertEqual(runtime.globals[2], 1)
+
+    def test_many_goroutines(self):
+        code = """
+        func echo(c: Chan, value: Int) -> Int {
+            send(c, value);
+        }
+        var c: Chan = chan(0);
+        var i: Int = 0;
+        while i < 10000 {
+            go echo(c, 1);
+            i = i + 1;
+        }
+        var total: Int = 0;
+        while i > 0 {
+            total = total + recv(c);
+            i = i - 1;
+        }
+        """
+        self.assertEqual(run_source(code).globals[3], 10000)
+
+    def test_parallel_for(self):
+        # Every iteration sees scale as it was when the loop started
+        expected = 1 + sum(3 * k for n in range(50) for k in range(n + 1))
+        for workers in (1, 2, 3):
+            runtime = run_source(PARALLEL_SUM, workers=workers)
+            self.assertEqual(runtime.globals[3], expected)
+            self.assertEqual(runtime.globals[0], 3)
+
+    def test_parallel_for_product_and_empty_range(self):
+        code = """
+        var product: Int = 1;
+        parallel for i in 1 .. 21 reduce(*: product) {
+            return i;
+        }
+        var unchanged: Int = 7;
+        parallel for i in 5 .. 5 reduce(+: unchanged) {
+            return i;
+        }
+        """
+        runtime = run_source(code, workers=2)
+        self.assertEqual(runtime.globals[0], 2432902008176640000)
+        self.assertEqual(runtime.globals[1], 7)
+
+    def test_nested_parallel_for(self):
+        code = """
+        var total: Int = 0;
+        parallel for i in 0 .. 4 reduce(+: total) {
+            var row: Int = 0;
+            parallel for j in 0 .. 4 reduce(+: row) {
+                return j * j;
+            }
+            return row * i;
+        }
+        """
+        self.assertEqual(run_source(code, workers=2).globals[0], 84)
+
+    def test_parallel_for_errors(self):
+        no_result = """
+        var total: Int = 0;
+        parallel for i in 0 .. 10 reduce(+: total) {
+            var x: Int = i;
+        }
+        """
+        too_large = """
+        var total: Int = 0;
+        parallel for i in 0 .. 10 reduce(+: total) {
+            return 9223372036854775807 + i;
+        }
+        """
+        for code in (no_result, too_large):
+            for workers in (1, 2):
+                with self.assertRaises(RuntimeError):
+                    run_source(code, workers=workers)
+
+ARRAYS = """
+var n: Int = 8;
+var k: Int = 3;
+var a: Array = array(n);
+var b: Array = array(n);
+var c: Array = array(n);
+var i: Int = 0;
+while i < n {
+    set(a, i, i * i);
+    i = i + 1;
+}
+i = 0;
+while i < n {
+    set(b, i, get(a, i) * k + 1);
+    i = i + 1;
+}
+i = 2;
+while i < n {
+    set(c, i, get(a, i) + get(b, i) - get(c, i));
+    i = i + 1;
+}
+"""
+
+def scalar(code):
+    # 'i = 1 + i' is not recognized as the step of an element-wise loop, so
+    # the loops run element by element
+    return code.replace('i = i + 1;', 'i = 1 + i;')
+
+@unittest.skipIf(numpy is None, 'NumPy is not installed')
+class TestArrays(unittest.TestCase):
+    def assertSameResult(self, code):
+        instructions = compile_source(code)
+        self.assertIn('VECTOR_GUARD', [instruction[0] for instruction in instructions])
+        results = []
+        for source in (code, scalar(code)):
+            runtime = run_source(source)
+            results.append([value.tolist() if type(value) is numpy.ndarray else value
+                            for value in runtime.globals])
+        self.assertEqual(results[0], results[1])
+        return results[0]
+
+    def test_builtins(self):
+        runtime = run_source("""
+        var a: Array = array(5);
+        set(a, 1, 7);
+        set(a, 4, 2);
+        var view: Array = slice(a, 1, 4);
+        set(view, 1, 5);
+        var total: Int = sum(a);
+        var first: Int = get(view, 0);
+        var size: Int = len(view);
+        copy(slice(a, 3, 5), 9);
+        """)
+        a, view, total, first, size = runtime.globals
+        self.assertEqual(a.tolist(), [0, 7, 5, 9, 9])
+        # Slices are views of the array they were taken from
+        self.assertTrue(numpy.shares_memory(view, a))
+        self.assertEqual((total, first, size), (14, 7, 3))
+        self.assertIs(type(total), int)
+
+    def test_element_wise_operators(self):
+        runtime = run_source("""
+        var a: Array = array(3);
+        copy(a, 4);
+        set(a, 0, 1);
+        var b: Array = a * a + 1;
+        var c: Array = a < 3;
+        """)
+        self.assertEqual(runtime.globals[1].tolist(), [2, 17, 17])
+        self.assertEqual(runtime.globals[2].tolist(), [True, False, False])
+
+    def test_errors(self):
+        for code in [
+            'var a: Array = array(3); var x: Int = get(a, 3);',
+            'var a: Array = array(3); set(a, 0 - 1, 1);',
+            'var a: Array = array(3); var b: Array = slice(a, 2, 4);',
+            'var a: Array = array(3); copy(a, array(2));',
+            'var c: Chan = chan(1); send(c, 4); var x: Int = sum(recv(c));',
+        ]:
+            with self.subTest(code=code):
+                with self.assertRaises(RuntimeError):
+                    run_source(code)
+
+    def test_vectorized_loops(self):
+        a, b, c = self.assertSameResult(ARRAYS)[2:5]
+        self.assertEqual(b, [3 * x + 1 for x in a])
+        self.assertEqual(c[:2], [0, 0])
+
+    def test_vectorized_loop_falls_back(self):
+        # Overlapping slices, a bound past the end of the arrays and a scalar
+        # that is really an array all leave the loop to run element by element
+        overlap = ARRAYS + """
+        var shifted: Array = slice(a, 1, n);
+        i = 0;
+        while i < n - 1 {
+            set(shifted, i, get(a, i) + 1);
+            i = i + 1;
+        }
+        """
+        self.assertEqual(self.assertSameResult(overlap)[2], [0, 1, 2, 3, 4, 5, 6, 7])
+        not_a_scalar = ARRAYS + """
+        var pipe: Chan = chan(1);
+        send(pipe, a);
+        k = recv(pipe);
+        i = 0;
+        while i < n {
+            set(b, i, get(a, i) + k);
+            i = i + 1;
+        }
+        """
+        for code in (not_a_scalar, scalar(not_a_scalar)):
+            with self.assertRaises(RuntimeError):
+                run_source(code)
+        out_of_range = ARRAYS.replace('i = 2;', 'n = 9; i = 2;')
+        for code in (out_of_range, scalar(out_of_range)):
+            with self.assertRaises(RuntimeError):
+                run_source(code)
+
+    def test_vectorized_loop_overflow(self):
+        # Products that leave the int64 range fail as the element-wise loop
+        # does, rather than wrapping around in NumPy
+        code = """
+        var a: Array = array(4);
+        var c: Array = array(4);
+        set(a, 2, 4611686018427387904);
+        var k: Int = %s;
+        var i: Int = 0;
+        while i < 4 {
+            set(c, i, get(a, i) * k - 1);
+            i = i + 1;
+        }
+        """
+        for k in ('4', '100000000000000000000000', '0 - 2'):
+            errors = []
+            for source in (code % k, scalar(code % k)):
+                with self.assertRaises(RuntimeError) as context:
+                    run_source(source)
+                errors.append(str(context.exception))
+            self.assertEqual(errors[0], errors[1])
+            self.assertIn('in an array of int64', errors[0])
+        # Within range the loop is still vectorized and gives the same result
+        self.assertEqual(self.assertSameResult(code % '1')[1], [-1, -1, 4611686018427387903, -1])
+        # Element-wise operators and copy report an Int too large the same way
+        for code in ('var a: Array = array(2); var b: Array = a * 100000000000000000000000;',
+                     'var a: Array = array(2); copy(a, 100000000000000000000000);'):
+            with self.assertRaisesRegex(RuntimeError, 'Cannot store 100000000000000000000000 in an array of int64'):
+                run_source(code)
 
 if __name__ == '__main__':
     unittest.main()
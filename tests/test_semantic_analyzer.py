@@ -1,7 +1,7 @@
 import unittest
 from src.lexer import Lexer
 from src.parser import Parser
-from src.semantic_analyzer import SemanticAnalyzer, SymbolTable
+from src.semantic_analyzer import SemanticAnalyzer, SymbolTable, FunctionType
 
 class TestSemanticAnalyzer(unittest.TestCase):
     def test_variable_declaration(self):
@@ -27,9 +27,10 @@ class TestSemanticAnalyzer(unittest.TestCase):
         analyzer = SemanticAnalyzer()
         analyzer.visit(ast)
         self.assertIn("add", analyzer.symbol_table.symbols)
-        self.assertEqual(analyzer.symbol_table.lookup("add"), "Int")
-        self.assertIn("result", analyzer.symbol_table.symbols)
-        self.assertEqual(analyzer.symbol_table.lookup("result"), "Int")
+        self.assertEqual(analyzer.symbol_table.lookup("add"), FunctionType("Int", ("Int", "Int")))
+        scope = analyzer.scopes[ast.statements[0]]
+        self.assertIn("result", scope.symbols)
+        self.assertEqual(scope.lookup("result"), "Int")
 
     def test_undeclared_variable(self):
         code = "x = 10;"
@@ -40,5 +41,128 @@ class TestSemanticAnalyzer(unittest.TestCase):
         with self.assertRaises(Exception):
             analyzer.visit(ast)
 
+    def test_slots(self):
+        code = """
+        var x: Int = 10;
+        var y: Int = x;
+        func f(a: Int) -> Int {
+            var b: Int = a;
+        }
+        """
+        lexer = Lexer(code)
+        parser = Parser(lexer)
+        ast = parser.parse()
+        analyzer = SemanticAnalyzer()
+        analyzer.visit(ast)
+        self.assertEqual(analyzer.symbol_table.slots, {"x": 0, "y": 1, "f": 2})
+        scope = analyzer.scopes[ast.statements[2]]
+        self.assertEqual(scope.slots, {"a": 0, "b": 1})
+        self.assertEqual(scope.resolve("x"), (analyzer.symbol_table, 0))
+        self.assertEqual(scope.resolve("b"), (scope, 1))
+
+    def test_use_before_declaration(self):
+        code = "var x: Int = x;"
+        lexer = Lexer(code)
+        parser = Parser(lexer)
+        ast = parser.parse()
+        analyzer = SemanticAnalyzer()
+        with self.assertRaises(Exception):
+            analyzer.visit(ast)
+
+    def test_return_outside_function(self):
+        code = "return 1;"
+        lexer = Lexer(code)
+        parser = Parser(lexer)
+        ast = parser.parse()
+        analyzer = SemanticAnalyzer()
+        with self.assertRaises(Exception):
+            analyzer.visit(ast)
+
+    def test_call_undeclared_function(self):
+        code = "var x: Int = f(1);"
+        lexer = Lexer(code)
+        parser = Parser(lexer)
+        ast = parser.parse()
+        analyzer = SemanticAnalyzer()
+        with self.assertRaises(Exception):
+            analyzer.visit(ast)
+
+    def test_builtins(self):
+        analyzer = SemanticAnalyzer()
+        analyzer.visit(Parser(Lexer("var c: Chan = chan(1);\nsend(c, 2);\nvar x: Int = recv(c);")).parse())
+        for code in ("var c: Chan = chan();", "go recv(c);"):
+            with self.assertRaises(Exception):
+                SemanticAnalyzer().visit(Parser(Lexer(code)).parse())
+
+    def test_parallel_for(self):
+        declarations = "var total: Int = 0;\nvar limit: Int = 10;\n"
+        SemanticAnalyzer().visit(Parser(Lexer(
+            declarations + "parallel for i in 0 .. limit reduce(+: total) { var x: Int = i + limit; x = x + 1; return x; }"
+        )).parse())
+        invalid = (
+            # Globals are copies inside the body, so writes to them would be lost
+            "parallel for i in 0 .. 10 reduce(+: total) { limit = i; return i; }",
+            "parallel for i in 0 .. 10 reduce(-: total) { return i; }",
+            "parallel for i in 0 .. 10 reduce(+: missing) { return i; }",
+            "func f(n: Int) -> Int { parallel for i in 0 .. 10 reduce(+: total) { return n; } }",
+        )
+        for code in invalid:
+            with self.assertRaises(Exception):
+                SemanticAnalyzer().visit(Parser(Lexer(declarations + code)).parse())
+
+    def test_nested_functions(self):
+        # Nested functions see globals and their own variables, but are not
+        # closures over the locals of the function around them
+        SemanticAnalyzer().visit(Parser(Lexer(
+            "var g: Int = 5;\nfunc outer(a: Int) -> Int { func inner(b: Int) -> Int { var c: Int = b + g; return c; } return inner(a); }"
+        )).parse())
+        invalid = (
+            "func outer(a: Int) -> Int { func inner(b: Int) -> Int { return a + b; } return inner(1); }",
+            "func outer() -> Int { var a: Int = 1; func inner() -> Int { a = 3; return 0; } return inner(); }",
+            "func outer() -> Int { func one() -> Int { return 1; } func two() -> Int { return one() + 1; } return two(); }",
+        )
+        for code in invalid:
+            with self.assertRaisesRegex(Exception, 'of the enclosing function inside a nested function'):
+                SemanticAnalyzer().visit(Parser(Lexer(code)).parse())
+
+    def test_types(self):
+        code = """
+        func add(a: Int, b: Int) -> Int {
+            return a + b;
+        }
+        var c: Chan = chan(1);
+        var a: Array = array(3);
+        var f: Func = add;
+        var x: Int = add(1, 2) * get(a, 0);
+        var y: Int = x / 2;
+        var z: Int = recv(c);
+        var same: Int = c == c;
+        var scaled: Array = a * x + a;
+        """
+        ast = Parser(Lexer(code)).parse()
+        analyzer = SemanticAnalyzer()
+        analyzer.visit(ast)
+        x = ast.statements[4].value
+        self.assertEqual(analyzer.types[x], 'Int')
+        self.assertEqual(analyzer.types[x.left], 'Int')
+        # Division makes a float, so its type is not known
+        self.assertIsNone(analyzer.types[ast.statements[5].value])
+        self.assertIsNone(analyzer.types[ast.statements[6].value])
+        self.assertEqual(analyzer.types[ast.statements[7].value], 'Int')
+        self.assertEqual(analyzer.types[ast.statements[8].value], 'Array')
+        invalid = (
+            "var c: Chan = 1;",
+            "var c: Chan = chan(1); var x: Int = c + 1;",
+            "var a: Array = array(2); var x: Int = a;",
+            "func f(n: Int) -> Int { return chan(n); }",
+            "func f(n: Int) -> Int { return n; } var x: Int = f(chan(1));",
+            "var x: Int = 1; var y: Int = x();",
+            "var a: Array = array(2); var x: Int = get(2, a);",
+            "parallel for i in 0 .. chan(1) reduce(+: total) { return i; }",
+        )
+        for code in invalid:
+            with self.assertRaises(Exception, msg=code):
+                SemanticAnalyzer().visit(Parser(Lexer("var total: Int = 0;\n" + code)).parse())
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,168 @@
+import os
+import sys
+import shutil
+import tempfile
+import threading
+import subprocess
+import unittest
+from src.bytecode import Bytecode, dump
+from src.cli import compile_source
+from src.client import request
+from src.server import CompileServer, serve
+
+LOOP = "var x: Int = 0;\nwhile x < 50 {\n    x = x + 1;\n}\n"
+CLI = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src', 'cli.py')
+
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.socket = os.path.join(self.directory, 'fusion.sock')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write(self, name, code):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w') as file:
+            file.write(code)
+        return path
+
+    def start(self, **options):
+        options.setdefault('cache_dir', os.path.join(self.directory, 'cache'))
+        server = CompileServer(self.socket, **options)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.start()
+
+        def stop():
+            server.shutdown()
+            thread.join()
+            server.server_close()
+            server.close_pools()
+        self.addCleanup(stop)
+        return server
+
+    def send(self, command, **message):
+        return request({'command': command, **message}, self.socket, timeout=30)
+
+    def test_run_and_cache(self):
+        self.start()
+        path = self.write('loop.fusion', LOOP)
+        for jit in (False, True, True):
+            self.assertEqual(self.send('run', path=path, jit=jit), {'ok': True})
+        self.assertEqual(self.send('compile', path=path, optimize=2)['ok'], True)
+        stats = self.send('stats')
+        self.assertEqual((stats['compiles'], stats['memory_hits'], stats['cached_programs']), (2, 2, 2))
+        self.assertEqual(stats['runs'], 3)
+
+        # A changed file is a new program
+        self.write('loop.fusion', LOOP.replace('50', '60'))
+        self.send('run', path=path)
+        self.assertEqual(self.send('stats')['compiles'], 3)
+
+    def test_disk_cache_shared(self):
+        server = self.start()
+        path = self.write('loop.fusion', LOOP)
+        self.send('run', path=path)
+        # A second daemon on the same cache directory loads instead of compiling
+        other = CompileServer(os.path.join(self.directory, 'other.sock'), cache_dir=server.cache.directory)
+        try:
+            cached = other.cached_program(path, 1)
+            self.assertEqual((other.stats['disk_hits'], other.stats['compiles']), (1, 0))
+            self.assertEqual(list(cached.program.instructions), compile_source(LOOP))
+        finally:
+            other.server_close()
+
+    def test_errors(self):
+        self.start(use_disk_cache=False)
+        cases = [
+            (self.write('zero.fusion', 'var x: Int = 1 / 0;'), 'ZeroDivisionError'),
+            (self.write('undefined.fusion', 'var x: Int = y;'), 'Exception'),
+            (os.path.join(self.directory, 'missing.fusion'), 'FileNotFoundError'),
+        ]
+        for path, error_type in cases:
+            response = self.send('run', path=path)
+            self.assertFalse(response['ok'])
+            self.assertEqual(response['error_type'], error_type)
+        self.assertEqual(self.send('nonsense')['error_type'], 'ValueError')
+        # The daemon keeps serving after errors
+        self.assertTrue(self.send('run', path=self.write('loop.fusion', LOOP))['ok'])
+        self.assertEqual(self.send('stats')['errors'], 4)
+
+    def test_bytecode_files(self):
+        self.start()
+        path = os.path.join(self.directory, 'loop.fbc')
+        dump(Bytecode.from_instructions(compile_source(LOOP)), path)
+        self.assertEqual(self.send('run', path=path), {'ok': True})
+        self.assertEqual(self.send('compile', path=path)['instructions'], len(compile_source(LOOP)))
+
+    def test_concurrent_clients(self):
+        server = self.start(pool_size=2)
+        paths = [self.write(f'loop{i}.fusion', LOOP.replace('50', str(50 + i))) for i in range(3)]
+        responses = []
+
+        def client(index):
+            for request_index in range(10):
+                responses.append(self.send('run', path=paths[(index + request_index) % 3]))
+
+        threads = [threading.Thread(target=client, args=(index,)) for index in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(responses, [{'ok': True}] * 60)
+        for cached in server.programs.values():
+            self.assertLessEqual(cached.pools[False].created, 2)
+
+    def test_eviction(self):
+        server = self.start(cache_size=2, use_disk_cache=False)
+        paths = [self.write(f'loop{i}.fusion', LOOP.replace('50', str(50 + i))) for i in range(3)]
+        for path in paths + paths[:1]:
+            self.send('run', path=path)
+        self.assertEqual(len(server.programs), 2)
+        self.assertEqual(self.send('stats')['compiles'], 4)
+
+    def test_serve_replaces_stale_socket(self):
+        self.start()
+        with self.assertRaises(RuntimeError):
+            serve(self.socket)
+        # A socket file nobody listens on is taken over
+        stale = os.path.join(self.directory, 'stale.sock')
+        CompileServer(stale).socket.close()
+        self.assertTrue(os.path.exists(stale))
+        thread = threading.Thread(target=serve, args=(stale,), kwargs={'use_disk_cache': False})
+        thread.start()
+        for _ in range(100):
+            try:
+                self.assertTrue(request({'command': 'ping'}, stale, timeout=30)['ok'])
+                break
+            except ConnectionRefusedError:
+                thread.join(0.05)
+        request({'command': 'shutdown'}, stale, timeout=30)
+        thread.join()
+        self.assertFalse(os.path.exists(stale))
+
+    def test_client(self):
+        self.start(use_disk_cache=False)
+        path = self.write('zero.fusion', 'var x: Int = 1 / 0;')
+
+        def client(*args):
+            return subprocess.run([sys.executable, CLI, '--connect', '--socket', self.socket, *args],
+                                  capture_output=True, text=True, timeout=60)
+
+        self.assertEqual(client(self.write('loop.fusion', LOOP)).returncode, 0)
+        result = client(path)
+        self.assertEqual((result.returncode, result.stderr), (1, 'ZeroDivisionError: division by zero\n'))
+        # --check compiles without running
+        self.assertEqual(client('--check', path).returncode, 0)
+        missing = subprocess.run([sys.executable, CLI, '--connect', '--socket', os.path.join(self.directory, 'none.sock'), path],
+                                 capture_output=True, text=True, timeout=60)
+        self.assertEqual(missing.returncode, 2)
+        # The client never imports the compiler
+        probe = subprocess.run([sys.executable, '-X', 'importtime', CLI, '--connect', '--socket', self.socket, path],
+                               capture_output=True, text=True, timeout=60)
+        self.assertNotIn('src.runtime', probe.stderr)
+        self.assertIn('src.client', probe.stderr)
+
+if __name__ == '__main__':
+    unittest.main()